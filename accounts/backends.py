@@ -0,0 +1,138 @@
+"""
+Permission backend that answers role permissions from an in-process matrix.
+
+Django's ModelBackend loads a user's permissions with two queries (direct
+user permissions, then group permissions) the first time ``has_perm`` is
+called on a user instance — that is, on every request, since the
+authentication middleware builds a fresh user each time. Here every user
+is normally in exactly the role group named by ``User.role``
+(accounts/signals.py keeps the group in step with the role), so the group
+half is the same for every user of a role.
+
+RolePermissionBackend compiles the role groups once per process into
+
+    roles           {role: frozenset('app_label.codename', ...)}
+    override_users  users with direct permissions, or whose groups are not
+                    exactly their role's group (a non-role group, another
+                    role group, or removed from their own in the admin)
+
+and answers ``has_perm`` for ordinary users without a query. Users in
+``override_users`` and superusers fall through to ModelBackend's DB lookup.
+
+Invalidation is versioned in the database: any write to the role groups,
+their permissions, a user's direct permissions, or a group change that
+moves a user in or out of ``override_users`` bumps the
+``role-permissions`` counter in core.ContentVersion inside the writing
+transaction (setup_roles also does so when it finishes). Each request reads
+the counter once — one indexed query, cached on the user object with the
+matrix it selected — and a process whose matrix carries another counter
+recompiles it, so a revoked permission stops working in every worker on
+its next request, whatever cache backend is configured.
+"""
+from dataclasses import dataclass
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group
+from django.db.models import Exists, F, OuterRef
+
+from core import conditional
+
+VERSION_KEY = 'role-permissions'
+
+_matrix = None
+
+
+@dataclass(frozen=True)
+class RoleMatrix:
+    version: int
+    roles: dict
+    role_group_ids: frozenset
+    override_users: frozenset
+
+
+def role_names():
+    from .models import User
+    return [value for value, _ in User.Roles.choices]
+
+
+def compile_matrix(version):
+    """Read the role groups, their permissions and the override users (3 queries)."""
+    from .models import User
+
+    groups = dict(Group.objects.filter(name__in=role_names()).values_list('pk', 'name'))
+    perms = {name: set() for name in groups.values()}
+    for group_id, app_label, codename in Group.permissions.through.objects.filter(
+        group_id__in=groups,
+    ).values_list('group_id', 'permission__content_type__app_label', 'permission__codename'):
+        perms[groups[group_id]].add(f'{app_label}.{codename}')
+
+    memberships = User.groups.through.objects
+    override_users = set(
+        User.user_permissions.through.objects.values_list('user_id', flat=True).union(
+            # مجموعة ليست دوراً، أو مجموعة دور غير دور المستخدم
+            memberships.exclude(group_id__in=groups).values_list('user_id', flat=True),
+            memberships.filter(group_id__in=groups).exclude(group__name=F('user__role')).values_list('user_id', flat=True),
+            # أُزيل من مجموعة دوره
+            User.objects.exclude(
+                Exists(memberships.filter(user_id=OuterRef('pk'), group__name=OuterRef('role'))),
+            ).values_list('pk', flat=True),
+        )
+    )
+    return RoleMatrix(
+        version=version,
+        roles={name: frozenset(codes) for name, codes in perms.items()},
+        role_group_ids=frozenset(groups),
+        override_users=frozenset(override_users),
+    )
+
+
+def role_matrix():
+    """The compiled matrix, recompiled when the stored version counter changed (1 query)."""
+    global _matrix
+    version, = conditional.versions(VERSION_KEY)
+    matrix = _matrix
+    if matrix is None or matrix.version != version:
+        matrix = _matrix = compile_matrix(version)
+    return matrix
+
+
+def invalidate():
+    """Make every process recompile the matrix on its next permission check."""
+    global _matrix
+    _matrix = None
+    # الزيادة جزء من معاملة الكتابة: العمليات الأخرى تراها مع البيانات الجديدة عند الالتزام فقط
+    conditional.bump(VERSION_KEY)
+
+
+def user_groups_changed(user):
+    """Invalidate when a group change moves ``user`` in or out of override_users."""
+    plain = set(user.groups.values_list('name', flat=True)) == {user.role}
+    if plain == (user.pk in role_matrix().override_users):
+        invalidate()
+
+
+class RolePermissionBackend(ModelBackend):
+    """ModelBackend whose role-group permissions come from the compiled matrix."""
+
+    def _matrix(self, user_obj):
+        # رقم الإصدار يُقرأ مرة لكل طلب: كائن المستخدم يُبنى من جديد في كل طلب
+        if not hasattr(user_obj, '_role_matrix'):
+            user_obj._role_matrix = role_matrix()
+        return user_obj._role_matrix
+
+    def _from_db(self, user_obj):
+        return user_obj.is_superuser or user_obj.pk in self._matrix(user_obj).override_users
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if self._from_db(user_obj):
+            return super().get_user_permissions(user_obj, obj)
+        return set()
+
+    def get_group_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if self._from_db(user_obj):
+            return super().get_group_permissions(user_obj, obj)
+        return set(self._matrix(user_obj).roles.get(user_obj.role, ()))
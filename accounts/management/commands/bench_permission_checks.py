@@ -0,0 +1,107 @@
+"""
+Management command: bench_permission_checks
+===========================================
+يقيس عدد استعلامات وزمن طلب صفحة تفاصيل المطالبة لكل دور، مرة بصلاحيات
+Django الافتراضية (ModelBackend: جدولا صلاحيات المستخدم والمجموعات في كل طلب)
+ومرة بمصفوفة الأدوار المُجمّعة (accounts/backends.py).
+
+الاستخدام:
+    python manage.py bench_permission_checks
+    python manage.py bench_permission_checks --requests 50
+
+تُنشأ البيانات داخل معاملة ويتم التراجع عنها بالكامل بعد القياس.
+"""
+import datetime
+import io
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client as HttpClient
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from accounts import backends
+from accounts.models import User
+from brokers.models import Broker
+from claims.models import Claim, Currency
+from clients.models import Client
+from members.models import Member
+from policies.models import Policy, PolicyClass
+from providers.models import Provider
+
+BACKENDS = (
+    ('group tables', 'django.contrib.auth.backends.ModelBackend'),
+    ('role matrix', 'accounts.backends.RolePermissionBackend'),
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark queries per claim-detail request with the role permission matrix vs ModelBackend."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help="Requests per role and backend.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['requests'])
+                raise _Rollback
+        except _Rollback:
+            pass
+        backends.invalidate()
+
+    def _run(self, requests):
+        call_command('setup_roles', stdout=io.StringIO())
+        broker = Broker.objects.create(name_ar='وسيط', name_en='Bench Broker', commercial_record='BENCH-BR')
+        insurer = Provider.objects.create(name_ar='مزود', name_en='Bench Insurer', license_number='BENCH-LIC')
+        company = Client.objects.create(
+            name_ar='شركة', name_en='Bench Company', commercial_record='BENCH-C', broker=broker,
+        )
+        policy = Policy.objects.create(
+            client=company, provider=insurer, policy_number='BENCH-POL',
+            start_date=datetime.date.today(), end_date=datetime.date.today() + datetime.timedelta(days=364),
+        )
+        member = Member.objects.create(
+            client=company, policy_class=PolicyClass.objects.create(policy=policy, name='A'),
+            full_name='Bench Member', national_id='8999999999', birth_date=datetime.date(1990, 1, 1),
+            gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        currency, _ = Currency.objects.get_or_create(code='SAR', defaults={'name_ar': 'ريال', 'name_en': 'Riyal'})
+        claim = Claim.objects.create(
+            member=member, currency=currency, status=Claim.Status.SUBMITTED_TO_BROKER,
+            service_date=datetime.date.today(), amount_original=100,
+        )
+        users = [
+            User.objects.create_user(
+                username='bench-broker', password='p', role=User.Roles.BROKER_ADMIN, related_broker=broker,
+            ),
+            User.objects.create_user(
+                username='bench-hr', password='p', role=User.Roles.HR_ADMIN, related_client=company,
+            ),
+        ]
+        url = reverse('claims:claim_detail', args=[claim.pk])
+
+        for label, backend in BACKENDS:
+            with override_settings(AUTHENTICATION_BACKENDS=[backend], ALLOWED_HOSTS=['testserver']):
+                for user in users:
+                    http = HttpClient()
+                    http.force_login(user, backend=backend)
+                    http.get(url)  # تسخين: تجميع المصفوفة والقوالب
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        for _ in range(requests):
+                            response = http.get(url)
+                        elapsed = time.perf_counter() - started
+                    if response.status_code != 200:
+                        self.stdout.write(self.style.ERROR(f"{user.role}: HTTP {response.status_code}"))
+                        continue
+                    self.stdout.write(
+                        f"{label:12s} {user.role:13s} {len(queries) / requests:5.1f} queries, "
+                        f"{elapsed / requests * 1000:6.1f}ms per claim-detail request"
+                    )
@@ -16,6 +16,8 @@ Management command: setup_roles
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import Group, Permission
 
+from accounts import backends
+
 
 # ============================================================
 # تعريف الصلاحيات لكل دور
@@ -346,6 +348,9 @@ class Command(BaseCommand):
             for m in missing:
                 self.stdout.write(self.style.WARNING(f"      ⚠  Not found (run migrate first?): {m}"))
 
+        # المصفوفة المُجمّعة في كل عملية (accounts/backends.py) تُعاد من المجموعات المحدّثة
+        backends.invalidate()
+
         self.stdout.write("")
         self.stdout.write(self.style.SUCCESS(f"Done. {total_set} permissions assigned across {len(ROLE_PERMISSIONS)} groups."))
         if total_missing:
@@ -3,8 +3,10 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 
+from core.tracking import TrackedFieldsMixin
 
-class User(AbstractUser):
+
+class User(TrackedFieldsMixin, AbstractUser):
     """
     نظام المستخدم الموحد: يدعم موظفي الوسيط، العملاء، والشركاء
     """
@@ -43,6 +45,9 @@ class User(AbstractUser):
         ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # تغيّرها يُخرج المستخدم من قائمة HR المخزنة مؤقتاً للعميل (notifications.outbox)
+    tracked_fields = ('role', 'related_client_id', 'is_active')
     
     role = models.CharField(
         _("Role"), 
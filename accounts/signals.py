@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group, Permission
+from . import backends
 from .models import User
 
 @receiver(post_save, sender=User)
@@ -21,9 +22,47 @@ def move_user_to_group(sender, instance, created, **kwargs):
     except Group.DoesNotExist:
         return
 
-    if not instance.groups.filter(pk=group.pk).exists():
-        instance.groups.add(group)
+    # الحالة الوسيطة (مجموعتا دور أثناء النقل) لا تُبطل المصفوفة — نفحص مرة بعد النقل
+    instance._syncing_role_group = True
+    try:
+        changed = False
+        if not instance.groups.filter(pk=group.pk).exists():
+            instance.groups.add(group)
+            changed = True
+
+        groups_to_remove = instance.groups.filter(name__in=all_role_names).exclude(pk=group.pk)
+        if groups_to_remove.exists():
+            instance.groups.remove(*groups_to_remove)
+            changed = True
+    finally:
+        del instance._syncing_role_group
+    if changed:
+        backends.user_groups_changed(instance)
+
+
+# ── مصفوفة صلاحيات الأدوار (accounts/backends.py) ──────────────────────────
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def role_groups_changed(sender, **kwargs):
+    backends.invalidate()
 
-    groups_to_remove = instance.groups.filter(name__in=all_role_names).exclude(pk=group.pk)
-    if groups_to_remove.exists():
-        instance.groups.remove(*groups_to_remove)
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def permissions_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        backends.invalidate()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """يُبطل المصفوفة فقط إذا دخل المستخدم قائمة الاستثناءات أو خرج منها."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # group.user_set — قد يغيّر عدة مستخدمين
+        backends.invalidate()
+    elif not getattr(instance, '_syncing_role_group', False):
+        backends.user_groups_changed(instance)
@@ -1,3 +1,127 @@
+from io import StringIO
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from core.conditional import versions
+
+from . import backends
+from .models import User
+
+
+class RolePermissionBackendTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # صلاحيات المجموعات تُنشأ بعد الترحيلات في قاعدة الاختبار
+        call_command('setup_roles', stdout=StringIO())
+
+    def setUp(self):
+        self.addCleanup(backends.invalidate)
+        self.users = {
+            role: User.objects.create_user(username=role.lower(), password='p', role=role)
+            for role in (User.Roles.BROKER_ADMIN, User.Roles.HR_STAFF, User.Roles.INSURANCE, User.Roles.MEMBER)
+        }
+
+    def fresh(self, role):
+        # كل طلب يبني كائن مستخدم جديداً بلا ذاكرة صلاحيات
+        return User.objects.get(pk=self.users[role].pk)
+
+    def test_matrix_matches_group_tables(self):
+        for role in self.users:
+            self.assertEqual(
+                backends.RolePermissionBackend().get_all_permissions(self.fresh(role)),
+                ModelBackend().get_all_permissions(self.fresh(role)),
+                role,
+            )
+        self.assertIn('claims.can_submit_claim', backends.role_matrix().roles[User.Roles.MEMBER])
+
+    def test_role_checks_read_only_the_version(self):
+        backends.role_matrix()
+        user = self.fresh(User.Roles.BROKER_ADMIN)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.has_perm('claims.can_process_broker'))
+            self.assertFalse(user.has_perm('claims.can_process_insurance'))
+            self.assertTrue(user.is_broker)
+
+    def test_user_overrides_fall_through_to_db(self):
+        perm = Permission.objects.get(content_type__app_label='claims', codename='can_process_insurance')
+        self.users[User.Roles.MEMBER].user_permissions.add(perm)
+        self.assertTrue(self.fresh(User.Roles.MEMBER).has_perm('claims.can_process_insurance'))
+
+        extra = Group.objects.create(name='Auditors')
+        extra.permissions.add(Permission.objects.get(content_type__app_label='claims', codename='can_approve_payment'))
+        self.users[User.Roles.HR_STAFF].groups.add(extra)
+        hr = self.fresh(User.Roles.HR_STAFF)
+        self.assertTrue(hr.has_perm('claims.can_approve_payment'))
+        self.assertTrue(hr.has_perm('claims.can_approve_hr'))
+
+        self.users[User.Roles.MEMBER].user_permissions.remove(perm)
+        self.assertFalse(self.fresh(User.Roles.MEMBER).has_perm('claims.can_process_insurance'))
+
+    def test_group_permission_change_and_role_change(self):
+        group = Group.objects.get(name=User.Roles.INSURANCE)
+        perm = Permission.objects.get(content_type__app_label='claims', codename='can_process_insurance')
+        self.assertTrue(self.fresh(User.Roles.INSURANCE).has_perm('claims.can_process_insurance'))
+        group.permissions.remove(perm)
+        self.assertFalse(self.fresh(User.Roles.INSURANCE).has_perm('claims.can_process_insurance'))
+
+        user = self.users[User.Roles.MEMBER]
+        user.role = User.Roles.INSURANCE
+        user.save()
+        self.assertNotIn(user.pk, backends.role_matrix().override_users)
+        self.assertFalse(self.fresh(User.Roles.MEMBER).has_perm('claims.can_submit_claim'))
+
+    def test_inactive_users_have_no_permissions(self):
+        User.objects.filter(pk=self.users[User.Roles.BROKER_ADMIN].pk).update(is_active=False)
+        self.assertFalse(self.fresh(User.Roles.BROKER_ADMIN).has_perm('claims.can_process_broker'))
+
+    def test_setup_roles_publishes_a_new_version(self):
+        group = Group.objects.get(name=User.Roles.MEMBER)
+        backends.role_matrix()
+        # كتابة لا تمر بالإشارات — المصفوفة لا تعلم بها حتى يعمل setup_roles
+        Group.permissions.through.objects.filter(group=group).delete()
+        self.assertTrue(self.fresh(User.Roles.MEMBER).has_perm('claims.can_submit_claim'))
+
+        version, = versions(backends.VERSION_KEY)
+        call_command('setup_roles', stdout=StringIO())
+        self.assertGreater(versions(backends.VERSION_KEY)[0], version)
+        self.assertEqual(backends.role_matrix().version, versions(backends.VERSION_KEY)[0])
+        self.assertTrue(self.fresh(User.Roles.MEMBER).has_perm('claims.can_submit_claim'))
+
+    def test_other_workers_see_a_revocation_on_their_next_request(self):
+        group = Group.objects.get(name=User.Roles.INSURANCE)
+        perm = Permission.objects.get(content_type__app_label='claims', codename='can_process_insurance')
+        matrix = backends.role_matrix()
+        group.permissions.remove(perm)
+        # عملية أخرى: مصفوفتها المُجمّعة قبل السحب ما زالت في ذاكرتها
+        backends._matrix = matrix
+        self.assertFalse(self.fresh(User.Roles.INSURANCE).has_perm('claims.can_process_insurance'))
+
+    def test_user_removed_from_role_group_loses_its_permissions(self):
+        user = self.users[User.Roles.INSURANCE]
+        user.groups.remove(Group.objects.get(name=User.Roles.INSURANCE))
+        fresh = self.fresh(User.Roles.INSURANCE)
+        self.assertFalse(fresh.has_perm('claims.can_process_insurance'))
+        self.assertEqual(
+            backends.RolePermissionBackend().get_all_permissions(fresh), ModelBackend().get_all_permissions(fresh),
+        )
+
+    def test_second_role_group_adds_its_permissions(self):
+        user = self.users[User.Roles.MEMBER]
+        user.groups.add(Group.objects.get(name=User.Roles.INSURANCE))
+        fresh = self.fresh(User.Roles.MEMBER)
+        self.assertTrue(fresh.has_perm('claims.can_process_insurance'))
+        self.assertTrue(fresh.has_perm('claims.can_submit_claim'))
+
+        user.groups.remove(Group.objects.get(name=User.Roles.INSURANCE))
+        self.assertFalse(self.fresh(User.Roles.MEMBER).has_perm('claims.can_process_insurance'))
+
+    def test_role_sync_keeps_the_matrix(self):
+        version, = versions(backends.VERSION_KEY)
+        user = User.objects.create_user(username='new', password='p', role=User.Roles.MEMBER)
+        user.role = User.Roles.HR_STAFF
+        user.save()
+        self.assertEqual(versions(backends.VERSION_KEY)[0], version)
+        self.assertNotIn(user.pk, backends.role_matrix().override_users)
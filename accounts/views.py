@@ -52,23 +52,24 @@ def dashboard(request):
             messages.error(request, "لم يتم ربط حسابك بشركة محددة، يرجى التواصل مع الدعم الفني")
             return redirect('login')
             
-        # إحصائيات الأعضاء
+        # إحصائيات الأعضاء — من اللقطة المحدثة تدريجياً (members/stats.py)
         from members.models import Member
-        members = Member.objects.filter(client=client)
-        
+        from members import stats as member_stats
+        snapshot = member_stats.client_stats(client)
+
         stats = {
-            'total_members': members.count(),
-            'employees': members.filter(relation='PRINCIPAL').count(),
-            'dependents': members.exclude(relation='PRINCIPAL').count(),
-            'spouses': members.filter(relation='SPOUSE').count(),
-            'children': members.filter(relation='CHILD').count(),
-            'parents': members.filter(relation='PARENT').count(),
-            'others': members.filter(relation__in=['BROTHER', 'SISTER', 'OTHER']).count(),
-            'pending_requests': members.filter(is_active=False).count(),
+            'total_members': snapshot.total,
+            'employees': snapshot.principals,
+            'dependents': snapshot.dependents,
+            'spouses': snapshot.spouses,
+            'children': snapshot.children,
+            'parents': snapshot.parents,
+            'others': snapshot.others,
+            'pending_requests': snapshot.inactive,
         }
-        
+
         # آخر الطلبات (الأعضاء غير النشطين)
-        recent_requests = members.filter(is_active=False).select_related('policy_class__policy', 'policy_class__network').order_by('-created_at')[:5]
+        recent_requests = Member.objects.filter(client=client, is_active=False).select_related('policy_class__policy', 'policy_class__network').order_by('-created_at')[:5]
         
         context = {
             'client': client,
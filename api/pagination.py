@@ -0,0 +1,59 @@
+"""
+Cursor pagination for the mobile API, on top of core/keyset.py.
+
+DRF's CursorPagination orders on a single field and falls back to OFFSET
+for ties; the API lists use the same composite keys (and indexes) as the
+web lists instead. A view names its key with ``keyset_fields`` (default
+newest-first ``('created_at', 'id')``) and ``keyset_descending``.
+
+    GET /api/v1/claims/?page_size=20
+    → {"next": ".../claims/?page_size=20&cursor=WyIy...", "results": [...]}
+"""
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core import keyset
+
+
+class KeysetPagination(BasePagination):
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page = keyset.paginate(
+            queryset,
+            cursor=request.query_params.get(self.cursor_query_param),
+            size=self.get_page_size(request),
+            fields=getattr(view, 'keyset_fields', ('created_at', 'id')),
+            descending=getattr(view, 'keyset_descending', True),
+        )
+        self.next_cursor = page.next_cursor
+        return page.items
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
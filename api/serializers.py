@@ -0,0 +1,155 @@
+"""
+Read serializers of the mobile API (v1).
+
+Sparse fieldsets: ``?fields=id,status,member_name`` serializes only those
+fields (``id`` is always kept; unknown names are ignored). Each serializer
+declares which relations its fields read, in ``select`` (select_related
+paths) and ``prefetch`` (prefetch_related paths). SparseFieldsMixin.optimize()
+joins only what the requested fields need, so a page costs the same number
+of queries whatever its size, and a narrow ``?fields=`` costs fewer joins.
+"""
+from rest_framework import serializers
+
+from claims.models import Claim
+from members.models import Member
+from networks.models import ServiceProvider
+from service_requests.models import ServiceRequest
+
+
+class SparseFieldsMixin:
+    select = {}
+    prefetch = {}
+    always = ('id',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context.get('request'))
+        if requested is not None:
+            for name in set(self.fields) - requested - set(self.always):
+                self.fields.pop(name)
+
+    @staticmethod
+    def requested_fields(request):
+        raw = request.query_params.get('fields') if request is not None else None
+        if not raw:
+            return None
+        return {name.strip() for name in raw.split(',') if name.strip()}
+
+    @classmethod
+    def optimize(cls, queryset, request):
+        """``queryset`` with exactly the joins/prefetches the requested fields need."""
+        requested = cls.requested_fields(request)
+        names = cls.Meta.fields if requested is None else [name for name in cls.Meta.fields if name in requested]
+        select = sorted({path for name in names for path in cls.select.get(name, ())})
+        prefetch = sorted({path for name in names for path in cls.prefetch.get(name, ())})
+        queryset = queryset.select_related(None)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class MemberSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    client_name = serializers.CharField(source='client.name_ar', read_only=True)
+    class_name = serializers.CharField(source='policy_class.name', read_only=True)
+    policy_number = serializers.CharField(source='policy_class.policy.policy_number', read_only=True)
+    policy_end_date = serializers.DateField(source='policy_class.policy.end_date', read_only=True)
+    relation_display = serializers.CharField(source='get_relation_display', read_only=True)
+
+    select = {
+        'client_name': ('client',),
+        'class_name': ('policy_class',),
+        'policy_number': ('policy_class__policy',),
+        'policy_end_date': ('policy_class__policy',),
+    }
+
+    class Meta:
+        model = Member
+        fields = [
+            'id', 'full_name', 'relation', 'relation_display', 'gender', 'birth_date',
+            'medical_card_number', 'phone_number', 'is_active', 'sponsor',
+            'client_name', 'class_name', 'policy_class', 'policy_number', 'policy_end_date',
+        ]
+
+
+class ClaimSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    member_name = serializers.CharField(source='member.full_name', read_only=True)
+    benefit_type_name = serializers.CharField(source='benefit_type.name_ar', read_only=True, default=None)
+    attachments_count = serializers.SerializerMethodField()
+
+    select = {
+        'member_name': ('member',),
+        'benefit_type_name': ('benefit_type',),
+    }
+    prefetch = {
+        'attachments_count': ('attachments',),
+    }
+
+    class Meta:
+        model = Claim
+        fields = [
+            'id', 'claim_reference', 'status', 'status_display', 'member', 'member_name',
+            'service_date', 'created_at', 'updated_at', 'currency', 'amount_original', 'approved_amount_sar',
+            'benefit_type', 'benefit_type_name', 'is_in_patient', 'is_international', 'rejection_reason',
+            'attachments_count',
+        ]
+
+    def get_attachments_count(self, claim):
+        return len(claim.attachments.all())
+
+
+class ServiceRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    member_name = serializers.CharField(source='member.full_name', read_only=True)
+    request_type_name = serializers.CharField(source='request_type.name_ar', read_only=True)
+    request_type_icon = serializers.CharField(source='request_type.icon', read_only=True)
+
+    select = {
+        'member_name': ('member',),
+        'request_type_name': ('request_type',),
+        'request_type_icon': ('request_type',),
+    }
+
+    class Meta:
+        model = ServiceRequest
+        fields = [
+            'id', 'reference', 'status', 'status_display', 'member', 'member_name',
+            'request_type', 'request_type_name', 'request_type_icon', 'data', 'broker_note',
+            'created_at', 'updated_at', 'submitted_at',
+        ]
+
+
+class ProviderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    type_display = serializers.CharField(source='get_type_display', read_only=True)
+
+    class Meta:
+        model = ServiceProvider
+        fields = ['id', 'name_ar', 'name_en', 'type', 'type_display', 'city', 'address', 'latitude', 'longitude']
+
+
+def _amount(value):
+    # المبالغ نصوص كما في حقول DecimalField (COERCE_DECIMAL_TO_STRING)
+    return None if value is None else str(value)
+
+
+def coverage_payload(cover, usage):
+    """The coverage snapshot of a class and the member's utilisation against it."""
+    def balance(b):
+        return {
+            'limit': _amount(b.limit), 'reserved': _amount(b.reserved),
+            'consumed': _amount(b.consumed), 'remaining': _amount(b.remaining),
+        }
+
+    return {
+        'policy_class': cover.policy_class_id,
+        'version': cover.version,
+        'network': cover.network,
+        'annual_limit': _amount(cover.annual_limit),
+        'benefits': [{**b, 'limit_amount': _amount(b['limit_amount'])} for b in cover.benefits],
+        'utilisation': {
+            'member': balance(usage.member),
+            'family': balance(usage.family),
+        },
+    }
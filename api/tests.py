@@ -1,3 +1,137 @@
+import datetime
+from urllib.parse import parse_qs, urlsplit
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from claims.models import Claim, ClaimAttachment, Currency
+from clients.models import Client
+from members.models import Member
+from networks.models import Network, ServiceProvider
+from policies.models import BenefitType, ClassBenefit, Policy, PolicyClass
+from providers.models import Provider
+from service_requests.models import RequestType, ServiceRequest
+
+
+class MobileApiTest(TestCase):
+    def setUp(self):
+        Currency.objects.create(code='SAR', name_ar='ريال', name_en='Riyal')
+        insurer = Provider.objects.create(name_ar='مزود', name_en='Insurer', license_number='LIC-1')
+        network = Network.objects.create(provider=insurer, name_ar='ذهبية', name_en='Gold')
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1')
+        other_company = Client.objects.create(name_ar='أخرى', name_en='Other', commercial_record='CR-2')
+        policy = Policy.objects.create(
+            client=company, provider=insurer, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        policy_class = PolicyClass.objects.create(policy=policy, name='VIP', network=network, annual_limit=10000)
+        ClassBenefit.objects.create(
+            policy_class=policy_class, benefit_type=BenefitType.objects.create(name_ar='أسنان', name_en='Dental'),
+            limit_amount=2000,
+        )
+
+        self.user = User.objects.create_user(username='member', password='p', role=User.Roles.MEMBER)
+        self.member = self.make_member(company, policy_class, '1000000001', user=self.user)
+        self.child = self.make_member(company, policy_class, '1000000002', sponsor=self.member, relation='CHILD')
+        self.stranger = self.make_member(other_company, policy_class, '1000000003')
+
+        submitter = User.objects.create_user(username='hr', password='p', role=User.Roles.SUPER_ADMIN)
+        request_type = RequestType.objects.create(name_ar='اعتراض')
+        for i in range(12):
+            claim = Claim.objects.create(
+                member=self.child if i % 2 else self.member, service_date=datetime.date(2026, 3, 1),
+                amount_original=100 + i,
+            )
+            ClaimAttachment.objects.create(claim=claim, file='claims/x.pdf')
+            ServiceRequest.objects.create(request_type=request_type, member=self.member, submitted_by=submitter)
+            network.hospitals.add(ServiceProvider.objects.create(
+                name_ar=f'مستشفى {i}', name_en=f'Hospital {i:02}', type='HOSPITAL', city='Riyadh',
+            ))
+        Claim.objects.create(member=self.stranger, service_date=datetime.date(2026, 3, 1), amount_original=1)
+        self.client.force_login(self.user)
+
+    def make_member(self, company, policy_class, national_id, **extra):
+        extra.setdefault('relation', 'PRINCIPAL')
+        return Member.objects.create(
+            client=company, policy_class=policy_class, full_name=f'Member {national_id}', national_id=national_id,
+            birth_date=datetime.date(1990, 1, 1), gender='M', phone_number='0500000000', **extra,
+        )
+
+    def url(self, name, **kwargs):
+        return reverse(f'api:{name}', kwargs={'version': 'v1', **kwargs})
+
+    def query_count(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def test_list_endpoints_have_constant_query_counts(self):
+        for url in (
+            self.url('claim_list'),
+            self.url('request_list'),
+            self.url('member_providers', member='me'),
+            self.url('member_family', member='me'),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.query_count(url, page_size=2), self.query_count(url, page_size=10))
+
+    def test_detail_endpoints_have_fixed_query_counts(self):
+        claim = Claim.objects.filter(member=self.member).first()
+        for url, expected in (
+            # الجلسة، المستخدم، نطاق العضو (العضو وتابعوه)، ثم:
+            (self.url('member_detail', member='me'), 5),  # العضو مع علاقاته
+            (self.url('claim_detail', pk=claim.pk), 7),  # رمز ETag، المطالبة، المرفقات
+            (self.url('member_coverage', member='me'), 7),  # العضو، لقطة التغطية، الأرصدة
+        ):
+            self.client.get(url)  # ترجمة لقطة التغطية في أول قراءة
+            with self.subTest(url=url):
+                self.assertEqual(self.query_count(url), expected)
+
+    def test_cursor_pages_cover_the_member_family_claims_once(self):
+        seen, params = [], {'page_size': 5}
+        while True:
+            body = self.client.get(self.url('claim_list'), params).json()
+            seen += [row['id'] for row in body['results']]
+            if not body['next']:
+                break
+            params['cursor'] = parse_qs(urlsplit(body['next']).query)['cursor'][0]
+        family_claims = Claim.objects.filter(member__in=[self.member, self.child])
+        self.assertEqual(sorted(seen), sorted(str(pk) for pk in family_claims.values_list('pk', flat=True)))
+
+    def test_sparse_fieldsets(self):
+        body = self.client.get(self.url('claim_list'), {'fields': 'status,amount_original'}).json()
+        self.assertEqual(set(body['results'][0]), {'id', 'status', 'amount_original'})
+        # بدون member_name لا حاجة للربط مع جدول الأعضاء
+        self.assertLess(
+            self.query_count(self.url('claim_list'), fields='id,status'),
+            self.query_count(self.url('claim_list')),
+        )
+
+    def test_role_scoping(self):
+        self.assertEqual(self.client.get(self.url('member_detail', member=self.stranger.pk)).status_code, 404)
+        body = self.client.get(self.url('member_family', member=self.child.pk)).json()
+        self.assertEqual([row['id'] for row in body], [str(self.member.pk), str(self.child.pk)])
+        stranger_claim = Claim.objects.get(member=self.stranger)
+        self.assertEqual(self.client.get(self.url('claim_detail', pk=stranger_claim.pk)).status_code, 404)
+
+    def test_coverage_and_providers(self):
+        body = self.client.get(self.url('member_coverage', member='me')).json()
+        self.assertEqual(body['annual_limit'], '10000.00')
+        self.assertEqual(body['utilisation']['member']['remaining'], '10000.00')
+        body = self.client.get(self.url('member_providers', member='me'), {'page_size': 3}).json()
+        self.assertEqual([row['name_en'] for row in body['results']], ['Hospital 00', 'Hospital 01', 'Hospital 02'])
+
+    def test_unchanged_claims_answer_304(self):
+        url = self.url('claim_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Claim.objects.filter(member=self.child).first().save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
 
-# Create your tests here.
+    def test_unknown_version_is_404(self):
+        response = self.client.get(reverse('api:claim_list', kwargs={'version': 'v9'}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,21 @@
+from django.urls import include, path
+
+from . import views
+
+app_name = 'api'
+
+# الإصدار جزء من المسار (URLPathVersioning) — ‎/api/v1/...
+v1_patterns = [
+    path('members/<str:member>/', views.MemberDetailView.as_view(), name='member_detail'),
+    path('members/<str:member>/family/', views.FamilyView.as_view(), name='member_family'),
+    path('members/<str:member>/coverage/', views.CoverageView.as_view(), name='member_coverage'),
+    path('members/<str:member>/providers/', views.ProviderListView.as_view(), name='member_providers'),
+    path('claims/', views.ClaimListView.as_view(), name='claim_list'),
+    path('claims/<uuid:pk>/', views.ClaimDetailView.as_view(), name='claim_detail'),
+    path('service-requests/', views.ServiceRequestListView.as_view(), name='request_list'),
+    path('service-requests/<uuid:pk>/', views.ServiceRequestDetailView.as_view(), name='request_detail'),
+]
+
+urlpatterns = [
+    path('<str:version>/', include(v1_patterns)),
+]
@@ -1,3 +1,207 @@
-from django.shortcuts import render
+"""
+Mobile API v1 — read endpoints for the Flutter app.
 
-# Create your views here.
+Every queryset starts from the same data-isolation helper as the web views
+(get_allowed_members / get_allowed_claims / get_allowed_requests, resolved
+through core/scope.py), so the API never sees more than the portal. Lists
+are keyset-paginated (api/pagination.py) and honour ``?fields=``
+(api/serializers.py). Claims, service requests and coverage answer
+``If-None-Match`` with 304 (core/conditional.py).
+
+``members/me/...`` addresses the member profile of the logged-in member.
+"""
+import uuid
+
+from django.db.models import F, Q
+from django.shortcuts import get_object_or_404
+from rest_framework import generics
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from claims import utilisation
+from claims.views import get_allowed_claims
+from core import conditional
+from core.scope import get_scope
+from members.utils import get_allowed_members
+from networks.models import ServiceProvider
+from policies import coverage
+from service_requests.views import get_allowed_requests
+from .pagination import KeysetPagination
+from .serializers import (
+    ClaimSerializer, MemberSerializer, ProviderSerializer, ServiceRequestSerializer, coverage_payload,
+)
+
+
+def _parse_uuid(value, field):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise ValidationError({field: "Not a valid id."})
+
+
+class MemberMixin:
+    """Resolves the ``member`` URL kwarg ('me' or an id) within the user's scope."""
+
+    def member_queryset(self):
+        return get_allowed_members(self.request.user)
+
+    def get_member(self):
+        if not hasattr(self, '_member'):
+            key = self.kwargs['member']
+            if key == 'me':
+                pk = get_scope(self.request.user).member_id
+                if pk is None:
+                    raise NotFound("The current user has no member profile.")
+            else:
+                try:
+                    pk = uuid.UUID(key)
+                except ValueError:
+                    raise NotFound()
+            self._member = get_object_or_404(self.member_queryset(), pk=pk)
+        return self._member
+
+
+class ConditionalMixin:
+    """
+    304 Not Modified while etag_token() is unchanged. Runs after DRF
+    authentication, so the token is computed for the authenticated user.
+    """
+
+    def etag_token(self):
+        return None
+
+    def get(self, request, *args, **kwargs):
+        etag = conditional.etag_for(request, self.etag_token())
+        response = conditional.not_modified(request, etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return conditional.tag(response, etag)
+
+
+class ScopedListView(generics.ListAPIView):
+    pagination_class = KeysetPagination
+
+    def scoped_queryset(self):
+        raise NotImplementedError
+
+    def get_queryset(self):
+        return self.serializer_class.optimize(self.scoped_queryset(), self.request)
+
+
+# ── Members ─────────────────────────────────────────────────────────────────
+
+class MemberDetailView(MemberMixin, generics.RetrieveAPIView):
+    serializer_class = MemberSerializer
+
+    def member_queryset(self):
+        return MemberSerializer.optimize(super().member_queryset(), self.request)
+
+    def get_object(self):
+        return self.get_member()
+
+
+class FamilyView(MemberMixin, ScopedListView):
+    """The principal member first, then their dependents (a family is small — no pages)."""
+    serializer_class = MemberSerializer
+    pagination_class = None
+
+    def scoped_queryset(self):
+        principal_id = self.get_member().sponsor_id or self.get_member().pk
+        return get_allowed_members(self.request.user).filter(
+            Q(pk=principal_id) | Q(sponsor_id=principal_id)
+        ).order_by(F('sponsor_id').asc(nulls_first=True), 'birth_date')
+
+
+class CoverageView(MemberMixin, APIView):
+    """The compiled coverage of the member's class and their utilisation against it."""
+
+    def member_queryset(self):
+        return super().member_queryset().select_related('policy_class')
+
+    def get(self, request, *args, **kwargs):
+        member = self.get_member()
+        cover = coverage.for_class(member.policy_class_id)
+        if cover is None:
+            raise NotFound()
+        usage = utilisation.for_member(member, cover=cover)
+        # إصدار اللقطة + الأرصدة — يوفّر الترميز والنقل وإن لم يوفّر الاستعلامات
+        etag = conditional.etag_for(request, (cover.version, usage))
+        response = conditional.not_modified(request, etag) or Response(coverage_payload(cover, usage))
+        return conditional.tag(response, etag)
+
+
+class ProviderListView(MemberMixin, ScopedListView):
+    """In-network providers of the member's class (?city=, ?type=), alphabetical."""
+    serializer_class = ProviderSerializer
+    keyset_fields = ('name_en', 'id')
+    keyset_descending = False
+
+    def scoped_queryset(self):
+        providers = ServiceProvider.objects.filter(
+            effective_class_links__policy_class_id=self.get_member().policy_class_id,
+        )
+        params = self.request.query_params
+        if params.get('city'):
+            providers = providers.filter(city=params['city'])
+        if params.get('type'):
+            providers = providers.filter(type=params['type'])
+        return providers
+
+
+# ── Claims & service requests ───────────────────────────────────────────────
+
+class MemberFilterMixin:
+    """?member=<id> and ?status=<value> on top of the scoped queryset."""
+
+    def filter_params(self, queryset):
+        params = self.request.query_params
+        if params.get('member'):
+            queryset = queryset.filter(member_id=_parse_uuid(params['member'], 'member'))
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        return queryset
+
+
+class UpdatedAtTokenMixin(ConditionalMixin):
+    """Lists: count + max(updated_at) of the filtered scope. Details: the row's updated_at."""
+
+    def etag_token(self):
+        queryset = self.scoped_queryset()
+        if 'pk' in self.kwargs:
+            return queryset.filter(pk=self.kwargs['pk']).values_list('updated_at', flat=True).first()
+        return conditional.queryset_token(queryset)
+
+
+class ClaimListView(UpdatedAtTokenMixin, MemberFilterMixin, ScopedListView):
+    serializer_class = ClaimSerializer
+
+    def scoped_queryset(self):
+        return self.filter_params(get_allowed_claims(self.request.user))
+
+
+class ClaimDetailView(UpdatedAtTokenMixin, generics.RetrieveAPIView):
+    serializer_class = ClaimSerializer
+
+    def scoped_queryset(self):
+        return get_allowed_claims(self.request.user)
+
+    def get_queryset(self):
+        return ClaimSerializer.optimize(self.scoped_queryset(), self.request)
+
+
+class ServiceRequestListView(UpdatedAtTokenMixin, MemberFilterMixin, ScopedListView):
+    serializer_class = ServiceRequestSerializer
+
+    def scoped_queryset(self):
+        return self.filter_params(get_allowed_requests(self.request.user))
+
+
+class ServiceRequestDetailView(UpdatedAtTokenMixin, generics.RetrieveAPIView):
+    serializer_class = ServiceRequestSerializer
+
+    def scoped_queryset(self):
+        return get_allowed_requests(self.request.user)
+
+    def get_queryset(self):
+        return ServiceRequestSerializer.optimize(self.scoped_queryset(), self.request)
@@ -0,0 +1,208 @@
+"""
+Submission batches of SENT_TO_INSURANCE claims, one file per insurer.
+
+create() records an InsurerBatch and numbers its claims (InsurerBatchClaim
+lines) before anything is exported, so the status file an insurer sends
+back can be matched to the claims by batch reference and line number, or by
+claim reference. A claim is pending while it is SENT_TO_INSURANCE and was
+not put in a batch since its last change. After an insurer query is
+answered, the claim goes out again in the next batch.
+
+The exports read the batch lines through one ``values_list().iterator()``,
+which joins the claim, member, sponsor, policy class and policy. Memory
+stays flat whatever the batch size:
+
+    csv_chunks(batch)         generator of CSV text for StreamingHttpResponse;
+    write_xlsx(batch, file)   openpyxl write-only workbook, row by row. An
+                              XLSX is a zip that can only be finished at the
+                              end, so views write it to a temporary file and
+                              stream that (FileResponse);
+    attachment_chunks(batch)  ZIP of the ClaimAttachment files, built
+                              incrementally. The files are copied block by
+                              block into an unseekable sink, with zip data
+                              descriptors, and each block is yielded as it
+                              is written.
+
+    python manage.py export_insurer_batches --output /srv/batches
+"""
+import csv
+import os
+import zipfile
+
+import openpyxl
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, F, OuterRef, Sum
+
+from core.sequences import next_reference
+from .models import Claim, ClaimAttachment, InsurerBatch, InsurerBatchClaim
+
+CHUNK = 1000
+FILE_BLOCK = 64 * 1024
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+PROVIDER_LOOKUP = 'member__policy_class__policy__provider'
+
+# (header, lookup from InsurerBatchClaim) — columns of the exported file
+COLUMNS = (
+    ('Line', 'line'),
+    ('Claim Reference', 'claim__claim_reference'),
+    ('Policy Number', 'claim__member__policy_class__policy__policy_number'),
+    ('Class', 'claim__member__policy_class__name'),
+    ('National ID', 'claim__member__national_id'),
+    ('Member Name', 'claim__member__full_name'),
+    ('Birth Date', 'claim__member__birth_date'),
+    ('Gender', 'claim__member__gender'),
+    ('Relation', 'claim__member__relation'),
+    ('Principal National ID', 'claim__member__sponsor__national_id'),
+    ('Service Date', 'claim__service_date'),
+    ('Benefit', 'claim__benefit_type__name_en'),
+    ('In-Patient', 'claim__is_in_patient'),
+    ('International', 'claim__is_international'),
+    ('Currency', 'claim__currency_id'),
+    ('Amount', 'claim__amount_original'),
+    ('Attachments', 'attachment_count'),
+)
+HEADERS = [header for header, _ in COLUMNS]
+
+
+# ── Recording a batch ───────────────────────────────────────────────────────
+
+def pending(queryset):
+    """Claims of ``queryset`` waiting to be sent: SENT_TO_INSURANCE and not batched since their last change."""
+    batched = InsurerBatchClaim.objects.filter(claim=OuterRef('pk'), batch__created_at__gte=OuterRef('updated_at'))
+    return queryset.filter(status=Claim.Status.SENT_TO_INSURANCE).exclude(Exists(batched))
+
+
+def pending_by_provider(queryset):
+    """[{'provider': id, 'name': ..., 'count': n}] of the pending claims, one query."""
+    return list(
+        pending(queryset).exclude(**{f'{PROVIDER_LOOKUP}__isnull': True})
+        .order_by().values(provider=F(PROVIDER_LOOKUP), name=F(f'{PROVIDER_LOOKUP}__name_ar'))
+        .annotate(count=Count('pk')).order_by('name')
+    )
+
+
+def create(provider, user, queryset):
+    """
+    Record a batch of every pending claim of ``queryset`` insured by
+    ``provider``. Returns the batch, or None if nothing is pending.
+    """
+    with transaction.atomic():
+        claim_ids = list(
+            pending(queryset).filter(**{PROVIDER_LOOKUP: provider})
+            .order_by('created_at', 'pk').values_list('pk', flat=True)
+        )
+        if not claim_ids:
+            return None
+        batch = InsurerBatch.objects.create(
+            reference=next_reference('BAT'), provider=provider, created_by=user,
+            broker_id=user.related_broker_id if user.is_broker_role else None,
+        )
+        InsurerBatchClaim.objects.bulk_create(
+            (InsurerBatchClaim(batch=batch, claim_id=pk, line=line) for line, pk in enumerate(claim_ids, 1)),
+            batch_size=CHUNK,
+        )
+        total = batch.lines.aggregate(total=Sum(
+            F('claim__amount_original') * F('claim__currency__exchange_rate'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ))['total']
+        batch.claim_count = len(claim_ids)
+        batch.total_amount_sar = round(total or 0, 2)
+        batch.save(update_fields=['claim_count', 'total_amount_sar'])
+    return batch
+
+
+# ── Exports ─────────────────────────────────────────────────────────────────
+
+def rows(batch):
+    """The file rows of ``batch`` in line order, streamed from the database."""
+    return (
+        InsurerBatchClaim.objects.filter(batch=batch).order_by('line')
+        .annotate(attachment_count=Count('claim__attachments'))
+        .values_list(*(lookup for _, lookup in COLUMNS))
+        .iterator(chunk_size=CHUNK)
+    )
+
+
+def filename(batch, extension):
+    return f"{batch.reference}_{batch.provider.license_number}.{extension}"
+
+
+class _Echo:
+    """csv.writer target that hands each formatted row back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(batch):
+    writer = csv.writer(_Echo())
+    # BOM: Excel يقرأ الأسماء العربية كـ UTF-8
+    buffer = ['\ufeff', writer.writerow(HEADERS)]
+    for row in rows(batch):
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= CHUNK:
+            yield ''.join(buffer)
+            buffer = []
+    yield ''.join(buffer)
+
+
+def write_xlsx(batch, file):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(batch.reference)
+    sheet.append(HEADERS)
+    for row in rows(batch):
+        sheet.append(row)
+    workbook.save(file)
+
+
+class _ZipSink:
+    """Unseekable write target: zipfile appends, attachment_chunks() drains."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def attachments(batch):
+    """(line, claim reference, file name) of every attachment of ``batch``."""
+    return (
+        InsurerBatchClaim.objects.filter(batch=batch, claim__attachments__isnull=False).order_by('line')
+        .values_list('line', 'claim__claim_reference', 'claim__attachments__file')
+        .iterator(chunk_size=CHUNK)
+    )
+
+
+def attachment_chunks(batch):
+    storage = ClaimAttachment._meta.get_field('file').storage
+    sink = _ZipSink()
+    missing = []
+    # المرفقات صور وملفات PDF مضغوطة أصلاً — تخزين بلا ضغط
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for line, reference, name in attachments(batch):
+            arcname = f"{line:05d}_{reference}/{os.path.basename(name)}"
+            try:
+                source = storage.open(name, 'rb')
+            except OSError:
+                missing.append(f"{line}\t{reference}\t{name}")
+                continue
+            with source, archive.open(arcname, 'w', force_zip64=True) as entry:
+                for block in iter(lambda: source.read(FILE_BLOCK), b''):
+                    entry.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+        if missing:
+            archive.writestr('MISSING_FILES.txt', '\n'.join(missing))
+    yield sink.drain()
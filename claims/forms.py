@@ -35,12 +35,13 @@ class ClaimCreateForm(forms.ModelForm):
 
     class Meta:
         model = Claim
-        fields = ['member', 'service_date', 'currency', 'amount_original', 'is_in_patient', 'is_international']
+        fields = ['member', 'service_date', 'currency', 'amount_original', 'benefit_type', 'is_in_patient', 'is_international']
         widgets = {
             'member': forms.Select(attrs={'class': 'w-full px-3 py-2 border border-slate-300 rounded-md'}),
             'service_date': forms.DateInput(attrs={'type': 'date', 'class': 'w-full px-3 py-2 border border-slate-300 rounded-md'}),
             'currency': forms.Select(attrs={'class': 'w-full px-3 py-2 border border-slate-300 rounded-md'}),
             'amount_original': forms.NumberInput(attrs={'class': 'w-full px-3 py-2 border border-slate-300 rounded-md'}),
+            'benefit_type': forms.Select(attrs={'class': 'w-full px-3 py-2 border border-slate-300 rounded-md'}),
             'is_in_patient': forms.CheckboxInput(attrs={'class': 'w-4 h-4 text-brand-600 border-slate-300 rounded focus:ring-brand-500'}),
             'is_international': forms.CheckboxInput(attrs={'class': 'w-4 h-4 text-brand-600 border-slate-300 rounded focus:ring-brand-500'}),
         }
@@ -88,7 +89,7 @@ class ClaimCreateForm(forms.ModelForm):
                         
                     elif self.user.is_broker_role and self.user.related_broker:
                         # الوسيط يبحث فقط في هويات المشتركين التابعين لشركات وساطته
-                        member = Member.objects.get(national_id=national_id, client__broker=self.user.related_broker)
+                        member = Member.objects.get(national_id=national_id, broker=self.user.related_broker)
                         
                     elif self.user.is_hr_role and self.user.related_client:
                         # الـ HR يبحث فقط في هويات موظفي شركته
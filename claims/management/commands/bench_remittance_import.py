@@ -0,0 +1,153 @@
+"""
+Management command: bench_remittance_import
+===========================================
+يقيس استيراد ملف ردود تأمين كبير (افتراضياً 50 ألف صف: موافقة وسداد ورفض)
+عبر claims/remittance.py: الزمن وعدد الاستعلامات وذروة الذاكرة، مرة بالمعاينة
+ومرة بالتطبيق الفعلي.
+
+الاستخدام:
+    python manage.py bench_remittance_import
+    python manage.py bench_remittance_import --rows 10000 --format csv
+
+تُنشأ البيانات داخل معاملة ويتم التراجع عنها بالكامل بعد القياس.
+"""
+import csv
+import datetime
+import io
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import User
+from brokers.models import Broker
+from claims import remittance
+from claims.models import Claim, Currency
+from clients.models import Client
+from members.models import Member
+from policies.models import Policy, PolicyClass
+from providers.models import Provider
+
+DECISIONS = ('APPROVED', 'PAID', 'REJECTED')
+# عينة المسار القديم (مطالبة بمطالبة)
+SAMPLE = 200
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark importing a large insurer remittance file (time, queries, peak memory)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['rows'], options['format'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, rows, extension):
+        call_command('setup_roles', stdout=io.StringIO())
+        broker = Broker.objects.create(name_ar='وسيط', name_en='Bench Broker', commercial_record='BENCH-BR')
+        insurer = Provider.objects.create(name_ar='مزود', name_en='Bench Insurer', license_number='BENCH-LIC')
+        company = Client.objects.create(
+            name_ar='شركة', name_en='Bench Company', commercial_record='BENCH-C', broker=broker,
+        )
+        policy = Policy.objects.create(
+            client=company, provider=insurer, policy_number='BENCH-POL',
+            start_date=datetime.date.today(), end_date=datetime.date.today() + datetime.timedelta(days=364),
+        )
+        member = Member.objects.create(
+            client=company, policy_class=PolicyClass.objects.create(policy=policy, name='A'),
+            full_name='Bench Member', national_id='8999999999', birth_date=datetime.date(1990, 1, 1),
+            gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        currency, _ = Currency.objects.get_or_create(code='SAR', defaults={'name_ar': 'ريال', 'name_en': 'Riyal'})
+        user = User.objects.create_user(username='bench-admin', password='p', role=User.Roles.SUPER_ADMIN)
+
+        # مطالبات الملف + عينة خارجه للمسار القديم
+        references = [f'BENCH-{n:07d}' for n in range(rows)] + [f'BENCH-S{n:04d}' for n in range(SAMPLE)]
+        claims = []
+        for reference in references:
+            claim = Claim(
+                member=member, currency=currency, status=Claim.Status.SENT_TO_INSURANCE,
+                service_date=datetime.date.today(), amount_original=100, claim_reference=reference,
+            )
+            claim.sync_tenant_keys()  # bulk_create لا يمر بـ save()
+            claims.append(claim)
+        Claim.objects.bulk_create(claims, batch_size=2000)
+        del claims
+
+        with tempfile.TemporaryFile() as file:
+            self._write_file(file, rows, extension)
+            self.stdout.write(f"{rows} rows, {extension} file of {file.tell() / 1024 / 1024:.1f} MB")
+
+            # الذاكرة بقياس منفصل: tracemalloc يبطئ التنفيذ عدة أضعاف
+            file.seek(0)
+            tracemalloc.start()
+            remittance.import_file(file, user, Claim.objects.all(), name=f'bench.{extension}', dry_run=True)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(f"peak memory (dry run): {peak / 1024 / 1024:.0f} MB")
+
+            for dry_run in (True, False):
+                file.seek(0)
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    report = remittance.import_file(
+                        file, user, Claim.objects.all(), name=f'bench.{extension}', dry_run=dry_run,
+                    )
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{'dry run' if dry_run else 'apply':8s} {elapsed:6.1f}s, {len(queries)} queries: "
+                    f"{len(report.changes)} changed, {len(report.unchanged)} unchanged, {len(report.failed)} failed"
+                )
+
+        # المسار القديم: مطالبة بمطالبة كما في insurance_approve_claim
+        sample = list(Claim.objects.filter(claim_reference__startswith='BENCH-S').select_related(
+            'member__client', 'currency',
+        ))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for claim in sample:
+                with transaction.atomic():
+                    claim.insurance_approve(user=user)
+                    claim.save()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"per-claim {elapsed / len(sample) * rows:6.1f}s estimated for {rows} rows "
+            f"({len(queries) / len(sample):.0f} queries per claim, sample of {len(sample)})"
+        )
+
+    def _write_file(self, file, rows, extension):
+        header = ['Claim Reference', 'Decision', 'Approved Amount', 'Reason']
+        lines = (
+            [f'BENCH-{n:07d}', DECISIONS[n % 3], 90 if n % 3 == 1 else None, 'Not covered' if n % 3 == 2 else '']
+            for n in range(rows)
+        )
+        if extension == 'csv':
+            text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow(header)
+            writer.writerows(lines)
+            text.flush()
+            text.detach()
+            return
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+        for line in lines:
+            sheet.append(line)
+        workbook.save(file)
+        file.seek(0, 2)
@@ -0,0 +1,80 @@
+"""
+Management command: export_insurer_batches
+==========================================
+ينشئ دفعة لكل شركة تأمين بالمطالبات المرسلة إليها التي لم تُضمَّن في ملف
+بعد، ويكتب ملف الدفعة (وملف مرفقاتها المضغوط) في مجلد الإخراج — للتشغيل
+الدوري بدلاً من الإنشاء من الواجهة. تُسجَّل الدفعات باسم المستخدم المحدد
+وفي حدود نطاقه.
+
+الاستخدام:
+    python manage.py export_insurer_batches --user broker1 --output /srv/batches
+    python manage.py export_insurer_batches --user broker1 --output /srv/batches --format csv --attachments
+    python manage.py export_insurer_batches --user broker1 --provider LIC-001 --output /srv/batches
+    python manage.py export_insurer_batches --user broker1 --check   (عرض المطالبات المنتظرة فقط)
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from claims import batches
+from claims.views import get_allowed_claims
+from providers.models import Provider
+
+
+class Command(BaseCommand):
+    help = "Create one submission batch per insurer of the pending SENT_TO_INSURANCE claims and write its files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help="Username the batches are created as (and scoped to).")
+        parser.add_argument('--output', help="Directory the batch files are written to.")
+        parser.add_argument('--provider', help="Only this insurer (license number).")
+        parser.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx')
+        parser.add_argument('--attachments', action='store_true', help="Also write the attachments ZIP.")
+        parser.add_argument('--check', action='store_true', help="List the pending claims without creating batches.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['user']}")
+        if not user.has_perm('claims.can_process_broker'):
+            raise CommandError(f"{user.username} may not send claims to insurers.")
+        if not options['check'] and not options['output']:
+            raise CommandError("--output is required unless --check is given.")
+
+        claims = get_allowed_claims(user)
+        pending = batches.pending_by_provider(claims)
+        if options['provider']:
+            try:
+                only = Provider.objects.get(license_number=options['provider'])
+            except Provider.DoesNotExist:
+                raise CommandError(f"Unknown provider: {options['provider']}")
+            pending = [row for row in pending if row['provider'] == only.pk]
+
+        if options['check']:
+            for row in pending:
+                self.stdout.write(f"{row['name']}: {row['count']} claim(s) pending")
+            self.stdout.write(self.style.SUCCESS(f"{len(pending)} insurer(s) with pending claims."))
+            return
+
+        os.makedirs(options['output'], exist_ok=True)
+        providers = Provider.objects.in_bulk([row['provider'] for row in pending])
+        for row in pending:
+            batch = batches.create(providers[row['provider']], user, claims)
+            if batch is None:
+                continue
+            path = os.path.join(options['output'], batches.filename(batch, options['format']))
+            if options['format'] == 'csv':
+                with open(path, 'w', encoding='utf-8', newline='') as file:
+                    file.writelines(batches.csv_chunks(batch))
+            else:
+                with open(path, 'wb') as file:
+                    batches.write_xlsx(batch, file)
+            self.stdout.write(f"{batch.reference}: {batch.claim_count} claim(s) → {path}")
+
+            if options['attachments']:
+                path = os.path.join(options['output'], f"{batch.reference}_attachments.zip")
+                with open(path, 'wb') as file:
+                    file.writelines(batches.attachment_chunks(batch))
+        self.stdout.write(self.style.SUCCESS("Done."))
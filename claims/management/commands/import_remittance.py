@@ -0,0 +1,61 @@
+"""
+Management command: import_remittance
+=====================================
+يطبّق ملف ردود شركة التأمين (موافقة / رفض / سداد لكل مطالبة) على المطالبات
+دفعة واحدة باسم المستخدم المحدد وفي حدود نطاقه وصلاحياته (claims/remittance.py).
+
+الاستخدام:
+    python manage.py import_remittance remittance.xlsx --user insurer1
+    python manage.py import_remittance remittance.csv --user insurer1 --check   (الفروقات فقط دون حفظ)
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from claims import remittance
+from claims.views import get_allowed_claims
+
+
+class Command(BaseCommand):
+    help = "Apply an insurer remittance file (approve / reject / pay per claim) in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="XLSX or CSV remittance file.")
+        parser.add_argument('--user', required=True, help="Username the decisions are recorded as (and scoped to).")
+        parser.add_argument('--check', action='store_true', help="Print the changes without writing them.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['user']}")
+        if not os.path.isfile(options['file']):
+            raise CommandError(f"No such file: {options['file']}")
+
+        with open(options['file'], 'rb') as file:
+            try:
+                report = remittance.import_file(
+                    file, user, get_allowed_claims(user), name=options['file'], dry_run=options['check'],
+                )
+            except remittance.RemittanceError as e:
+                raise CommandError(str(e))
+
+        for change in report.changes:
+            amount = '' if change.amount_before == change.amount_after else \
+                f"\t{change.amount_before or '-'} -> {change.amount_after or '-'}"
+            self.stdout.write(
+                f"{change.row}\t{change.reference}\t{change.from_status} -> {change.to_status}{amount}"
+            )
+        for row, reference, problem in report.failed:
+            self.stdout.write(self.style.ERROR(f"{row}\t{reference}\t{problem}"))
+
+        prefix = "would have " if options['check'] else ""
+        self.stdout.write(
+            f"{report.total_rows} row(s): {prefix}changed {len(report.changes)}, "
+            f"{len(report.unchanged)} unchanged, {len(report.failed)} failed"
+        )
+        if report.failed:
+            self.stdout.write(self.style.WARNING("Some rows were not applied."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done."))
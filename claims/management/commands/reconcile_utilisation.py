@@ -0,0 +1,44 @@
+"""
+Management command: reconcile_utilisation
+=========================================
+يطابق سجل استهلاك المنافع مع حالة المطالبات (قيود معاكسة للفروقات) ثم يعيد
+بناء الأرصدة التراكمية من السجل — للإصلاح بعد تعديلات تمت خارج الـ ORM
+(SQL مباشر، ‎.update() على المطالبات، نقل عضو لفئة أخرى بعد الترحيل).
+
+الاستخدام:
+    python manage.py reconcile_utilisation           (إصلاح)
+    python manage.py reconcile_utilisation --check   (تقرير الفروقات فقط دون حفظ)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from claims import utilisation
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Reconcile the benefit utilisation ledger with claims and rebuild the balances from it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                claims = utilisation.reconcile_claims()
+                balances = utilisation.rebuild_balances()
+                if options['check']:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        prefix = "would have " if options['check'] else ""
+        self.stdout.write(f"claims: {prefix}posted corrections for {claims} claim(s)")
+        self.stdout.write(f"balances: {prefix}corrected {balances} row(s)")
+        if options['check'] and (claims or balances):
+            self.stdout.write(self.style.WARNING("Utilisation ledger is out of sync."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0008_assign_claim_permissions_to_groups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['-created_at', '-id'], name='claim_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='claim_status_created_id_idx'),
+        ),
+    ]
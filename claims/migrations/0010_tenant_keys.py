@@ -0,0 +1,47 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def populate_tenant_keys(apps, schema_editor):
+    Claim = apps.get_model('claims', 'Claim')
+    Member = apps.get_model('members', 'Member')
+    parent = Member.objects.filter(pk=OuterRef('member_id'))
+    Claim.objects.update(
+        client_id=Subquery(parent.values('client_id')[:1]),
+        broker_id=Subquery(parent.values('broker_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0009_tenant_keys'),
+        ('brokers', '0001_initial'),
+        ('clients', '0006_sponsornumber'),
+        ('claims', '0009_claim_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claim',
+            name='broker',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='brokers.broker'),
+        ),
+        migrations.AddField(
+            model_name='claim',
+            name='client',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='clients.client'),
+        ),
+        migrations.RunPython(populate_tenant_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['broker', '-created_at', '-id'], name='claim_broker_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claim',
+            index=models.Index(fields=['client', '-created_at', '-id'], name='claim_client_created_id_idx'),
+        ),
+    ]
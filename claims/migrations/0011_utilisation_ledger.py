@@ -0,0 +1,93 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+
+
+def post_historic_claims(apps, schema_editor):
+    """قيود وأرصدة المطالبات الموافق عليها والمسددة قبل إنشاء السجل."""
+    Claim = apps.get_model('claims', 'Claim')
+    UtilisationEntry = apps.get_model('claims', 'UtilisationEntry')
+    UtilisationBalance = apps.get_model('claims', 'UtilisationBalance')
+
+    claims = Claim.objects.filter(status__in=['APPROVED_BY_INSURANCE', 'PAID']).values_list(
+        'pk', 'status', 'member_id', 'member__sponsor_id', 'member__policy_class__policy_id',
+        'approved_amount_sar', 'amount_original', 'currency__exchange_rate',
+    )
+    entries = []
+    totals = defaultdict(lambda: {'reserved': Decimal('0'), 'consumed': Decimal('0')})
+    for pk, status, member_id, sponsor_id, policy_id, approved, original, rate in claims.iterator():
+        estimate = (original * rate).quantize(Decimal('0.01'))
+        if status == 'PAID':
+            kind, column, amount = 'CONSUME', 'consumed', approved if approved is not None else estimate
+        else:
+            kind, column, amount = 'RESERVE', 'reserved', estimate
+        family_id = sponsor_id or member_id
+        entries.append(UtilisationEntry(
+            claim_id=pk, member_id=member_id, family_id=family_id, policy_id=policy_id, kind=kind, amount=amount,
+        ))
+        totals[('MEMBER', member_id, policy_id)][column] += amount
+        totals[('FAMILY', family_id, policy_id)][column] += amount
+    UtilisationEntry.objects.bulk_create(entries, batch_size=500)
+    UtilisationBalance.objects.bulk_create([
+        UtilisationBalance(scope=scope, member_id=member_id, policy_id=policy_id, **sums)
+        for (scope, member_id, policy_id), sums in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policies', '0010_class_coverage_snapshot'),
+        ('members', '0009_tenant_keys'),
+        ('claims', '0010_tenant_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claim',
+            name='benefit_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='claims', to='policies.benefittype', verbose_name='Benefit Type'),
+        ),
+        migrations.CreateModel(
+            name='UtilisationEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RESERVE', 'Reserved (Approved by Insurance)'), ('CONSUME', 'Consumed (Paid)')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('benefit_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='policies.benefittype')),
+                ('claim', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='utilisation_entries', to='claims.claim')),
+                ('family', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='members.member')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='members.member')),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='policies.policy')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UtilisationBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('MEMBER', 'Member'), ('FAMILY', 'Family')], max_length=6)),
+                ('reserved', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('consumed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('benefit_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='policies.benefittype')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='members.member')),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='policies.policy')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='utilisationbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('benefit_type__isnull', False)), fields=('scope', 'member', 'policy', 'benefit_type'), name='utilbal_benefit_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='utilisationbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('benefit_type__isnull', True)), fields=('scope', 'member', 'policy'), name='utilbal_total_uniq'),
+        ),
+        migrations.RunPython(post_historic_claims, migrations.RunPython.noop),
+    ]
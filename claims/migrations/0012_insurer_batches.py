@@ -0,0 +1,68 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('brokers', '0001_initial'),
+        ('providers', '0002_alter_provider_options'),
+        ('claims', '0011_utilisation_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InsurerBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('reference', models.CharField(editable=False, max_length=20, unique=True, verbose_name='Batch Ref')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claim_count', models.PositiveIntegerField(default=0)),
+                ('total_amount_sar', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('broker', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='brokers.broker')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InsurerBatchClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.PositiveIntegerField()),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='claims.insurerbatch')),
+                ('claim', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_lines', to='claims.claim')),
+            ],
+            options={
+                'ordering': ['batch', 'line'],
+            },
+        ),
+        migrations.AddField(
+            model_name='insurerbatch',
+            name='claims',
+            field=models.ManyToManyField(related_name='insurer_batches', through='claims.InsurerBatchClaim', to='claims.claim'),
+        ),
+        migrations.AddField(
+            model_name='insurerbatch',
+            name='created_by',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='insurerbatch',
+            name='provider',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='claim_batches', to='providers.provider'),
+        ),
+        migrations.AddConstraint(
+            model_name='insurerbatchclaim',
+            constraint=models.UniqueConstraint(fields=('batch', 'line'), name='insurer_batch_line_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='insurerbatchclaim',
+            constraint=models.UniqueConstraint(fields=('batch', 'claim'), name='insurer_batch_claim_uniq'),
+        ),
+    ]
@@ -1,5 +1,4 @@
 import uuid
-import datetime
 import os
 from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
@@ -8,6 +7,9 @@ from django_fsm import FSMField, transition
 from django.utils.text import get_valid_filename
 from django.conf import settings
 
+from core.sequences import next_reference
+from core.tenancy import TenantKeysMixin
+
 
 
 # --- دالة مساعدة لتحديد مسار حفظ الملفات ---
@@ -44,7 +46,7 @@ class Currency(models.Model):
 
 
 # --- 2. المطالبة المالية ---
-class Claim(models.Model):
+class Claim(TenantKeysMixin, models.Model):
     class Status(models.TextChoices):
         DRAFT = 'DRAFT', _('Draft')
         
@@ -66,10 +68,29 @@ class Claim(models.Model):
         # المرحلة النهائية
         PAID = 'PAID', _('Paid / Settled')
 
+    # الحالة كما حُمّلت — تستخدمها إشارات الإشعارات لاكتشاف الانتقال دون SELECT؛
+    # والعضو ومفاتيح المستأجر لإعادة نسخها عند تغيّر العضو (core/tenancy.py)
+    # والمبالغ ونوع المنفعة لإعادة ترحيل سجل الاستهلاك عند تغيّرها (claims/utilisation.py)
+    tracked_fields = (
+        'status', 'member_id', 'client_id', 'broker_id',
+        'approved_amount_sar', 'amount_original', 'currency_id', 'benefit_type_id',
+    )
+    tenant_parent = 'member'
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     claim_reference = models.CharField(_("Claim Ref"), max_length=20, unique=True, editable=False)
     
     member = models.ForeignKey('members.Member', on_delete=models.CASCADE, related_name='claims')
+
+    # مفاتيح المستأجر منسوخة من العضو (core/tenancy.py) — فلترة العزل بعمود واحد
+    client = models.ForeignKey(
+        'clients.Client', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', db_index=True,
+    )
+    broker = models.ForeignKey(
+        'brokers.Broker', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', db_index=True,
+    )
     status = FSMField(
         _("Status"), 
         default=Status.DRAFT, 
@@ -85,6 +106,12 @@ class Claim(models.Model):
     amount_original = models.DecimalField(_("Amount (Original Currency)"), max_digits=10, decimal_places=2)
     approved_amount_sar = models.DecimalField(_("Approved Amount (SAR)"), max_digits=10, decimal_places=2, null=True, blank=True)
     
+    # المنفعة التي تُخصم منها المطالبة (اختيارية — بدونها تُخصم من الحد السنوي فقط)
+    benefit_type = models.ForeignKey(
+        'policies.BenefitType', on_delete=models.PROTECT, null=True, blank=True,
+        related_name='claims', verbose_name=_("Benefit Type"),
+    )
+
     is_in_patient = models.BooleanField(_("In-Patient (Admission)"), default=False)
     is_international = models.BooleanField(_("Treatment Outside KSA"), default=False)
 
@@ -95,6 +122,14 @@ class Claim(models.Model):
         verbose_name = _("Claim Request")
         verbose_name_plural = _("Claim Requests")
         ordering = ['-created_at']
+        indexes = [
+            # قائمة المطالبات: صفحات بمؤشر على (created_at, id) — مع فلتر الحالة وبدونه
+            models.Index(fields=['-created_at', '-id'], name='claim_created_id_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='claim_status_created_id_idx'),
+            # نفس الصفحات ضمن نطاق الوسيط / الشركة (get_allowed_claims)
+            models.Index(fields=['broker', '-created_at', '-id'], name='claim_broker_created_id_idx'),
+            models.Index(fields=['client', '-created_at', '-id'], name='claim_client_created_id_idx'),
+        ]
         permissions = [
             ("can_submit_claim", "Can submit new claim"),
             ("can_approve_hr", "Can approve claim as HR"),
@@ -110,27 +145,17 @@ class Claim(models.Model):
         return f"{self.claim_reference} ({self.status})"
 
     def save(self, *args, **kwargs):
-        if not self.claim_reference:
+        if self.claim_reference:
+            return super().save(*args, **kwargs)
+        # المرجع والإدراج في نفس المعاملة: فشل الإدراج يعيد العدّاد (بدون فجوات)
+        try:
             with transaction.atomic():
-                year = datetime.date.today().year
-
-                last_claim = (
-                Claim.objects
-                .select_for_update()
-                .filter(claim_reference__startswith=f"CLM-{year}")
-                .order_by('-claim_reference')
-                .first()
-            )
-
-            if last_claim:
-                last_id = int(last_claim.claim_reference.split('-')[-1])
-                new_id = last_id + 1
-            else:
-                new_id = 1
-
-            self.claim_reference = f"CLM-{year}-{new_id:05d}"
-
-        super().save(*args, **kwargs)
+                self.claim_reference = next_reference('CLM')
+                super().save(*args, **kwargs)
+        except Exception:
+            # لا نُبقي مرجعاً تم التراجع عن حجزه على الكائن
+            self.claim_reference = ''
+            raise
 
     # ====================================================
     # FSM Conditions (الشروط)
@@ -420,3 +445,120 @@ class ClaimStatusLog(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+
+# --- 5. سجل استهلاك المنافع ---
+class UtilisationEntry(models.Model):
+    """
+    قيد في سجل الاستهلاك (إلحاقي فقط — التصحيح بقيد معاكس لا بالتعديل).
+    يُرحَّل من claims/utilisation.py عند موافقة شركة التأمين (حجز) وعند السداد (صرف).
+    """
+    class Kind(models.TextChoices):
+        RESERVE = 'RESERVE', _('Reserved (Approved by Insurance)')
+        CONSUME = 'CONSUME', _('Consumed (Paid)')
+
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='utilisation_entries')
+    member = models.ForeignKey('members.Member', on_delete=models.CASCADE, related_name='+')
+    # رب الأسرة (العضو نفسه إن كان رئيسياً) — لرصيد العائلة
+    family = models.ForeignKey('members.Member', on_delete=models.CASCADE, related_name='+')
+    # الوثيقة تحدد فترة الاستهلاك (كل تجديد وثيقة جديدة)
+    policy = models.ForeignKey('policies.Policy', on_delete=models.CASCADE, related_name='+')
+    benefit_type = models.ForeignKey(
+        'policies.BenefitType', on_delete=models.PROTECT, null=True, blank=True, related_name='+',
+    )
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # سالب للقيود المعاكسة
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"{self.claim_id} {self.kind} {self.amount}"
+
+
+class UtilisationBalance(models.Model):
+    """
+    الرصيد التراكمي لسجل الاستهلاك: صف لكل (عضو أو عائلة، وثيقة، نوع منفعة)
+    وصف إجمالي (benefit_type فارغ) لكل (عضو أو عائلة، وثيقة).
+    يُحدَّث بـ F() في نفس معاملة القيد؛ يعاد بناؤه بـ reconcile_utilisation.
+    """
+    class Scope(models.TextChoices):
+        MEMBER = 'MEMBER', _('Member')
+        FAMILY = 'FAMILY', _('Family')
+
+    scope = models.CharField(max_length=6, choices=Scope.choices)
+    member = models.ForeignKey('members.Member', on_delete=models.CASCADE, related_name='+')
+    policy = models.ForeignKey('policies.Policy', on_delete=models.CASCADE, related_name='+')
+    benefit_type = models.ForeignKey(
+        'policies.BenefitType', on_delete=models.CASCADE, null=True, blank=True, related_name='+',
+    )
+    reserved = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    consumed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'member', 'policy', 'benefit_type'],
+                condition=models.Q(benefit_type__isnull=False),
+                name='utilbal_benefit_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['scope', 'member', 'policy'],
+                condition=models.Q(benefit_type__isnull=True),
+                name='utilbal_total_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.member_id} {self.benefit_type_id or 'total'}: {self.consumed}"
+
+    @property
+    def used(self):
+        return self.reserved + self.consumed
+
+
+# --- 6. دفعات الإرسال لشركات التأمين ---
+class InsurerBatch(models.Model):
+    """
+    ملف مطالبات أُرسل لشركة تأمين (claims/batches.py). يُسجَّل قبل التصدير
+    لتُطابَق حالات الملف العائد من الشركة مع مطالباتها (رقم الدفعة + رقم السطر).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    reference = models.CharField(_("Batch Ref"), max_length=20, unique=True, editable=False)
+    provider = models.ForeignKey('providers.Provider', on_delete=models.PROTECT, related_name='claim_batches')
+    # نطاق الوسيط الذي أنشأها (فارغ لمدير النظام)
+    broker = models.ForeignKey(
+        'brokers.Broker', on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+    )
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    claim_count = models.PositiveIntegerField(default=0)
+    # مجموع مبالغ المطالبات بالريال وقت الإنشاء
+    total_amount_sar = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    claims = models.ManyToManyField(Claim, through='InsurerBatchClaim', related_name='insurer_batches')
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.reference
+
+
+class InsurerBatchClaim(models.Model):
+    """سطر في دفعة: رقم السطر في الملف المُصدَّر ← المطالبة."""
+    batch = models.ForeignKey(InsurerBatch, on_delete=models.CASCADE, related_name='lines')
+    claim = models.ForeignKey(Claim, on_delete=models.CASCADE, related_name='batch_lines')
+    line = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['batch', 'line']
+        constraints = [
+            models.UniqueConstraint(fields=['batch', 'line'], name='insurer_batch_line_uniq'),
+            models.UniqueConstraint(fields=['batch', 'claim'], name='insurer_batch_claim_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.batch_id} #{self.line}"
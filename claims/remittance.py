@@ -0,0 +1,311 @@
+"""
+Insurer remittance import.
+
+Insurers answer a submission batch (claims/batches.py) with a spreadsheet of
+decisions. import_file() applies a whole file instead of one
+insurance_approve_claim / insurance_reject_claim / mark_claim_as_paid call
+per row:
+
+    report = remittance.import_file(upload, request.user,
+                                    get_allowed_claims(request.user), dry_run=True)
+
+    * the file (XLSX or CSV) is read row by row — openpyxl read-only mode or
+      csv over the upload — and handled in chunks of CHUNK rows;
+    * columns are found by header, so the exported batch file can come back
+      with Decision / Approved Amount / Reason columns added;
+    * each chunk's claims are loaded (and locked) with one scoped
+      ``claim_reference__in`` query;
+    * a decision is a path of FSM transitions (PAID on a claim still
+      SENT_TO_INSURANCE is approved, then paid); every step is checked
+      against the transition's sources and permission, and written with
+      transitions.move() — one UPDATE per step and source state, one
+      ClaimStatusLog bulk_create, one ledger sync;
+    * a PAID row needs an Approved Amount unless the claim already has one —
+      the paid amount is never estimated;
+    * rows already at their decision are reported as unchanged, so a file
+      can be imported again safely.
+
+The whole file runs in one transaction. With ``dry_run`` it is rolled back
+at the end: the report is the diff the import would make, computed by the
+same code path. Notifications are sent once, after the last chunk, through
+NotificationService.notify_claims_status_change().
+
+    python manage.py import_remittance remittance.xlsx --user insurer1 --check
+"""
+import csv
+import io
+import os
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+import openpyxl
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.services import NotificationService
+from . import transitions
+from .models import Claim
+
+CHUNK = 1000
+
+# ترويسة العمود في الملف (بأحرف صغيرة) ← الحقل
+COLUMNS = {
+    'claim reference': 'reference',
+    'رقم المطالبة': 'reference',
+    'decision': 'decision',
+    'القرار': 'decision',
+    'approved amount': 'amount',
+    'approved amount (sar)': 'amount',
+    'المبلغ المعتمد': 'amount',
+    'reason': 'reason',
+    'السبب': 'reason',
+}
+REQUIRED = ('reference', 'decision')
+
+APPROVED, REJECTED, PAID = 'APPROVED', 'REJECTED', 'PAID'
+DECISIONS = {
+    'APPROVED': APPROVED, 'APPROVE': APPROVED, 'موافقة': APPROVED,
+    'REJECTED': REJECTED, 'REJECT': REJECTED, 'رفض': REJECTED, 'مرفوضة': REJECTED,
+    'PAID': PAID, 'مدفوعة': PAID, 'سداد': PAID,
+}
+# القرار ← الانتقالات حتى الحالة النهائية
+PATHS = {
+    APPROVED: ('insurance_approve',),
+    REJECTED: ('insurance_reject',),
+    PAID: ('insurance_approve', 'mark_as_paid'),
+}
+FINAL = {
+    APPROVED: Claim.Status.APPROVED_BY_INSURANCE,
+    REJECTED: Claim.Status.REJECTED_BY_INSURANCE,
+    PAID: Claim.Status.PAID,
+}
+DECISION_LABELS = {APPROVED: 'موافقة', REJECTED: 'رفض', PAID: 'سداد'}
+# ترتيب تنفيذ الخطوات على مستوى الدفعة
+STEPS = ('insurance_approve', 'insurance_reject', 'mark_as_paid')
+
+
+class RemittanceError(ValueError):
+    """The file cannot be read as a remittance (format or missing columns)."""
+
+
+@dataclass
+class RemittanceChange:
+    row: int
+    reference: str
+    from_status: str
+    to_status: str
+    amount_before: Decimal = None
+    amount_after: Decimal = None
+
+
+@dataclass
+class RemittanceReport:
+    dry_run: bool
+    total_rows: int = 0
+    changes: list = field(default_factory=list)     # [RemittanceChange]
+    unchanged: list = field(default_factory=list)   # [(row, reference)]
+    failed: list = field(default_factory=list)      # [(row, reference, reason)]
+
+
+# ── Reading ─────────────────────────────────────────────────────────────────
+
+def _header_map(header):
+    positions = {}
+    for index, title in enumerate(header):
+        name = COLUMNS.get(str(title or '').strip().lower())
+        if name and name not in positions:
+            positions[name] = index
+    missing = [name for name in REQUIRED if name not in positions]
+    if missing:
+        raise RemittanceError(f"أعمدة ناقصة في الملف: {', '.join(missing)}")
+    return positions
+
+
+def _sheet_rows(file, name):
+    if os.path.splitext(name)[1].lower() == '.csv':
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        try:
+            yield from csv.reader(text)
+        except UnicodeDecodeError:
+            raise RemittanceError("ملف CSV ليس بترميز UTF-8")
+        finally:
+            text.detach()
+        return
+    try:
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except Exception as e:
+        raise RemittanceError(f"تعذر قراءة الملف: {e}")
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_rows(file, name):
+    """(row number, {'reference', 'decision', 'amount', 'reason'}) per non-empty data row."""
+    rows = _sheet_rows(file, name)
+    positions = _header_map(next(rows, ()))
+    for number, row in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in row):
+            continue
+        yield number, {
+            name: row[index] if index < len(row) else None for name, index in positions.items()
+        }
+
+
+def _parse(values):
+    """(reference, decision, amount, reason) of one row, or raise ValueError with the reason."""
+    reference = str(values.get('reference') or '').strip()
+    if not reference:
+        raise ValueError("رقم المطالبة فارغ")
+    decision = DECISIONS.get(str(values.get('decision') or '').strip().upper())
+    if decision is None:
+        raise ValueError(f"قرار غير معروف: {values.get('decision')}")
+    amount = values.get('amount')
+    if amount in (None, ''):
+        amount = None
+    else:
+        try:
+            amount = Decimal(str(amount).replace(',', '')).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise ValueError(f"مبلغ غير صالح: {values.get('amount')}")
+        if amount < 0:
+            raise ValueError("المبلغ سالب")
+    reason = str(values.get('reason') or '').strip()
+    if decision == REJECTED and not reason:
+        raise ValueError("يجب تحديد سبب الرفض")
+    return reference, decision, amount, reason
+
+
+# ── Planning and applying ───────────────────────────────────────────────────
+
+def _plan(claim, decision, amount, user):
+    """
+    The transitions that take ``claim`` to ``decision`` (empty when it is
+    already there), or raise ValueError with the reason it cannot.
+    """
+    if claim.status == FINAL[decision]:
+        if amount is not None and claim.approved_amount_sar not in (None, amount):
+            raise ValueError(f"مسجلة مسبقاً بمبلغ {claim.approved_amount_sar} وليس {amount}")
+        return ()
+
+    path = PATHS[decision]
+    for start, name in enumerate(path):
+        if claim.status in transitions.fsm_transitions(name):
+            break
+    else:
+        raise ValueError(f"لا يمكن تسجيل «{DECISION_LABELS[decision]}» من حالة «{claim.get_status_display()}»")
+    steps = path[start:]
+    status = claim.status
+    for name in steps:
+        transition = transitions.fsm_transitions(name)[status]
+        if not transition.has_perm(claim, user):
+            raise ValueError("لا تملك صلاحية هذا الإجراء")
+        status = transition.target
+    # لا يُقدَّر مبلغ السداد: من الملف أو المبلغ المعتمد المسجل على المطالبة
+    if 'mark_as_paid' in steps and amount is None and claim.approved_amount_sar is None:
+        raise ValueError("لا يوجد مبلغ معتمد للسداد")
+    return steps
+
+
+def _apply_chunk(chunk, user, queryset, report, seen, now):
+    """Plan and write one chunk of rows. Returns the claims that moved."""
+    parsed = []
+    for number, values in chunk:
+        try:
+            reference, decision, amount, reason = _parse(values)
+        except ValueError as e:
+            report.failed.append((number, str(values.get('reference') or ''), str(e)))
+            continue
+        if reference in seen:
+            report.failed.append((number, reference, f"مكررة في الملف (الصف {seen[reference]})"))
+            continue
+        seen[reference] = number
+        parsed.append((number, reference, decision, amount, reason))
+
+    claims = {
+        claim.claim_reference: claim
+        for claim in queryset.filter(claim_reference__in=[row[1] for row in parsed])
+        .select_related('currency', 'member__policy_class')
+        .select_for_update(of=('self',))
+    }
+
+    planned, updates, reasons = [], {}, {}
+    for number, reference, decision, amount, reason in parsed:
+        claim = claims.get(reference)
+        if claim is None:
+            report.failed.append((number, reference, "المطالبة غير موجودة أو خارج نطاقك"))
+            continue
+        try:
+            steps = _plan(claim, decision, amount, user)
+        except ValueError as e:
+            report.failed.append((number, reference, str(e)))
+            continue
+        if not steps:
+            report.unchanged.append((number, reference))
+            continue
+        change = RemittanceChange(number, reference, claim.status, FINAL[decision], claim.approved_amount_sar)
+        values = {}
+        if amount is not None:
+            claim.approved_amount_sar = values['approved_amount_sar'] = amount
+        if decision == REJECTED:
+            claim.rejection_reason = values['rejection_reason'] = reasons[claim.pk] = reason
+        if values:
+            updates.setdefault(tuple(sorted(values.items())), []).append(claim.pk)
+        planned.append((claim, steps, change))
+
+    # المبالغ والأسباب تتكرر في ملف الردود: UPDATE واحد لكل قيمة مختلفة
+    for values, pks in updates.items():
+        Claim.objects.filter(pk__in=pks).update(**dict(values))
+    for name in STEPS:
+        group = [claim for claim, steps, _ in planned if name in steps]
+        if group:
+            transitions.move(name, user, group, now, reasons)
+
+    for claim, _, change in planned:
+        change.amount_after = claim.approved_amount_sar
+        report.changes.append(change)
+    return [claim for claim, _, _ in planned]
+
+
+def _chunks(rows, report):
+    chunk = []
+    for row in rows:
+        report.total_rows += 1
+        chunk.append(row)
+        if len(chunk) >= CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _Rollback(Exception):
+    pass
+
+
+def import_file(file, user, queryset, name='', dry_run=False):
+    """
+    Apply the remittance ``file`` (XLSX, or CSV when ``name`` ends in .csv)
+    as ``user`` to the claims of ``queryset`` — the user's scope, references
+    outside it are reported as not found. Raises RemittanceError when the
+    file cannot be read.
+    """
+    report = RemittanceReport(dry_run=dry_run)
+    now = timezone.now()
+    moved = {}
+    try:
+        with transaction.atomic():
+            seen = {}
+            for chunk in _chunks(read_rows(file, name or getattr(file, 'name', '')), report):
+                claims = _apply_chunk(chunk, user, queryset, report, seen, now)
+                if not dry_run:
+                    for claim in claims:
+                        moved.setdefault(claim.status, []).append(claim)
+            if dry_run:
+                raise _Rollback
+            for status, claims in moved.items():
+                NotificationService.notify_claims_status_change(claims, status)
+    except _Rollback:
+        pass
+    return report
@@ -0,0 +1,27 @@
+# claims/signals.py
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from . import utilisation
+from .models import Claim
+
+
+# ── Benefit utilisation ledger ──────────────────────────────────────────────
+
+@receiver(post_save, sender=Claim)
+def claim_utilisation_on_save(sender, instance, created, **kwargs):
+    """
+    Post the ledger difference when a claim enters, leaves or changes inside
+    APPROVED_BY_INSURANCE / PAID. Runs inside the transition's atomic block.
+    """
+    in_ledger = instance.status in utilisation.LEDGER_STATUSES
+    was_in_ledger = not created and instance.loaded_value('status') in utilisation.LEDGER_STATUSES
+    if not (in_ledger or was_in_ledger):
+        return
+    if created or instance.tracked_field_changed(*utilisation.SOURCE_FIELDS):
+        utilisation.sync_claim(instance)
+
+
+@receiver(pre_delete, sender=Claim)
+def claim_utilisation_on_delete(sender, instance, **kwargs):
+    utilisation.release_claim(instance)
@@ -1,3 +1,645 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import io
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.exceptions import PermissionDenied
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from brokers.models import Broker
+from clients.models import Client
+from core import keyset
+from members.models import Member
+from notifications.models import Notification
+from policies import coverage, renewal
+from policies.models import BenefitType, ClassBenefit, Policy, PolicyClass
+from providers.models import Provider
+from openpyxl import Workbook, load_workbook
+
+from . import batches, remittance, transitions, utilisation
+from .models import (
+    Claim, ClaimAttachment, ClaimStatusLog, Currency, InsurerBatch, UtilisationBalance, UtilisationEntry,
+)
+from .views import get_allowed_claims
+
+
+class ClaimListTest(TestCase):
+    def setUp(self):
+        Currency.objects.create(code='SAR', name_ar='ريال', name_en='Riyal')
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1')
+        policy = Policy.objects.create(
+            client=company, provider=provider, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        member = Member.objects.create(
+            client=company, policy_class=PolicyClass.objects.create(policy=policy, name='VIP'),
+            full_name='Member', national_id='1000000001', birth_date=datetime.date(1990, 1, 1),
+            gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        statuses = ['PAID', 'PAID', 'DRAFT', 'SENT_TO_INSURANCE', 'PAID', 'DRAFT', 'PAID']
+        self.claims = [
+            Claim.objects.create(member=member, status=status, service_date=datetime.date(2026, 3, 1), amount_original=100)
+            for status in statuses
+        ]
+        # نصف المطالبات بنفس الطابع الزمني — الترتيب يعتمد على id لكسر التعادل
+        Claim.objects.filter(pk__in=[c.pk for c in self.claims[:4]]).update(created_at=timezone.now())
+        self.user = User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN)
+        self.client.force_login(self.user)
+
+    def test_keyset_pages_cover_every_row_once(self):
+        expected = list(Claim.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        seen, cursor = [], None
+        while True:
+            page = keyset.paginate(Claim.objects.all(), cursor=cursor, size=3)
+            seen += [claim.pk for claim in page.items]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        first = keyset.paginate(Claim.objects.all(), size=3).items
+        self.assertEqual(keyset.paginate(Claim.objects.all(), cursor='garbage!', size=3).items, first)
+
+    def test_cursor_with_non_string_values_is_rejected(self):
+        tampered = base64.urlsafe_b64encode(b'[1,2]').decode().rstrip('=')
+        self.assertIsNone(keyset.decode_cursor(tampered, Claim, ('created_at', 'id')))
+        response = self.client.get(reverse('claims:claim_list'), {'cursor': tampered})
+        self.assertEqual(response.status_code, 200)
+
+    @patch('claims.views.CLAIM_LIST_PAGE_SIZE', 3)
+    def test_list_is_paginated_with_htmx_fragments(self):
+        response = self.client.get(reverse('claims:claim_list'))
+        self.assertEqual(len(response.context['claims']), 3)
+        self.assertEqual(response.context['total_count'], 7)
+        self.assertEqual(
+            [(value, count) for value, _, count in response.context['status_facets']],
+            [('DRAFT', 2), ('SENT_TO_INSURANCE', 1), ('PAID', 4)],
+        )
+        next_query = response.context['next_query']
+        self.assertTrue(next_query)
+
+        response = self.client.get(f"{reverse('claims:claim_list')}?{next_query}&fragment=rows", HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(response, 'claims/partials/claim_rows.html')
+        self.assertNotIn('status_facets', response.context)
+        self.assertContains(response, 'hx-trigger="revealed"')
+
+    def test_status_filter_keeps_facets_of_whole_scope(self):
+        response = self.client.get(reverse('claims:claim_list'), {'status_filter': 'PAID'}, HTTP_HX_REQUEST='true')
+        self.assertTemplateUsed(response, 'claims/partials/claim_table.html')
+        self.assertEqual({c.status for c in response.context['claims']}, {'PAID'})
+        self.assertEqual(response.context['total_count'], 7)
+
+
+class UtilisationLedgerTest(TestCase):
+    def setUp(self):
+        Currency.objects.create(code='SAR', name_ar='ريال', name_en='Riyal')
+        Currency.objects.create(code='USD', name_ar='دولار', name_en='Dollar', exchange_rate=Decimal('3.75'))
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1')
+        self.policy = Policy.objects.create(
+            client=company, provider=provider, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        policy_class = PolicyClass.objects.create(policy=self.policy, name='VIP', annual_limit=10000)
+        self.dental = BenefitType.objects.create(name_ar='أسنان', name_en='Dental')
+        ClassBenefit.objects.create(policy_class=policy_class, benefit_type=self.dental, limit_amount=2000)
+        self.principal = Member.objects.create(
+            client=company, policy_class=policy_class, full_name='Principal', national_id='1000000001',
+            birth_date=datetime.date(1990, 1, 1), gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        self.spouse = Member.objects.create(
+            client=company, policy_class=policy_class, sponsor=self.principal, full_name='Spouse',
+            national_id='1000000002', birth_date=datetime.date(1992, 1, 1), gender='F', relation='SPOUSE',
+            phone_number='0500000001',
+        )
+        self.user = User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN)
+
+    def approved_claim(self, member, amount, currency='SAR', benefit_type=None):
+        claim = Claim.objects.create(
+            member=member, status=Claim.Status.SENT_TO_INSURANCE, service_date=datetime.date(2026, 3, 1),
+            amount_original=amount, currency_id=currency, benefit_type=benefit_type,
+        )
+        claim.insurance_approve(user=self.user)
+        claim.save()
+        return claim
+
+    def balance(self, scope, member, benefit_type=None):
+        row = UtilisationBalance.objects.get(
+            scope=scope, member=member, policy=self.policy, benefit_type=benefit_type,
+        )
+        return row.reserved, row.consumed
+
+    def test_approval_reserves_and_payment_consumes(self):
+        claim = self.approved_claim(self.spouse, 100, currency='USD', benefit_type=self.dental)
+        Scope = UtilisationBalance.Scope
+        self.assertEqual(self.balance(Scope.MEMBER, self.spouse), (Decimal('375.00'), 0))
+        self.assertEqual(self.balance(Scope.FAMILY, self.principal, self.dental), (Decimal('375.00'), 0))
+
+        claim.mark_as_paid(user=self.user, amount=Decimal('300'))
+        claim.save()
+        self.assertEqual(self.balance(Scope.MEMBER, self.spouse, self.dental), (0, Decimal('300.00')))
+        self.assertEqual(self.balance(Scope.FAMILY, self.principal), (0, Decimal('300.00')))
+        # الحجز يُلغى بقيد معاكس — السجل إلحاقي فقط
+        self.assertEqual(
+            sorted(claim.utilisation_entries.values_list('kind', 'amount')),
+            [('CONSUME', Decimal('300.00')), ('RESERVE', Decimal('-375.00')), ('RESERVE', Decimal('375.00'))],
+        )
+
+    def test_remaining_limit_is_constant_queries(self):
+        for _ in range(3):
+            self.approved_claim(self.principal, 500, benefit_type=self.dental)
+        self.approved_claim(self.spouse, 1000)
+        # لقطة التغطية مترجمة والفئة محمّلة (select_related في claim_detail)
+        coverage.for_class(self.principal.policy_class.pk)
+        with self.assertNumQueries(2):
+            result = utilisation.for_member(self.principal, self.dental.pk)
+        self.assertEqual(result.member.remaining, Decimal('8500.00'))
+        self.assertEqual(result.benefit.remaining, Decimal('500.00'))
+        self.assertEqual(result.family.used, Decimal('2500.00'))
+        self.assertIsNone(result.family.remaining)
+
+    def test_deleting_a_claim_releases_its_balance(self):
+        claim = self.approved_claim(self.spouse, 400)
+        claim.delete()
+        self.assertEqual(self.balance(UtilisationBalance.Scope.FAMILY, self.principal), (0, 0))
+
+    def test_reconcile_repairs_drift_from_history(self):
+        claim = self.approved_claim(self.principal, 400)
+        self.approved_claim(self.spouse, 600)
+        # تعديلات خارج الإشارات: مبلغ المطالبة ورصيد مفسود
+        Claim.objects.filter(pk=claim.pk).update(amount_original=450)
+        UtilisationBalance.objects.filter(scope=UtilisationBalance.Scope.FAMILY).update(reserved=1)
+
+        out = StringIO()
+        call_command('reconcile_utilisation', '--check', stdout=out)
+        self.assertIn('would have posted corrections for 1 claim(s)', out.getvalue())
+        self.assertEqual(UtilisationEntry.objects.count(), 2)
+
+        call_command('reconcile_utilisation', stdout=StringIO())
+        Scope = UtilisationBalance.Scope
+        self.assertEqual(self.balance(Scope.MEMBER, self.principal), (Decimal('450.00'), 0))
+        self.assertEqual(self.balance(Scope.FAMILY, self.principal), (Decimal('1050.00'), 0))
+        self.assertEqual((utilisation.reconcile_claims(), utilisation.rebuild_balances()), (0, 0))
+
+    def test_old_claims_stay_in_their_period_after_renewal(self):
+        approved = self.approved_claim(self.principal, 1000)
+        paid = self.approved_claim(self.principal, 500)
+        paid.mark_as_paid(user=self.user, amount=Decimal('500'))
+        paid.save()
+
+        report = renewal.renew(renewal.preview(Policy.objects.filter(pk=self.policy.pk)))
+        (_, new_policy), = report.renewed
+        # بدء سريان الوثيقة الجديدة: الأعضاء ينتقلون إلى فئتها
+        Member.objects.update(policy_class=new_policy.classes.get())
+        approved = Claim.objects.select_related('currency', 'member__policy_class').get(pk=approved.pk)
+        approved.mark_as_paid(user=self.user, amount=Decimal('1000'))
+        approved.save()
+
+        out = StringIO()
+        call_command('reconcile_utilisation', stdout=out)
+        self.assertIn('posted corrections for 0 claim(s)', out.getvalue())
+        Scope = UtilisationBalance.Scope
+        self.assertEqual(self.balance(Scope.MEMBER, self.principal), (0, Decimal('1500.00')))
+        self.assertFalse(UtilisationBalance.objects.filter(policy=new_policy).exclude(consumed=0).exists())
+        self.assertEqual(
+            utilisation.for_member(Member.objects.get(pk=self.principal.pk), policy_id=self.policy.pk).member.used,
+            Decimal('1500.00'),
+        )
+
+
+class BulkTransitionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('setup_roles', stdout=StringIO())
+
+    def setUp(self):
+        Currency.objects.create(code='SAR', name_ar='ريال', name_en='Riyal')
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        broker = Broker.objects.create(name_ar='وسيط', name_en='Broker', commercial_record='BR-1')
+        self.company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1', broker=broker)
+        other = Client.objects.create(name_ar='أخرى', name_en='Other', commercial_record='CR-2')
+        self.policy = Policy.objects.create(
+            client=self.company, provider=provider, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        policy_class = PolicyClass.objects.create(policy=self.policy, name='VIP', annual_limit=10000)
+        self.member = Member.objects.create(
+            client=self.company, policy_class=policy_class, full_name='Member', national_id='1000000001',
+            birth_date=datetime.date(1990, 1, 1), gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        self.stranger = Member.objects.create(
+            client=other, policy_class=policy_class, full_name='Stranger', national_id='1000000002',
+            birth_date=datetime.date(1990, 1, 1), gender='M', relation='PRINCIPAL', phone_number='0500000001',
+        )
+        self.broker_user = User.objects.create_user(
+            username='broker', password='p', role=User.Roles.BROKER_ADMIN, related_broker=broker,
+        )
+        self.admin = User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN)
+        self.hr = User.objects.create_user(
+            username='hr', password='p', role=User.Roles.HR_ADMIN, related_client=self.company,
+        )
+
+    def claims(self, count, status, member=None, **fields):
+        return [
+            Claim.objects.create(
+                member=member or self.member, status=status, service_date=datetime.date(2026, 3, 1),
+                amount_original=100, **fields,
+            )
+            for _ in range(count)
+        ]
+
+    def test_report_covers_every_requested_claim(self):
+        ready = self.claims(3, Claim.Status.SUBMITTED_TO_BROKER)
+        draft, = self.claims(1, Claim.Status.DRAFT)
+        foreign, = self.claims(1, Claim.Status.SUBMITTED_TO_BROKER, member=self.stranger)
+
+        report = transitions.apply(
+            'broker_start_process', self.broker_user, get_allowed_claims(self.broker_user),
+            [c.pk for c in ready] + [draft.pk, foreign.pk, 'not-a-uuid'],
+        )
+        self.assertEqual({c.pk for c in report.succeeded}, {c.pk for c in ready})
+        failed = {getattr(item, 'pk', item): reason for item, reason in report.failed}
+        self.assertIn('Draft', failed[draft.pk])
+        self.assertIn('خارج نطاقك', failed[foreign.pk])
+        self.assertIn('not-a-uuid', failed)
+
+        self.assertEqual(
+            set(Claim.objects.filter(pk__in=[c.pk for c in ready]).values_list('status', flat=True)),
+            {Claim.Status.BROKER_PROCESSING},
+        )
+        self.assertEqual(Claim.objects.get(pk=foreign.pk).status, Claim.Status.SUBMITTED_TO_BROKER)
+        self.assertEqual(
+            ClaimStatusLog.objects.filter(action='broker_start_process', user=self.broker_user).count(), 3,
+        )
+        with self.assertRaises(PermissionDenied):
+            transitions.apply('insurance_approve', self.broker_user, get_allowed_claims(self.broker_user))
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def run(count):
+            claims = self.claims(count, Claim.Status.BROKER_PROCESSING)
+            with CaptureQueriesContext(connection) as queries:
+                report = transitions.apply(
+                    'sent_to_insurance', self.broker_user, get_allowed_claims(self.broker_user),
+                    [c.pk for c in claims],
+                )
+            self.assertEqual(len(report.succeeded), count)
+            return len(queries)
+
+        run(1)  # تسخين: إصدار مصفوفة الصلاحيات يُقرأ مرة لكل كائن مستخدم
+        self.assertEqual(run(3), run(30))
+
+    def test_approval_and_payment_post_the_ledger_and_group_hr_notifications(self):
+        claims = self.claims(4, Claim.Status.SENT_TO_INSURANCE)
+        with self.captureOnCommitCallbacks(execute=True):
+            report = transitions.apply('insurance_approve', self.admin, get_allowed_claims(self.admin))
+        self.assertEqual(len(report.succeeded), 4)
+        Scope = UtilisationBalance.Scope
+        balance = UtilisationBalance.objects.get(scope=Scope.MEMBER, member=self.member, benefit_type=None)
+        self.assertEqual((balance.reserved, balance.consumed), (Decimal('400.00'), 0))
+        # ملخص واحد لـ HR الشركة بدلاً من أربعة إشعارات
+        self.assertEqual(list(Notification.objects.filter(recipient=self.hr).values_list('title', flat=True)), [
+            '4 مطالبات وافقت عليها شركة التأمين ✅',
+        ])
+
+        Claim.objects.filter(pk__in=[c.pk for c in claims[:3]]).update(approved_amount_sar=80)
+        report = transitions.apply(
+            'mark_as_paid', self.admin, get_allowed_claims(self.admin), [c.pk for c in claims],
+        )
+        self.assertEqual(len(report.succeeded), 3)
+        # بلا مبلغ معتمد: تُرفض ولا يُقدَّر مبلغ السداد
+        self.assertEqual(
+            [(c.pk, reason) for c, reason in report.failed], [(claims[3].pk, "لا يوجد مبلغ معتمد للسداد")],
+        )
+        unpriced = Claim.objects.get(pk=claims[3].pk)
+        self.assertEqual((unpriced.status, unpriced.approved_amount_sar), (Claim.Status.APPROVED_BY_INSURANCE, None))
+        balance.refresh_from_db()
+        self.assertEqual((balance.reserved, balance.consumed), (Decimal('100.00'), Decimal('240.00')))
+        self.assertEqual((utilisation.reconcile_claims(), utilisation.rebuild_balances()), (0, 0))
+
+    def test_bulk_page_applies_the_selected_claims(self):
+        ready = self.claims(2, Claim.Status.SUBMITTED_TO_BROKER)
+        self.client.force_login(self.broker_user)
+        url = reverse('claims:claim_bulk_transition')
+        response = self.client.get(url, {'transition': 'broker_start_process'})
+        self.assertContains(response, ready[0].claim_reference)
+
+        response = self.client.post(url, {
+            'transition': 'broker_start_process', 'scope': 'selected', 'claims': [ready[0].pk],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['report'].succeeded), 1)
+        self.assertEqual(response.context['eligible_count'], 1)
+
+        self.client.force_login(User.objects.create_user(username='member', password='p', role=User.Roles.MEMBER))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class InsurerBatchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('setup_roles', stdout=StringIO())
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        Currency.objects.create(code='SAR', name_ar='ريال', name_en='Riyal')
+        broker = Broker.objects.create(name_ar='وسيط', name_en='Broker', commercial_record='BR-1')
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1', broker=broker)
+        self.insurer = Provider.objects.create(name_ar='تأمين أ', name_en='Insurer A', license_number='LIC-A')
+        other_insurer = Provider.objects.create(name_ar='تأمين ب', name_en='Insurer B', license_number='LIC-B')
+        self.members = {}
+        for number, provider in enumerate((self.insurer, other_insurer), 1):
+            policy = Policy.objects.create(
+                client=company, provider=provider, policy_number=f'POL-{number}',
+                start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+            )
+            self.members[provider] = Member.objects.create(
+                client=company, policy_class=PolicyClass.objects.create(policy=policy, name='A'),
+                full_name=f'عضو {number}', national_id=f'100000000{number}', birth_date=datetime.date(1990, 1, 1),
+                gender='M', relation='PRINCIPAL', phone_number=f'050000000{number}',
+            )
+        self.user = User.objects.create_user(
+            username='broker', password='p', role=User.Roles.BROKER_ADMIN, related_broker=broker,
+        )
+
+    def claims(self, count, status=Claim.Status.SENT_TO_INSURANCE, provider=None):
+        return [
+            Claim.objects.create(
+                member=self.members[provider or self.insurer], status=status,
+                service_date=datetime.date(2026, 3, 1), amount_original=100,
+            )
+            for _ in range(count)
+        ]
+
+    def test_batch_takes_pending_claims_once(self):
+        sent = self.claims(3)
+        self.claims(1, status=Claim.Status.BROKER_PROCESSING)
+        other, = self.claims(1, provider=Provider.objects.get(license_number='LIC-B'))
+        scope = get_allowed_claims(self.user)
+
+        self.assertEqual(
+            {row['name']: row['count'] for row in batches.pending_by_provider(scope)},
+            {'تأمين أ': 3, 'تأمين ب': 1},
+        )
+        batch = batches.create(self.insurer, self.user, scope)
+        self.assertEqual((batch.claim_count, batch.total_amount_sar), (3, Decimal('300.00')))
+        self.assertEqual(list(batch.lines.values_list('claim', flat=True)), [c.pk for c in sent])
+        self.assertIsNone(batches.create(self.insurer, self.user, scope))
+        self.assertEqual(list(batches.pending(scope)), [other])
+
+        # مطالبة أُعيدت لشركة التأمين بعد تعديلها تدخل في الدفعة التالية
+        Claim.objects.filter(pk=sent[0].pk).update(updated_at=timezone.now() + datetime.timedelta(seconds=1))
+        again = batches.create(self.insurer, self.user, scope)
+        self.assertEqual(list(again.claims.all()), [sent[0]])
+
+    def test_exports_stream_every_line(self):
+        claims = self.claims(3)
+        invoice = ClaimAttachment.objects.create(
+            claim=claims[1], file=SimpleUploadedFile('invoice.pdf', b'%PDF-1.4 invoice'),
+        )
+        missing = ClaimAttachment.objects.create(claim=claims[2], file=SimpleUploadedFile('lost.pdf', b'x'))
+        missing.file.storage.delete(missing.file.name)
+        batch = batches.create(self.insurer, self.user, get_allowed_claims(self.user))
+
+        with CaptureQueriesContext(connection) as queries:
+            text = ''.join(batches.csv_chunks(batch))
+        self.assertEqual(len(queries), 1)
+        rows = list(csv.reader(io.StringIO(text.lstrip('\ufeff'))))
+        self.assertEqual(rows[0], batches.HEADERS)
+        self.assertEqual([row[:2] for row in rows[1:]], [[str(n), c.claim_reference] for n, c in enumerate(claims, 1)])
+        self.assertEqual([row[-1] for row in rows[1:]], ['0', '1', '1'])
+
+        file = io.BytesIO()
+        batches.write_xlsx(batch, file)
+        sheet = load_workbook(file, read_only=True)[batch.reference]
+        self.assertEqual([row[1] for row in sheet.iter_rows(min_row=2, values_only=True)],
+                         [c.claim_reference for c in claims])
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(batches.attachment_chunks(batch))))
+        self.assertEqual(archive.namelist(), [
+            f'00002_{claims[1].claim_reference}/{invoice.file.name.rsplit("/", 1)[-1]}', 'MISSING_FILES.txt',
+        ])
+        self.assertEqual(archive.read(archive.namelist()[0]), b'%PDF-1.4 invoice')
+        self.assertIn(claims[2].claim_reference, archive.read('MISSING_FILES.txt').decode())
+
+    def test_batch_pages(self):
+        claim, = self.claims(1)
+        self.client.force_login(self.user)
+        url = reverse('claims:insurer_batches')
+        self.assertContains(self.client.get(url), 'تأمين أ')
+        self.assertRedirects(self.client.post(url, {'provider': self.insurer.pk}), url)
+        batch = InsurerBatch.objects.get()
+
+        for kind in ('csv', 'attachments'):
+            response = self.client.get(reverse('claims:insurer_batch_download', args=[batch.pk, kind]))
+            self.assertTrue(response.streaming)
+        response = self.client.get(reverse('claims:insurer_batch_download', args=[batch.pk, 'xlsx']))
+        self.assertEqual(response['Content-Type'], batches.XLSX_CONTENT_TYPE)
+        self.assertIn(claim.claim_reference, [
+            row[1] for row in load_workbook(io.BytesIO(b''.join(response.streaming_content))).active.values
+        ])
+        self.assertEqual(self.client.get(reverse('claims:insurer_batch_download', args=[batch.pk, 'pdf'])).status_code, 404)
+
+        self.client.force_login(User.objects.create_user(username='member', password='p', role=User.Roles.MEMBER))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_export_command_writes_one_file_per_insurer(self):
+        self.claims(2)
+        self.claims(1, provider=Provider.objects.get(license_number='LIC-B'))
+        out = StringIO()
+        call_command('export_insurer_batches', user='broker', output=self.media_root, format='csv', stdout=out)
+        self.assertEqual(InsurerBatch.objects.count(), 2)
+        for batch in InsurerBatch.objects.all():
+            with open(f'{self.media_root}/{batches.filename(batch, "csv")}', encoding='utf-8') as file:
+                self.assertEqual(len(file.read().splitlines()), batch.claim_count + 1)
+        call_command('export_insurer_batches', user='broker', check=True, stdout=out)
+        self.assertIn('0 insurer(s) with pending claims.', out.getvalue())
+
+
+def remittance_file(rows, header=('Claim Reference', 'Decision', 'Approved Amount', 'Reason')):
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return io.BytesIO(text.getvalue().encode('utf-8-sig'))
+
+
+class RemittanceImportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('setup_roles', stdout=StringIO())
+
+    def setUp(self):
+        Currency.objects.create(code='SAR', name_ar='ريال', name_en='Riyal')
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        broker = Broker.objects.create(name_ar='وسيط', name_en='Broker', commercial_record='BR-1')
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1', broker=broker)
+        policy = Policy.objects.create(
+            client=company, provider=provider, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        self.member = Member.objects.create(
+            client=company, policy_class=PolicyClass.objects.create(policy=policy, name='A', annual_limit=10000),
+            full_name='Member', national_id='1000000001', birth_date=datetime.date(1990, 1, 1),
+            gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        self.admin = User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN)
+        self.broker_user = User.objects.create_user(
+            username='broker', password='p', role=User.Roles.BROKER_ADMIN, related_broker=broker,
+        )
+
+    def claims(self, count, status=Claim.Status.SENT_TO_INSURANCE):
+        return [
+            Claim.objects.create(
+                member=self.member, status=status, service_date=datetime.date(2026, 3, 1), amount_original=100,
+            )
+            for _ in range(count)
+        ]
+
+    def run_import(self, rows, user=None, dry_run=False):
+        user = user or self.admin
+        return remittance.import_file(
+            remittance_file(rows), user, get_allowed_claims(user), name='remittance.csv', dry_run=dry_run,
+        )
+
+    def test_dry_run_reports_the_diff_without_writing(self):
+        approve, reject, pay = self.claims(3)
+        rows = [
+            [approve.claim_reference, 'APPROVED', '80', ''],
+            [reject.claim_reference, 'rejected', '', 'Not covered'],
+            [pay.claim_reference, 'PAID', '95', ''],
+            ['CLM-0000-99999', 'APPROVED', '', ''],
+            [approve.claim_reference, 'PAID', '', ''],
+            [pay.claim_reference, 'MAYBE', '', ''],
+            [reject.claim_reference, 'REJECTED', '', ''],
+        ]
+        report = self.run_import(rows, dry_run=True)
+
+        self.assertEqual(report.total_rows, 7)
+        self.assertEqual(
+            [(c.reference, c.to_status, c.amount_after) for c in report.changes],
+            [
+                (approve.claim_reference, Claim.Status.APPROVED_BY_INSURANCE, Decimal('80.00')),
+                (reject.claim_reference, Claim.Status.REJECTED_BY_INSURANCE, None),
+                (pay.claim_reference, Claim.Status.PAID, Decimal('95.00')),
+            ],
+        )
+        failed = {row: reason for row, _, reason in report.failed}
+        self.assertIn('خارج نطاقك', failed[5])
+        self.assertIn('مكررة في الملف (الصف 2)', failed[6])
+        self.assertIn('قرار غير معروف', failed[7])
+        self.assertIn('سبب الرفض', failed[8])
+
+        self.assertEqual(set(Claim.objects.values_list('status', flat=True)), {Claim.Status.SENT_TO_INSURANCE})
+        self.assertFalse(ClaimStatusLog.objects.exists())
+        self.assertFalse(UtilisationEntry.objects.exists())
+
+    def test_import_applies_decisions_and_is_repeatable(self):
+        approve, reject, pay = self.claims(3)
+        rows = [
+            [approve.claim_reference, 'APPROVED', '80', ''],
+            [reject.claim_reference, 'REJECTED', '', 'Not covered'],
+            [pay.claim_reference, 'PAID', '90', ''],
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            report = self.run_import(rows)
+        self.assertEqual((len(report.changes), report.failed), (3, []))
+
+        claims = {c.pk: c for c in Claim.objects.all()}
+        self.assertEqual(
+            (claims[approve.pk].status, claims[approve.pk].approved_amount_sar),
+            (Claim.Status.APPROVED_BY_INSURANCE, Decimal('80.00')),
+        )
+        self.assertEqual(
+            (claims[reject.pk].status, claims[reject.pk].rejection_reason),
+            (Claim.Status.REJECTED_BY_INSURANCE, 'Not covered'),
+        )
+        self.assertEqual(
+            (claims[pay.pk].status, claims[pay.pk].approved_amount_sar), (Claim.Status.PAID, Decimal('90.00')),
+        )
+        self.assertEqual(
+            list(ClaimStatusLog.objects.filter(claim=pay).order_by('created_at', 'action').values_list('action', flat=True)),
+            ['insurance_approve', 'mark_as_paid'],
+        )
+        self.assertEqual(ClaimStatusLog.objects.get(claim=reject).reason, 'Not covered')
+        self.assertEqual((utilisation.reconcile_claims(), utilisation.rebuild_balances()), (0, 0))
+
+        again = self.run_import(rows)
+        self.assertEqual((again.changes, len(again.unchanged)), ([], 3))
+        conflict = self.run_import([[pay.claim_reference, 'PAID', '75', '']])
+        self.assertIn('90.00', conflict.failed[0][2])
+
+    def test_rows_need_every_step_permission(self):
+        # الوسيط يسجّل السداد ولا يملك موافقة شركة التأمين
+        approved, unpriced = self.claims(2, status=Claim.Status.APPROVED_BY_INSURANCE)
+        Claim.objects.filter(pk=approved.pk).update(approved_amount_sar=80)
+        sent, = self.claims(1)
+        report = self.run_import([
+            [approved.claim_reference, 'PAID', '', ''],
+            [sent.claim_reference, 'PAID', '90', ''],
+            [unpriced.claim_reference, 'PAID', '', ''],
+        ], user=self.broker_user)
+        self.assertEqual(
+            [(c.reference, c.amount_after) for c in report.changes], [(approved.claim_reference, Decimal('80.00'))],
+        )
+        self.assertIn('صلاحية', report.failed[0][2])
+        # مبلغ السداد لا يُقدَّر من مبلغ المطالبة
+        self.assertIn('لا يوجد مبلغ معتمد', report.failed[1][2])
+        self.assertEqual(Claim.objects.get(pk=unpriced.pk).status, Claim.Status.APPROVED_BY_INSURANCE)
+        self.assertEqual(Claim.objects.get(pk=sent.pk).status, Claim.Status.SENT_TO_INSURANCE)
+
+    def test_queries_do_not_grow_with_the_file(self):
+        def run(count):
+            claims = self.claims(count)
+            with CaptureQueriesContext(connection) as queries:
+                report = self.run_import([[c.claim_reference, 'PAID', '90', ''] for c in claims])
+            self.assertEqual(len(report.changes), count)
+            return len(queries)
+
+        run(1)  # تسخين: مصفوفة الصلاحيات
+        self.assertEqual(run(3), run(30))
+
+    def test_import_page(self):
+        claim, = self.claims(1)
+        workbook = Workbook()
+        workbook.active.append(['رقم المطالبة', 'القرار'])
+        workbook.active.append([claim.claim_reference, 'موافقة'])
+        content = io.BytesIO()
+        workbook.save(content)
+
+        self.client.force_login(self.admin)
+        url = reverse('claims:remittance_import')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {
+            'file': SimpleUploadedFile('remittance.xlsx', content.getvalue()), 'dry_run': 'on',
+        })
+        self.assertEqual(len(response.context['report'].changes), 1)
+        self.assertContains(response, claim.claim_reference)
+        self.assertEqual(Claim.objects.get(pk=claim.pk).status, Claim.Status.SENT_TO_INSURANCE)
+
+        response = self.client.post(url, {
+            'file': SimpleUploadedFile('remittance.csv', b'Reference,Status\r\n'),
+        })
+        self.assertContains(response, 'أعمدة ناقصة')
+
+        self.client.force_login(User.objects.create_user(username='member', password='p', role=User.Roles.MEMBER))
+        self.assertEqual(self.client.get(url).status_code, 403)
@@ -0,0 +1,188 @@
+"""
+Bulk claim transitions.
+
+Brokers and insurers move claims through the same FSM steps many at a time.
+Calling the transition method per claim costs a SELECT, an UPDATE, a
+ClaimStatusLog INSERT and the post_save chain (ledger, notifications) for
+each one. apply() runs one transition over a whole selection instead:
+
+    report = transitions.apply('sent_to_insurance', request.user,
+                               get_allowed_claims(request.user), claim_ids)
+
+    * sources, permission and conditions come from the FSM metadata of the
+      Claim method, so the rules are those of the single-claim views;
+      mark_as_paid pays the recorded approved amount, and claims without
+      one are reported as failed;
+    * the claims are loaded (and locked) with one scoped query per chunk of
+      CHUNK and checked against the sources in memory;
+    * status and updated_at move with one UPDATE per chunk and source state,
+      the ClaimStatusLog rows with one bulk_create, the utilisation ledger
+      with utilisation.sync_claims() — all in one transaction;
+    * notifications go through NotificationService.notify_claims_status_change()
+      (one per member, one summary per company's HR) and are written by the
+      outbox when the transaction commits.
+
+The queryset UPDATE sends no post_save, so every receiver of Claim.save()
+that a bulk transition can trigger is called here explicitly.
+"""
+import uuid
+from dataclasses import dataclass, field
+
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.services import NotificationService
+from . import utilisation
+from .models import Claim, ClaimStatusLog
+
+CHUNK = 500
+# أقصى عدد مطالبات في دفعة واحدة
+MAX_CLAIMS = 5000
+
+# الانتقالات المتاحة جماعياً (لا تحتاج سبباً لكل مطالبة) ← اسمها في الواجهة
+BULK_TRANSITIONS = {
+    'broker_start_process': 'بدء المعالجة',
+    'sent_to_insurance': 'إرسال لشركة التأمين',
+    'insurance_approve': 'موافقة شركة التأمين',
+    'mark_as_paid': 'تسجيل السداد',
+}
+
+
+@dataclass
+class BulkTransitionReport:
+    transition: str
+    succeeded: list = field(default_factory=list)   # [claim]
+    failed: list = field(default_factory=list)      # [(claim or requested id, reason)]
+
+    @property
+    def label(self):
+        return BULK_TRANSITIONS[self.transition]
+
+
+def fsm_transitions(name):
+    """{source: django_fsm Transition} of the Claim method ``name``."""
+    return getattr(Claim, name)._django_fsm.transitions
+
+
+def sources(name):
+    return list(fsm_transitions(name))
+
+
+def available(user):
+    """The bulk transitions ``user`` may run, in display order."""
+    return [
+        name for name in BULK_TRANSITIONS
+        if any(transition.has_perm(None, user) for transition in fsm_transitions(name).values())
+    ]
+
+
+def eligible(name, queryset):
+    """Claims of ``queryset`` currently in a source state of ``name``."""
+    return queryset.filter(status__in=sources(name))
+
+
+def _check(name, claim, user):
+    """The reason ``claim`` cannot take the transition, or None."""
+    transition = fsm_transitions(name).get(claim.status)
+    if transition is None:
+        return f"لا يمكن «{BULK_TRANSITIONS[name]}» من حالة «{claim.get_status_display()}»"
+    if not transition.has_perm(claim, user):
+        return "لا تملك صلاحية هذا الإجراء"
+    if not all(condition(claim) for condition in transition.conditions or ()):
+        return "شروط الانتقال غير مستوفاة"
+    # السداد بالمبلغ المعتمد المسجل فقط — لا يُقدَّر من مبلغ المطالبة
+    if name == 'mark_as_paid' and claim.approved_amount_sar is None:
+        return "لا يوجد مبلغ معتمد للسداد"
+    return None
+
+
+def move(name, user, claims, now, reasons=None):
+    """
+    Write the transition of ``claims`` (already checked) and update the
+    instances to match. ``reasons``: {claim pk: reason} for the status log.
+    """
+    reasons = reasons or {}
+    status_field = Claim._meta.get_field('status')
+    targets = {}
+    for claim in claims:
+        target = fsm_transitions(name)[claim.status].target
+        targets.setdefault((claim.status, target), []).append(claim)
+
+    logs = []
+    for (source, target), group in targets.items():
+        Claim.objects.filter(pk__in=[claim.pk for claim in group], status=source).update(
+            status=target, updated_at=now,
+        )
+        for claim in group:
+            logs.append(ClaimStatusLog(
+                claim=claim, from_status=source, to_status=target, action=name, user=user,
+                reason=reasons.get(claim.pk, ''),
+            ))
+            status_field.set_state(claim, target)
+            claim.updated_at = now
+    ClaimStatusLog.objects.bulk_create(logs)
+
+    in_ledger = [claim for claim in claims if claim.status in utilisation.LEDGER_STATUSES]
+    if in_ledger:
+        utilisation.sync_claims(in_ledger)
+    for claim in claims:
+        claim.snapshot_tracked_fields()
+
+
+def apply(name, user, queryset, claim_ids=None):
+    """
+    Run transition ``name`` as ``user`` on ``claim_ids`` (every eligible claim
+    of ``queryset`` when None, up to MAX_CLAIMS). ``queryset`` is the user's
+    scope — ids outside it are reported as not found.
+    """
+    if name not in BULK_TRANSITIONS:
+        raise ValueError(f"Unknown bulk transition: {name}")
+    if name not in available(user):
+        raise PermissionDenied
+    report = BulkTransitionReport(transition=name)
+
+    if claim_ids is None:
+        ids = list(eligible(name, queryset).order_by('created_at', 'pk').values_list('pk', flat=True)[:MAX_CLAIMS])
+    else:
+        ids = []
+        for value in dict.fromkeys(claim_ids):
+            try:
+                ids.append(uuid.UUID(str(value)))
+            except ValueError:
+                report.failed.append((value, "معرّف غير صالح"))
+        if len(ids) > MAX_CLAIMS:
+            report.failed += [(pk, f"تجاوز الحد الأقصى للدفعة ({MAX_CLAIMS})") for pk in ids[MAX_CLAIMS:]]
+            ids = ids[:MAX_CLAIMS]
+
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(ids), CHUNK):
+            chunk = ids[start:start + CHUNK]
+            found = {
+                claim.pk: claim
+                for claim in queryset.filter(pk__in=chunk)
+                .select_related('currency', 'member__policy_class')
+                .select_for_update(of=('self',))
+            }
+            moving = []
+            for pk in chunk:
+                claim = found.get(pk)
+                if claim is None:
+                    report.failed.append((pk, "المطالبة غير موجودة أو خارج نطاقك"))
+                    continue
+                problem = _check(name, claim, user)
+                if problem:
+                    report.failed.append((claim, problem))
+                else:
+                    moving.append(claim)
+            if moving:
+                move(name, user, moving, now)
+                report.succeeded += moving
+
+        by_status = {}
+        for claim in report.succeeded:
+            by_status.setdefault(claim.status, []).append(claim)
+        for status, claims in by_status.items():
+            NotificationService.notify_claims_status_change(claims, status)
+    return report
@@ -11,6 +11,10 @@ urlpatterns = [
     # ==========================================
     path('', views.claim_list, name='claim_list'),
     path('<uuid:pk>/', views.claim_detail, name='claim_detail'),
+    path('bulk/', views.claim_bulk_transition, name='claim_bulk_transition'),
+    path('batches/', views.insurer_batches, name='insurer_batches'),
+    path('batches/<uuid:pk>/<str:kind>/', views.insurer_batch_download, name='insurer_batch_download'),
+    path('remittance/', views.remittance_import, name='remittance_import'),
     
     path('create/', views.claim_create, name='claim_create'),
     path('create/search-member/', views.search_member_by_nid, name='search_member_by_nid'),
@@ -0,0 +1,387 @@
+"""
+Benefit utilisation ledger.
+
+Every amount a claim takes out of a member's cover is posted as an
+append-only UtilisationEntry:
+
+    * APPROVED_BY_INSURANCE  → RESERVE  amount_original × exchange rate
+    * PAID                   → CONSUME  approved_amount_sar (the reservation is released)
+
+Entries are keyed on (member, family, policy, benefit type); the policy is
+the coverage period that contains the claim's service date (a renewal is a
+new Policy, see covering_policies()) and the family is the principal
+member. sync_claim() posts the difference between what a claim
+should hold in its current state and what it already posted, so a
+reversal or a correction is a compensating entry, never an UPDATE.
+
+UtilisationBalance holds the running sums per member and per family, per
+benefit type plus a total row, bumped with F() in the same transaction as
+the entry (the post_save receiver in claims/signals.py runs inside the
+transition's transaction.atomic()). Claim review reads the remaining limit
+with for_member(): one query for the balances and one for the coverage
+snapshot, however many claims the member has.
+
+Balances that drifted (SQL, queryset.update() on claims, a member moved to
+another class after posting) are repaired from history with:
+    python manage.py reconcile_utilisation
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from policies import coverage
+from policies.models import Policy
+from .models import Claim, UtilisationBalance, UtilisationEntry
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+RECONCILE_CHUNK = 500
+
+# الحالات التي تشغل رصيداً؛ وحقول المطالبة التي يتغيّر بها المبلغ المرحَّل
+LEDGER_STATUSES = (Claim.Status.APPROVED_BY_INSURANCE, Claim.Status.PAID)
+SOURCE_FIELDS = ('status', 'member_id', 'approved_amount_sar', 'amount_original', 'currency_id', 'benefit_type_id')
+
+# أقصى عدد وثائق يُتتبّع عبرها تسلسل التجديد
+MAX_RENEWAL_HOPS = 20
+
+# نوع القيد ← عمود الرصيد
+BALANCE_COLUMN = {
+    UtilisationEntry.Kind.RESERVE: 'reserved',
+    UtilisationEntry.Kind.CONSUME: 'consumed',
+}
+
+
+# ── Posting ─────────────────────────────────────────────────────────────────
+
+def estimated_amount_sar(claim):
+    return (claim.amount_original * claim.currency.exchange_rate).quantize(CENT)
+
+
+def covering_policies(claims):
+    """
+    {claim pk: policy id} — the policy whose period contains each claim's
+    service date. It is the member's current policy, or one reached along
+    its renewal chain (renewed_from backwards, renewals forwards): after a
+    renewal moves the member to the new policy, an old claim still posts to
+    the period that covered it. One query per link of the chain walked; the
+    current policy when no period contains the date.
+    """
+    current = {claim.pk: claim.member.policy_class.policy_id for claim in claims}
+    periods, successors, fetched, result = {}, defaultdict(set), set(), {}
+    # المطالبة ← (الوثيقة الحالية في البحث، تاريخ الخدمة، الاتجاه، عدد الخطوات)
+    pending = {claim.pk: (current[claim.pk], claim.service_date, 0, 0) for claim in claims}
+
+    while pending:
+        wanted = set()
+        for claim_pk, (policy_id, day, direction, hops) in list(pending.items()):
+            if policy_id not in periods:
+                if policy_id in fetched:
+                    result[claim_pk] = current[claim_pk]
+                    del pending[claim_pk]
+                else:
+                    wanted.add(policy_id)
+                continue
+            start, end, previous = periods[policy_id]
+            if start <= day <= end:
+                result[claim_pk] = policy_id
+                del pending[claim_pk]
+                continue
+            step = None
+            if hops < MAX_RENEWAL_HOPS:
+                if day < start and direction <= 0 and previous:
+                    step = (previous, day, -1, hops + 1)
+                elif day > end and direction >= 0:
+                    if policy_id not in fetched:
+                        wanted.add(policy_id)  # التجديدات اللاحقة لم تُقرأ بعد
+                        continue
+                    following = sorted(successors[policy_id], key=lambda pk: periods[pk][0])
+                    if following:
+                        step = (following[0], day, 1, hops + 1)
+            if step is None:
+                result[claim_pk] = current[claim_pk]
+                del pending[claim_pk]
+            else:
+                pending[claim_pk] = step
+
+        if wanted:
+            rows = Policy.objects.filter(Q(pk__in=wanted) | Q(renewed_from_id__in=wanted)).values_list(
+                'pk', 'start_date', 'end_date', 'renewed_from_id',
+            )
+            for pk, start, end, previous in rows:
+                periods[pk] = (start, end, previous)
+                if previous:
+                    successors[previous].add(pk)
+            fetched |= wanted
+    return result
+
+
+def target_postings(claim, policy_id):
+    """
+    {(member, family, policy, benefit_type, kind): amount} the claim should
+    hold in its current state; ``policy_id`` is its covering policy.
+    """
+    if claim.status not in LEDGER_STATUSES:
+        return {}
+    member = claim.member
+    key = (member.pk, member.sponsor_id or member.pk, policy_id, claim.benefit_type_id)
+    if claim.status == Claim.Status.PAID:
+        amount = claim.approved_amount_sar
+        if amount is None:
+            amount = estimated_amount_sar(claim)
+        return {(*key, UtilisationEntry.Kind.CONSUME): amount}
+    return {(*key, UtilisationEntry.Kind.RESERVE): estimated_amount_sar(claim)}
+
+
+def posted(claim_ids):
+    """{claim_id: {(member, family, policy, benefit_type, kind): amount}} summed from the ledger."""
+    rows = (
+        UtilisationEntry.objects.filter(claim_id__in=list(claim_ids))
+        .values('claim_id', 'member_id', 'family_id', 'policy_id', 'benefit_type_id', 'kind')
+        .annotate(total=Sum('amount'))
+    )
+    result = defaultdict(dict)
+    for row in rows:
+        key = (row['member_id'], row['family_id'], row['policy_id'], row['benefit_type_id'], row['kind'])
+        result[row['claim_id']][key] = row['total']
+    return result
+
+
+def pending_entries(claim, already_posted, policy_id):
+    """Unsaved entries that bring ``already_posted`` to the claim's target state."""
+    target = target_postings(claim, policy_id)
+    entries = []
+    for key in target.keys() | already_posted.keys():
+        delta = target.get(key, ZERO) - already_posted.get(key, ZERO)
+        if delta:
+            member_id, family_id, policy_id, benefit_type_id, kind = key
+            entries.append(UtilisationEntry(
+                claim_id=claim.pk, member_id=member_id, family_id=family_id, policy_id=policy_id,
+                benefit_type_id=benefit_type_id, kind=kind, amount=delta,
+            ))
+    return entries
+
+
+def sync_claim(claim):
+    """Post what the claim's current state requires. Returns the new entries."""
+    with transaction.atomic():
+        policies = covering_policies([claim] if claim.status in LEDGER_STATUSES else [])
+        entries = pending_entries(claim, posted([claim.pk]).get(claim.pk, {}), policies.get(claim.pk))
+        record(entries)
+    return entries
+
+
+def sync_claims(claims):
+    """sync_claim() for many claims: one ledger read, one bulk insert. Returns how many posted."""
+    already = posted(claim.pk for claim in claims)
+    policies = covering_policies([claim for claim in claims if claim.status in LEDGER_STATUSES])
+    entries, changed = [], 0
+    for claim in claims:
+        pending = pending_entries(claim, already.get(claim.pk, {}), policies.get(claim.pk))
+        changed += bool(pending)
+        entries += pending
+    record(entries)
+    return changed
+
+
+def record(entries):
+    """Append ``entries`` to the ledger and bump the running balances."""
+    if not entries:
+        return
+    UtilisationEntry.objects.bulk_create(entries)
+    apply(balance_deltas(
+        (entry.member_id, entry.family_id, entry.policy_id, entry.benefit_type_id, entry.kind, entry.amount)
+        for entry in entries
+    ))
+
+
+def release_claim(claim):
+    """Take a deleted claim's postings out of the balances (its entries go with it by CASCADE)."""
+    apply(balance_deltas(
+        (*key, -amount) for key, amount in posted([claim.pk]).get(claim.pk, {}).items()
+    ))
+
+
+# ── Running balances ────────────────────────────────────────────────────────
+
+def balance_keys(member_id, family_id, policy_id, benefit_type_id):
+    """The balance rows one posting moves: member and family, per benefit and total."""
+    for scope, holder in ((UtilisationBalance.Scope.MEMBER, member_id), (UtilisationBalance.Scope.FAMILY, family_id)):
+        yield scope, holder, policy_id, None
+        if benefit_type_id is not None:
+            yield scope, holder, policy_id, benefit_type_id
+
+
+def balance_deltas(postings):
+    """(member, family, policy, benefit_type, kind, amount) rows → {balance key: {column: delta}}."""
+    deltas = defaultdict(lambda: {'reserved': ZERO, 'consumed': ZERO})
+    for member_id, family_id, policy_id, benefit_type_id, kind, amount in postings:
+        for key in balance_keys(member_id, family_id, policy_id, benefit_type_id):
+            deltas[key][BALANCE_COLUMN[kind]] += amount
+    return deltas
+
+
+def _balance_filter(key):
+    scope, member_id, policy_id, benefit_type_id = key
+    return UtilisationBalance.objects.filter(
+        scope=scope, member_id=member_id, policy_id=policy_id, benefit_type_id=benefit_type_id,
+    )
+
+
+def apply(deltas):
+    now = timezone.now()
+    for key, delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        changes = {column: F(column) + value for column, value in delta.items()}
+        if _balance_filter(key).update(updated_at=now, **changes):
+            continue
+        scope, member_id, policy_id, benefit_type_id = key
+        try:
+            with transaction.atomic():
+                UtilisationBalance.objects.create(
+                    scope=scope, member_id=member_id, policy_id=policy_id,
+                    benefit_type_id=benefit_type_id, **delta,
+                )
+        except IntegrityError:
+            # أنشأه ترحيل متزامن بين الـ UPDATE والـ INSERT
+            _balance_filter(key).update(updated_at=now, **changes)
+
+
+# ── Remaining limit ─────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class Balance:
+    limit: Optional[Decimal] = None
+    reserved: Decimal = ZERO
+    consumed: Decimal = ZERO
+
+    @property
+    def used(self):
+        return self.reserved + self.consumed
+
+    @property
+    def remaining(self):
+        """None when the cover has no cap."""
+        if self.limit is None:
+            return None
+        return self.limit - self.used
+
+
+@dataclass(frozen=True)
+class MemberUtilisation:
+    member: Balance
+    family: Balance
+    benefit: Optional[Balance] = None
+    family_benefit: Optional[Balance] = None
+
+
+def for_member(member, benefit_type_id=None, cover=None, policy_id=None):
+    """
+    The member's (and their family's) utilisation in a policy period — the
+    current one, or ``policy_id`` (a claim's covering policy) — against the
+    annual limit and, with ``benefit_type_id``, that benefit's limit.
+    Pass ``cover`` when the caller already read the class's Coverage.
+    """
+    family_id = member.sponsor_id or member.pk
+    policy_id = policy_id or member.policy_class.policy_id
+    benefit_ids = [None] if benefit_type_id is None else [None, benefit_type_id]
+    rows = UtilisationBalance.objects.filter(
+        Q(scope=UtilisationBalance.Scope.MEMBER, member_id=member.pk)
+        | Q(scope=UtilisationBalance.Scope.FAMILY, member_id=family_id),
+        Q(benefit_type__isnull=True) | Q(benefit_type_id__in=benefit_ids[1:]),
+        policy_id=policy_id,
+    )
+    found = {(row.scope, row.benefit_type_id): row for row in rows}
+
+    if cover is None:
+        cover = coverage.for_class(member.policy_class_id)
+    limits = {None: cover.annual_limit if cover else None}
+    if benefit_type_id is not None and cover:
+        limits[benefit_type_id] = next(
+            (b['limit_amount'] for b in cover.benefits if b['benefit_type_id'] == str(benefit_type_id)), None,
+        )
+
+    def balance(scope, benefit_id, limit):
+        row = found.get((scope, benefit_id))
+        if row is None:
+            return Balance(limit=limit)
+        return Balance(limit=limit, reserved=row.reserved, consumed=row.consumed)
+
+    # لا يوجد حد للعائلة في الوثائق — رصيدها للاطلاع فقط
+    Scope = UtilisationBalance.Scope
+    return MemberUtilisation(
+        member=balance(Scope.MEMBER, None, limits[None]),
+        family=balance(Scope.FAMILY, None, None),
+        benefit=balance(Scope.MEMBER, benefit_type_id, limits.get(benefit_type_id)) if benefit_type_id else None,
+        family_benefit=balance(Scope.FAMILY, benefit_type_id, None) if benefit_type_id else None,
+    )
+
+
+# ── Reconciliation ──────────────────────────────────────────────────────────
+
+def reconcile_claims():
+    """
+    Post compensating entries for claims whose ledger no longer matches their
+    current state. Returns the number of claims corrected.
+    """
+    claims = (
+        Claim.objects.filter(Q(status__in=LEDGER_STATUSES) | Q(utilisation_entries__isnull=False))
+        .distinct()
+        .select_related('currency', 'member__policy_class')
+        .order_by('pk')
+    )
+    corrected, chunk = 0, []
+
+    def flush():
+        nonlocal corrected
+        corrected += sync_claims(chunk)
+        chunk.clear()
+
+    for claim in claims.iterator(chunk_size=RECONCILE_CHUNK):
+        chunk.append(claim)
+        if len(chunk) == RECONCILE_CHUNK:
+            flush()
+    if chunk:
+        flush()
+    return corrected
+
+
+def rebuild_balances():
+    """Recompute every balance from the ledger. Returns the number of rows corrected."""
+    rows = (
+        UtilisationEntry.objects
+        .values('member_id', 'family_id', 'policy_id', 'benefit_type_id', 'kind')
+        .annotate(total=Sum('amount'))
+    )
+    expected = balance_deltas(
+        (row['member_id'], row['family_id'], row['policy_id'], row['benefit_type_id'], row['kind'], row['total'])
+        for row in rows
+    )
+    stored = {
+        (row.scope, row.member_id, row.policy_id, row.benefit_type_id): row
+        for row in UtilisationBalance.objects.all()
+    }
+
+    now = timezone.now()
+    created, updated = [], []
+    for key, sums in expected.items():
+        row = stored.pop(key, None)
+        if row is None:
+            scope, member_id, policy_id, benefit_type_id = key
+            created.append(UtilisationBalance(
+                scope=scope, member_id=member_id, policy_id=policy_id, benefit_type_id=benefit_type_id, **sums,
+            ))
+        elif row.reserved != sums['reserved'] or row.consumed != sums['consumed']:
+            row.reserved, row.consumed, row.updated_at = sums['reserved'], sums['consumed'], now
+            updated.append(row)
+    # صفوف لا يقابلها أي قيد
+    orphans = [row.pk for row in stored.values() if row.reserved or row.consumed]
+    UtilisationBalance.objects.bulk_create(created)
+    UtilisationBalance.objects.bulk_update(updated, ['reserved', 'consumed', 'updated_at'])
+    UtilisationBalance.objects.filter(pk__in=orphans).update(reserved=ZERO, consumed=ZERO, updated_at=now)
+    return len(created) + len(updated) + len(orphans)
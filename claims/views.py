@@ -1,15 +1,23 @@
+import tempfile
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, permission_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
+from django.core.exceptions import PermissionDenied
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Count, Q
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django_fsm import TransitionNotAllowed
-from .models import Claim, ClaimComment, ClaimAttachment
+from .models import Claim, ClaimComment, ClaimAttachment, InsurerBatch
 from .forms import ClaimCreateForm, ClaimCommentForm
 from members.models import Member
 from members.utils import get_allowed_members
-from accounts.models import User
+from core import keyset
+from core.scope import get_scope
+from policies import coverage
+from providers.models import Provider
+from . import batches, remittance, transitions, utilisation
 
 # ==========================================
 # دالة مساعدة: الحماية الجوهرية (Data Isolation)
@@ -20,25 +28,12 @@ def get_allowed_claims(user):
     """
     base_qs = Claim.objects.select_related('member', 'member__client', 'currency')
 
-    # 1. السوبر أدمن يرى كل شيء
-    if user.role == User.Roles.SUPER_ADMIN:
-        return base_qs
-        
-    # 2. الوسيط يرى فقط مطالبات الشركات العميلة التابعة له
-    elif user.is_broker_role and user.related_broker:
-        return base_qs.filter(member__client__broker=user.related_broker)
-        
-    # 3. الـ HR يرى مطالبات شركته فقط
-    elif user.is_hr_role and user.related_client:
-        return base_qs.filter(member__client=user.related_client)
-        
-    # 4. العضو يرى مطالباته ومطالبات التابعين له (عائلته)
-    elif user.is_member_role and hasattr(user, 'member_profile'):
-        return base_qs.filter(
-            Q(member=user.member_profile) | Q(member__sponsor=user.member_profile)
-        )
-        
-    return Claim.objects.none()
+    # السوبر أدمن: الكل | الوسيط: شركاته | الـ HR: شركته | العضو: مطالباته ومطالبات عائلته
+    return get_scope(user).restrict(base_qs, broker='broker', client='client', member='member')
+
+
+# عدد المطالبات في كل دفعة من التمرير اللانهائي
+CLAIM_LIST_PAGE_SIZE = 50
 
 
 @login_required
@@ -62,17 +57,53 @@ def claim_list(request):
         # الـ HR لا يرى مسودات الموظف التي لم تُرسل بعد
         claims = claims.exclude(status=Claim.Status.DRAFT)
 
-    # 3. الترتيب (الأحدث أولاً)
-    claims = claims.order_by('-created_at')
-    
-    return render(request, 'claims/claim_list.html', {'claims': claims})
+    # 3. البحث والفلترة من شريط الأدوات
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        claims = claims.filter(
+            Q(claim_reference__icontains=search_query) | Q(member__full_name__icontains=search_query)
+        )
+    status_filter = request.GET.get('status_filter', '')
+
+    # 4. صفحة واحدة (الأحدث أولاً) بمؤشر على (created_at, id) بدلاً من تحميل كل المطالبات
+    page = keyset.paginate(
+        claims.filter(status=status_filter) if status_filter else claims,
+        cursor=request.GET.get('cursor'),
+        size=CLAIM_LIST_PAGE_SIZE,
+    )
+    next_query = ''
+    if page.has_next:
+        params = request.GET.copy()
+        params.pop('fragment', None)
+        params['cursor'] = page.next_cursor
+        next_query = params.urlencode()
+
+    context = {'claims': page.items, 'next_query': next_query}
+
+    # دفعة تالية من التمرير: صفوف الجدول أو بطاقات الجوال فقط
+    fragment = request.GET.get('fragment')
+    if request.htmx and fragment in ('rows', 'cards'):
+        return render(request, f'claims/partials/claim_{fragment}.html', context)
+
+    # عدادات الحالات باستعلام تجميع واحد (قبل فلتر الحالة، بعد البحث)
+    counts = dict(claims.order_by().values_list('status').annotate(total=Count('pk')))
+    context['status_facets'] = [
+        (value, label, counts[value]) for value, label in Claim.Status.choices if value in counts
+    ]
+    context['total_count'] = sum(counts.values())
+    context['status_filter'] = status_filter
+    context['can_bulk_transition'] = bool(transitions.available(user))
+
+    if request.htmx:
+        return render(request, 'claims/partials/claim_table.html', context)
+    return render(request, 'claims/claim_list.html', context)
 
 
 @login_required
 def claim_detail(request, pk):
     # الحماية التلقائية: إذا أدخل ID مطالبة لا تخصه سيظهر له 404
     claim = get_object_or_404(
-        get_allowed_claims(request.user).prefetch_related(
+        get_allowed_claims(request.user).select_related('member__policy_class', 'benefit_type').prefetch_related(
             'attachments',
             'comments__author',  
             'status_logs__user'  
@@ -99,11 +130,19 @@ def claim_detail(request, pk):
         ClaimComment.objects.filter(id__in=unread_comments).update(is_read=True)
 
     comment_form = ClaimCommentForm(user=user)
+    cover = coverage.for_class(claim.member.policy_class_id)
 
     context = {
         'claim': claim,
         'comments': comments,
         'comment_form': comment_form,
+        'coverage': cover,
+        # الرصيد المتبقي من السجل التراكمي — لا جمع للمطالبات السابقة
+        # رصيد الفترة التي تغطي تاريخ الخدمة — لا الوثيقة الحالية للعضو بعد التجديد
+        'utilisation': utilisation.for_member(
+            claim.member, claim.benefit_type_id, cover=cover,
+            policy_id=utilisation.covering_policies([claim])[claim.pk],
+        ),
     }
     return render(request, 'claims/claim_detail.html', context)
 
@@ -317,6 +356,138 @@ def mark_claim_as_paid(request, pk):
         messages.error(request, "لا يمكن تحويل هذه المطالبة للسداد في حالتها الحالية.")
     return redirect('claims:claim_detail', pk=pk)
 
+# عدد الصفوف المعروضة من كل قسم في تقرير استيراد ردود التأمين
+REMITTANCE_REPORT_ROWS = 500
+
+# عدد المطالبات المعروضة للاختيار في صفحة الإجراء الجماعي (خيار "الكل" يشمل ما بعدها)
+BULK_LIST_SIZE = 500
+
+
+@login_required
+def claim_bulk_transition(request):
+    """
+    إجراء جماعي على المطالبات: اختيار الانتقال، معاينة المطالبات المؤهلة في
+    نطاق المستخدم، ثم تنفيذه على المحدد (أو على كل المؤهلة) في معاملة واحدة
+    وعرض تقرير بالنجاح والفشل لكل مطالبة (claims/transitions.py).
+    """
+    available = transitions.available(request.user)
+    if not available:
+        raise PermissionDenied
+    data = request.POST if request.method == 'POST' else request.GET
+    name = data.get('transition')
+    if name not in available:
+        name = available[0]
+    claims = get_allowed_claims(request.user)
+    context = {
+        'transition': name,
+        'label': transitions.BULK_TRANSITIONS[name],
+        'choices': [(choice, transitions.BULK_TRANSITIONS[choice]) for choice in available],
+    }
+
+    if request.method == 'POST':
+        selected = None if request.POST.get('scope') == 'all' else request.POST.getlist('claims')
+        if selected == []:
+            messages.error(request, "لم يتم اختيار أي مطالبة.")
+        else:
+            report = transitions.apply(name, request.user, claims, selected)
+            if report.succeeded:
+                messages.success(request, f"تم تنفيذ «{report.label}» على {len(report.succeeded)} مطالبة.")
+            if report.failed:
+                messages.error(request, f"تعذّر تنفيذ الإجراء على {len(report.failed)} مطالبة — انظر التقرير.")
+            context['report'] = report
+
+    pending = transitions.eligible(name, claims).order_by('created_at', 'id')
+    context['claims'] = pending[:BULK_LIST_SIZE]
+    context['eligible_count'] = pending.count()
+    return render(request, 'claims/claim_bulk_transition.html', context)
+
+
+@login_required
+@permission_required('claims.can_process_broker', raise_exception=True)
+def insurer_batches(request):
+    """
+    دفعات الإرسال لشركات التأمين: المطالبات المرسلة للتأمين التي لم تُضمَّن
+    في ملف بعد (لكل شركة)، وإنشاء دفعة جديدة، وتحميل ملفات الدفعات السابقة.
+    """
+    claims = get_allowed_claims(request.user)
+    if request.method == 'POST':
+        provider = get_object_or_404(Provider, pk=request.POST.get('provider'))
+        batch = batches.create(provider, request.user, claims)
+        if batch:
+            messages.success(request, f"تم إنشاء الدفعة {batch.reference} ({batch.claim_count} مطالبة).")
+        else:
+            messages.info(request, "لا توجد مطالبات جديدة لهذه الشركة.")
+        return redirect('claims:insurer_batches')
+
+    context = {
+        'pending': batches.pending_by_provider(claims),
+        'batches': get_scope(request.user).restrict(
+            InsurerBatch.objects.select_related('provider', 'created_by'), broker='broker',
+        )[:50],
+    }
+    return render(request, 'claims/insurer_batches.html', context)
+
+
+@login_required
+@permission_required('claims.can_process_broker', raise_exception=True)
+def insurer_batch_download(request, pk, kind):
+    """ملف الدفعة (CSV / XLSX) أو مرفقاتها (ZIP) — يُبث صفاً بصف دون تحميل الدفعة في الذاكرة."""
+    batch = get_object_or_404(
+        get_scope(request.user).restrict(InsurerBatch.objects.select_related('provider'), broker='broker'), pk=pk,
+    )
+    if kind == 'csv':
+        response = StreamingHttpResponse(batches.csv_chunks(batch), content_type='text/csv; charset=utf-8')
+        name = batches.filename(batch, 'csv')
+    elif kind == 'xlsx':
+        # XLSX ملف zip لا يكتمل إلا في النهاية: يُكتب إلى ملف مؤقت ثم يُبث
+        file = tempfile.TemporaryFile()
+        batches.write_xlsx(batch, file)
+        file.seek(0)
+        return FileResponse(
+            file, as_attachment=True, filename=batches.filename(batch, 'xlsx'),
+            content_type=batches.XLSX_CONTENT_TYPE,
+        )
+    elif kind == 'attachments':
+        response = StreamingHttpResponse(batches.attachment_chunks(batch), content_type='application/zip')
+        name = f"{batch.reference}_attachments.zip"
+    else:
+        raise Http404
+    response['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
+
+@login_required
+def remittance_import(request):
+    """
+    استيراد ملف ردود شركة التأمين (موافقة / رفض / سداد لكل مطالبة) وتطبيقه
+    دفعة واحدة (claims/remittance.py). المعاينة تعرض الفروقات دون حفظ.
+    """
+    user = request.user
+    if not (user.has_perm('claims.can_process_insurance') or user.has_perm('claims.can_approve_payment')):
+        raise PermissionDenied
+    context = {'dry_run': True}
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        context['dry_run'] = dry_run = request.POST.get('dry_run') == 'on'
+        if not upload:
+            messages.error(request, "يرجى اختيار ملف الردود.")
+        else:
+            try:
+                report = remittance.import_file(
+                    upload, user, get_allowed_claims(user), name=upload.name, dry_run=dry_run,
+                )
+            except remittance.RemittanceError as e:
+                messages.error(request, str(e))
+            else:
+                context.update({
+                    'report': report,
+                    'changes': report.changes[:REMITTANCE_REPORT_ROWS],
+                    'failed': report.failed[:REMITTANCE_REPORT_ROWS],
+                    'report_rows': REMITTANCE_REPORT_ROWS,
+                })
+    return render(request, 'claims/remittance_import.html', context)
+
+
 @login_required
 @permission_required('claims.can_submit_claim', raise_exception=True)
 def claim_create(request):
@@ -375,18 +546,8 @@ def search_member_by_nid(request):
         return render(request, 'claims/partials/member_search_result.html', {'member': None})
         
     try:
-        # استخدام دالة العزل التي أنشأناها في تطبيق الأعضاء 
-        # نكتب الكود هنا مباشرة للاستقلالية أو نستورد الدالة لو رغبت
-        base_members = Member.objects.all()
-        if user.role == User.Roles.SUPER_ADMIN:
-            members_qs = base_members
-        elif user.is_broker_role and user.related_broker:
-            members_qs = base_members.filter(client__broker=user.related_broker)
-        elif user.is_hr_role and user.related_client:
-            members_qs = base_members.filter(client=user.related_client)
-        else:
-            members_qs = base_members.none()
-
+        # البحث للوسيط والـ HR فقط (العضو لا يبحث برقم الهوية)
+        members_qs = get_scope(user).restrict(Member.objects.all(), broker='broker', client='client')
         member = members_qs.get(national_id=q)
     except Member.DoesNotExist:
         member = None
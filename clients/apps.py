@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ClientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clients'
+
+    def ready(self):
+        import clients.signals  # noqa: F401 — broker propagation (core/tenancy.py), hierarchy index
@@ -99,7 +99,8 @@ class SponsorNumberForm(forms.ModelForm):
         if self.user:
             allowed = get_allowed_clients(self.user)
             if self.group:
-                allowed = allowed.filter(id=self.group.id) | allowed.filter(parent__id=self.group.id)
+                # كل شركات المجموعة بأي عمق (clients/hierarchy.py)
+                allowed = allowed.filter(root_id=self.group.id)
                 self.fields['owner_client'].queryset = allowed
             else:
                 self.fields['owner_client'].queryset = allowed
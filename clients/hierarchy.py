@@ -0,0 +1,140 @@
+"""
+Index of the Client holding hierarchy.
+
+Two stored forms of the ``parent`` tree, so reads never walk it level by level:
+
+    Client.root_id   the top of the client's holding group (itself for a root);
+    ClientClosure    one row per (ancestor, descendant, depth), including the
+                     client itself at depth 0.
+
+    "group root"               client.root_id                     (no query)
+    "all companies in group"   Client.objects.filter(root_id=...)
+    "a company's subtree"      subtree_ids(client_id)             (one query)
+    "all members in group"     Member.objects.filter(client__root_id=...)
+
+Client.save() sets root_id from the parent's. The receivers in
+clients/signals.py add the closure rows of a new client and, when a client
+moves, re-link its whole subtree and carry the new root down to it.
+Writes that bypass save() (queryset.update(parent=...)) are repaired with:
+
+    python manage.py rebuild_client_hierarchy
+"""
+from django.db import transaction
+
+from .models import Client, ClientClosure
+
+
+# ── Reads ───────────────────────────────────────────────────────────────────
+
+def subtree_ids(client_id):
+    """``client_id`` and every company below it, at any depth."""
+    return set(ClientClosure.objects.filter(ancestor_id=client_id).values_list('descendant_id', flat=True))
+
+
+def group_clients(client):
+    """Every company of ``client``'s holding group, the root included."""
+    return Client.objects.filter(root_id=client.root_id or client.pk)
+
+
+# ── Maintenance ─────────────────────────────────────────────────────────────
+
+def insert(client):
+    """Closure rows of a newly created client (it has no subtree yet)."""
+    rows = [ClientClosure(ancestor_id=client.pk, descendant_id=client.pk, depth=0)]
+    if client.parent_id:
+        rows += [
+            ClientClosure(ancestor_id=ancestor_id, descendant_id=client.pk, depth=depth + 1)
+            for ancestor_id, depth in ClientClosure.objects.filter(descendant_id=client.parent_id)
+            .values_list('ancestor_id', 'depth')
+        ]
+    ClientClosure.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def move(client):
+    """Re-link ``client`` and its subtree under its new parent and propagate root_id."""
+    subtree = list(ClientClosure.objects.filter(ancestor_id=client.pk).values_list('descendant_id', 'depth'))
+    if not subtree:
+        # لم يُفهرس بعد (بيانات سابقة للفهرس) — يكفي إدراجه
+        insert(client)
+        return
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    with transaction.atomic():
+        # روابط الشجرة الفرعية بأسلافها القدامى
+        ClientClosure.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        if client.parent_id:
+            ancestors = ClientClosure.objects.filter(descendant_id=client.parent_id).values_list('ancestor_id', 'depth')
+            ClientClosure.objects.bulk_create([
+                ClientClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+                for ancestor_id, up in ancestors
+                for descendant_id, down in subtree
+            ])
+        Client.objects.filter(pk__in=subtree_ids).exclude(root_id=client.root_id).update(root_id=client.root_id)
+
+
+def expected_index(parents):
+    """
+    ({client: root}, {(ancestor, descendant): depth}) computed from
+    ``parents`` ({client: parent}). A parent cycle is cut where it closes.
+    """
+    chains = {}
+
+    def chain(client_id):
+        # [client, parent, grandparent, ..., root]
+        if client_id not in chains:
+            path, seen, current = [], set(), client_id
+            while current is not None and current not in seen and current not in chains:
+                seen.add(current)
+                path.append(current)
+                current = parents.get(current)
+            tail = chains.get(current, []) if current not in seen else []
+            for i in range(len(path) - 1, -1, -1):
+                tail = [path[i], *tail]
+                chains[path[i]] = tail
+        return chains[client_id]
+
+    roots, closure = {}, {}
+    for client_id in parents:
+        ancestors = chain(client_id)
+        roots[client_id] = ancestors[-1]
+        for depth, ancestor_id in enumerate(ancestors):
+            closure[ancestor_id, client_id] = depth
+    return roots, closure
+
+
+def rebuild():
+    """
+    Recompute root_id and the closure table from ``parent`` and apply the
+    difference. Returns {'roots': n, 'closure_added': n, 'closure_removed': n}.
+    """
+    parents = dict(Client.objects.values_list('pk', 'parent_id'))
+    roots, closure = expected_index(parents)
+
+    current = {
+        (ancestor_id, descendant_id): (pk, depth)
+        for pk, ancestor_id, descendant_id, depth in ClientClosure.objects.values_list(
+            'pk', 'ancestor_id', 'descendant_id', 'depth',
+        )
+    }
+    stale = [pk for key, (pk, depth) in current.items() if closure.get(key) != depth]
+    missing = [
+        ClientClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+        for (ancestor_id, descendant_id), depth in closure.items()
+        if current.get((ancestor_id, descendant_id), (None, None))[1] != depth
+    ]
+
+    wrong_roots = {}
+    for client_id, root_id in Client.objects.values_list('pk', 'root_id'):
+        if roots[client_id] != root_id:
+            wrong_roots.setdefault(roots[client_id], []).append(client_id)
+
+    with transaction.atomic():
+        for start in range(0, len(stale), 500):
+            ClientClosure.objects.filter(pk__in=stale[start:start + 500]).delete()
+        ClientClosure.objects.bulk_create(missing, batch_size=1000)
+        for root_id, client_ids in wrong_roots.items():
+            Client.objects.filter(pk__in=client_ids).update(root_id=root_id)
+    return {
+        'roots': sum(len(ids) for ids in wrong_roots.values()),
+        'closure_added': len(missing),
+        'closure_removed': len(stale),
+    }
@@ -0,0 +1,44 @@
+"""
+Management command: rebuild_client_hierarchy
+============================================
+يعيد بناء فهرس شجرة الشركات (Client.root_id وجدول الإغلاق ClientClosure) من
+حقل parent — للإصلاح بعد تعديلات تمت خارج الـ ORM (SQL مباشر، ‎.update(parent=...)).
+
+الاستخدام:
+    python manage.py rebuild_client_hierarchy           (إصلاح)
+    python manage.py rebuild_client_hierarchy --check   (تقرير الفروقات فقط دون حفظ)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from clients import hierarchy
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Rebuild Client.root_id and the ClientClosure table from Client.parent."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                fixed = hierarchy.rebuild()
+                if options['check']:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        prefix = "would have " if options['check'] else ""
+        self.stdout.write(
+            f"roots: {prefix}fixed {fixed['roots']} client(s); closure: {prefix}added "
+            f"{fixed['closure_added']} row(s), {prefix}removed {fixed['closure_removed']} stale row(s)"
+        )
+        if options['check'] and any(fixed.values()):
+            self.stdout.write(self.style.WARNING("Client hierarchy index is out of sync."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done."))
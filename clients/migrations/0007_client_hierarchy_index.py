@@ -0,0 +1,54 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_hierarchy(apps, schema_editor):
+    Client = apps.get_model('clients', 'Client')
+    ClientClosure = apps.get_model('clients', 'ClientClosure')
+    parents = dict(Client.objects.values_list('pk', 'parent_id'))
+    rows, roots = [], {}
+    for client_id in parents:
+        # صعود السلسلة (مع قطع أي حلقة) — ترحيل لمرة واحدة
+        current, depth, seen = client_id, 0, set()
+        while current is not None and current not in seen:
+            seen.add(current)
+            rows.append(ClientClosure(ancestor_id=current, descendant_id=client_id, depth=depth))
+            roots[client_id] = current
+            current, depth = parents.get(current), depth + 1
+    ClientClosure.objects.bulk_create(rows, batch_size=1000)
+    by_root = {}
+    for client_id, root_id in roots.items():
+        by_root.setdefault(root_id, []).append(client_id)
+    for root_id, client_ids in by_root.items():
+        Client.objects.filter(pk__in=client_ids).update(root_id=root_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_sponsornumber'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='root',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='group_clients', to='clients.client', verbose_name='Holding Group Root'),
+        ),
+        migrations.CreateModel(
+            name='ClientClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='clients.client')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='clients.client')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='clientclosure_desc_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(populate_hierarchy, migrations.RunPython.noop),
+    ]
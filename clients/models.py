@@ -3,6 +3,8 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 
+from core.tracking import TrackedFieldsMixin
+
 
 def default_services_config():
     return {
@@ -11,13 +13,16 @@ def default_services_config():
         }
     }
 
-class Client(models.Model):
+class Client(TrackedFieldsMixin, models.Model):
     """
     يمثل هذا الجدول الشركات أو المؤسسات المتعاقدة (مثل SBG).
     يدعم الهيكلة الشجرية (شركة قابضة تحتها شركات تابعة)
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    
+
+    # تغيّر الوسيط يُنسخ إلى أعضاء الشركة وطلباتها، وتغيّر الأب يُعيد بناء فهرس الشجرة (clients/signals.py)
+    tracked_fields = ('broker_id', 'parent_id')
+
     # Self-referencing ForeignKey for Holding Company logic
     # إذا كان الحقل فارغاً، فهذا يعني أنها شركة قابضة أو مستقلة
     # إذا تم اختيار شركة، فهذا يعني أن هذه الشركة تابعة للشركة المختارة
@@ -29,6 +34,16 @@ class Client(models.Model):
         related_name='subsidiaries',
         verbose_name=_("Parent Company (Holding)")
     )
+    # جذر مجموعة القابضة (الشركة نفسها إن لم يكن لها أب) — يُحدَّث مع parent (clients/hierarchy.py)
+    root = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='group_clients',
+        verbose_name=_("Holding Group Root"),
+    )
     
     name_ar = models.CharField(_("Arabic Name"), max_length=255)
     name_en = models.CharField(_("English Name"), max_length=255)
@@ -83,6 +98,30 @@ class Client(models.Model):
     def is_holding(self):
         return self.subsidiaries.exists()
 
+    def clean(self):
+        # منع الحلقات: لا يكون الأب إحدى الشركات التابعة لهذه الشركة
+        if self.parent_id and self.pk and (
+            self.parent_id == self.pk
+            or ClientClosure.objects.filter(ancestor_id=self.pk, descendant_id=self.parent_id).exists()
+        ):
+            raise ValidationError({'parent': _("A company cannot be placed under one of its own subsidiaries.")})
+
+    def save(self, *args, **kwargs):
+        # الجذر من جذر الأب (استعلام واحد) — الشركات التابعة تتبعه في post_save
+        if self._state.adding or not self.root_id or self.tracked_field_changed('parent_id'):
+            self.root_id = self._parent_root_id() or self.pk
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'parent' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'root'}
+        super().save(*args, **kwargs)
+
+    def _parent_root_id(self):
+        if not self.parent_id:
+            return None
+        if Client.parent.is_cached(self) and self.parent.root_id:
+            return self.parent.root_id
+        return Client.objects.filter(pk=self.parent_id).values_list('root_id', flat=True).first() or self.parent_id
+
     def get_claim_setting(self, setting_name, default=False):
         """
         جلب إعداد محدد لقسم المطالبات من services_config.
@@ -92,15 +131,42 @@ class Client(models.Model):
         return self.services_config['claims'].get(setting_name, default)
 
 
+class ClientClosure(models.Model):
+    """
+    جدول الإغلاق لشجرة الشركات: صف لكل (سلف، تابع) بما فيها الشركة مع نفسها (depth=0).
+    "كل الشركات تحت X" و"كل أسلاف X" استعلام مفهرس واحد. يُحدَّث من clients/signals.py.
+    """
+    ancestor = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [models.Index(fields=['descendant', 'depth'], name='clientclosure_desc_idx')]
+
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
+
+
+def group_root_id(client):
+    """معرّف جذر مجموعة القابضة من root_id المخزّن — بدون استعلام للشركات المحفوظة."""
+    if client.root_id:
+        return client.root_id
+    # شركة لم تُحفظ بعد: جذرها جذر أبيها
+    return client._parent_root_id() or client.pk
+
+
 def get_group_root(client):
     """
     إرجاع جذر مجموعة القابضة (أعلى أب في سلسلة parent).
     إذا لم يكن للعميل أب، يعيد العميل نفسه.
     """
-    current = client
-    while current.parent_id:
-        current = current.parent
-    return current
+    root_id = group_root_id(client)
+    if root_id == client.pk:
+        return client
+    if Client.root.is_cached(client) and client.root is not None:
+        return client.root
+    return Client.objects.get(pk=root_id)
 
 
 class SponsorNumber(models.Model):
@@ -142,7 +208,7 @@ class SponsorNumber(models.Model):
     def clean(self):
         # الشركة المالكة يجب أن تكون ضمن نفس مجموعة القابضة
         if self.owner_client_id:
-            if get_group_root(self.owner_client) != self.group:
+            if group_root_id(self.owner_client) != self.group_id:
                 raise ValidationError(
                     _("The owner company must belong to the same holding group as the sponsor number.")
                 )
@@ -150,7 +216,7 @@ class SponsorNumber(models.Model):
     def save(self, *args, **kwargs):
         # ملء المجموعة تلقائياً من جذر الشركة المالكة (إن لم تُحدد)
         if not self.group_id and self.owner_client_id:
-            self.group = get_group_root(self.owner_client)
+            self.group_id = group_root_id(self.owner_client)
         super().save(*args, **kwargs)
 
     def __str__(self):
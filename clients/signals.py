@@ -0,0 +1,23 @@
+# clients/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core import tenancy
+from . import hierarchy
+from .models import Client
+
+
+@receiver(post_save, sender=Client)
+def client_broker_changed(sender, instance, created, **kwargs):
+    """Members, claims and requests carry the client's broker_id — keep them in step."""
+    if not created and instance.tracked_field_changed('broker_id'):
+        tenancy.propagate(instance)
+
+
+@receiver(post_save, sender=Client)
+def client_hierarchy_changed(sender, instance, created, **kwargs):
+    """Closure rows of a new client; a moved client re-links its subtree (clients/hierarchy.py)."""
+    if created:
+        hierarchy.insert(instance)
+    elif instance.tracked_field_changed('parent_id'):
+        hierarchy.move(instance)
@@ -1,3 +1,78 @@
+import io
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from . import hierarchy
+from .models import Client, ClientClosure, SponsorNumber, get_group_root
+
+
+class ClientHierarchyTest(TestCase):
+    def setUp(self):
+        self.holding = self.make('HOLD')
+        self.sub = self.make('SUB', parent=self.holding)
+        self.grandchild = self.make('GRAND', parent=self.sub)
+        self.other = self.make('OTHER')
+
+    def make(self, code, **kwargs):
+        return Client.objects.create(name_ar=code, name_en=code, commercial_record=f'CR-{code}', **kwargs)
+
+    def closure(self):
+        return set(ClientClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_root_and_closure_on_create(self):
+        self.assertEqual(
+            [c.root_id for c in (self.holding, self.sub, self.grandchild, self.other)],
+            [self.holding.pk, self.holding.pk, self.holding.pk, self.other.pk],
+        )
+        self.assertEqual(hierarchy.subtree_ids(self.sub.pk), {self.sub.pk, self.grandchild.pk})
+        self.assertEqual(
+            set(hierarchy.group_clients(self.grandchild)), {self.holding, self.sub, self.grandchild},
+        )
+        grandchild = Client.objects.get(pk=self.grandchild.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_group_root(grandchild), self.holding)
+
+    def test_moving_a_subtree_relinks_descendants(self):
+        self.sub.parent = self.other
+        self.sub.save()
+        self.grandchild.refresh_from_db()
+        self.assertEqual(self.grandchild.root_id, self.other.pk)
+        self.assertEqual(hierarchy.subtree_ids(self.holding.pk), {self.holding.pk})
+        self.assertEqual(hierarchy.subtree_ids(self.other.pk), {self.other.pk, self.sub.pk, self.grandchild.pk})
+        self.assertIn((self.other.pk, self.grandchild.pk, 2), self.closure())
+
+        self.sub.parent = None
+        self.sub.save()
+        self.grandchild.refresh_from_db()
+        self.assertEqual(self.grandchild.root_id, self.sub.pk)
+        self.assertEqual(hierarchy.rebuild(), {'roots': 0, 'closure_added': 0, 'closure_removed': 0})
+
+    def test_cycles_are_rejected(self):
+        self.holding.parent = self.grandchild
+        with self.assertRaises(ValidationError):
+            self.holding.full_clean()
+
+    def test_sponsor_number_group_is_the_owner_root(self):
+        sponsor = SponsorNumber.objects.create(owner_client=self.grandchild, sponsor_number='700')
+        self.assertEqual(sponsor.group, self.holding)
+        SponsorNumber(owner_client=self.grandchild, group=self.holding, sponsor_number='701').full_clean()
+        with self.assertRaises(ValidationError):
+            SponsorNumber(owner_client=self.other, group=self.holding, sponsor_number='702').full_clean()
+
+    def test_rebuild_command_repairs_drift(self):
+        expected = self.closure()
+        Client.objects.filter(pk=self.sub.pk).update(parent=self.other)
+        ClientClosure.objects.filter(descendant=self.other).delete()
+
+        out = io.StringIO()
+        call_command('rebuild_client_hierarchy', '--check', stdout=out)
+        self.assertIn('out of sync', out.getvalue())
+
+        call_command('rebuild_client_hierarchy', stdout=io.StringIO())
+        self.grandchild.refresh_from_db()
+        self.assertEqual(self.grandchild.root_id, self.other.pk)
+        Client.objects.filter(pk=self.sub.pk).update(parent=self.holding)
+        call_command('rebuild_client_hierarchy', stdout=io.StringIO())
+        self.assertEqual(self.closure(), expected)
@@ -1,12 +1,13 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Sum
 from .models import Client, SponsorNumber, get_group_root
 from .forms import ClientForm, SponsorNumberForm
 from policies.models import Policy
 from members.models import Member
-from accounts.models import User
+from members import stats as member_stats
+from core.scope import get_scope
 from django.core.paginator import Paginator
 from django.http import Http404
 
@@ -15,11 +16,7 @@ def get_allowed_clients(user):
     """
     تُرجع فقط العملاء الذين يحق للمستخدم رؤيتهم بناءً على دوره وشركته
     """
-    if user.role == User.Roles.SUPER_ADMIN:
-        return Client.objects.all()
-    elif user.is_broker_role and user.related_broker:
-        return Client.objects.filter(broker=user.related_broker)
-    return Client.objects.none()
+    return get_scope(user).restrict(Client.objects.all(), broker='broker')
 # -------------------------------------------------------------
 
 @login_required
@@ -133,12 +130,17 @@ def client_detail(request, pk):
     ).select_related('owner_client').order_by('sponsor_number')
 
     if client.is_holding:
-        subsidiaries = client.subsidiaries.all().annotate(
-            total_employees=Count('members', filter=Q(members__relation='PRINCIPAL')),
-            total_spouses=Count('members', filter=Q(members__relation='SPOUSE')),
-            total_children=Count('members', filter=Q(members__relation='CHILD')),
-            total_lives=Count('members')
-        )
+        # كل الشركات التابعة بأي عمق — استعلام واحد عبر جدول الإغلاق (clients/hierarchy.py)
+        subsidiaries = list(Client.objects.filter(
+            ancestor_links__ancestor=client, ancestor_links__depth__gt=0,
+        ).order_by('ancestor_links__depth', 'name_en'))
+        snapshots = member_stats.snapshots([client.pk] + [sub.pk for sub in subsidiaries])
+        for sub in subsidiaries:
+            snapshot = snapshots[sub.pk]
+            sub.total_employees = snapshot.principals
+            sub.total_spouses = snapshot.spouses
+            sub.total_children = snapshot.children
+            sub.total_lives = snapshot.total
         
         master_policy = Policy.objects.filter(client=client, master_policy__isnull=True).select_related('provider').prefetch_related(
             'classes',
@@ -147,15 +149,14 @@ def client_detail(request, pk):
             'classes__benefits__benefit_type'
         ).first()
         
-        all_members = Member.objects.filter(
-            Q(client=client) | Q(client__parent=client)
-        )
+        all_members = Member.objects.filter(client__ancestor_links__ancestor=client)
         
+        group_stats = member_stats.combined(snapshots.values())
         census = {
-            'employees': all_members.filter(relation='PRINCIPAL').count(),
-            'spouses': all_members.filter(relation='SPOUSE').count(),
-            'children': all_members.filter(relation='CHILD').count(),
-            'total': all_members.count()
+            'employees': group_stats['principals'],
+            'spouses': group_stats['spouses'],
+            'children': group_stats['children'],
+            'total': group_stats['total'],
         }
         
         class_stats = all_members.values('policy_class__name').annotate(
@@ -191,11 +192,11 @@ def client_detail(request, pk):
                 if master_class:
                     network = master_class.network
 
-        members = Member.objects.filter(client=client)
+        snapshot = member_stats.client_stats(client)
         census = {
-            'employees': members.filter(relation='PRINCIPAL').count(),
-            'dependents': members.exclude(relation='PRINCIPAL').count(),
-            'total': members.count()
+            'employees': snapshot.principals,
+            'dependents': snapshot.dependents,
+            'total': snapshot.total,
         }
 
         context = {
@@ -28,6 +28,7 @@ INSTALLED_APPS = [
     'django_filters',
 
     # Local Apps (AP PLUS)
+    'core',
     'accounts',
     'clients',
     'providers',
@@ -121,6 +122,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # 1. Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# صلاحيات الأدوار من مصفوفة مُجمّعة في الذاكرة؛ الاستثناءات الفردية من قاعدة البيانات
+AUTHENTICATION_BACKENDS = ['accounts.backends.RolePermissionBackend']
+
 # Note: FIELD_ENCRYPTION_KEY is still needed because old migrations reference encrypted_model_fields
 FIELD_ENCRYPTION_KEY = env_config('FIELD_ENCRYPTION_KEY')
 
@@ -129,6 +133,22 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 
+# 4. Background Jobs
+# 'thread' runs bulk member uploads in a background thread of the web process;
+# 'command' leaves them for: python manage.py run_upload_worker
+MEMBER_UPLOAD_WORKER = env_config('MEMBER_UPLOAD_WORKER', default='thread')
+
+# 5. Cache
+# Per-process memory by default. Multi-process deployments should point this at
+# a shared backend (e.g. django.core.cache.backends.redis.RedisCache) so that
+# invalidations (notification counters, provider facets) reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': env_config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env_config('CACHE_LOCATION', default=''),
+    }
+}
+
 
 # --- DRF CONFIGURATION (For Flutter App) ---
 REST_FRAMEWORK = {
@@ -141,4 +161,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # ‎/api/<version>/... — الإصدارات غير المدرجة تعيد 404
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ('v1',),
 }
\ No newline at end of file
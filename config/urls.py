@@ -23,6 +23,9 @@ urlpatterns = [
     path('service-requests/', include('service_requests.urls')),
     path('medications/', include('medications.urls')),
     path('notifications/', include('notifications.urls')),
+
+    # واجهة تطبيق الجوال (Flutter)
+    path('api/', include('api.urls')),
 ]
 
 
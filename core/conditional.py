@@ -0,0 +1,129 @@
+"""
+Conditional GET (ETag / 304 Not Modified) for HTMX partials and API reads.
+
+Repeat tab switches re-request partials whose content rarely changed. An
+HTMX view wrapped with ``conditional(token_func)`` first asks ``token_func``
+for a cheap version token — one aggregate or one indexed read — and answers
+304 with an empty body when the browser's ``If-None-Match`` still matches,
+skipping the queries and template rendering of the view itself:
+
+    @login_required
+    @conditional(member_tab_version('claims', 'updated_at'), templates=[...])
+    def member_tab_claims(request, pk): ...
+
+API views use etag_for() / not_modified() / tag() directly (api/views.py).
+
+Token sources:
+    * queryset_token(qs)  — count + max(updated_at) of a scoped queryset;
+    * versions(*keys)     — per-entity counters in ContentVersion, bumped with
+                            bump() from signals for rows without updated_at
+                            (providers, network membership, families);
+    * any other tuple of values that changes with the rendered content.
+
+A token of None disables the check (e.g. the object is outside the user's
+scope, so the view must run and answer 404 itself). The final ETag also
+covers the user and role (permissions change the markup), the full path,
+the HX-Request header (partial vs full page) and the template files' mtimes,
+so a deploy that changes a template never gets a stale 304.
+Responses are marked ``Cache-Control: private, no-cache`` — the browser
+keeps them but revalidates every time.
+"""
+import hashlib
+import os
+from functools import wraps
+
+from django.db.models import Count, F, Max
+from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from .models import ContentVersion
+
+
+# ── Token sources ───────────────────────────────────────────────────────────
+
+def queryset_token(queryset, field='updated_at'):
+    """(count, max(field)) of ``queryset`` in one aggregate query."""
+    row = queryset.order_by().aggregate(count=Count('pk'), latest=Max(field))
+    return row['count'], row['latest']
+
+
+def versions(*keys):
+    """The current counter of each key (0 if never bumped), in one query."""
+    found = dict(ContentVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    return tuple(found.get(key, 0) for key in keys)
+
+
+def bump(*keys):
+    """Invalidate every ETag built from ``keys`` (call inside the writing transaction)."""
+    keys = set(keys)
+    if not keys:
+        return
+    # استعلامان مهما كان عدد المفاتيح: إنشاء الناقص بصفر ثم زيادة الكل
+    # (إنشاء متزامن لنفس المفتاح يُتجاهل ولا تضيع أي زيادة)
+    ContentVersion.objects.bulk_create([ContentVersion(key=key) for key in keys], ignore_conflicts=True)
+    ContentVersion.objects.filter(key__in=keys).update(version=F('version') + 1)
+
+
+def _template_stamp(names):
+    stamps = []
+    for name in names:
+        origin = get_template(name).origin.name
+        try:
+            stamps.append(os.stat(origin).st_mtime_ns)
+        except (OSError, TypeError):
+            stamps.append(name)
+    return stamps
+
+
+# ── ETag plumbing ───────────────────────────────────────────────────────────
+
+def etag_for(request, token, templates=()):
+    """The quoted ETag of ``token`` for this request, or None when ``token`` is None."""
+    if token is None:
+        return None
+    user = request.user
+    parts = (
+        getattr(user, 'pk', None), getattr(user, 'role', None),
+        request.get_full_path(), request.headers.get('HX-Request', ''),
+        _template_stamp(templates), token,
+    )
+    return quote_etag(hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest())
+
+
+def not_modified(request, etag):
+    """A 304 response if the client's copy is current, else None."""
+    if etag is None or request.method not in ('GET', 'HEAD'):
+        return None
+    return get_conditional_response(request, etag=etag)
+
+
+def tag(response, etag):
+    """Attach ``etag`` and the revalidation headers to a 200 / 304 response."""
+    if etag is not None and response.status_code in (200, 304) and not response.has_header('ETag'):
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('HX-Request',))
+    return response
+
+
+def conditional(token_func, templates=()):
+    """
+    View decorator: skip the view with a 304 while ``token_func(request, *args,
+    **kwargs)`` is unchanged. Put it under the auth/permission decorators.
+
+    Only HTMX requests are answered conditionally: full pages also carry
+    flash messages, the CSRF token and the header widgets of base.html.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not request.headers.get('HX-Request'):
+                return view(request, *args, **kwargs)
+            etag = etag_for(request, token_func(request, *args, **kwargs), templates)
+            response = not_modified(request, etag)
+            if response is not None:
+                return tag(response, etag)
+            return tag(view(request, *args, **kwargs), etag)
+        return wrapper
+    return decorator
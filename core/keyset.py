@@ -0,0 +1,89 @@
+"""
+Keyset (cursor) pagination for long, newest-first lists.
+
+Instead of OFFSET, each page remembers the sort key of its last row and the
+next page asks for rows strictly "after" it:
+
+    WHERE created_at < :c OR (created_at = :c AND id < :id)
+    ORDER BY created_at DESC, id DESC
+    LIMIT :size + 1
+
+The cost of a page is the same on page 1 and page 4000, and rows inserted
+while the user scrolls do not shift the pages. The trailing ``id`` makes the
+key unique when timestamps collide. Back the ordering with a composite index
+on the same columns (see Claim.Meta.indexes).
+
+Cursors are opaque url-safe tokens; an invalid or tampered cursor simply
+yields the first page.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = ''
+
+    @property
+    def has_next(self):
+        return bool(self.next_cursor)
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, model, fields):
+    """Field values of ``token`` converted with the model fields, or None if invalid."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        # encode_cursor() writes strings only — anything else is tampered
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        if not all(isinstance(value, str) for value in values):
+            return None
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(fields, values)]
+    except (binascii.Error, ValueError, ValidationError):
+        return None
+
+
+def _after(fields, values, descending=True):
+    """Rows strictly after ``values`` in (fields) order."""
+    beyond = 'lt' if descending else 'gt'
+    condition = Q()
+    for position, name in enumerate(fields):
+        step = Q(**{f'{name}__{beyond}': values[position]})
+        for previous, value in zip(fields[:position], values[:position]):
+            step &= Q(**{previous: value})
+        condition |= step
+    return condition
+
+
+def paginate(queryset, cursor=None, size=50, fields=('created_at', 'id'), descending=True):
+    """
+    One page of ``queryset`` ordered by ``fields`` — newest-first (descending)
+    by default, or ascending for alphabetical lists.
+    Returns a KeysetPage whose ``next_cursor`` is empty on the last page.
+    """
+    fields = tuple(fields)
+    values = decode_cursor(cursor, queryset.model, fields)
+    if values is not None:
+        queryset = queryset.filter(_after(fields, values, descending))
+    prefix = '-' if descending else ''
+    items = list(queryset.order_by(*(f'{prefix}{name}' for name in fields))[:size + 1])
+
+    next_cursor = ''
+    if len(items) > size:
+        items = items[:size]
+        next_cursor = encode_cursor(getattr(items[-1], name) for name in fields)
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,79 @@
+"""
+Management command: bench_references
+====================================
+يقيس معدل حجز أرقام المراجع من ReferenceSequence تحت عدة عمّال متوازين.
+
+الاستخدام:
+    python manage.py bench_references
+    python manage.py bench_references --writers 8 --per-writer 500 --block-size 20
+
+يستخدم بادئة وسنة وهميتين (BNC / 9999) ويحذف العدّاد بعد الانتهاء.
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.test.utils import override_settings
+
+from core import sequences
+from core.models import ReferenceSequence
+
+BENCH_PREFIX = 'BNC'
+BENCH_YEAR = 9999
+
+
+class Command(BaseCommand):
+    help = "Benchmark reference number allocation throughput under parallel writers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--per-writer', type=int, default=250)
+        parser.add_argument('--block-size', type=int, default=1)
+
+    def handle(self, *args, **options):
+        writers = options['writers']
+        per_writer = options['per_writer']
+        block_size = options['block_size']
+
+        ReferenceSequence.objects.filter(prefix=BENCH_PREFIX, year=BENCH_YEAR).delete()
+        sequences.reset_blocks()
+
+        values = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            local = []
+            try:
+                for _ in range(per_writer):
+                    try:
+                        local.append(sequences.next_value(BENCH_PREFIX, BENCH_YEAR))
+                    except OperationalError as exc:  # e.g. SQLite "database is locked"
+                        errors.append(str(exc))
+            finally:
+                connection.close()
+            with lock:
+                values.extend(local)
+
+        with override_settings(REFERENCE_SEQUENCE_BLOCK_SIZE=block_size):
+            threads = [threading.Thread(target=worker) for _ in range(writers)]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+
+        ReferenceSequence.objects.filter(prefix=BENCH_PREFIX, year=BENCH_YEAR).delete()
+        sequences.reset_blocks()
+
+        duplicates = len(values) - len(set(values))
+        rate = len(values) / elapsed if elapsed else 0
+        self.stdout.write(
+            f"writers={writers} per_writer={per_writer} block_size={block_size} "
+            f"allocated={len(values)} elapsed={elapsed:.3f}s rate={rate:,.0f}/s "
+            f"duplicates={duplicates} errors={len(errors)}"
+        )
+        if duplicates:
+            self.stdout.write(self.style.ERROR("Duplicate values allocated!"))
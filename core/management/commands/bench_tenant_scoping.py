@@ -0,0 +1,126 @@
+"""
+Management command: bench_tenant_scoping
+========================================
+يقيس زمن أول صفحة من قائمة المطالبات لمستخدم وسيط ولمستخدم HR (p50/p95)،
+بالفلترة عبر الربط member → client → broker (القديم) مقارنةً بعمودي
+broker_id / client_id المنسوخين على المطالبة (core/tenancy.py).
+
+الاستخدام:
+    python manage.py bench_tenant_scoping
+    python manage.py bench_tenant_scoping --brokers 20 --clients 10 --claims 100000 --queries 200
+
+تُنشأ البيانات داخل معاملة ويتم التراجع عنها بالكامل بعد القياس.
+"""
+import datetime
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from brokers.models import Broker
+from claims.models import Claim, Currency
+from clients.models import Client
+from core import tenancy
+from members.models import Member
+from policies.models import Policy, PolicyClass
+from providers.models import Provider
+
+PAGE_SIZE = 50
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark claim list scoping latency (joined vs denormalized tenant keys)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--brokers', type=int, default=20)
+        parser.add_argument('--clients', type=int, default=10, help="Clients per broker.")
+        parser.add_argument('--members', type=int, default=50, help="Members per client.")
+        parser.add_argument('--claims', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self._run(rng, options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, rng, options):
+        self.stdout.write("Creating brokers, clients and members...")
+        Currency.objects.get_or_create(code='SAR', defaults={'name_ar': 'ريال', 'name_en': 'Riyal'})
+        insurer = Provider.objects.create(name_ar='مزود', name_en='Bench Insurer', license_number='BENCH-LIC')
+        brokers = Broker.objects.bulk_create(
+            Broker(name_ar=f'وسيط {i}', name_en=f'Broker {i}', commercial_record=f'BENCH-B{i}')
+            for i in range(options['brokers'])
+        )
+        clients = Client.objects.bulk_create(
+            Client(
+                name_ar=f'شركة {b}-{c}', name_en=f'Company {b}-{c}',
+                commercial_record=f'BENCH-C{b}-{c}', broker=broker,
+            )
+            for b, broker in enumerate(brokers)
+            for c in range(options['clients'])
+        )
+        today = datetime.date.today()
+        members = []
+        for c, company in enumerate(clients):
+            policy = Policy.objects.create(
+                client=company, provider=insurer, policy_number=f'BENCH-{c}',
+                start_date=today, end_date=today + datetime.timedelta(days=365),
+            )
+            policy_class = PolicyClass.objects.create(policy=policy, name='Bench')
+            for m in range(options['members']):
+                member = Member(
+                    client=company, policy_class=policy_class, full_name=f'Member {c}-{m}',
+                    national_id=f'9{c:04d}{m:05d}', birth_date=datetime.date(1990, 1, 1),
+                    gender='M', relation='PRINCIPAL', phone_number='0500000000',
+                )
+                member.sync_tenant_keys()
+                members.append(member)
+        Member.objects.bulk_create(members, batch_size=1000)
+
+        count = options['claims']
+        self.stdout.write(f"Creating {count} claims...")
+        rows = []
+        for i in range(count):
+            member = rng.choice(members)
+            claim = Claim(
+                member=member, claim_reference=f'BENCH-{i}', service_date=today, amount_original=100,
+            )
+            claim.sync_tenant_keys()
+            rows.append(claim)
+        Claim.objects.bulk_create(rows, batch_size=2000)
+        assert not any(tenancy.repair().values())
+
+        base_qs = Claim.objects.select_related('member', 'member__client', 'currency')
+        scopes = (
+            ('broker', brokers, 'member__client__broker', 'broker'),
+            ('hr', clients, 'member__client', 'client'),
+        )
+        for role, owners, joined, column in scopes:
+            picks = [rng.choice(owners) for _ in range(options['queries'])]
+            for label, lookup in (('joined', joined), ('column', column)):
+                samples = []
+                for owner in picks:
+                    started = time.perf_counter()
+                    list(base_qs.filter(**{lookup: owner}).order_by('-created_at', '-id')[:PAGE_SIZE])
+                    base_qs.filter(**{lookup: owner}).count()
+                    samples.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{role:>6} {label:>6}: p50={statistics.median(samples):.2f}ms "
+                    f"p95={_percentile(samples, 95):.2f}ms max={max(samples):.2f}ms"
+                )
@@ -0,0 +1,43 @@
+"""
+Management command: repair_tenant_keys
+======================================
+يعيد نسخ مفاتيح المستأجر (client_id / broker_id) على الأعضاء والمطالبات والطلبات
+وطلبات الأدوية من السجل الأب — للإصلاح بعد تعديلات تمت خارج الـ ORM
+(SQL مباشر، ‎.update() على member أو client).
+
+الاستخدام:
+    python manage.py repair_tenant_keys           (إصلاح)
+    python manage.py repair_tenant_keys --check   (تقرير الفروقات فقط دون حفظ)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import tenancy
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Re-copy the denormalized client/broker keys from their parent rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                fixed = tenancy.repair()
+                if options['check']:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        prefix = "would have " if options['check'] else ""
+        for label, count in fixed.items():
+            self.stdout.write(f"{label}: {prefix}corrected {count} row(s)")
+        if options['check'] and any(fixed.values()):
+            self.stdout.write(self.style.WARNING("Tenant keys are out of sync."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:25
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceSequence',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('prefix', models.CharField(max_length=10, verbose_name='Prefix')),
+                ('year', models.PositiveIntegerField(verbose_name='Year')),
+                ('last_value', models.PositiveBigIntegerField(default=0, verbose_name='Last Allocated Value')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Reference Sequence',
+                'verbose_name_plural': 'Reference Sequences',
+                'ordering': ['prefix', '-year'],
+                'unique_together': {('prefix', 'year')},
+            },
+        ),
+    ]
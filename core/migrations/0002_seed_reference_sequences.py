@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# (app_label, model, reference field, prefix)
+SEQUENCE_SOURCES = [
+    ('claims', 'Claim', 'claim_reference', 'CLM'),
+    ('service_requests', 'ServiceRequest', 'reference', 'REQ'),
+    ('medications', 'MedicationRequest', 'reference', 'MED'),
+]
+
+
+def seed_sequences(apps, schema_editor):
+    """
+    Start each (prefix, year) counter at the highest reference already issued,
+    so the first allocation after deploy continues the existing numbering.
+    """
+    ReferenceSequence = apps.get_model('core', 'ReferenceSequence')
+    for app_label, model_name, field, prefix in SEQUENCE_SOURCES:
+        Model = apps.get_model(app_label, model_name)
+        highest = {}
+        refs = Model.objects.filter(**{f'{field}__startswith': f'{prefix}-'}).values_list(field, flat=True)
+        for ref in refs.iterator():
+            try:
+                _, year, number = ref.split('-')
+                year, number = int(year), int(number)
+            except ValueError:
+                continue
+            highest[year] = max(highest.get(year, 0), number)
+        for year, last_value in highest.items():
+            ReferenceSequence.objects.update_or_create(
+                prefix=prefix, year=year, defaults={'last_value': last_value},
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('claims', '0008_assign_claim_permissions_to_groups'),
+        ('service_requests', '0006_assign_hr_process_permission'),
+        ('medications', '0003_medicationrequest_pharmacy'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
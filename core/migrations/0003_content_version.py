@@ -0,0 +1,24 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_seed_reference_sequences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Key')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Content Version',
+                'verbose_name_plural': 'Content Versions',
+            },
+        ),
+    ]
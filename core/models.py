@@ -0,0 +1,41 @@
+import uuid
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ReferenceSequence(models.Model):
+    """
+    عدّاد أرقام المراجع لكل (بادئة، سنة) — مثال: CLM / 2026.
+    يحل محل البحث عن آخر مرجع بالبادئة (prefix scan + sort) عند كل إنشاء.
+    last_value هو آخر رقم تم حجزه (وليس بالضرورة آخر رقم مستخدم عند الحجز بالكتل).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    prefix = models.CharField(_("Prefix"), max_length=10)
+    year = models.PositiveIntegerField(_("Year"))
+    last_value = models.PositiveBigIntegerField(_("Last Allocated Value"), default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Reference Sequence")
+        verbose_name_plural = _("Reference Sequences")
+        unique_together = ('prefix', 'year')
+        ordering = ['prefix', '-year']
+
+    def __str__(self):
+        return f"{self.prefix}-{self.year}: {self.last_value}"
+
+
+class ContentVersion(models.Model):
+    """
+    عدّاد إصدار لكل مفتاح محتوى (مثال: providers أو network:<id>) — يُرفع عند كل
+    تعديل ويدخل في ETag الأجزاء التي لا تملك updated_at (core/conditional.py).
+    """
+    key = models.CharField(_("Key"), max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(_("Version"), default=0)
+
+    class Meta:
+        verbose_name = _("Content Version")
+        verbose_name_plural = _("Content Versions")
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
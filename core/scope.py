@@ -0,0 +1,122 @@
+"""
+Role-based data scope of a user, resolved once per request.
+
+Every data-isolation helper (get_allowed_claims, get_allowed_members, ...)
+used to repeat the same SUPER_ADMIN / broker / HR / member branching and to
+fetch ``related_broker``, ``related_client`` and ``member_profile`` on each
+call. The branching now happens here once:
+
+    scope = get_scope(request.user)
+    scope.kind            # ALL | BROKER | HR | PARTNER | MEMBER | NONE
+    scope.broker_id / client_id / partner_id   # from the user row, no query
+    scope.member_ids      # the member and their direct dependents (1 query, lazy)
+
+and the helpers narrow their queryset with one call:
+
+    scope.restrict(Claim.objects.all(), broker='broker', client='client', member='member')
+
+The scope is cached on the user instance. ``request.user`` is loaded once per
+request, so in practice this is a per-request cache. It is recomputed if
+the role or a related_* key of that instance changes.
+"""
+from functools import cached_property
+
+from django.apps import apps
+
+
+class Scope:
+    ALL = 'all'
+    BROKER = 'broker'
+    HR = 'hr'
+    PARTNER = 'partner'
+    MEMBER = 'member'
+    NONE = 'none'
+
+    def __init__(self, kind, user=None, broker_id=None, client_id=None, partner_id=None):
+        self.kind = kind
+        self.user = user
+        self.broker_id = broker_id
+        self.client_id = client_id
+        self.partner_id = partner_id
+
+    def __repr__(self):
+        return f"<Scope {self.kind}>"
+
+    @cached_property
+    def member_id(self):
+        """The member profile of a MEMBER user, or None."""
+        if self.kind != self.MEMBER:
+            return None
+        Member = apps.get_model('members', 'Member')
+        return Member.objects.filter(user=self.user).values_list('pk', flat=True).first()
+
+    @cached_property
+    def member_ids(self):
+        """The member and their direct dependents (the family a member user sees)."""
+        if self.member_id is None:
+            return []
+        Member = apps.get_model('members', 'Member')
+        return [self.member_id, *Member.objects.filter(sponsor_id=self.member_id).values_list('pk', flat=True)]
+
+    @cached_property
+    def client_parent_id(self):
+        if self.client_id is None:
+            return None
+        Client = apps.get_model('clients', 'Client')
+        return Client.objects.filter(pk=self.client_id).values_list('parent_id', flat=True).first()
+
+    def restrict(self, queryset, *, broker=None, client=None, partner=None, member=None):
+        """
+        ``queryset`` narrowed to this scope. Each keyword is the lookup from the
+        queryset's model to the broker / client / partner / member it belongs to;
+        a role without a lookup sees nothing.
+        """
+        if self.kind == self.ALL:
+            return queryset
+        if self.kind == self.MEMBER:
+            if member is None:
+                return queryset.none()
+            return queryset.filter(**{f'{member}__in': self.member_ids})
+        lookup, value = {
+            self.BROKER: (broker, self.broker_id),
+            self.HR: (client, self.client_id),
+            self.PARTNER: (partner, self.partner_id),
+        }.get(self.kind, (None, None))
+        if lookup is None:
+            return queryset.none()
+        return queryset.filter(**{lookup: value})
+
+
+def _cache_key(user):
+    return (
+        user.pk, user.role, user.related_broker_id, user.related_client_id, user.related_partner_id,
+    )
+
+
+def resolve(user):
+    """Build the scope of ``user`` from the user row alone (no queries)."""
+    if not getattr(user, 'is_authenticated', False):
+        return Scope(Scope.NONE)
+    if user.role == user.Roles.SUPER_ADMIN:
+        return Scope(Scope.ALL, user)
+    if user.is_broker_role and user.related_broker_id:
+        return Scope(Scope.BROKER, user, broker_id=user.related_broker_id)
+    if user.is_hr_role and user.related_client_id:
+        return Scope(Scope.HR, user, client_id=user.related_client_id)
+    if user.is_partner_role and user.related_partner_id:
+        return Scope(Scope.PARTNER, user, partner_id=user.related_partner_id)
+    if user.is_member_role:
+        return Scope(Scope.MEMBER, user)
+    return Scope(Scope.NONE, user)
+
+
+def get_scope(user):
+    """The cached scope of ``user`` (see the module docstring)."""
+    if not getattr(user, 'is_authenticated', False):
+        return Scope(Scope.NONE)
+    key = _cache_key(user)
+    cached = getattr(user, '_role_scope', None)
+    if cached is None or cached[0] != key:
+        cached = (key, resolve(user))
+        user._role_scope = cached
+    return cached[1]
@@ -0,0 +1,112 @@
+"""
+Reference number allocator (CLM-2026-00001, REQ-2026-00001, MED-2026-00001).
+
+Each (prefix, year) pair owns one ReferenceSequence row. Allocation is a single
+atomic ``UPDATE ... SET last_value = last_value + n`` on that row, so concurrent
+creates only contend on one small row instead of scanning and locking the
+business table.
+
+Block pre-allocation (opt-in):
+    REFERENCE_SEQUENCE_BLOCK_SIZE = 20   # in settings.py
+
+With a block size > 1 every worker process reserves numbers in batches and
+hands them out from memory. This trades strict ordering and gap-freeness
+(a worker that exits loses the rest of its block) for fewer DB round-trips.
+The default (1) keeps references gap-free: a rolled-back insert also rolls
+back its counter increment.
+"""
+import datetime
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ReferenceSequence
+
+DEFAULT_WIDTH = 5
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def _block_size():
+    return max(1, int(getattr(settings, 'REFERENCE_SEQUENCE_BLOCK_SIZE', 1)))
+
+
+def reserve(prefix, year, count=1):
+    """
+    Atomically reserve ``count`` consecutive values for (prefix, year).
+    Returns the (first, last) values of the reserved range, inclusive.
+    """
+    with transaction.atomic():
+        updated = (
+            ReferenceSequence.objects
+            .filter(prefix=prefix, year=year)
+            .update(last_value=F('last_value') + count)
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    ReferenceSequence.objects.create(prefix=prefix, year=year, last_value=count)
+            except IntegrityError:
+                # سباق على إنشاء الصف — أنشأه عامل آخر للتو
+                ReferenceSequence.objects.filter(prefix=prefix, year=year).update(
+                    last_value=F('last_value') + count
+                )
+        last = (
+            ReferenceSequence.objects
+            .filter(prefix=prefix, year=year)
+            .values_list('last_value', flat=True)
+            .get()
+        )
+    return last - count + 1, last
+
+
+def _publish_block(key, start, stop):
+    with _blocks_lock:
+        _blocks[key] = iter(range(start, stop + 1))
+
+
+def _take_from_block(prefix, year, block_size):
+    key = (prefix, year)
+    with _blocks_lock:
+        block = _blocks.get(key)
+        value = next(block, None) if block is not None else None
+        if value is not None:
+            return value
+
+    first, last = reserve(prefix, year, block_size)
+    if last > first:
+        # الكتلة لا تُنشر للاستخدام إلا بعد تثبيت الزيادة في قاعدة البيانات،
+        # وإلا فقد تُعاد نفس الأرقام لو تم التراجع عن المعاملة.
+        transaction.on_commit(lambda: _publish_block(key, first + 1, last))
+    return first
+
+
+def next_value(prefix, year=None):
+    """Return the next integer for (prefix, year)."""
+    year = year or datetime.date.today().year
+    block_size = _block_size()
+    if block_size == 1:
+        return reserve(prefix, year)[0]
+    return _take_from_block(prefix, year, block_size)
+
+
+def format_reference(prefix, year, value, width=DEFAULT_WIDTH):
+    return f"{prefix}-{year}-{value:0{width}d}"
+
+
+def next_reference(prefix, year=None, width=DEFAULT_WIDTH):
+    """
+    Return the next formatted reference, e.g. ``next_reference('CLM')`` →
+    ``'CLM-2026-00042'``.
+    """
+    year = year or datetime.date.today().year
+    return format_reference(prefix, year, next_value(prefix, year), width)
+
+
+def reset_blocks():
+    """Drop in-memory blocks (tests / after changing the block size)."""
+    with _blocks_lock:
+        _blocks.clear()
@@ -0,0 +1,145 @@
+"""
+Denormalized tenant keys for row-level scoping.
+
+Member, ServiceRequest, Claim and MedicationRequest carry their own indexed
+``client_id`` / ``broker_id`` columns, copied from the row they hang off:
+
+    Client ── Member ──┬── Claim
+                       └── ServiceRequest ── MedicationRequest
+
+so the data-isolation helpers (get_allowed_claims & co.) filter on one local
+column instead of joining member → client → broker on every request.
+
+Consistency:
+    * TenantKeysMixin.save() copies the keys from ``tenant_parent`` when the
+      row is created or re-parented, and pushes changed keys down to the
+      descendants with one UPDATE per descendant model;
+    * a broker change on Client is pushed down by clients/signals.py;
+    * bulk_create callers call ``sync_tenant_keys()`` themselves;
+    * anything else (raw SQL, queryset.update() on the parent FK) is caught by
+          python manage.py repair_tenant_keys [--check]
+"""
+from django.apps import apps
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .tracking import TrackedFieldsMixin
+
+# parent model -> [(descendant model, lookup from the descendant to the parent)]
+DESCENDANTS = {
+    'clients.Client': (
+        ('members.Member', 'client'),
+        ('claims.Claim', 'client'),
+        ('service_requests.ServiceRequest', 'client'),
+        ('medications.MedicationRequest', 'client'),
+    ),
+    'members.Member': (
+        ('claims.Claim', 'member'),
+        ('service_requests.ServiceRequest', 'member'),
+        ('medications.MedicationRequest', 'service_request__member'),
+    ),
+    'service_requests.ServiceRequest': (
+        ('medications.MedicationRequest', 'service_request'),
+    ),
+}
+
+# model -> parent FK the keys are copied from, in repair order (parents first)
+TENANT_MODELS = (
+    ('members.Member', 'client'),
+    ('claims.Claim', 'member'),
+    ('service_requests.ServiceRequest', 'member'),
+    ('medications.MedicationRequest', 'service_request'),
+)
+
+
+def tenant_keys(instance):
+    """The keys descendants of ``instance`` must carry."""
+    if instance._meta.label == 'clients.Client':
+        return {'broker_id': instance.broker_id}
+    return {'client_id': instance.client_id, 'broker_id': instance.broker_id}
+
+
+def propagate(instance):
+    """Push the keys of ``instance`` down to every descendant row."""
+    keys = tenant_keys(instance)
+    for label, lookup in DESCENDANTS.get(instance._meta.label, ()):
+        apps.get_model(label).objects.filter(**{lookup: instance.pk}).update(**keys)
+
+
+class TenantKeysMixin(TrackedFieldsMixin):
+    """
+    For models with denormalized ``client``/``broker`` columns. ``tracked_fields``
+    must include the parent FK attname, 'client_id' and 'broker_id'.
+    """
+    tenant_parent = ''
+
+    def sync_tenant_keys(self):
+        """Copy the keys from the parent row. Returns the names of the fields that changed."""
+        parent = getattr(self, self.tenant_parent)
+        if self.tenant_parent == 'client':
+            keys = {'broker_id': parent.broker_id}
+        else:
+            keys = {'client_id': parent.client_id, 'broker_id': parent.broker_id}
+        changed = [name for name, value in keys.items() if getattr(self, name) != value]
+        for name in changed:
+            setattr(self, name, keys[name])
+        return [name.removesuffix('_id') for name in changed]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding or self.tracked_field_changed(f'{self.tenant_parent}_id'):
+            changed = self.sync_tenant_keys()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and changed:
+                kwargs['update_fields'] = set(update_fields) | set(changed)
+        keys_changed = not adding and self.tracked_field_changed('client_id', 'broker_id')
+        super().save(*args, **kwargs)
+        if keys_changed:
+            propagate(self)
+
+
+# ── Repair ──────────────────────────────────────────────────────────────────
+
+REPAIR_CHUNK = 500
+
+
+def _source(lookup):
+    """Source expressions for (client_id, broker_id) through the parent FK."""
+    if lookup == 'client':
+        return F('client_id'), F('client__broker_id')
+    return F(f'{lookup}__client_id'), F(f'{lookup}__broker_id')
+
+
+def _differs(field):
+    source = f'_src_{field}'
+    return (
+        Q(**{f'{field}__isnull': True, f'{source}__isnull': False})
+        | Q(**{f'{field}__isnull': False, f'{source}__isnull': True})
+        | (Q(**{f'{field}__isnull': False, f'{source}__isnull': False}) & ~Q(**{field: F(source)}))
+    )
+
+
+def drifted(label, lookup):
+    """Rows of ``label`` whose keys no longer match their parent."""
+    model = apps.get_model(label)
+    src_client, src_broker = _source(lookup)
+    return model.objects.annotate(_src_client_id=src_client, _src_broker_id=src_broker).filter(
+        _differs('client_id') | _differs('broker_id')
+    )
+
+
+def repair():
+    """Re-copy drifted keys, parents first. Returns {model label: rows fixed}."""
+    fixed = {}
+    for label, lookup in TENANT_MODELS:
+        model = apps.get_model(label)
+        parent = model._meta.get_field(lookup).related_model
+        parent_row = parent.objects.filter(pk=OuterRef(f'{lookup}_id'))
+        keys = {'broker_id': Subquery(parent_row.values('broker_id')[:1])}
+        if lookup != 'client':
+            keys['client_id'] = Subquery(parent_row.values('client_id')[:1])
+        pks = list(drifted(label, lookup).values_list('pk', flat=True))
+        fixed[label] = sum(
+            model.objects.filter(pk__in=pks[start:start + REPAIR_CHUNK]).update(**keys)
+            for start in range(0, len(pks), REPAIR_CHUNK)
+        )
+    return fixed
@@ -0,0 +1,294 @@
+import datetime
+
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from brokers.models import Broker
+from claims.models import Claim, Currency
+from claims.views import get_allowed_claims
+from clients.models import Client
+from medications.models import MedicationRequest
+from members.models import Member
+from networks.models import ServiceProvider
+from policies.models import Policy, PolicyClass
+from providers.models import Provider
+from service_requests.models import RequestType, ServiceRequest
+
+from . import conditional, sequences, tenancy
+from .scope import Scope, get_scope
+from .models import ReferenceSequence
+
+
+class ReferenceSequenceTest(TestCase):
+    def tearDown(self):
+        sequences.reset_blocks()
+
+    def test_first_reference_starts_at_one(self):
+        self.assertEqual(sequences.next_reference('CLM', year=2026), 'CLM-2026-00001')
+        self.assertEqual(sequences.next_reference('CLM', year=2026), 'CLM-2026-00002')
+
+    def test_counters_are_independent_per_prefix_and_year(self):
+        sequences.next_reference('CLM', year=2026)
+        self.assertEqual(sequences.next_reference('REQ', year=2026), 'REQ-2026-00001')
+        self.assertEqual(sequences.next_reference('CLM', year=2027), 'CLM-2027-00001')
+
+    def test_continues_from_seeded_value(self):
+        ReferenceSequence.objects.create(prefix='MED', year=2026, last_value=41)
+        self.assertEqual(sequences.next_reference('MED', year=2026), 'MED-2026-00042')
+
+    def test_reserve_returns_inclusive_range(self):
+        self.assertEqual(sequences.reserve('CLM', 2026, 10), (1, 10))
+        self.assertEqual(sequences.reserve('CLM', 2026, 5), (11, 15))
+
+    @override_settings(REFERENCE_SEQUENCE_BLOCK_SIZE=5)
+    def test_block_allocation_hands_out_reserved_values(self):
+        values = []
+        for _ in range(7):
+            # الكتلة تُنشر بعد تثبيت المعاملة فقط
+            with self.captureOnCommitCallbacks(execute=True):
+                values.append(sequences.next_value('CLM', 2026))
+        self.assertEqual(values, [1, 2, 3, 4, 5, 6, 7])
+        # كتلتان محجوزتان بالكامل في قاعدة البيانات
+        self.assertEqual(ReferenceSequence.objects.get(prefix='CLM', year=2026).last_value, 10)
+
+
+class TrackedFieldsMixinTest(TestCase):
+    """Exercised through ServiceProvider (tracked_fields = name_ar, name_en, city)."""
+
+    def setUp(self):
+        self.provider = ServiceProvider.objects.create(name_ar='مستشفى', type='HOSPITAL', city='الرياض')
+
+    def test_unsaved_instance_counts_as_changed(self):
+        provider = ServiceProvider(name_ar='جديد', type='HOSPITAL')
+        self.assertTrue(provider.tracked_field_changed('city'))
+        self.assertIsNone(provider.loaded_value('city'))
+
+    def test_loaded_instance_detects_changes_without_queries(self):
+        provider = ServiceProvider.objects.get(pk=self.provider.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(provider.tracked_field_changed('city'))
+            provider.city = 'جدة'
+            self.assertTrue(provider.tracked_field_changed('city'))
+            self.assertEqual(provider.loaded_value('city'), 'الرياض')
+
+    def test_save_resnapshots_after_post_save(self):
+        seen = []
+
+        def receiver(sender, instance, **kwargs):
+            seen.append((instance.loaded_value('city'), instance.city))
+
+        post_save.connect(receiver, sender=ServiceProvider)
+        self.addCleanup(post_save.disconnect, receiver, sender=ServiceProvider)
+
+        self.provider.city = 'جدة'
+        self.provider.save()
+        # المستقبل يرى القيمة القديمة، وبعد الحفظ تصبح الجديدة هي المرجع
+        self.assertEqual(seen, [('الرياض', 'جدة')])
+        self.assertFalse(self.provider.tracked_field_changed('city'))
+
+    def test_refresh_from_db_resnapshots_refreshed_fields(self):
+        ServiceProvider.objects.filter(pk=self.provider.pk).update(city='الدمام')
+        self.provider.refresh_from_db(fields=['city'])
+        self.assertEqual(self.provider.loaded_value('city'), 'الدمام')
+        self.assertFalse(self.provider.tracked_field_changed('city'))
+
+
+class TenantKeysTest(TestCase):
+    def setUp(self):
+        Currency.objects.create(code='SAR', name_ar='ريال', name_en='Riyal')
+        self.broker = Broker.objects.create(name_ar='وسيط', name_en='Broker', commercial_record='BR-1')
+        self.other_broker = Broker.objects.create(name_ar='وسيط 2', name_en='Broker 2', commercial_record='BR-2')
+        self.company = Client.objects.create(
+            name_ar='شركة', name_en='Company', commercial_record='CR-1', broker=self.broker,
+        )
+        self.other_company = Client.objects.create(
+            name_ar='شركة 2', name_en='Company 2', commercial_record='CR-2', broker=self.other_broker,
+        )
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        policy = Policy.objects.create(
+            client=self.company, provider=provider, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        self.member = Member.objects.create(
+            client=self.company, policy_class=PolicyClass.objects.create(policy=policy, name='VIP'),
+            full_name='Member', national_id='1000000001', birth_date=datetime.date(1990, 1, 1),
+            gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        self.claim = Claim.objects.create(
+            member=self.member, service_date=datetime.date(2026, 3, 1), amount_original=100,
+        )
+        user = User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN)
+        self.request = ServiceRequest.objects.create(
+            request_type=RequestType.objects.create(name_ar='أدوية', integration='medication'),
+            member=self.member, submitted_by=user,
+        )
+        self.medication = MedicationRequest.objects.create(
+            service_request=self.request, prescription_date=datetime.date(2026, 3, 1),
+            interval_months=1, total_duration_months=6, created_by=user,
+        )
+
+    def keys(self, model, pk):
+        return tuple(model.objects.filter(pk=pk).values_list('client_id', 'broker_id').get())
+
+    def assertKeys(self, client, broker):
+        self.assertEqual(self.keys(Member, self.member.pk), (client.pk, broker.pk))
+        for model, pk in ((Claim, self.claim.pk), (ServiceRequest, self.request.pk),
+                          (MedicationRequest, self.medication.pk)):
+            self.assertEqual(self.keys(model, pk), (client.pk, broker.pk), model.__name__)
+
+    def test_keys_copied_on_create(self):
+        self.assertKeys(self.company, self.broker)
+
+    def test_client_broker_change_propagates(self):
+        self.company.broker = self.other_broker
+        self.company.save()
+        self.assertKeys(self.company, self.other_broker)
+
+    def test_moving_member_propagates_to_descendants(self):
+        self.member.client = self.other_company
+        self.member.save(update_fields=['client'])
+        self.assertKeys(self.other_company, self.other_broker)
+
+    def test_repair_fixes_drift_from_queryset_updates(self):
+        Member.objects.filter(pk=self.member.pk).update(client=self.other_company)  # لا يمر بـ save()
+        self.assertEqual(tenancy.drifted('members.Member', 'client').count(), 1)
+        fixed = tenancy.repair()
+        self.assertEqual(fixed, {
+            'members.Member': 1, 'claims.Claim': 1,
+            'service_requests.ServiceRequest': 1, 'medications.MedicationRequest': 1,
+        })
+        self.assertKeys(self.other_company, self.other_broker)
+        self.assertFalse(any(tenancy.repair().values()))
+
+    def test_broker_scope_is_a_single_column_filter(self):
+        user = User.objects.create_user(
+            username='broker', password='p', role=User.Roles.BROKER_ADMIN, related_broker=self.broker,
+        )
+        sql = str(get_allowed_claims(user).query)
+        self.assertNotIn('"clients_client"."broker_id" =', sql)
+        self.assertEqual(list(get_allowed_claims(user)), [self.claim])
+
+
+class ScopeTest(TestCase):
+    def setUp(self):
+        self.broker = Broker.objects.create(name_ar='وسيط', name_en='Broker', commercial_record='BR-1')
+        self.holding = Client.objects.create(
+            name_ar='قابضة', name_en='Holding', commercial_record='CR-1', broker=self.broker,
+        )
+        self.subsidiary = Client.objects.create(
+            name_ar='فرعية', name_en='Sub', commercial_record='CR-2', broker=self.broker, parent=self.holding,
+        )
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        policy = Policy.objects.create(
+            client=self.holding, provider=provider, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        policy_class = PolicyClass.objects.create(policy=policy, name='VIP')
+        self.member_user = User.objects.create_user(username='member', password='p', role=User.Roles.MEMBER)
+
+        def member(national_id, **kwargs):
+            return Member.objects.create(
+                client=self.holding, policy_class=policy_class, full_name=national_id, national_id=national_id,
+                birth_date=datetime.date(1990, 1, 1), gender='M', phone_number='0500000000', **kwargs,
+            )
+
+        self.principal = member('1000000001', relation='PRINCIPAL', user=self.member_user)
+        self.child = member('1000000002', relation='CHILD', sponsor=self.principal)
+        self.stranger = member('1000000003', relation='PRINCIPAL')
+
+    def test_broker_and_hr_scopes_resolve_without_queries(self):
+        broker_user = User.objects.create_user(
+            username='broker', password='p', role=User.Roles.BROKER_STAFF, related_broker=self.broker,
+        )
+        hr_user = User.objects.create_user(
+            username='hr', password='p', role=User.Roles.HR_ADMIN, related_client=self.holding,
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(get_scope(broker_user).kind, Scope.BROKER)
+            self.assertEqual(get_scope(broker_user).broker_id, self.broker.pk)
+            self.assertEqual(get_scope(hr_user).client_id, self.holding.pk)
+
+    def test_member_family_is_resolved_once_per_user(self):
+        user = User.objects.get(pk=self.member_user.pk)
+        with self.assertNumQueries(2):
+            self.assertEqual(set(get_scope(user).member_ids), {self.principal.pk, self.child.pk})
+        with self.assertNumQueries(1):  # استعلام القائمة فقط
+            members = list(get_scope(user).restrict(Member.objects.all(), member='pk'))
+        self.assertEqual(set(members), {self.principal, self.child})
+
+    def test_scope_recomputed_when_role_changes(self):
+        user = User.objects.create_user(username='x', password='p', role=User.Roles.MEMBER)
+        self.assertEqual(get_scope(user).kind, Scope.MEMBER)
+        user.role = User.Roles.HR_STAFF
+        user.related_client = self.subsidiary
+        self.assertEqual(get_scope(user).kind, Scope.HR)
+        self.assertEqual(get_scope(user).client_parent_id, self.holding.pk)
+
+    def test_role_without_lookup_sees_nothing(self):
+        self.assertFalse(get_scope(self.member_user).restrict(Member.objects.all(), broker='broker').exists())
+        lonely_hr = User.objects.create_user(username='hr', password='p', role=User.Roles.HR_ADMIN)
+        self.assertEqual(get_scope(lonely_hr).kind, Scope.NONE)
+
+
+class ConditionalResponseTest(TestCase):
+    """Exercised through the HTMX tabs of the member detail page."""
+
+    def setUp(self):
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1')
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        policy = Policy.objects.create(
+            client=company, provider=provider, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        policy_class = PolicyClass.objects.create(policy=policy, name='VIP')
+
+        def member(national_id, **kwargs):
+            return Member.objects.create(
+                client=company, policy_class=policy_class, full_name=national_id, national_id=national_id,
+                birth_date=datetime.date(1990, 1, 1), gender='M', phone_number='0500000000', **kwargs,
+            )
+
+        self.principal = member('1000000001', relation='PRINCIPAL')
+        self.make_member = member
+        Currency.objects.create(code='SAR', name_ar='ريال', name_en='Riyal')
+        self.claim = Claim.objects.create(
+            member=self.principal, service_date=datetime.date(2026, 3, 1), amount_original=100,
+        )
+        self.client.force_login(User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN))
+
+    def get(self, name, etag=None):
+        headers = {'HTTP_HX_REQUEST': 'true'}
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get(reverse(f'members:{name}', kwargs={'pk': self.principal.pk}), **headers)
+
+    def test_repeat_request_is_not_modified(self):
+        response = self.get('member_tab_claims')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        repeat = self.get('member_tab_claims', response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+
+    def test_change_invalidates_etag(self):
+        etag = self.get('member_tab_claims')['ETag']
+        self.claim.save()
+        self.assertEqual(self.get('member_tab_claims', etag).status_code, 200)
+
+    def test_new_dependent_bumps_family_version(self):
+        etag = self.get('member_tab_dependents')['ETag']
+        self.make_member('1000000002', relation='CHILD', sponsor=self.principal)
+        self.assertEqual(conditional.versions(f'family:{self.principal.pk}'), (1,))
+        self.assertEqual(self.get('member_tab_dependents', etag).status_code, 200)
+
+    def test_full_page_requests_are_not_conditional(self):
+        url = reverse('members:member_tab_claims', kwargs={'pk': self.principal.pk})
+        self.assertFalse(self.client.get(url).has_header('ETag'))
+
+    def test_bump_and_versions(self):
+        self.assertEqual(conditional.versions('a', 'b'), (0, 0))
+        conditional.bump('a')
+        conditional.bump('a', 'b')
+        self.assertEqual(conditional.versions('a', 'b'), (2, 1))
@@ -0,0 +1,63 @@
+"""
+Tracked-field change detection without extra queries.
+
+Models list the attributes they care about in ``tracked_fields`` (use the
+attname for foreign keys, e.g. ``'network_id'``). The values are captured
+when the instance is loaded from the database and again after every save, so
+a post_save receiver can ask "did status change?" without re-reading the row:
+
+    class Claim(TrackedFieldsMixin, models.Model):
+        tracked_fields = ('status',)
+
+    @receiver(post_save, sender=Claim)
+    def on_save(sender, instance, created, **kwargs):
+        if instance.tracked_field_changed('status'):
+            old = instance.loaded_value('status')
+
+Deferred fields are simply not tracked until they are loaded.
+"""
+
+
+class TrackedFieldsMixin:
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_tracked_fields()
+        return instance
+
+    def snapshot_tracked_fields(self, fields=None):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or fields is None:
+            loaded = self._loaded_values = {}
+        for name in self.tracked_fields if fields is None else fields:
+            if name in self.__dict__:
+                loaded[name] = self.__dict__[name]
+
+    def loaded_value(self, field, default=None):
+        """Value of ``field`` as last loaded/saved, or ``default`` if unknown."""
+        return getattr(self, '_loaded_values', {}).get(field, default)
+
+    def tracked_field_changed(self, *fields):
+        """True if any of ``fields`` differs from its loaded value (or was never loaded)."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return True
+        return any(name not in loaded or loaded[name] != self.__dict__.get(name) for name in fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # بعد تنفيذ مستقبلات post_save — لتبقى القيم القديمة متاحة لها
+        self.snapshot_tracked_fields()
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None:
+            self.snapshot_tracked_fields()
+        else:
+            refreshed = set(fields)
+            self.snapshot_tracked_fields([
+                name for name in self.tracked_fields
+                if name in refreshed or name.removesuffix('_id') in refreshed
+            ])
@@ -0,0 +1,128 @@
+"""
+Prescription expiry and refill alerts for the medications dashboard.
+
+The side panels of medication_dashboard ("prescriptions expiring within 30
+days", "refills due within 7 days") are read from MedicationAlert, a small
+precomputed table, with one indexed range scan each. Computing the table is
+a range scan as well: prescription_expiry_date is a stored, indexed column
+(maintained by MedicationRequest.save()) and refills are filtered on
+scheduled_date.
+
+Alerts are stored HORIZON_SLACK_DAYS beyond the panel windows so a late
+scheduled run does not empty the panels. They are kept current by:
+    * the scheduled full rebuild (daily):
+          python manage.py refresh_medication_alerts
+    * medications/signals.py — the alerts of one request are recomputed when
+      the request or one of its refills is saved or deleted;
+    * callers that bulk_create refills call refresh_for() themselves.
+
+Stored expiry dates that drifted (queryset.update() on prescription_date) are
+repaired with:
+    python manage.py backfill_prescription_expiry
+"""
+import datetime
+
+from django.db import transaction
+
+from .models import MedicationAlert, MedicationRefill, MedicationRequest
+
+EXPIRY_WINDOW_DAYS = 30
+REFILL_WINDOW_DAYS = 7
+HORIZON_SLACK_DAYS = 2
+BACKFILL_CHUNK = 500
+
+ALERT_REFILL_STATUSES = [MedicationRefill.RefillStatus.PENDING, MedicationRefill.RefillStatus.APPROVED]
+
+
+# ── Range queries ───────────────────────────────────────────────────────────
+
+def expiring_requests(days, today=None):
+    """ACTIVE requests whose prescription expires within ``days`` days (index range scan)."""
+    today = today or datetime.date.today()
+    return MedicationRequest.objects.filter(
+        status=MedicationRequest.Status.ACTIVE,
+        prescription_expiry_date__range=(today, today + datetime.timedelta(days=days)),
+    )
+
+
+def due_refills(days, today=None):
+    """Pending/approved refills of ACTIVE requests scheduled within ``days`` days."""
+    today = today or datetime.date.today()
+    return MedicationRefill.objects.filter(
+        status__in=ALERT_REFILL_STATUSES,
+        scheduled_date__range=(today, today + datetime.timedelta(days=days)),
+        medication_request__status=MedicationRequest.Status.ACTIVE,
+    )
+
+
+# ── Alert table ─────────────────────────────────────────────────────────────
+
+def compute(medication_request_ids=None, today=None):
+    """Unsaved MedicationAlert rows, for every request or only ``medication_request_ids``."""
+    expiring = expiring_requests(EXPIRY_WINDOW_DAYS + HORIZON_SLACK_DAYS, today)
+    refills = due_refills(REFILL_WINDOW_DAYS + HORIZON_SLACK_DAYS, today)
+    if medication_request_ids is not None:
+        expiring = expiring.filter(pk__in=medication_request_ids)
+        refills = refills.filter(medication_request_id__in=medication_request_ids)
+
+    alerts = [
+        MedicationAlert(
+            kind=MedicationAlert.Kind.PRESCRIPTION_EXPIRY,
+            medication_request_id=pk,
+            due_date=expiry,
+        )
+        for pk, expiry in expiring.values_list('pk', 'prescription_expiry_date')
+    ]
+    alerts.extend(
+        MedicationAlert(
+            kind=MedicationAlert.Kind.REFILL_DUE,
+            medication_request_id=medication_request_id,
+            refill_id=pk,
+            due_date=scheduled_date,
+        )
+        for pk, medication_request_id, scheduled_date in refills.values_list(
+            'pk', 'medication_request_id', 'scheduled_date'
+        )
+    )
+    return alerts
+
+
+def rebuild(today=None):
+    """Replace the whole alert table. Returns the number of alerts."""
+    alerts = compute(today=today)
+    with transaction.atomic():
+        MedicationAlert.objects.all().delete()
+        MedicationAlert.objects.bulk_create(alerts)
+    return len(alerts)
+
+
+def refresh_for(medication_request_ids, today=None):
+    """Recompute the alerts of some requests only."""
+    medication_request_ids = list(medication_request_ids)
+    alerts = compute(medication_request_ids, today)
+    with transaction.atomic():
+        MedicationAlert.objects.filter(medication_request_id__in=medication_request_ids).delete()
+        MedicationAlert.objects.bulk_create(alerts)
+
+
+def panel(kind, days, today=None):
+    """Alerts of ``kind`` due within ``days`` days — what the dashboard shows."""
+    today = today or datetime.date.today()
+    return (
+        MedicationAlert.objects
+        .filter(kind=kind, due_date__range=(today, today + datetime.timedelta(days=days)))
+        .select_related('medication_request', 'refill')
+        .order_by('due_date')
+    )
+
+
+# ── Expiry column repair ────────────────────────────────────────────────────
+
+def backfill_expiry_dates():
+    """Recompute stored prescription_expiry_date values. Returns the number of rows fixed."""
+    rows = MedicationRequest.objects.only(
+        'prescription_date', 'prescription_validity_months', 'prescription_expiry_date',
+    ).order_by('pk')
+    changed = [row for row in rows.iterator(chunk_size=BACKFILL_CHUNK) if row.sync_expiry_date()]
+    MedicationRequest.objects.bulk_update(changed, ['prescription_expiry_date'], batch_size=BACKFILL_CHUNK)
+    return len(changed)
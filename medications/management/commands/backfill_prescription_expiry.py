@@ -0,0 +1,43 @@
+"""
+Management command: backfill_prescription_expiry
+================================================
+يعيد حساب تاريخ انتهاء الوصفة المخزن (prescription_expiry_date) لكل طلبات الأدوية —
+للإصلاح بعد تعديلات تمت خارج الـ ORM (SQL مباشر، ‎.update() على prescription_date).
+
+الاستخدام:
+    python manage.py backfill_prescription_expiry           (إصلاح)
+    python manage.py backfill_prescription_expiry --check   (تقرير الفروقات فقط دون حفظ)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from medications import alerts
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored prescription expiry dates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                fixed = alerts.backfill_expiry_dates()
+                if options['check']:
+                    raise _Rollback
+                if fixed:
+                    alerts.rebuild()
+        except _Rollback:
+            pass
+
+        prefix = "would have " if options['check'] else ""
+        self.stdout.write(f"{prefix}corrected {fixed} expiry date(s)")
+        if options['check'] and fixed:
+            self.stdout.write(self.style.WARNING("Prescription expiry dates are out of sync."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done."))
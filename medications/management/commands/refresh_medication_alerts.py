@@ -0,0 +1,24 @@
+"""
+Management command: refresh_medication_alerts
+=============================================
+يعيد بناء جدول تنبيهات لوحة الأدوية (MedicationAlert): الوصفات النشطة التي تنتهي
+قريباً ودورات الصرف القادمة. يُجدول يومياً (cron) — الإشارات تُبقي الجدول محدثاً
+بين التشغيلات، لكن النافذة الزمنية تتقدم مع التاريخ.
+
+الاستخدام:
+    python manage.py refresh_medication_alerts
+
+مثال cron (كل يوم 00:05):
+    5 0 * * * cd /srv/app && python manage.py refresh_medication_alerts
+"""
+from django.core.management.base import BaseCommand
+
+from medications import alerts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed medication dashboard alerts."
+
+    def handle(self, *args, **options):
+        count = alerts.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{count} alert(s) computed."))
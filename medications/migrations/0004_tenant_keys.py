@@ -0,0 +1,39 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def populate_tenant_keys(apps, schema_editor):
+    MedicationRequest = apps.get_model('medications', 'MedicationRequest')
+    ServiceRequest = apps.get_model('service_requests', 'ServiceRequest')
+    parent = ServiceRequest.objects.filter(pk=OuterRef('service_request_id'))
+    MedicationRequest.objects.update(
+        client_id=Subquery(parent.values('client_id')[:1]),
+        broker_id=Subquery(parent.values('broker_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service_requests', '0007_tenant_keys'),
+        ('brokers', '0001_initial'),
+        ('clients', '0006_sponsornumber'),
+        ('medications', '0003_medicationrequest_pharmacy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicationrequest',
+            name='broker',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='brokers.broker'),
+        ),
+        migrations.AddField(
+            model_name='medicationrequest',
+            name='client',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='clients.client'),
+        ),
+        migrations.RunPython(populate_tenant_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import calendar
+
+
+def _add_months(d, months):
+    month = d.month - 1 + months
+    year = d.year + month // 12
+    month = month % 12 + 1
+    return d.replace(year=year, month=month, day=min(d.day, calendar.monthrange(year, month)[1]))
+
+
+def populate_expiry_dates(apps, schema_editor):
+    MedicationRequest = apps.get_model('medications', 'MedicationRequest')
+    rows = list(MedicationRequest.objects.only('prescription_date', 'prescription_validity_months'))
+    for row in rows:
+        row.prescription_expiry_date = _add_months(row.prescription_date, row.prescription_validity_months)
+    MedicationRequest.objects.bulk_update(rows, ['prescription_expiry_date'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medications', '0004_tenant_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MedicationAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('PRESCRIPTION_EXPIRY', 'Prescription Expiry'), ('REFILL_DUE', 'Refill Due')], max_length=20, verbose_name='Kind')),
+                ('due_date', models.DateField(verbose_name='Due Date')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Medication Alert',
+                'verbose_name_plural': 'Medication Alerts',
+                'ordering': ['due_date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='medicationrequest',
+            name='prescription_expiry_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='Prescription Expiry Date'),
+        ),
+        migrations.RunPython(populate_expiry_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='medicationrequest',
+            index=models.Index(fields=['status', 'prescription_expiry_date'], name='medreq_status_expiry_idx'),
+        ),
+        migrations.AddField(
+            model_name='medicationalert',
+            name='medication_request',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='medications.medicationrequest'),
+        ),
+        migrations.AddField(
+            model_name='medicationalert',
+            name='refill',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='medications.medicationrefill'),
+        ),
+        migrations.AddIndex(
+            model_name='medicationalert',
+            index=models.Index(fields=['kind', 'due_date'], name='medalert_kind_due_idx'),
+        ),
+    ]
@@ -1,6 +1,5 @@
 import uuid
 import calendar
-import datetime
 import os
 from django.db import models, transaction
 from django.conf import settings
@@ -8,6 +7,9 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.text import get_valid_filename
 from django.core.exceptions import ValidationError
 
+from core.sequences import next_reference
+from core.tenancy import TenantKeysMixin
+
 
 def _add_months(d, months):
     """إضافة عدد من الأشهر إلى تاريخ بشكل آمن."""
@@ -30,13 +32,16 @@ def medication_file_upload_path(instance, filename):
 # ====================================================
 # 1. طلب الأدوية (المرتبط بالطلب الأساسي)
 # ====================================================
-class MedicationRequest(models.Model):
+class MedicationRequest(TenantKeysMixin, models.Model):
     class Status(models.TextChoices):
         PROCESSING = 'PROCESSING', _('Under Processing')
         ACTIVE     = 'ACTIVE',     _('Active')
         COMPLETED  = 'COMPLETED',  _('Completed')
         CANCELLED  = 'CANCELLED',  _('Cancelled')
 
+    tracked_fields = ('service_request_id', 'client_id', 'broker_id', 'status', 'prescription_expiry_date')
+    tenant_parent = 'service_request'
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     reference = models.CharField(
         _("Reference"),
@@ -53,6 +58,16 @@ class MedicationRequest(models.Model):
         verbose_name=_("Original Service Request"),
     )
 
+    # مفاتيح المستأجر منسوخة من طلب الخدمة (core/tenancy.py) — فلترة العزل بعمود واحد
+    client = models.ForeignKey(
+        'clients.Client', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', db_index=True,
+    )
+    broker = models.ForeignKey(
+        'brokers.Broker', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', db_index=True,
+    )
+
     # القواعد الطبية
     prescription_date = models.DateField(_("Prescription Date"), db_index=True)
     prescription_validity_months = models.PositiveIntegerField(
@@ -60,6 +75,10 @@ class MedicationRequest(models.Model):
         default=6,
         help_text=_("Number of months the prescription is valid (default: 6)"),
     )
+    # prescription_date + prescription_validity_months — يُحسب في save() ليُستعلم عنه بالفهرس
+    prescription_expiry_date = models.DateField(
+        _("Prescription Expiry Date"), null=True, blank=True, editable=False,
+    )
     interval_months = models.PositiveIntegerField(
         _("Dispense Interval (Months)"),
         help_text=_("e.g., 1 for Monthly, 3 for Quarterly"),
@@ -109,6 +128,10 @@ class MedicationRequest(models.Model):
         verbose_name = _("Medication Request")
         verbose_name_plural = _("Medication Requests")
         ordering = ['-created_at']
+        indexes = [
+            # الوصفات النشطة التي تنتهي خلال فترة (get_expiring_prescriptions)
+            models.Index(fields=['status', 'prescription_expiry_date'], name='medreq_status_expiry_idx'),
+        ]
         permissions = [
             ("can_transfer_to_medications",  "Can transfer service request to medications"),
             ("can_view_medication_dashboard", "Can view medications dashboard"),
@@ -121,10 +144,6 @@ class MedicationRequest(models.Model):
     def __str__(self):
         return self.reference or str(self.id)
 
-    @property
-    def prescription_expiry_date(self):
-        return _add_months(self.prescription_date, self.prescription_validity_months)
-
     @property
     def max_cycles(self):
         if self.interval_months and self.interval_months > 0:
@@ -132,20 +151,29 @@ class MedicationRequest(models.Model):
             return math.ceil(self.total_duration_months / self.interval_months)
         return 0
 
+    def sync_expiry_date(self):
+        """Recompute prescription_expiry_date. Returns True if it changed."""
+        if not self.prescription_date:
+            return False
+        expiry = _add_months(self.prescription_date, self.prescription_validity_months)
+        if expiry == self.prescription_expiry_date:
+            return False
+        self.prescription_expiry_date = expiry
+        return True
+
     def save(self, *args, **kwargs):
-        if not self.reference:
+        if self.sync_expiry_date() and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'prescription_expiry_date'}
+        if self.reference:
+            return super().save(*args, **kwargs)
+        try:
             with transaction.atomic():
-                year = datetime.date.today().year
-                last = (
-                    MedicationRequest.objects
-                    .select_for_update()
-                    .filter(reference__startswith=f"MED-{year}")
-                    .order_by('-reference')
-                    .first()
-                )
-                new_id = (int(last.reference.split('-')[-1]) + 1) if last else 1
-                self.reference = f"MED-{year}-{new_id:05d}"
-        super().save(*args, **kwargs)
+                self.reference = next_reference('MED')
+                super().save(*args, **kwargs)
+        except Exception:
+            # لا نُبقي مرجعاً تم التراجع عن حجزه على الكائن
+            self.reference = ''
+            raise
 
     def change_status(self, new_status, user, action, note=''):
         allowed = {
@@ -291,6 +319,41 @@ class MedicationRefill(models.Model):
             )
 
 
+# ====================================================
+# 2.1 تنبيهات لوحة الأدوية (محسوبة مسبقاً — medications/alerts.py)
+# ====================================================
+class MedicationAlert(models.Model):
+    class Kind(models.TextChoices):
+        PRESCRIPTION_EXPIRY = 'PRESCRIPTION_EXPIRY', _('Prescription Expiry')
+        REFILL_DUE          = 'REFILL_DUE',          _('Refill Due')
+
+    kind = models.CharField(_("Kind"), max_length=20, choices=Kind.choices)
+    medication_request = models.ForeignKey(
+        MedicationRequest,
+        on_delete=models.CASCADE,
+        related_name='alerts',
+    )
+    refill = models.ForeignKey(
+        MedicationRefill,
+        on_delete=models.CASCADE,
+        null=True, blank=True,
+        related_name='alerts',
+    )
+    due_date = models.DateField(_("Due Date"))
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['due_date']
+        verbose_name = _('Medication Alert')
+        verbose_name_plural = _('Medication Alerts')
+        indexes = [
+            models.Index(fields=['kind', 'due_date'], name='medalert_kind_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} — {self.due_date}"
+
+
 # ====================================================
 # 3. مرفقات طلب الدواء
 # ====================================================
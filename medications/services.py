@@ -3,6 +3,7 @@ from dateutil.relativedelta import relativedelta
 from django.db import transaction
 from django.contrib import messages
 from django.utils.translation import gettext as _
+from . import alerts
 from .models import MedicationRequest, MedicationRefill
 
 def generate_medication_schedule(
@@ -56,5 +57,6 @@ def generate_medication_schedule(
             MedicationRefill.objects.bulk_create(refills_to_create)
             med_request.status = MedicationRequest.Status.ACTIVE
             med_request.save(update_fields=['status'])
+            alerts.refresh_for([med_request.pk])  # bulk_create لا يطلق post_save
             
     return cycles_generated
\ No newline at end of file
@@ -0,0 +1,20 @@
+# medications/signals.py
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import alerts
+from .models import MedicationRefill, MedicationRequest
+
+
+# ── Dashboard alerts ────────────────────────────────────────────────────────
+# حذف الطلب أو الدورة يحذف تنبيهاتها تلقائياً (CASCADE) — لا حاجة لـ post_delete
+
+@receiver(post_save, sender=MedicationRequest)
+def medication_alerts_on_request_save(sender, instance, created, **kwargs):
+    if created or instance.tracked_field_changed('status', 'prescription_expiry_date'):
+        alerts.refresh_for([instance.pk])
+
+
+@receiver(post_save, sender=MedicationRefill)
+def medication_alerts_on_refill_save(sender, instance, **kwargs):
+    alerts.refresh_for([instance.medication_request_id])
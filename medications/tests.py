@@ -1,3 +1,88 @@
+import datetime
+
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import User
+from clients.models import Client
+from members.models import Member
+from policies.models import Policy, PolicyClass
+from providers.models import Provider
+from service_requests.models import RequestType, ServiceRequest
+from . import alerts
+from .models import MedicationAlert, MedicationRefill, MedicationRequest
+from .utils import get_expiring_prescriptions
+
+
+class PrescriptionExpiryTest(TestCase):
+    def setUp(self):
+        self.today = datetime.date.today()
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1')
+        policy = Policy.objects.create(
+            client=company, provider=provider, policy_number='POL-1',
+            start_date=self.today, end_date=self.today + datetime.timedelta(days=365),
+        )
+        self.member = Member.objects.create(
+            client=company, policy_class=PolicyClass.objects.create(policy=policy, name='VIP'),
+            full_name='Member', national_id='1000000001', birth_date=datetime.date(1990, 1, 1),
+            gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        self.user = User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN)
+        self.request_type = RequestType.objects.create(name_ar='أدوية', integration='medication')
+
+    def medication(self, days_ago, validity=1, status=MedicationRequest.Status.ACTIVE):
+        service_request = ServiceRequest.objects.create(
+            request_type=self.request_type, member=self.member, submitted_by=self.user,
+        )
+        prescription_date = self.today - datetime.timedelta(days=days_ago)
+        return MedicationRequest.objects.create(
+            service_request=service_request, prescription_date=prescription_date,
+            prescription_validity_months=validity, interval_months=1, total_duration_months=6,
+            created_by=self.user, status=status,
+        )
+
+    def test_expiry_date_stored_and_kept_in_sync(self):
+        medication = self.medication(days_ago=0, validity=6)
+        self.assertGreater(medication.prescription_expiry_date, self.today + datetime.timedelta(days=180))
+        medication.prescription_validity_months = 1
+        medication.save(update_fields=['prescription_validity_months'])
+        medication.refresh_from_db()
+        self.assertLess(medication.prescription_expiry_date, self.today + datetime.timedelta(days=32))
+
+    def test_expiring_prescriptions_is_a_range_query(self):
+        soon = self.medication(days_ago=20)  # تنتهي خلال ~10 أيام
+        self.medication(days_ago=0, validity=6)  # بعيدة
+        self.medication(days_ago=40)  # انتهت
+        self.medication(days_ago=20, status=MedicationRequest.Status.COMPLETED)
+        with self.assertNumQueries(1):
+            self.assertEqual(list(get_expiring_prescriptions(days=30)), [soon])
+
+    def test_backfill_repairs_drift(self):
+        medication = self.medication(days_ago=0)
+        MedicationRequest.objects.filter(pk=medication.pk).update(prescription_expiry_date=None)
+        self.assertEqual(alerts.backfill_expiry_dates(), 1)
+        self.assertEqual(alerts.backfill_expiry_dates(), 0)
+
+    def test_alert_table_follows_saves(self):
+        medication = self.medication(days_ago=20)
+        self.assertEqual(
+            list(MedicationAlert.objects.values_list('kind', flat=True)),
+            [MedicationAlert.Kind.PRESCRIPTION_EXPIRY],
+        )
+        refill = MedicationRefill.objects.create(
+            medication_request=medication, cycle_number=1, scheduled_date=self.today + datetime.timedelta(days=3),
+        )
+        self.assertEqual(
+            [alert.refill for alert in alerts.panel(MedicationAlert.Kind.REFILL_DUE, 7)], [refill],
+        )
+        medication.status = MedicationRequest.Status.COMPLETED
+        medication.save(update_fields=['status'])
+        self.assertFalse(MedicationAlert.objects.exists())
+
+    def test_rebuild_matches_incremental_state(self):
+        self.medication(days_ago=20)
+        self.medication(days_ago=0, validity=6)
+        before = set(MedicationAlert.objects.values_list('kind', 'medication_request_id', 'due_date'))
+        self.assertEqual(alerts.rebuild(), 1)
+        after = set(MedicationAlert.objects.values_list('kind', 'medication_request_id', 'due_date'))
+        self.assertEqual(before, after)
@@ -5,7 +5,8 @@ Utility functions for the medications app.
 - Upcoming refill/prescription alerts
 """
 import datetime
-from .models import MedicationRequest, MedicationRefill
+
+from . import alerts
 
 
 def check_policy_active_on_date(member, target_date):
@@ -93,15 +94,8 @@ def get_upcoming_refills(days=7):
     Returns refills with status PENDING or APPROVED scheduled within the next `days` days
     and whose parent MedicationRequest is ACTIVE.
     """
-    today = datetime.date.today()
-    cutoff = today + datetime.timedelta(days=days)
     return (
-        MedicationRefill.objects
-        .filter(
-            status__in=[MedicationRefill.RefillStatus.PENDING, MedicationRefill.RefillStatus.APPROVED],
-            scheduled_date__range=(today, cutoff),
-            medication_request__status=MedicationRequest.Status.ACTIVE,
-        )
+        alerts.due_refills(days)
         .select_related('medication_request', 'partner')
         .order_by('scheduled_date')
     )
@@ -111,16 +105,8 @@ def get_expiring_prescriptions(days=10):
     """
     Returns ACTIVE MedicationRequests whose prescription will expire within `days` days.
     """
-    today = datetime.date.today()
-    results = []
-    qs = (
-        MedicationRequest.objects
-        .filter(status=MedicationRequest.Status.ACTIVE)
+    return (
+        alerts.expiring_requests(days)
         .select_related('service_request')
+        .order_by('prescription_expiry_date')
     )
-    for mr in qs:
-        expiry = mr.prescription_expiry_date
-        diff = (expiry - today).days
-        if 0 <= diff <= days:
-            results.append(mr)
-    return results
@@ -11,18 +11,16 @@ from django.views.decorators.http import require_POST
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 
-from django.db.models import Q
-from accounts.models import User
+from core.scope import get_scope
 from service_requests.models import ServiceRequest, RequestAttachment
 from service_requests.views import get_allowed_requests
-from .models import MedicationRequest, MedicationRefill, MedicationAttachment
+from . import alerts
+from .models import MedicationRequest, MedicationRefill, MedicationAttachment, MedicationAlert
 from .models import _add_months
 from .forms import MedicationTransferForm, ScheduleRefillForm, RefillReviewForm
 from .utils import (
     check_policy_active_on_date,
     get_member_policy_info,
-    get_upcoming_refills,
-    get_expiring_prescriptions,
 )
 
 
@@ -41,26 +39,9 @@ def get_allowed_medication_requests(user):
         'created_by',
     )
 
-    if user.role == User.Roles.SUPER_ADMIN:
-        return base_qs
-
-    elif user.is_broker_role and user.related_broker:
-        return base_qs.filter(
-            service_request__member__client__broker=user.related_broker
-        )
-
-    elif user.is_hr_role and user.related_client:
-        return base_qs.filter(
-            service_request__member__client=user.related_client
-        )
-
-    elif user.is_member_role and hasattr(user, 'member_profile'):
-        return base_qs.filter(
-            Q(service_request__member=user.member_profile) |
-            Q(service_request__member__sponsor=user.member_profile)
-        )
-
-    return MedicationRequest.objects.none()
+    return get_scope(user).restrict(
+        base_qs, broker='broker', client='client', member='service_request__member',
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -79,8 +60,15 @@ def medication_dashboard(request):
     if status_filter:
         qs = qs.filter(status=status_filter)
 
-    upcoming_refills = get_upcoming_refills(days=7)
-    expiring_prescriptions = get_expiring_prescriptions(days=30)
+    # اللوحات الجانبية من جدول التنبيهات المحسوب مسبقاً (medications/alerts.py)
+    upcoming_refills = [
+        alert.refill
+        for alert in alerts.panel(MedicationAlert.Kind.REFILL_DUE, alerts.REFILL_WINDOW_DAYS)
+    ]
+    expiring_prescriptions = [
+        alert.medication_request
+        for alert in alerts.panel(MedicationAlert.Kind.PRESCRIPTION_EXPIRY, alerts.EXPIRY_WINDOW_DAYS)
+    ]
     expiring_pks = {mr.pk for mr in expiring_prescriptions}
 
     context = {
@@ -91,6 +79,8 @@ def medication_dashboard(request):
         'upcoming_refills': upcoming_refills,
         'expiring_prescriptions': expiring_prescriptions,
         'expiring_pks': expiring_pks,
+        'expiry_window_days': alerts.EXPIRY_WINDOW_DAYS,
+        'refill_window_days': alerts.REFILL_WINDOW_DAYS,
     }
 
     if request.headers.get('HX-Request'):
@@ -225,6 +215,7 @@ def transfer_to_medications(request, service_request_id):
                 status=MedicationRefill.RefillStatus.PENDING,
             ))
         MedicationRefill.objects.bulk_create(bulk_refills)
+        alerts.refresh_for([med_req.pk])  # bulk_create لا يطلق post_save
 
         # تحديث حالة طلب الخدمة مع تسجيل أثر التدقيق
         old_status = sr.status
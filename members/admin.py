@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Member, MemberDocument
+from .models import Member, MemberDocument, MemberUploadJob
 
 class MemberDocumentInline(admin.TabularInline):
     model = MemberDocument
@@ -13,4 +13,11 @@ class MemberAdmin(admin.ModelAdmin):
     inlines = [MemberDocumentInline]
     
     # هام جداً: يجعل حقول ForeignKey قابلة للبحث بدلاً من القائمة المنسدلة
-    autocomplete_fields = ['client', 'sponsor', 'policy_class']
\ No newline at end of file
+    autocomplete_fields = ['client', 'sponsor', 'policy_class']
+
+@admin.register(MemberUploadJob)
+class MemberUploadJobAdmin(admin.ModelAdmin):
+    list_display = ('original_filename', 'client', 'uploaded_by', 'status', 'processed_rows', 'success_count', 'failed_count', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('results', 'created_at', 'started_at', 'finished_at')
+    raw_id_fields = ('client', 'uploaded_by')
@@ -98,7 +98,7 @@ class MemberForm(forms.ModelForm):
         # 3. فلترة الفئات المتاحة والكفلاء (بناءً على العميل الموثوق به الآن)
         if target_client_id:
             from django.db.models import Q
-            from clients.models import get_group_root
+            from clients.models import group_root_id
             try:
                 cid = target_client_id
                 query = Q(policy__client_id=cid)
@@ -119,9 +119,8 @@ class MemberForm(forms.ModelForm):
                 # أرقام الكفيلة: كل أرقام الكفيلة ضمن نفس مجموعة القابضة (تسمح بالشقيقات)
                 try:
                     client_obj = Client.objects.get(id=cid)
-                    group_root = get_group_root(client_obj)
                     self.fields['sponsor_number'].queryset = SponsorNumber.objects.filter(
-                        group=group_root,
+                        group_id=group_root_id(client_obj),
                         is_active=True,
                     ).select_related('owner_client')
                     self.fields['sponsor_number'].label_from_instance = (
@@ -0,0 +1,213 @@
+"""
+Background execution of bulk member uploads (MemberUploadJob).
+
+Two ways to run jobs, chosen by settings.MEMBER_UPLOAD_WORKER:
+    'thread'  (default) — a single background thread inside the web process
+                          picks the job up right after the upload commits.
+    'command'           — jobs stay PENDING until the worker command runs them:
+                              python manage.py run_upload_worker
+
+A running job writes a heartbeat after every chunk. One whose heartbeat is
+older than STALE_AFTER lost its worker (crash, restart) and is marked
+FAILED by recover_stale_jobs() — for all jobs before the worker claims the
+next one, for the viewed job on its progress page. A failed job whose file
+is still stored can be retried and resumes after its committed rows.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import MemberUploadJob
+from .utils import UploadInterrupted, process_bulk_upload
+
+logger = logging.getLogger(__name__)
+
+# دفعة واحدة تنتهي في ثوانٍ — نبضة أقدم من هذا تعني أن العامل مات
+STALE_AFTER = timedelta(minutes=10)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # عامل واحد: الرفع كثيف الكتابة ولا فائدة من التوازي على نفس قاعدة البيانات
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='member-upload')
+    return _executor
+
+
+def enqueue_upload_job(job):
+    """Schedule a freshly created job according to MEMBER_UPLOAD_WORKER."""
+    if getattr(settings, 'MEMBER_UPLOAD_WORKER', 'thread') != 'thread':
+        return
+    job_id = job.pk
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job_id))
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run_upload_job(job_id)
+    except Exception:
+        logger.exception("Member upload job %s crashed", job_id)
+    finally:
+        connection.close()
+
+
+def claim_job(job_id):
+    """Atomically move a PENDING job to RUNNING. Returns False if another worker got it."""
+    now = timezone.now()
+    return bool(
+        MemberUploadJob.objects
+        .filter(pk=job_id, status=MemberUploadJob.Status.PENDING)
+        .update(status=MemberUploadJob.Status.RUNNING, started_at=now, heartbeat_at=now)
+    )
+
+
+def is_stale(job, now=None):
+    """A RUNNING job whose last heartbeat is older than STALE_AFTER."""
+    last_seen = job.heartbeat_at or job.started_at or job.created_at
+    return job.status == MemberUploadJob.Status.RUNNING and last_seen < (now or timezone.now()) - STALE_AFTER
+
+
+def recover_stale_jobs(now=None, pk=None):
+    """
+    Mark RUNNING jobs without a heartbeat for STALE_AFTER as FAILED (only
+    job ``pk`` when given). The rows reported before the worker died are
+    committed, so a retry resumes after them. Returns the number of jobs
+    recovered.
+    """
+    now = now or timezone.now()
+    jobs = MemberUploadJob.objects.filter(status=MemberUploadJob.Status.RUNNING)
+    if pk is not None:
+        jobs = jobs.filter(pk=pk)
+    return (
+        jobs
+        .alias(last_seen=Coalesce('heartbeat_at', 'started_at', 'created_at'))
+        .filter(last_seen__lt=now - STALE_AFTER)
+        .update(
+            status=MemberUploadJob.Status.FAILED,
+            committed_rows=F('processed_rows'),
+            error_message="توقف العامل أثناء المعالجة. يمكن إعادة المحاولة لاستكمال الصفوف المتبقية",
+            finished_at=now,
+        )
+    )
+
+
+def retry_job(job):
+    """
+    Move a FAILED job whose file is still stored back to PENDING and schedule
+    it. Returns False if the job is not retryable (or was already retried).
+    """
+    retried = bool(
+        MemberUploadJob.objects
+        .filter(pk=job.pk, status=MemberUploadJob.Status.FAILED)
+        .exclude(file='')
+        .update(status=MemberUploadJob.Status.PENDING, error_message='', failed_row=None, finished_at=None)
+    )
+    if retried:
+        enqueue_upload_job(job)
+    return retried
+
+
+def claim_next_job():
+    """Claim the oldest pending job, or return None when the queue is empty."""
+    recover_stale_jobs()
+    pending_ids = (
+        MemberUploadJob.objects
+        .filter(status=MemberUploadJob.Status.PENDING)
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:5]
+    )
+    for job_id in pending_ids:
+        if claim_job(job_id):
+            return job_id
+    return None
+
+
+def run_upload_job(job_id, claimed=False):
+    """
+    Process one upload job end to end. Progress counters are written after
+    every chunk so the HTMX progress endpoint can poll them. A retried job
+    resumes after its committed rows.
+    """
+    if not claimed and not claim_job(job_id):
+        return None
+
+    job = MemberUploadJob.objects.select_related('client').get(pk=job_id)
+
+    # نتائج المحاولة السابقة — إن فُقدت قوائمها (مات العامل) تبقى العدادات فقط
+    resumed = job.results if job.results.get('total_rows') == job.committed_rows else {}
+    results = {
+        'success': list(resumed.get('success', [])),
+        'failed': list(resumed.get('failed', [])),
+        'total_rows': job.committed_rows,
+    }
+    success_offset = job.success_count - len(results['success']) if job.committed_rows else 0
+    failed_offset = job.failed_count - len(results['failed']) if job.committed_rows else 0
+
+    def counts(results):
+        return {
+            'processed_rows': results['total_rows'],
+            'success_count': success_offset + len(results['success']),
+            'failed_count': failed_offset + len(results['failed']),
+        }
+
+    def report_progress(results, expected_rows):
+        # كل ما سبق هذه النقطة محفوظ — النبضة تثبت أن العامل حي
+        MemberUploadJob.objects.filter(pk=job.pk).update(
+            total_rows=expected_rows,
+            committed_rows=results['total_rows'],
+            heartbeat_at=timezone.now(),
+            **counts(results),
+        )
+
+    try:
+        with job.file.open('rb') as f:
+            results = process_bulk_upload(f, job.client, progress=report_progress, results=results)
+    except UploadInterrupted as e:
+        logger.exception("Member upload job %s failed at row %s", job.pk, e.row)
+        _fail(job, e.__cause__, row=e.row, results=e.results, **counts(e.results))
+        return job
+    except Exception as e:
+        logger.exception("Member upload job %s failed", job.pk)
+        _fail(job, e)
+        return job
+
+    job.results = results
+    job.total_rows = results['total_rows']
+    job.committed_rows = results['total_rows']
+    for name, value in counts(results).items():
+        setattr(job, name, value)
+    job.status = MemberUploadJob.Status.COMPLETED
+    job.finished_at = timezone.now()
+    # الملف الأصلي يحتوي بيانات هوية — لا حاجة له بعد حفظ النتائج
+    job.file.delete(save=False)
+    job.save()
+    return job
+
+
+def _fail(job, error, row=None, results=None, **counts):
+    job.status = MemberUploadJob.Status.FAILED
+    job.finished_at = timezone.now()
+    fields = ['status', 'error_message', 'finished_at']
+    if row is None:
+        job.error_message = str(error)
+    else:
+        job.failed_row = row
+        job.results = results
+        job.committed_rows = results['total_rows']
+        for name, value in counts.items():
+            setattr(job, name, value)
+        job.error_message = (
+            f"توقفت المعالجة عند الصف {row}: {error}. "
+            f"حُفظ {job.committed_rows} صف ويمكن إعادة المحاولة لاستكمال الباقي"
+        )
+        fields += ['failed_row', 'results', 'committed_rows', *counts]
+    job.save(update_fields=fields)
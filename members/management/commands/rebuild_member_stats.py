@@ -0,0 +1,41 @@
+"""
+Management command: rebuild_member_stats
+========================================
+يعيد حساب لقطات إحصائيات الأعضاء لكل شركة (ClientMemberStats) من جدول الأعضاء
+باستعلام تجميع واحد — للإصلاح بعد تعديلات تمت خارج الـ ORM (SQL مباشر، ‎.update()).
+
+الاستخدام:
+    python manage.py rebuild_member_stats           (إصلاح)
+    python manage.py rebuild_member_stats --check   (تقرير الفروقات فقط دون حفظ)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from members import stats
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-client member statistics snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                fixed = stats.rebuild()
+                if options['check']:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        prefix = "would have " if options['check'] else ""
+        self.stdout.write(f"{prefix}corrected {fixed} snapshot(s)")
+        if options['check'] and fixed:
+            self.stdout.write(self.style.WARNING("ClientMemberStats is out of sync."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,57 @@
+"""
+Management command: run_upload_worker
+=====================================
+عامل محلي ينفذ مهام رفع الأعضاء الجماعي (MemberUploadJob) المعلقة.
+
+الاستخدام:
+    python manage.py run_upload_worker            (يعمل باستمرار)
+    python manage.py run_upload_worker --once     (ينفذ المهام المعلقة ثم يخرج)
+
+يُستخدم عند ضبط MEMBER_UPLOAD_WORKER = 'command' في الإعدادات.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from members.jobs import claim_next_job, run_upload_job
+
+
+class Command(BaseCommand):
+    help = "Runs pending bulk member upload jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the pending queue and exit instead of polling forever.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep when the queue is empty (default: 2).',
+        )
+
+    def handle(self, *args, **options):
+        once = options['once']
+        interval = options['poll_interval']
+        self.stdout.write(self.style.MIGRATE_HEADING("Member upload worker started."))
+
+        while True:
+            close_old_connections()
+            job_id = claim_next_job()
+            if job_id is None:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            job = run_upload_job(job_id, claimed=True)
+            style = self.style.SUCCESS if job.status == job.Status.COMPLETED else self.style.ERROR
+            self.stdout.write(style(
+                f"  ✓ Job {job.pk} — {job.get_status_display()}: "
+                f"{job.success_count} succeeded, {job.failed_count} failed"
+            ))
+
+        self.stdout.write(self.style.SUCCESS("Queue empty."))
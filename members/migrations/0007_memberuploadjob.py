@@ -0,0 +1,43 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('clients', '0006_sponsornumber'),
+        ('members', '0006_member_sponsor_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberUploadJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file', models.FileField(blank=True, upload_to='members/uploads/%Y/%m/')),
+                ('original_filename', models.CharField(blank=True, max_length=255, verbose_name='File Name')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20, verbose_name='Status')),
+                ('total_rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='Total Rows')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='Processed Rows')),
+                ('success_count', models.PositiveIntegerField(default=0, verbose_name='Success Count')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Failed Count')),
+                ('results', models.JSONField(blank=True, default=dict, verbose_name='Results')),
+                ('error_message', models.TextField(blank=True, verbose_name='Error Message')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='member_upload_jobs', to='clients.client', verbose_name='Company / Client')),
+                ('uploaded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='member_upload_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Member Upload Job',
+                'verbose_name_plural': 'Member Upload Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_member_stats(apps, schema_editor):
+    Member = apps.get_model('members', 'Member')
+    ClientMemberStats = apps.get_model('members', 'ClientMemberStats')
+    Count, Q = models.Count, models.Q
+    rows = (
+        Member.objects.values('client_id')
+        .annotate(
+            total=Count('pk'),
+            principals=Count('pk', filter=Q(relation='PRINCIPAL')),
+            spouses=Count('pk', filter=Q(relation='SPOUSE')),
+            children=Count('pk', filter=Q(relation='CHILD')),
+            parents=Count('pk', filter=Q(relation='PARENT')),
+            others=Count('pk', filter=Q(relation__in=['BROTHER', 'SISTER', 'OTHER'])),
+            inactive=Count('pk', filter=Q(is_active=False)),
+        )
+        .order_by()
+    )
+    ClientMemberStats.objects.bulk_create(ClientMemberStats(**row) for row in rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_sponsornumber'),
+        ('members', '0007_memberuploadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientMemberStats',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='member_stats', serialize=False, to='clients.client')),
+                ('total', models.IntegerField(default=0)),
+                ('principals', models.IntegerField(default=0)),
+                ('spouses', models.IntegerField(default=0)),
+                ('children', models.IntegerField(default=0)),
+                ('parents', models.IntegerField(default=0)),
+                ('others', models.IntegerField(default=0)),
+                ('inactive', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Client Member Stats',
+                'verbose_name_plural': 'Client Member Stats',
+            },
+        ),
+        migrations.RunPython(populate_member_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def populate_tenant_keys(apps, schema_editor):
+    Member = apps.get_model('members', 'Member')
+    Client = apps.get_model('clients', 'Client')
+    parent = Client.objects.filter(pk=OuterRef('client_id'))
+    Member.objects.update(
+        broker_id=Subquery(parent.values('broker_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('brokers', '0001_initial'),
+        ('members', '0008_clientmemberstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='broker',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='brokers.broker'),
+        ),
+        migrations.RunPython(populate_tenant_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-18 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0009_tenant_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberuploadjob',
+            name='committed_rows',
+            field=models.PositiveIntegerField(default=0, verbose_name='Committed Rows'),
+        ),
+        migrations.AddField(
+            model_name='memberuploadjob',
+            name='failed_row',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Failed Row'),
+        ),
+        migrations.AddField(
+            model_name='memberuploadjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -3,7 +3,9 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinLengthValidator, MaxLengthValidator
 
-class Member(models.Model):
+from core.tenancy import TenantKeysMixin
+
+class Member(TenantKeysMixin, models.Model):
     class Gender(models.TextChoices):
         MALE = 'M', _('Male')
         FEMALE = 'F', _('Female')
@@ -27,6 +29,12 @@ class Member(models.Model):
         verbose_name=_("Company / Client")
     )
 
+    # وسيط الشركة منسوخ منها (core/tenancy.py) — فلترة العزل بعمود واحد
+    broker = models.ForeignKey(
+        'brokers.Broker', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', db_index=True,
+    )
+
     # 2. ربط اختياري مع جدول المستخدمين
     user = models.OneToOneField(
         'accounts.User',
@@ -82,6 +90,11 @@ class Member(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # client/relation/is_active تحدد خانة العضو في ClientMemberStats؛ broker منسوخ من الشركة (core/tenancy.py)
+    # sponsor لرفع عدّاد ETag تبويب التابعين للعائلة القديمة والجديدة (members/signals.py)
+    tracked_fields = ('client_id', 'relation', 'is_active', 'broker_id', 'sponsor_id')
+    tenant_parent = 'client'
+
     class Meta:
         verbose_name = _("Member / Beneficiary")
         verbose_name_plural = _("Members / Beneficiaries")
@@ -101,15 +114,49 @@ class Member(models.Model):
 
     def clean(self):
         from django.core.exceptions import ValidationError
-        from clients.models import get_group_root
+        from clients.models import group_root_id
         if self.sponsor_number_id and self.client_id:
             # كفيل العضو يجب أن يكون ضمن نفس مجموعة القابضة التي تتبعها الشركة
-            if get_group_root(self.sponsor_number.owner_client) != get_group_root(self.client):
+            # (group هو جذر مجموعة الشركة المالكة — SponsorNumber.clean)
+            if self.sponsor_number.group_id != group_root_id(self.client):
                 raise ValidationError({
                     'sponsor_number': _("The sponsor number must belong to the same holding group as the member's company.")
                 })
 
 
+class ClientMemberStats(models.Model):
+    """
+    لقطة إحصائيات الأعضاء لكل شركة (لوحات HR والوسيط).
+    تُحدّث تدريجياً من إشارات Member (انظر members/stats.py) فلا يعتمد زمن
+    تحميل اللوحة على عدد الأعضاء.
+    """
+    client = models.OneToOneField(
+        'clients.Client',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='member_stats',
+    )
+    total = models.IntegerField(default=0)
+    principals = models.IntegerField(default=0)
+    spouses = models.IntegerField(default=0)
+    children = models.IntegerField(default=0)
+    parents = models.IntegerField(default=0)
+    others = models.IntegerField(default=0)
+    inactive = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Client Member Stats")
+        verbose_name_plural = _("Client Member Stats")
+
+    def __str__(self):
+        return f"{self.client_id}: {self.total}"
+
+    @property
+    def dependents(self):
+        return self.total - self.principals
+
+
 class MemberDocument(models.Model):
     """
     مرفقات الأعضاء
@@ -121,4 +168,89 @@ class MemberDocument(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class MemberUploadJob(models.Model):
+    """
+    مهمة رفع أعضاء جماعي تُنفذ خارج طلب HTTP.
+    النتائج (نجاح/فشل لكل صف) تُحفظ في results ليُعاد عرضها وتنزيل تقرير الأخطاء لاحقاً.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        RUNNING = 'RUNNING', _('Running')
+        COMPLETED = 'COMPLETED', _('Completed')
+        FAILED = 'FAILED', _('Failed')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    client = models.ForeignKey(
+        'clients.Client',
+        on_delete=models.CASCADE,
+        related_name='member_upload_jobs',
+        verbose_name=_("Company / Client"),
+    )
+    uploaded_by = models.ForeignKey(
+        'accounts.User',
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='member_upload_jobs',
+    )
+    file = models.FileField(upload_to='members/uploads/%Y/%m/', blank=True)
+    original_filename = models.CharField(_("File Name"), max_length=255, blank=True)
+
+    status = models.CharField(
+        _("Status"), max_length=20, choices=Status.choices, default=Status.PENDING, db_index=True,
+    )
+    # total_rows تقديري من أبعاد الورقة حتى تنتهي المعالجة
+    total_rows = models.PositiveIntegerField(_("Total Rows"), null=True, blank=True)
+    processed_rows = models.PositiveIntegerField(_("Processed Rows"), default=0)
+    success_count = models.PositiveIntegerField(_("Success Count"), default=0)
+    failed_count = models.PositiveIntegerField(_("Failed Count"), default=0)
+    results = models.JSONField(_("Results"), default=dict, blank=True)
+    error_message = models.TextField(_("Error Message"), blank=True)
+    # صفوف الملف التي حُفظت نتيجتها نهائياً — إعادة المحاولة تستكمل بعدها
+    committed_rows = models.PositiveIntegerField(_("Committed Rows"), default=0)
+    # صف الورقة الذي كانت تعالجه الدفعة عند فشلها
+    failed_row = models.PositiveIntegerField(_("Failed Row"), null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # يُحدَّث بعد كل دفعة — مهمة RUNNING توقفت نبضتها مات عاملها (jobs.recover_stale_jobs)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("Member Upload Job")
+        verbose_name_plural = _("Member Upload Jobs")
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.original_filename or self.pk} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.COMPLETED, self.Status.FAILED)
+
+    @property
+    def can_retry(self):
+        """فشلت والملف ما زال محفوظاً — تستكمل من بعد committed_rows."""
+        return self.status == self.Status.FAILED and bool(self.file)
+
+    @property
+    def progress_percent(self):
+        if self.status == self.Status.COMPLETED:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, int(self.processed_rows * 100 / self.total_rows))
+
+    @property
+    def eta_seconds(self):
+        """الوقت المتبقي المتوقع بناءً على سرعة المعالجة حتى الآن."""
+        from django.utils import timezone
+        if self.status != self.Status.RUNNING or not self.started_at:
+            return None
+        if not self.processed_rows or not self.total_rows:
+            return None
+        elapsed = (timezone.now() - self.started_at).total_seconds()
+        remaining = max(self.total_rows - self.processed_rows, 0)
+        return int(elapsed / self.processed_rows * remaining)
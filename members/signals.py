@@ -0,0 +1,59 @@
+# members/signals.py
+from collections import Counter, defaultdict
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import conditional
+from . import stats
+from .models import Member
+
+# الحقول التي تحدد خانة العضو في ClientMemberStats
+STATS_FIELDS = ('client_id', 'relation', 'is_active')
+
+
+# ── Client stats snapshot ───────────────────────────────────────────────────
+
+@receiver(post_save, sender=Member)
+def member_stats_on_save(sender, instance, created, **kwargs):
+    """+1 in the new buckets; on edits also -1 in the buckets the member left."""
+    deltas = defaultdict(Counter)
+    if not created:
+        if not instance.tracked_field_changed(*STATS_FIELDS):
+            return
+        old_client_id = instance.loaded_value('client_id')
+        if old_client_id is None:
+            # لم تُحمَّل القيم القديمة (كائن بُني يدوياً) — نعيد الحساب بدلاً من التخمين
+            stats.rebuild([instance.client_id])
+            return
+        deltas[old_client_id].subtract(
+            stats.buckets_of(instance.loaded_value('relation'), instance.loaded_value('is_active'))
+        )
+    deltas[instance.client_id].update(stats.buckets_of(instance.relation, instance.is_active))
+    stats.apply(deltas)
+
+
+@receiver(post_delete, sender=Member)
+def member_stats_on_delete(sender, instance, **kwargs):
+    # القيم كما هي في قاعدة البيانات (قد يكون الكائن عُدّل في الذاكرة قبل الحذف)
+    relation = instance.loaded_value('relation', instance.relation)
+    is_active = instance.loaded_value('is_active', instance.is_active)
+    client_id = instance.loaded_value('client_id', instance.client_id)
+    stats.apply({client_id: Counter({name: -1 for name in stats.buckets_of(relation, is_active)})})
+
+
+# ── Dependents tab ETag ─────────────────────────────────────────────────────
+
+def _bump_families(*sponsor_ids):
+    conditional.bump(*(f'family:{pk}' for pk in sponsor_ids if pk))
+
+
+@receiver(post_save, sender=Member)
+def member_family_version_on_save(sender, instance, created, **kwargs):
+    """An edited dependent changes the dependents tab of its sponsor (core/conditional.py)."""
+    _bump_families(instance.sponsor_id, instance.loaded_value('sponsor_id'))
+
+
+@receiver(post_delete, sender=Member)
+def member_family_version_on_delete(sender, instance, **kwargs):
+    _bump_families(instance.loaded_value('sponsor_id', instance.sponsor_id))
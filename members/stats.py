@@ -0,0 +1,137 @@
+"""
+Per-client member statistics for the HR and broker dashboards.
+
+Every bucket (principals, spouses, children, ...) is computed in one
+conditional-aggregation query and stored in ClientMemberStats. After that the
+snapshot is kept current incrementally: Member signals (members/signals.py)
+and the bulk upload apply +1/-1 deltas with F() updates, so reading the
+dashboard costs one primary-key lookup whatever the headcount.
+
+Writes that bypass the ORM signals (SQL, queryset.update()) can be repaired with:
+    python manage.py rebuild_member_stats
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Q
+
+from .models import ClientMemberStats, Member
+
+Relation = Member.RelationType
+
+# bucket -> condition; 'total' counts every member
+BUCKETS = {
+    'principals': Q(relation=Relation.PRINCIPAL),
+    'spouses': Q(relation=Relation.SPOUSE),
+    'children': Q(relation=Relation.CHILD),
+    'parents': Q(relation=Relation.PARENT),
+    'others': Q(relation__in=[Relation.BROTHER, Relation.SISTER, Relation.OTHER]),
+    'inactive': Q(is_active=False),
+}
+FIELDS = ('total',) + tuple(BUCKETS)
+
+_RELATION_BUCKET = {
+    Relation.PRINCIPAL: 'principals',
+    Relation.SPOUSE: 'spouses',
+    Relation.CHILD: 'children',
+    Relation.PARENT: 'parents',
+    Relation.BROTHER: 'others',
+    Relation.SISTER: 'others',
+    Relation.OTHER: 'others',
+}
+
+
+def _aggregates():
+    return {'total': Count('pk'), **{name: Count('pk', filter=q) for name, q in BUCKETS.items()}}
+
+
+def compute(client_ids):
+    """{client_id: {bucket: count}} — one grouped query for all the clients."""
+    client_ids = list(client_ids)
+    result = {client_id: dict.fromkeys(FIELDS, 0) for client_id in client_ids}
+    rows = (
+        Member.objects.filter(client_id__in=client_ids)
+        .values('client_id')
+        .annotate(**_aggregates())
+        .order_by()
+    )
+    for row in rows:
+        result[row.pop('client_id')] = row
+    return result
+
+
+def snapshots(client_ids):
+    """{client_id: ClientMemberStats}, computing the missing snapshots on first use."""
+    client_ids = set(client_ids)
+    found = {s.client_id: s for s in ClientMemberStats.objects.filter(client_id__in=client_ids)}
+    missing = client_ids - found.keys()
+    if missing:
+        # طلبان متزامنان قد ينشئان نفس اللقطة — الأول يفوز، والكل يعيد قراءة الصف المحفوظ
+        # (قد يكون الفائز قد طبّق عليه فروقاً بعد إنشائه)
+        ClientMemberStats.objects.bulk_create(
+            [ClientMemberStats(client_id=client_id, **values) for client_id, values in compute(missing).items()],
+            ignore_conflicts=True,
+        )
+        found.update((s.client_id, s) for s in ClientMemberStats.objects.filter(client_id__in=missing))
+    return found
+
+
+def client_stats(client):
+    return snapshots([client.pk])[client.pk]
+
+
+def combined(client_snapshots):
+    """Sum of several snapshots (a holding and its subsidiaries)."""
+    totals = dict.fromkeys(FIELDS, 0)
+    for snapshot in client_snapshots:
+        for name in FIELDS:
+            totals[name] += getattr(snapshot, name)
+    totals['dependents'] = totals['total'] - totals['principals']
+    return totals
+
+
+# ── Incremental maintenance ─────────────────────────────────────────────────
+
+def buckets_of(relation, is_active):
+    buckets = ['total']
+    if relation in _RELATION_BUCKET:
+        buckets.append(_RELATION_BUCKET[relation])
+    if not is_active:
+        buckets.append('inactive')
+    return buckets
+
+
+def apply(deltas):
+    """deltas: {client_id: Counter(bucket -> +n/-n)}. Clients without a snapshot are skipped."""
+    for client_id, delta in deltas.items():
+        changes = {name: F(name) + n for name, n in delta.items() if n}
+        if client_id is not None and changes:
+            ClientMemberStats.objects.filter(client_id=client_id).update(**changes)
+
+
+def record_created(members):
+    """Account for members inserted with bulk_create (no post_save signals)."""
+    deltas = defaultdict(Counter)
+    for member in members:
+        deltas[member.client_id].update(buckets_of(member.relation, member.is_active))
+    apply(deltas)
+
+
+def rebuild(client_ids=None):
+    """Recompute snapshots from the members table. Returns the number of corrected snapshots."""
+    if client_ids is None:
+        client_ids = set(Member.objects.values_list('client_id', flat=True).distinct())
+        client_ids |= set(ClientMemberStats.objects.values_list('client_id', flat=True))
+    expected = compute(client_ids)
+    current = {s.client_id: s for s in ClientMemberStats.objects.filter(client_id__in=client_ids)}
+    fixed = 0
+    for client_id, values in expected.items():
+        snapshot = current.get(client_id)
+        if snapshot is None:
+            # لقطة أنشأها طلب آخر بعد القراءة أعلاه تُستبدل بالقيم المحسوبة
+            ClientMemberStats.objects.update_or_create(client_id=client_id, defaults=values)
+        elif any(getattr(snapshot, name) != value for name, value in values.items()):
+            ClientMemberStats.objects.filter(pk=client_id).update(**values)
+        else:
+            continue
+        fixed += 1
+    return fixed
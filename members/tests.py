@@ -1,3 +1,311 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+from collections import Counter
+from functools import partial
+from unittest.mock import patch
 
-# Create your tests here.
+import openpyxl
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+
+from accounts.models import User
+from clients.models import Client, SponsorNumber
+from policies.models import Policy, PolicyClass
+from providers.models import Provider
+from . import stats
+from . import utils
+from .jobs import STALE_AFTER, claim_job, recover_stale_jobs, retry_job, run_upload_job
+from .models import ClientMemberStats, Member, MemberUploadJob
+from .utils import process_bulk_upload
+
+
+def build_upload_file(rows):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['header'] * 11)
+    for row in rows:
+        ws.append(list(row))
+    stream = io.BytesIO()
+    wb.save(stream)
+    stream.seek(0)
+    return stream
+
+
+class UploadFixturesMixin:
+    def setUp(self):
+        provider = Provider.objects.create(name_ar='مزود', name_en='Provider', license_number='LIC-1')
+        self.company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1')
+        policy = Policy.objects.create(
+            client=self.company, provider=provider, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        self.vip = PolicyClass.objects.create(policy=policy, name='VIP')
+        SponsorNumber.objects.create(owner_client=self.company, sponsor_number='700')
+        self.birth = datetime.datetime(1990, 5, 5)
+
+    def _principal(self, nid, name, **overrides):
+        row = [nid, name, '0500000000', self.birth, 'M', 'EMPLOYEE', None, '700', 'vip', None, None]
+        for col, value in overrides.items():
+            row[int(col[1:])] = value
+        return row
+
+
+class BulkUploadTest(UploadFixturesMixin, TestCase):
+    def test_dependents_link_to_sponsors_created_earlier_in_file(self):
+        rows = [
+            self._principal('1000000001', 'Principal'),
+            ['1000000002', 'Spouse', '0500000000', self.birth, 'F', 'SPOUSE', '1000000001', None, None, None, None],
+        ]
+        results = process_bulk_upload(build_upload_file(rows), self.company, chunk_size=1)
+
+        self.assertEqual([r['nid'] for r in results['success']], ['1000000001', '1000000002'])
+        spouse = Member.objects.get(national_id='1000000002')
+        self.assertEqual(spouse.sponsor.national_id, '1000000001')
+        self.assertEqual(spouse.policy_class, self.vip)
+        self.assertEqual(spouse.sponsor_number.sponsor_number, '700')
+
+    def test_row_errors_are_reported_per_row(self):
+        rows = [
+            self._principal('1000000001', 'First'),
+            self._principal('1000000001', 'Duplicate'),
+            self._principal('1000000003', 'Bad Class', c8='Unknown'),
+            self._principal('1000000004', 'Bad Gender', c4='X'),
+        ]
+        results = process_bulk_upload(build_upload_file(rows), self.company)
+
+        self.assertEqual(results['total_rows'], 4)
+        self.assertEqual(len(results['success']), 1)
+        self.assertEqual(
+            [(f['row'], f['error']) for f in results['failed']],
+            [
+                (3, "Duplicate National ID in file"),
+                (4, "Invalid Policy Class: Unknown"),
+                (5, "Invalid Gender"),
+            ],
+        )
+
+    def test_database_rejection_falls_back_to_row_by_row(self):
+        rows = [
+            self._principal('1000000001', 'Card A', c9='MC-1'),
+            self._principal('1000000002', 'Card B', c9='MC-1'),
+            self._principal('1000000003', 'No Card'),
+        ]
+        results = process_bulk_upload(build_upload_file(rows), self.company)
+
+        self.assertEqual([r['row'] for r in results['success']], [2, 4])
+        self.assertEqual(len(results['failed']), 1)
+        self.assertEqual(results['failed'][0]['row'], 3)
+        self.assertTrue(results['failed'][0]['error'].startswith("Save Error:"))
+        self.assertEqual(Member.objects.count(), 2)
+
+
+@override_settings(MEMBER_UPLOAD_WORKER='command')
+class MemberUploadJobTest(UploadFixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_superuser(username='admin', password='pass123')
+
+    def _make_job(self, rows):
+        upload = SimpleUploadedFile('members.xlsx', build_upload_file(rows).read())
+        return MemberUploadJob.objects.create(
+            client=self.company, uploaded_by=self.user, file=upload, original_filename='members.xlsx',
+        )
+
+    def test_job_runs_and_persists_results(self):
+        job = self._make_job([
+            self._principal('1000000001', 'Ok'),
+            self._principal('1000000002', 'Bad Gender', c4='X'),
+        ])
+
+        run_upload_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, MemberUploadJob.Status.COMPLETED)
+        self.assertEqual((job.processed_rows, job.success_count, job.failed_count), (2, 1, 1))
+        self.assertEqual(job.results['failed'][0]['error'], "Invalid Gender")
+        self.assertFalse(job.file)
+
+    def test_job_is_claimed_only_once(self):
+        job = self._make_job([self._principal('1000000001', 'Ok')])
+        run_upload_job(job.pk)
+        self.assertIsNone(run_upload_job(job.pk))
+        self.assertEqual(Member.objects.filter(national_id='1000000001').count(), 1)
+
+    def test_progress_and_report_views(self):
+        job = self._make_job([self._principal('1000000001', 'Bad Gender', c4='X')])
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('members:upload_job_progress', kwargs={'pk': job.pk}))
+        self.assertContains(response, 'every 2s')
+
+        run_upload_job(job.pk)
+        response = self.client.get(reverse('members:upload_job_report', kwargs={'pk': job.pk}))
+        self.assertEqual(response.status_code, 200)
+        ws = openpyxl.load_workbook(io.BytesIO(response.content)).active
+        self.assertEqual(ws.cell(row=2, column=4).value, "Invalid Gender")
+
+    def test_database_outage_fails_the_job_instead_of_the_rows(self):
+        job = self._make_job([self._principal('1000000001', 'One'), self._principal('1000000002', 'Two')])
+
+        with patch.object(Member.objects, 'bulk_create', side_effect=OperationalError("database is locked")):
+            run_upload_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, MemberUploadJob.Status.FAILED)
+        self.assertEqual((job.failed_row, job.committed_rows, job.failed_count), (2, 0, 0))
+        self.assertIn("database is locked", job.error_message)
+        self.assertFalse(Member.objects.exists())
+
+    def test_failed_chunk_records_the_row_and_retry_resumes_after_it(self):
+        job = self._make_job([
+            self._principal('1000000001', 'One'),
+            self._principal('1000000002', 'Two'),
+            self._principal('1000000003', 'Three'),
+        ])
+        process_chunk = utils._process_chunk
+
+        def crash_on_second_row(state, rows):
+            if rows[0][0] == 3:
+                raise RuntimeError("database went away")
+            return process_chunk(state, rows)
+
+        one_row_chunks = partial(process_bulk_upload, chunk_size=1)
+        with patch('members.jobs.process_bulk_upload', one_row_chunks), \
+                patch('members.utils._process_chunk', crash_on_second_row):
+            run_upload_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, MemberUploadJob.Status.FAILED)
+        self.assertEqual((job.failed_row, job.committed_rows, job.success_count), (3, 1, 1))
+        self.assertIn("database went away", job.error_message)
+        self.assertTrue(job.can_retry)
+
+        self.assertTrue(retry_job(job))
+        self.assertFalse(retry_job(job))
+        run_upload_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, MemberUploadJob.Status.COMPLETED)
+        self.assertEqual((job.processed_rows, job.success_count, job.failed_count), (3, 3, 0))
+        self.assertEqual([row['row'] for row in job.results['success']], [2, 3, 4])
+        self.assertEqual(Member.objects.filter(national_id__startswith='100000000').count(), 3)
+
+    def test_running_job_without_heartbeat_is_failed_and_retryable(self):
+        job = self._make_job([self._principal('1000000001', 'Ok')])
+        claim_job(job.pk)
+        MemberUploadJob.objects.filter(pk=job.pk).update(processed_rows=0)
+
+        self.assertEqual(recover_stale_jobs(), 0)
+        self.assertEqual(recover_stale_jobs(now=timezone.now() + STALE_AFTER + datetime.timedelta(seconds=1)), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, MemberUploadJob.Status.FAILED)
+        self.assertTrue(job.can_retry)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('members:upload_job_progress', kwargs={'pk': job.pk}))
+        self.assertContains(response, reverse('members:upload_job_retry', kwargs={'pk': job.pk}))
+
+        response = self.client.post(reverse('members:upload_job_retry', kwargs={'pk': job.pk}))
+        self.assertRedirects(response, reverse('members:upload_job_detail', kwargs={'pk': job.pk}))
+        run_upload_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, MemberUploadJob.Status.COMPLETED)
+
+
+    def test_progress_view_recovers_only_the_viewed_job(self):
+        viewed, other = (self._make_job([self._principal('1000000001', 'Ok')]) for _ in range(2))
+        for job in (viewed, other):
+            claim_job(job.pk)
+        MemberUploadJob.objects.update(heartbeat_at=timezone.now() - STALE_AFTER - datetime.timedelta(seconds=1))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('members:upload_job_progress', kwargs={'pk': viewed.pk}))
+        self.assertContains(response, reverse('members:upload_job_retry', kwargs={'pk': viewed.pk}))
+        other.refresh_from_db()
+        self.assertEqual(other.status, MemberUploadJob.Status.RUNNING)
+
+class ClientMemberStatsTest(UploadFixturesMixin, TestCase):
+    def _member(self, nid, relation='PRINCIPAL', client=None, **extra):
+        return Member.objects.create(
+            client=client or self.company, policy_class=self.vip, full_name=nid, national_id=nid,
+            birth_date=self.birth.date(), gender='M', relation=relation, phone_number='0500000000', **extra
+        )
+
+    def _assert_in_sync(self, client=None):
+        client = client or self.company
+        snapshot = ClientMemberStats.objects.get(client=client)
+        expected = stats.compute([client.pk])[client.pk]
+        self.assertEqual({name: getattr(snapshot, name) for name in stats.FIELDS}, expected)
+
+    def test_snapshot_follows_member_changes(self):
+        principal = self._member('1000000001')
+        stats.client_stats(self.company)
+        spouse = self._member('1000000002', relation='SPOUSE')
+        self._member('1000000003', relation='SISTER', is_active=False)
+        self._assert_in_sync()
+
+        spouse.relation = 'CHILD'
+        spouse.is_active = False
+        spouse.save()
+        self._assert_in_sync()
+
+        other = Client.objects.create(name_ar='أخرى', name_en='Other', commercial_record='CR-2')
+        stats.client_stats(other)
+        principal.client = other
+        principal.save()
+        self._assert_in_sync()
+        self._assert_in_sync(other)
+
+        spouse.delete()
+        self._assert_in_sync()
+        snapshot = stats.client_stats(self.company)
+        self.assertEqual((snapshot.total, snapshot.dependents, snapshot.others, snapshot.inactive), (1, 1, 1, 1))
+
+    def test_dashboard_reads_are_a_single_lookup(self):
+        self._member('1000000001')
+        stats.client_stats(self.company)
+        with self.assertNumQueries(1):
+            self.assertEqual(stats.client_stats(self.company).principals, 1)
+
+    def test_concurrent_first_read_returns_the_stored_snapshot(self):
+        self._member('1000000001')
+        compute = stats.compute
+
+        def racing_compute(client_ids):
+            values = compute(client_ids)
+            # طلب آخر أنشأ اللقطة ثم طبّق عليها عضواً جديداً قبل أن نكتب
+            ClientMemberStats.objects.create(client=self.company, **values[self.company.pk])
+            stats.apply({self.company.pk: Counter(total=1, spouses=1)})
+            return values
+
+        with patch('members.stats.compute', racing_compute):
+            snapshot = stats.client_stats(self.company)
+        self.assertEqual((snapshot.total, snapshot.spouses), (2, 1))
+
+    def test_bulk_upload_updates_snapshot(self):
+        stats.client_stats(self.company)
+        rows = [
+            self._principal('1000000001', 'Principal'),
+            ['1000000002', 'Spouse', '0500000000', self.birth, 'F', 'SPOUSE', '1000000001', None, None, None, None],
+        ]
+        process_bulk_upload(build_upload_file(rows), self.company)
+        self._assert_in_sync()
+
+    def test_rebuild_repairs_updates_that_bypass_signals(self):
+        self._member('1000000001')
+        stats.client_stats(self.company)
+        Member.objects.filter(client=self.company).update(is_active=False)
+
+        self.assertEqual(stats.rebuild(), 1)
+        self._assert_in_sync()
+        self.assertEqual(stats.rebuild(), 0)
@@ -16,6 +16,10 @@ urlpatterns = [
     # Upload / Template
     path('upload/', views_upload.MemberBulkUploadView.as_view(), name='member_bulk_upload'),
     path('upload/template/', views_upload.MemberDownloadTemplateView.as_view(), name='member_download_template'),
+    path('upload/jobs/<uuid:pk>/', views_upload.MemberUploadJobDetailView.as_view(), name='upload_job_detail'),
+    path('upload/jobs/<uuid:pk>/progress/', views_upload.MemberUploadJobProgressView.as_view(), name='upload_job_progress'),
+    path('upload/jobs/<uuid:pk>/retry/', views_upload.MemberUploadJobRetryView.as_view(), name='upload_job_retry'),
+    path('upload/jobs/<uuid:pk>/report/', views_upload.MemberUploadJobReportView.as_view(), name='upload_job_report'),
 
     # AJAX / HTMX
     path('ajax/load-policy-classes/', views.load_policy_classes, name='ajax_load_policy_classes'),
@@ -24,4 +28,5 @@ urlpatterns = [
     path('dashboard/', views.my_dashboard, name='member_dashboard'),
     path('my-family/', views.my_family_members, name='my_family_members'),
     path('my-hospitals/', views.my_hospitals, name='my_hospitals'),
+    path('my-hospitals/nearest/', views.my_nearest_hospitals, name='my_nearest_hospitals'),
 ]
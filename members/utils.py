@@ -3,8 +3,7 @@ from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
 from io import BytesIO
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q
-from accounts.models import User
+from core.scope import get_scope
 
 def generate_empty_template():
     """
@@ -55,208 +54,384 @@ def generate_empty_template():
     stream.seek(0)
     return stream
 
+def generate_failure_report(results):
+    """
+    Builds an Excel report of the failed rows of a bulk upload.
+    Returns a BytesIO object containing the workbook.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Failed Rows")
+    ws.append(["Row", "Name", "National ID", "Error"])
+    for item in results.get('failed', []):
+        ws.append([item.get('row'), item.get('name'), item.get('nid', ''), item.get('error')])
+
+    stream = BytesIO()
+    wb.save(stream)
+    stream.seek(0)
+    return stream
+
+from . import stats as member_stats
 from .models import Member
-from clients.models import Client, SponsorNumber, get_group_root
+from clients.models import Client, SponsorNumber, group_root_id
 from policies.models import PolicyClass
-from django.db import transaction
+from django.db import IntegrityError, transaction
+
+# عدد الصفوف في كل دفعة (جلب مسبق + bulk_create داخل معاملة واحدة)
+BULK_UPLOAD_CHUNK_SIZE = 500
+
+GENDER_MAP = {'MALE': 'M', 'M': 'M', 'FEMALE': 'F', 'F': 'F'}
+RELATION_MAP = {
+    'PRINCIPAL': 'PRINCIPAL', 'EMPLOYEE': 'PRINCIPAL',
+    'SPOUSE': 'SPOUSE', 'CHILD': 'CHILD',
+    'SON': 'CHILD', 'DAUGHTER': 'CHILD',
+    'PARENT': 'PARENT', 'BROTHER': 'BROTHER', 'SISTER': 'SISTER',
+    'OTHER': 'OTHER'
+}
+
 
-def process_bulk_upload(file, client):
+class UploadInterrupted(Exception):
     """
-    Parses the uploaded Excel file and processes members.
-    Returns a dict with 'success' list and 'failed' list.
+    A chunk raised an unexpected error. ``results`` holds only what was
+    committed: the first ``committed_rows`` data rows, ending before sheet
+    row ``row`` — pass it back to process_bulk_upload() to resume.
     """
-    wb = openpyxl.load_workbook(file)
-    ws = wb.active
-    
-    results = {
-        'success': [],
-        'failed': [],
-        'total_rows': 0
-    }
-    
-    # 1. Read all rows to avoid processing duplicates within the file itself
-    rows = list(ws.iter_rows(min_row=2, values_only=True))
-    results['total_rows'] = len(rows)
-    
-    processed_nids = set() # To track duplicates inside the file
-    
-    # national_id is now a normal CharField, so we can query the DB directly
-    member_cache = {}
-
-    # Validation loop
-    for index, row in enumerate(rows, start=2):
-        # Unpack row (handle potentially empty rows or extra columns carefully)
-        try:
-            # Skip empty rows
-            if not any(row):
-                continue
 
-            nid = str(row[0]).strip() if row[0] else None
-            full_name = str(row[1]).strip() if row[1] else None
-            mobile = str(row[2]).strip() if row[2] else None
-            birth_date = row[3] # Should be datetime or date
-            gender = str(row[4]).strip().upper() if row[4] else None
-            relation = str(row[5]).strip().upper() if row[5] else None
-            sponsor_nid = str(row[6]).strip() if row[6] else None
-            sponsor_number_str = str(row[7]).strip() if row[7] else None
-            policy_class_name = str(row[8]).strip() if row[8] else None # Optional
-            medical_card = str(row[9]).strip() if row[9] else None # Optional
-            address = str(row[10]).strip() if row[10] else "" # Optional
-        except Exception as e:
-            results['failed'].append({
-                'row': index, 
-                'name': 'Unknown', 
-                'error': f"Formatting Error: {str(e)}"
-            })
-            continue
+    def __init__(self, row, committed_rows, results):
+        super().__init__(f"row {row}")
+        self.row = row
+        self.committed_rows = committed_rows
+        self.results = results
 
-        # Basic Required Checks
-        if not nid or not full_name or not mobile or not birth_date or not gender or not relation:
-            results['failed'].append({'row': index, 'name': full_name or 'Unknown', 'error': "Missing required fields"})
-            continue
-            
-        # Check in-file duplicate
-        if nid in processed_nids:
-             results['failed'].append({'row': index, 'name': full_name, 'error': "Duplicate National ID in file"})
-             continue
-        processed_nids.add(nid)
-
-        # Check in-DB duplicate via direct query (national_id is now a normal field)
-        existing_member = member_cache.get(nid) or Member.objects.select_related('client').filter(national_id=nid).first()
-        if existing_member:
-            # Check context
-            if existing_member.client == client:
-                msg = "Member already exists in this company"
-            else:
-                msg = f"Member exists in another company: {existing_member.client.name_en}"
-            
-            results['failed'].append({'row': index, 'name': full_name, 'error': msg, 'nid': nid})
-            continue
-            
-        # Logic for Sponsor / Policy Class
-        sponsor_obj = None
-        target_policy_class = None
-        target_sponsor_number = None
-
-        # Resolve Sponsor Number (ضمن مجموعة القابضة للعميل)
-        group_root = get_group_root(client)
-        if sponsor_number_str:
-            target_sponsor_number = SponsorNumber.objects.filter(
-                sponsor_number=sponsor_number_str,
-                group=group_root,
-                is_active=True,
-            ).first()
-            if not target_sponsor_number:
-                results['failed'].append({
-                    'row': index, 'name': full_name,
-                    'error': f"Invalid Sponsor Number: {sponsor_number_str} (not found in this holding group)"
-                })
-                continue
-        
-        # Resolve Sponsor if dependent
-        if relation != 'PRINCIPAL' and relation != 'EMPLOYEE':
-            if not sponsor_nid:
-                results['failed'].append({'row': index, 'name': full_name, 'error': "Sponsor ID required for dependents"})
+
+class _UploadState:
+    """
+    حالة المعالجة المشتركة بين الدفعات: الكاشات المحمّلة مسبقاً + ما تم إنشاؤه من الملف.
+    """
+
+    def __init__(self, client, results=None):
+        self.client = client
+        self.results = results or {'success': [], 'failed': [], 'total_rows': 0}
+        # ما حُفظ نهائياً: عدد الصفوف وطول قائمتي النتائج عندها
+        self.committed_rows = self.results['total_rows']
+        self.committed_marks = (len(self.results['success']), len(self.results['failed']))
+        self.current_row = None
+        self.processed_nids = set()   # لتتبع التكرار داخل الملف
+        self.member_cache = {}        # الأعضاء المنشأون من هذا الملف (ليجدهم التابعون)
+        self.existing = {}            # national_id -> Member موجود مسبقاً (أي شركة) — للدفعة الحالية
+        self.db_sponsors = {}         # national_id -> Member كفيل في نفس الشركة — للدفعة الحالية
+        self.birth_date_field = Member._meta.get_field('birth_date')
+
+        # أرقام الكفيل النشطة ضمن مجموعة القابضة (استعلام واحد بدلاً من استعلام لكل صف)
+        self.sponsor_numbers = {
+            sn.sponsor_number: sn
+            for sn in SponsorNumber.objects.filter(group_id=group_root_id(client), is_active=True)
+        }
+
+        # فئات الوثيقة: الشركة نفسها أولاً، ثم وثائق الشركة الأم (الوثائق الأم فقط)
+        self.own_classes = self._classes_by_name(PolicyClass.objects.filter(policy__client=client))
+        self.parent_classes = {}
+        if client.parent_id:
+            self.parent_classes = self._classes_by_name(PolicyClass.objects.filter(
+                policy__client_id=client.parent_id,
+                policy__master_policy__isnull=True,
+            ))
+
+    @staticmethod
+    def _classes_by_name(queryset):
+        # .first() على QuerySet غير مرتب يرتب حسب pk — نحافظ على نفس الاختيار
+        by_name = {}
+        for pc in queryset.order_by('pk'):
+            by_name.setdefault(pc.name.lower(), pc)
+        return by_name
+
+    def prefetch(self, rows):
+        """جلب كل الأعضاء المشار إليهم في الدفعة باستعلامين فقط."""
+        nids, sponsor_nids = set(), set()
+        for _, row in rows:
+            try:
+                if row[0]:
+                    nids.add(str(row[0]).strip())
+                if row[6]:
+                    sponsor_nids.add(str(row[6]).strip())
+            except IndexError:
                 continue
-                
-            # Look for sponsor via cache or DB query
-            sponsor_obj = member_cache.get(sponsor_nid) or Member.objects.select_related('client', 'policy_class').filter(national_id=sponsor_nid, client=client).first()
-            
-            # Additional check: Sponsor must belong to the SAME client
-            if not sponsor_obj or sponsor_obj.client != client:
-                 results['failed'].append({'row': index, 'name': full_name, 'error': f"Sponsor not found in this client (ID: {sponsor_nid})"})
-                 continue
-            
-            # التابع يرث رقم الكفيل من رب الأسرة إن لم يُحدد
-            if not target_sponsor_number and sponsor_obj.sponsor_number_id:
-                target_sponsor_number = sponsor_obj.sponsor_number
-            
-            # Policy Class Check - Must match Sponsor
-            sponsor_class = sponsor_obj.policy_class
-            target_policy_class = sponsor_class
-            
-            if policy_class_name:
-                # If provided, verify strict match
-                if policy_class_name.lower() != sponsor_class.name.lower(): 
-                     results['failed'].append({
-                         'row': index, 
-                         'name': full_name, 
-                         'error': f"Policy Class Mismatch: Sponsor is '{sponsor_class.name}', provided '{policy_class_name}'"
-                     })
-                     continue
+        self.existing = {
+            m.national_id: m
+            for m in Member.objects.select_related('client').filter(national_id__in=nids)
+        }
+        self.db_sponsors = {
+            m.national_id: m
+            for m in Member.objects.select_related('client', 'policy_class', 'sponsor_number').filter(
+                national_id__in=sponsor_nids, client=self.client,
+            )
+        }
+
+    def resolve_policy_class(self, name):
+        key = name.lower()
+        return self.own_classes.get(key) or self.parent_classes.get(key)
+
+    def commit(self, rows):
+        self.committed_rows += rows
+        self.committed_marks = (len(self.results['success']), len(self.results['failed']))
+
+    def committed_results(self):
+        """النتائج حتى آخر صف محفوظ — تُسقط نتائج الدفعة التي لم تكتمل."""
+        success_mark, failed_mark = self.committed_marks
+        return {
+            'success': self.results['success'][:success_mark],
+            'failed': self.results['failed'][:failed_mark],
+            'total_rows': self.committed_rows,
+        }
+
+
+def _validate_row(state, index, row):
+    """
+    التحقق من صف واحد بالكامل في الذاكرة.
+    يُرجع (Member, None) عند النجاح أو (None, failure_dict) عند الفشل —
+    بنفس رسائل الأخطاء وترتيب الفحوصات المعتاد.
+    """
+    client = state.client
+    # Unpack row (handle potentially empty rows or extra columns carefully)
+    try:
+        nid = str(row[0]).strip() if row[0] else None
+        full_name = str(row[1]).strip() if row[1] else None
+        mobile = str(row[2]).strip() if row[2] else None
+        birth_date = row[3] # Should be datetime or date
+        gender = str(row[4]).strip().upper() if row[4] else None
+        relation = str(row[5]).strip().upper() if row[5] else None
+        sponsor_nid = str(row[6]).strip() if row[6] else None
+        sponsor_number_str = str(row[7]).strip() if row[7] else None
+        policy_class_name = str(row[8]).strip() if row[8] else None # Optional
+        medical_card = str(row[9]).strip() if row[9] else None # Optional
+        address = str(row[10]).strip() if row[10] else "" # Optional
+    except Exception as e:
+        return None, {'row': index, 'name': 'Unknown', 'error': f"Formatting Error: {str(e)}"}
+
+    # Basic Required Checks
+    if not nid or not full_name or not mobile or not birth_date or not gender or not relation:
+        return None, {'row': index, 'name': full_name or 'Unknown', 'error': "Missing required fields"}
+
+    # Check in-file duplicate
+    if nid in state.processed_nids:
+        return None, {'row': index, 'name': full_name, 'error': "Duplicate National ID in file"}
+    state.processed_nids.add(nid)
+
+    # Check in-DB duplicate (prefetched for the whole chunk)
+    existing_member = state.member_cache.get(nid) or state.existing.get(nid)
+    if existing_member:
+        if existing_member.client == client:
+            msg = "Member already exists in this company"
         else:
-            # RELATION == PRINCIPAL or EMPLOYEE
-            if not target_sponsor_number:
-                results['failed'].append({'row': index, 'name': full_name, 'error': "Sponsor Number required for Principal/Employee"})
-                continue
+            msg = f"Member exists in another company: {existing_member.client.name_en}"
+        return None, {'row': index, 'name': full_name, 'error': msg, 'nid': nid}
 
-            if not policy_class_name:
-                 results['failed'].append({'row': index, 'name': full_name, 'error': "Policy Class required for Principal/Employee"})
-                 continue
-            
-            # Find class by Name within Client context
-            # Try direct match
-            candidates = PolicyClass.objects.filter(
-                name__iexact=policy_class_name, 
-                policy__client=client
-            )
-            # Try parent company policies if applicable (Shared policies)
-            if not candidates.exists() and client.parent:
-                 candidates = PolicyClass.objects.filter(
-                    name__iexact=policy_class_name, 
-                    policy__client=client.parent,
-                    policy__master_policy__isnull=True
-                 )
-            
-            if not candidates.exists():
-                results['failed'].append({'row': index, 'name': full_name, 'error': f"Invalid Policy Class: {policy_class_name}"})
-                continue
-            
-            target_policy_class = candidates.first()
-
-        try:
-            # Map Gender / Relation keys
-            g_map = {'MALE': 'M', 'M': 'M', 'FEMALE': 'F', 'F': 'F'}
-            r_map = {
-                'PRINCIPAL': 'PRINCIPAL', 'EMPLOYEE': 'PRINCIPAL',
-                'SPOUSE': 'SPOUSE', 'CHILD': 'CHILD', 
-                'SON': 'CHILD', 'DAUGHTER': 'CHILD',
-                'PARENT': 'PARENT', 'BROTHER': 'BROTHER', 'SISTER': 'SISTER',
-                'OTHER': 'OTHER'
+    sponsor_obj = None
+    target_policy_class = None
+    target_sponsor_number = None
+
+    # Resolve Sponsor Number (ضمن مجموعة القابضة للعميل)
+    if sponsor_number_str:
+        target_sponsor_number = state.sponsor_numbers.get(sponsor_number_str)
+        if not target_sponsor_number:
+            return None, {
+                'row': index, 'name': full_name,
+                'error': f"Invalid Sponsor Number: {sponsor_number_str} (not found in this holding group)"
             }
-            
-            clean_gender = g_map.get(gender.upper())
-            clean_relation = r_map.get(relation.upper(), 'OTHER')
-            
-            if not clean_gender:
-                 results['failed'].append({'row': index, 'name': full_name, 'error': "Invalid Gender"})
-                 continue
-            
-            member = Member(
-                client=client,
-                full_name=full_name,
-                national_id=nid,
-                phone_number=mobile,
-                birth_date=birth_date,
-                gender=clean_gender,
-                relation=clean_relation,
-                sponsor=sponsor_obj,
-                sponsor_number=target_sponsor_number,
-                policy_class=target_policy_class,
-                medical_card_number=medical_card,
-                national_address=address
-            )
-            member.save()
-            results['success'].append({'row': index, 'name': full_name, 'nid': nid})
-            
-            # Update cache so subsequent rows can find this sponsor
-            member_cache[nid] = member
-            
-        except Exception as e:
-            results['failed'].append({'row': index, 'name': full_name, 'error': f"Save Error: {str(e)}"})
+
+    # Resolve Sponsor if dependent
+    if relation != 'PRINCIPAL' and relation != 'EMPLOYEE':
+        if not sponsor_nid:
+            return None, {'row': index, 'name': full_name, 'error': "Sponsor ID required for dependents"}
+
+        sponsor_obj = state.member_cache.get(sponsor_nid) or state.db_sponsors.get(sponsor_nid)
+
+        # Additional check: Sponsor must belong to the SAME client
+        if not sponsor_obj or sponsor_obj.client != client:
+            return None, {'row': index, 'name': full_name, 'error': f"Sponsor not found in this client (ID: {sponsor_nid})"}
+
+        # التابع يرث رقم الكفيل من رب الأسرة إن لم يُحدد
+        if not target_sponsor_number and sponsor_obj.sponsor_number_id:
+            target_sponsor_number = sponsor_obj.sponsor_number
+
+        # Policy Class Check - Must match Sponsor
+        sponsor_class = sponsor_obj.policy_class
+        target_policy_class = sponsor_class
+
+        if policy_class_name and policy_class_name.lower() != sponsor_class.name.lower():
+            return None, {
+                'row': index,
+                'name': full_name,
+                'error': f"Policy Class Mismatch: Sponsor is '{sponsor_class.name}', provided '{policy_class_name}'"
+            }
+    else:
+        # RELATION == PRINCIPAL or EMPLOYEE
+        if not target_sponsor_number:
+            return None, {'row': index, 'name': full_name, 'error': "Sponsor Number required for Principal/Employee"}
+
+        if not policy_class_name:
+            return None, {'row': index, 'name': full_name, 'error': "Policy Class required for Principal/Employee"}
+
+        target_policy_class = state.resolve_policy_class(policy_class_name)
+        if not target_policy_class:
+            return None, {'row': index, 'name': full_name, 'error': f"Invalid Policy Class: {policy_class_name}"}
+
+    clean_gender = GENDER_MAP.get(gender.upper())
+    clean_relation = RELATION_MAP.get(relation.upper(), 'OTHER')
+
+    if not clean_gender:
+        return None, {'row': index, 'name': full_name, 'error': "Invalid Gender"}
+
+    # تحويل التاريخ هنا بدلاً من اكتشاف الخطأ عند الحفظ
+    try:
+        birth_date = state.birth_date_field.to_python(birth_date)
+    except Exception as e:
+        return None, {'row': index, 'name': full_name, 'error': f"Save Error: {str(e)}"}
+
+    member = Member(
+        client=client,
+        full_name=full_name,
+        national_id=nid,
+        phone_number=mobile,
+        birth_date=birth_date,
+        gender=clean_gender,
+        relation=clean_relation,
+        sponsor=sponsor_obj,
+        sponsor_number=target_sponsor_number,
+        policy_class=target_policy_class,
+        medical_card_number=medical_card,
+        national_address=address
+    )
+    return member, None
+
+
+def _process_chunk(state, rows):
+    """
+    معالجة دفعة: تحقق في الذاكرة ثم bulk_create واحد داخل معاملة.
+    إذا رفضت قاعدة البيانات الدفعة (مثلاً تكرار رقم البطاقة الطبية) نعيد
+    معالجة نفس الدفعة صفاً بصف لإنتاج نفس تقرير الأخطاء لكل صف.
+    """
+    results = state.results
+    success_mark, failed_mark = len(results['success']), len(results['failed'])
+    added_nids = []
+    pending = []
+
+    state.prefetch(rows)
+
+    for index, row in rows:
+        if not any(row):
             continue
+        state.current_row = index
+        before = len(state.processed_nids)
+        member, failure = _validate_row(state, index, row)
+        if len(state.processed_nids) != before:
+            added_nids.append(str(row[0]).strip())
+        if failure:
+            results['failed'].append(failure)
+            continue
+        pending.append(member)
+        state.member_cache[member.national_id] = member
+        results['success'].append({'row': index, 'name': member.full_name, 'nid': member.national_id})
+
+    if not pending:
+        state.commit(len(rows))
+        return
+
+    for member in pending:
+        member.sync_tenant_keys()  # bulk_create لا يمر بـ save()
+    state.current_row = rows[0][0]  # الإدراج للدفعة كلها — لا صف بعينه
+    try:
+        with transaction.atomic():
+            Member.objects.bulk_create(pending)
+            member_stats.record_created(pending)
+        state.commit(len(rows))
+        return
+    except IntegrityError:
+        # قيد فريد رفض الدفعة — أي خطأ آخر (انقطاع، قفل...) يُوقف المهمة عند هذا الصف
+        pass
+
+    # التراجع عن حالة الدفعة ثم إعادة المعالجة صفاً بصف
+    del results['success'][success_mark:]
+    del results['failed'][failed_mark:]
+    for nid in added_nids:
+        state.processed_nids.discard(nid)
+        state.member_cache.pop(nid, None)
+
+    for index, row in rows:
+        state.current_row = index
+        _save_row(state, index, row)
+        state.commit(1)
+
 
-    return results
+def _save_row(state, index, row):
+    """مسار صف بصف بعد رفض الدفعة: تحقق ثم save() في نقطة حفظ مستقلة."""
+    results = state.results
+    if not any(row):
+        return
+    member, failure = _validate_row(state, index, row)
+    if failure:
+        results['failed'].append(failure)
+        return
+    try:
+        with transaction.atomic():
+            member.save()
+    except Exception as e:
+        results['failed'].append({'row': index, 'name': member.full_name, 'error': f"Save Error: {str(e)}"})
+        return
+    results['success'].append({'row': index, 'name': member.full_name, 'nid': member.national_id})
+    # Update cache so subsequent rows can find this sponsor
+    state.member_cache[member.national_id] = member
+
+
+def process_bulk_upload(file, client, chunk_size=BULK_UPLOAD_CHUNK_SIZE, progress=None, results=None):
+    """
+    Parses the uploaded Excel file and processes members.
+    Returns a dict with 'success' list and 'failed' list.
+
+    The workbook is streamed in read-only mode and handled in chunks: every
+    chunk prefetches the national IDs it references in two queries, validates
+    rows in memory and inserts the valid ones with a single bulk_create.
+
+    progress: optional callable(results, expected_rows) invoked after every
+    chunk; expected_rows comes from the sheet dimensions and may be None.
+
+    results: the committed results of an interrupted run — its first
+    ``total_rows`` data rows are skipped and the lists extended. A chunk
+    that raises is wrapped in UploadInterrupted, carrying the row it was on
+    and the results committed so far.
+    """
+    wb = openpyxl.load_workbook(file, read_only=True)
+    try:
+        ws = wb.active
+        expected_rows = max(ws.max_row - 1, 0) if ws.max_row else None
+        state = _UploadState(client, results)
+        skip = state.committed_rows
+        chunk = []
+        for index, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            if index - 2 < skip:
+                continue  # حُفظ في محاولة سابقة
+            state.results['total_rows'] += 1
+            chunk.append((index, row))
+            if len(chunk) >= chunk_size:
+                _run_chunk(state, chunk)
+                chunk = []
+                if progress:
+                    progress(state.results, expected_rows)
+        if chunk:
+            _run_chunk(state, chunk)
+            if progress:
+                progress(state.results, expected_rows)
+    finally:
+        wb.close()
+
+    return state.results
+
+
+def _run_chunk(state, chunk):
+    state.current_row = chunk[0][0]
+    try:
+        _process_chunk(state, chunk)
+    except Exception as e:
+        raise UploadInterrupted(state.current_row, state.committed_rows, state.committed_results()) from e
 
 
 # ==========================================
@@ -266,22 +441,5 @@ def get_allowed_members(user):
     """
     تُرجع المشتركين المسموح للمستخدم رؤيتهم بناءً على دوره.
     """
-    # 1. السوبر أدمن يرى كل المشتركين
-    if user.role == User.Roles.SUPER_ADMIN:
-        return Member.objects.all()
-
-    # 2. الوسيط يرى مشتركي العملاء التابعين لشركته فقط
-    elif user.is_broker_role and user.related_broker:
-        return Member.objects.filter(client__broker=user.related_broker)
-
-    # 3. مدير الموارد البشرية (HR) يرى مشتركي شركته فقط
-    elif user.is_hr_role and user.related_client:
-        return Member.objects.filter(client=user.related_client)
-
-    # 4. العضو نفسه (يرى نفسه والتابعين له فقط)
-    elif user.is_member_role and hasattr(user, 'member_profile'):
-        return Member.objects.filter(
-            Q(id=user.member_profile.id) | Q(sponsor=user.member_profile)
-        )
-
-    return Member.objects.none()
+    # السوبر أدمن: الكل | الوسيط: مشتركو شركاته | الـ HR: مشتركو شركته | العضو: نفسه والتابعون له
+    return get_scope(user).restrict(Member.objects.all(), broker='broker', client='client', member='pk')
@@ -1,14 +1,19 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db.models import Count, Max, Q
 from django.core.paginator import Paginator
+from django.http import JsonResponse
 from .models import Member
 from .forms import MemberForm
 from .utils import get_allowed_members
 from clients.models import Client, SponsorNumber
-from accounts.models import User
+from core.conditional import conditional, versions
+from core.scope import Scope, get_scope
+from policies import coverage
 from networks.models import ServiceProvider
+from networks.geo import nearest_providers
+from networks.search import class_city_facets, search_providers
 from service_requests.models import ServiceRequest
 from claims.models import Claim
 
@@ -47,10 +52,9 @@ def member_list(request):
     page_obj = paginator.get_page(page_number)
 
     # للفلترة في القالب (نجلب فقط العملاء المسموحين لهذا المستخدم بدلاً من كل العملاء)
-    if request.user.role == User.Roles.SUPER_ADMIN:
-        clients = Client.objects.all()
-    elif request.user.is_broker_role and request.user.related_broker:
-        clients = Client.objects.filter(broker=request.user.related_broker)
+    scope = get_scope(request.user)
+    if scope.kind in (Scope.ALL, Scope.BROKER):
+        clients = scope.restrict(Client.objects.all(), broker='broker')
     else:
         clients = []
 
@@ -108,6 +112,7 @@ def member_detail(request, pk):
 
     return render(request, 'members/member_detail.html', {
         'member': member,
+        'coverage': coverage.for_class(member.policy_class_id),
         'stats': stats,
         'default_tab': default_tab,
     })
@@ -192,12 +197,13 @@ def load_policy_classes(request):
     user = request.user
     
     # حماية أمنية (Security Check)
-    if user.role == User.Roles.SUPER_ADMIN:
+    scope = get_scope(user)
+    if scope.kind == Scope.ALL:
         has_access = True
-    elif user.is_broker_role and user.related_broker:
-        has_access = Client.objects.filter(id=client_id, broker=user.related_broker).exists()
-    elif user.is_hr_role and user.related_client:
-        has_access = (str(user.related_client.id) == str(client_id))
+    elif scope.kind == Scope.BROKER:
+        has_access = Client.objects.filter(id=client_id, broker_id=scope.broker_id).exists()
+    elif scope.kind == Scope.HR:
+        has_access = (str(scope.client_id) == str(client_id))
     else:
         has_access = False
 
@@ -222,9 +228,9 @@ def load_policy_classes(request):
     sponsors = Member.objects.filter(client_id=client_id, relation='PRINCIPAL').only('id', 'full_name')
 
     # 3. جلب أرقام الكفيلة ضمن مجموعة القابضة (تسمح بالشقيقات)
-    from clients.models import get_group_root
+    from clients.models import group_root_id
     sponsor_numbers = SponsorNumber.objects.filter(
-        group=get_group_root(client_obj),
+        group_id=group_root_id(client_obj),
         is_active=True,
     ).select_related('owner_client')
 
@@ -275,7 +281,16 @@ def my_family_members(request):
     
     return render(request, 'members/my_family_members.html', {'members': members})
 
+def my_hospitals_version(request):
+    """مزودو الفئة وبياناتهم لم يتغيروا؟ (تحدّثه provider_sets و networks/signals)"""
+    class_id = Member.objects.filter(user=request.user).values_list('policy_class_id', flat=True).first()
+    if class_id is None:
+        return None
+    return class_id, versions('providers', f'class-providers:{class_id}')
+
+
 @login_required
+@conditional(my_hospitals_version, templates=['members/partials/hospital_list_content.html'])
 def my_hospitals(request):
     """قائمة المستشفيات الخاصة بشبكة العضو (موبيل-فيرست)"""
     try:
@@ -285,15 +300,16 @@ def my_hospitals(request):
         return redirect('members:member_dashboard')
 
     policy_class = current_member.policy_class
-    network = policy_class.network if policy_class else None
+    network = policy_class.effective_network if policy_class else None
 
-    if not network:
+    # الشبكة الفعلية للفئة (بعد الاستثناءات والإضافات) — join واحد على الجدول المحسوب
+    if not policy_class:
         hospitals = ServiceProvider.objects.none()
     else:
-        hospitals = network.hospitals.all()
+        hospitals = policy_class.get_effective_providers()
 
-    # Filters prep
-    cities = hospitals.values_list('city', flat=True).distinct().order_by('city')
+    # Filters prep (المدن مخزنة مؤقتاً لكل فئة)
+    cities = class_city_facets(policy_class) if policy_class else []
     types_choices = ServiceProvider.ProviderTypes.choices
 
     search_query = request.GET.get('search', '')
@@ -301,11 +317,8 @@ def my_hospitals(request):
     type_filter = request.GET.get('type', '')
 
     if search_query:
-        hospitals = hospitals.filter(
-            Q(name_ar__icontains=search_query) | 
-            Q(name_en__icontains=search_query) |
-            Q(city__icontains=search_query)
-        )
+        # بحث بالبادئة على فهرس الكلمات المطبّعة (عربي/إنجليزي) بدلاً من icontains
+        hospitals = search_providers(hospitals, search_query)
     if city_filter:
         hospitals = hospitals.filter(city=city_filter)
     if type_filter:
@@ -331,12 +344,79 @@ def my_hospitals(request):
     return render(request, 'members/my_hospitals.html', context)
 
 
+NEAREST_HOSPITALS_MAX = 50
+
+
+@login_required
+def my_nearest_hospitals(request):
+    """
+    JSON: أقرب المستشفيات داخل الشبكة الفعلية للعضو لإحداثياته الحالية.
+    GET ?lat=24.7&lng=46.6[&type=PHARMACY][&limit=10]
+    """
+    try:
+        current_member = request.user.member_profile
+    except Member.DoesNotExist:
+        return JsonResponse({'error': 'no member profile'}, status=404)
+
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+        limit = min(int(request.GET.get('limit', 10)), NEAREST_HOSPITALS_MAX)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lng are required numbers'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or limit < 1:
+        return JsonResponse({'error': 'coordinates out of range'}, status=400)
+
+    policy_class = current_member.policy_class
+    if not policy_class:
+        return JsonResponse({'results': []})
+
+    hospitals = policy_class.get_effective_providers()
+    type_filter = request.GET.get('type', '')
+    if type_filter:
+        hospitals = hospitals.filter(type=type_filter)
+
+    results = [
+        {
+            'id': str(provider.pk),
+            'name_ar': provider.name_ar,
+            'name_en': provider.name_en,
+            'type': provider.type,
+            'city': provider.city,
+            'latitude': float(provider.latitude),
+            'longitude': float(provider.longitude),
+            'distance_km': distance,
+        }
+        for provider, distance in nearest_providers(hospitals, lat, lng, limit=limit)
+    ]
+    return JsonResponse({'results': results})
+
+
 # ==========================================
 # Tab Partials — HTMX lazy loading
 # ==========================================
 
+def member_tab_version(relation, field):
+    """
+    (عدد، أحدث field) لعلاقة عضو مسموح به — استعلام تجميعي واحد بدلاً من عرض التبويب.
+    None خارج نطاق المستخدم فيعمل العرض ويعيد 404.
+    """
+    def token(request, pk):
+        return get_allowed_members(request.user).filter(pk=pk).annotate(
+            count=Count(relation), latest=Max(f'{relation}__{field}'),
+        ).values_list('count', 'latest').first()
+    return token
+
+
+def member_tab_dependents_version(request, pk):
+    # التعديلات لا تغيّر created_at — عدّاد العائلة ترفعه members/signals.py
+    rows = member_tab_version('dependents', 'created_at')(request, pk)
+    return rows and (rows, versions(f'family:{pk}'))
+
+
 @login_required
 @permission_required('members.view_member', raise_exception=True)
+@conditional(member_tab_dependents_version, templates=['members/partials/tab_dependents.html'])
 def member_tab_dependents(request, pk):
     member = get_object_or_404(get_allowed_members(request.user), pk=pk)
     dependents = member.dependents.select_related('policy_class').order_by('full_name')
@@ -348,6 +428,7 @@ def member_tab_dependents(request, pk):
 
 @login_required
 @permission_required('members.view_member', raise_exception=True)
+@conditional(member_tab_version('service_requests', 'updated_at'), templates=['members/partials/tab_requests.html'])
 def member_tab_requests(request, pk):
     member = get_object_or_404(get_allowed_members(request.user), pk=pk)
     service_requests = member.service_requests.select_related('request_type').order_by('-created_at')
@@ -359,6 +440,7 @@ def member_tab_requests(request, pk):
 
 @login_required
 @permission_required('members.view_member', raise_exception=True)
+@conditional(member_tab_version('claims', 'updated_at'), templates=['members/partials/tab_claims.html'])
 def member_tab_claims(request, pk):
     member = get_object_or_404(get_allowed_members(request.user), pk=pk)
     claims = member.claims.order_by('-created_at')
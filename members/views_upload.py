@@ -1,12 +1,14 @@
 from django.views import View
 from django.http import HttpResponse
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from .utils import generate_empty_template, process_bulk_upload
+from .utils import generate_empty_template, generate_failure_report
 import datetime
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib import messages
 from .forms_upload import MemberUploadForm
+from .jobs import enqueue_upload_job, is_stale, recover_stale_jobs, retry_job
+from .models import MemberUploadJob
 from accounts.models import User
 
 class MemberDownloadTemplateView(LoginRequiredMixin, View):
@@ -44,14 +46,83 @@ class MemberBulkUploadView(LoginRequiredMixin, PermissionRequiredMixin, View):
                 messages.error(request, "حدث خطأ: لم يتم تحديد الشركة المراد رفع البيانات لها.")
                 return render(request, self.template_name, {'form': form})
             
-            # معالجة الملف
-            results = process_bulk_upload(file, client)
+            # المعالجة تتم في الخلفية — نحفظ الملف كمهمة ونعرض صفحة التقدم
+            job = MemberUploadJob.objects.create(
+                client=client,
+                uploaded_by=request.user,
+                file=file,
+                original_filename=file.name,
+            )
+            enqueue_upload_job(job)
+            return redirect('members:upload_job_detail', pk=job.pk)
             
-            # إعادة عرض الصفحة مع النتائج
-            return render(request, self.template_name, {
-                'form': MemberUploadForm(user=request.user), # فورم جديد لعملية رفع أخرى
-                'results': results,
-                'client': client
-            })
-            
-        return render(request, self.template_name, {'form': form})
\ No newline at end of file
+        return render(request, self.template_name, {'form': form})
+
+
+def get_allowed_upload_jobs(user):
+    """مهام الرفع: السوبر أدمن يرى الكل، وغيره يرى المهام التي رفعها فقط."""
+    qs = MemberUploadJob.objects.select_related('client')
+    if user.role == User.Roles.SUPER_ADMIN:
+        return qs
+    return qs.filter(uploaded_by=user)
+
+
+class MemberUploadJobDetailView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    template_name = 'members/bulk_upload.html'
+    permission_required = 'members.add_member'
+
+    def get(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(get_allowed_upload_jobs(request.user), pk=pk)
+        return render(request, self.template_name, {
+            'form': MemberUploadForm(user=request.user), # فورم جديد لعملية رفع أخرى
+            'job': job,
+            'results': job.results if job.status == MemberUploadJob.Status.COMPLETED else None,
+            'client': job.client,
+        })
+
+
+class MemberUploadJobProgressView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """HTMX partial — يُستدعى كل ثانيتين حتى تنتهي المهمة."""
+    permission_required = 'members.add_member'
+
+    def get(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(get_allowed_upload_jobs(request.user), pk=pk)
+        # مهمة مات عاملها تظهر فاشلة بدل التقدم إلى الأبد (وضع 'thread' بلا عامل مستقل)
+        if is_stale(job) and recover_stale_jobs(pk=job.pk):
+            job.refresh_from_db()
+        response = render(request, 'members/partials/upload_job_progress.html', {'job': job})
+        if job.is_finished and job.status == MemberUploadJob.Status.COMPLETED:
+            # إعادة تحميل الصفحة لعرض جداول النتائج الكاملة
+            response['HX-Refresh'] = 'true'
+        return response
+
+
+class MemberUploadJobRetryView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """إعادة تشغيل مهمة فاشلة — تستكمل من بعد الصفوف المحفوظة."""
+    permission_required = 'members.add_member'
+
+    def post(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(get_allowed_upload_jobs(request.user), pk=pk)
+        if not retry_job(job):
+            messages.error(request, "لا يمكن إعادة محاولة هذه المهمة.")
+        return redirect('members:upload_job_detail', pk=job.pk)
+
+
+class MemberUploadJobReportView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """تنزيل تقرير الصفوف الفاشلة من النتائج المحفوظة (بدون إعادة معالجة الملف)."""
+    permission_required = 'members.add_member'
+
+    def get(self, request, pk, *args, **kwargs):
+        job = get_object_or_404(
+            get_allowed_upload_jobs(request.user).filter(status=MemberUploadJob.Status.COMPLETED),
+            pk=pk,
+        )
+        stream = generate_failure_report(job.results)
+        response = HttpResponse(
+            content=stream.read(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        timestamp = job.created_at.strftime("%Y-%m-%d")
+        filename = f"members_upload_errors_{timestamp}.xlsx"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NetworksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'networks'
+
+    def ready(self):
+        import networks.signals  # noqa: F401 — keeps the provider search index in sync
@@ -0,0 +1,124 @@
+"""
+Nearest-provider lookup backed by a geohash column on ServiceProvider.
+
+A geohash is a base32 string where every extra character narrows the cell,
+so "all providers in cell X" is an index range scan on the ``geohash``
+column (X <= geohash < X + '{'). To find the N nearest providers we scan the
+member's cell plus its 8 neighbours, starting fine and widening one
+precision level at a time, and only compute haversine distances for those
+candidates. A candidate set is accepted once the N-th nearest lies within
+the distance the 3x3 block is guaranteed to cover.
+"""
+import math
+
+from django.db.models import Q
+
+GEOHASH_PRECISION = 9
+SEARCH_PRECISIONS = (6, 5, 4, 3, 2)
+EARTH_RADIUS_KM = 6371.0088
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# أكبر من كل رموز base32 — حد أعلى لمسح النطاق بالبادئة
+_PREFIX_END = '{'
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) of a cell in degrees."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def neighbourhood(latitude, longitude, precision):
+    """The cell containing the point plus its 8 neighbours (deduplicated)."""
+    height, width = cell_size(precision)
+    cells = set()
+    for dy in (-1, 0, 1):
+        lat = latitude + dy * height
+        if not -90.0 <= lat <= 90.0:
+            continue
+        for dx in (-1, 0, 1):
+            lng = (longitude + dx * width + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lng, precision))
+    return cells
+
+
+def covered_radius_km(latitude, precision):
+    """Distance around the point that the 3x3 block is guaranteed to contain."""
+    height, width = cell_size(precision)
+    height_km = math.radians(height) * EARTH_RADIUS_KM
+    width_km = math.radians(width) * EARTH_RADIUS_KM * math.cos(math.radians(min(abs(latitude), 89.0)))
+    return min(height_km, width_km)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _in_cells(cells):
+    condition = Q()
+    for cell in cells:
+        condition |= Q(geohash__gte=cell, geohash__lt=cell + _PREFIX_END)
+    return condition
+
+
+def _ranked(queryset, latitude, longitude):
+    rows = queryset.values_list('pk', 'latitude', 'longitude')
+    ranked = [
+        (haversine_km(latitude, longitude, float(lat), float(lng)), pk)
+        for pk, lat, lng in rows
+    ]
+    ranked.sort()
+    return ranked
+
+
+def nearest_providers(queryset, latitude, longitude, limit=10):
+    """
+    Return up to ``limit`` (provider, distance_km) pairs from ``queryset``
+    (e.g. a class's effective providers), nearest first.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    located = queryset.exclude(geohash='')
+
+    ranked = None
+    for precision in SEARCH_PRECISIONS:
+        candidates = _ranked(located.filter(_in_cells(neighbourhood(latitude, longitude, precision))),
+                             latitude, longitude)
+        if len(candidates) >= limit and candidates[limit - 1][0] <= covered_radius_km(latitude, precision):
+            ranked = candidates
+            break
+    if ranked is None:
+        # لا توجد كثافة كافية قريباً — نكتفي بكل المستشفيات ذات الإحداثيات
+        ranked = _ranked(located, latitude, longitude)
+
+    ranked = ranked[:limit]
+    providers = queryset.model.objects.in_bulk([pk for _, pk in ranked])
+    return [(providers[pk], round(distance, 2)) for distance, pk in ranked]
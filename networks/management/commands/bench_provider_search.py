@@ -0,0 +1,135 @@
+"""
+Management command: bench_provider_search
+=========================================
+يقيس زمن البحث عن المستشفيات (p50/p95) ضمن الشبكة الفعلية لفئة عضو،
+بالفهرس (search_providers) مقارنةً بـ icontains القديم.
+
+الاستخدام:
+    python manage.py bench_provider_search
+    python manage.py bench_provider_search --providers 50000 --queries 200
+
+تُنشأ البيانات داخل معاملة ويتم التراجع عنها بالكامل بعد القياس.
+"""
+import datetime
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from clients.models import Client
+from networks import search
+from networks.models import Network, ServiceProvider
+from policies.models import Policy, PolicyClass
+from providers.models import Provider
+
+KINDS_AR = ['مستشفى', 'مجمع عيادات', 'مركز', 'صيدلية', 'مختبر', 'مركز بصريات']
+KINDS_EN = ['Hospital', 'Clinics', 'Medical Center', 'Pharmacy', 'Lab', 'Optical']
+SYLLABLES_AR = ['با', 'سل', 'مر', 'كر', 'حم', 'دي', 'نو', 'ري', 'فه', 'عب', 'طا', 'لي', 'زي', 'قا', 'جو', 'شا']
+SYLLABLES_EN = ['ba', 'sal', 'mar', 'kar', 'ham', 'di', 'no', 'ri', 'fah', 'ab', 'ta', 'li', 'zi', 'qa', 'jo', 'sha']
+CITIES = ['الرياض', 'جدة', 'الدمام', 'مكة', 'المدينة', 'الخبر', 'أبها', 'تبوك', 'حائل', 'بريدة']
+
+
+def _family_name(rng):
+    picks = [rng.randrange(len(SYLLABLES_AR)) for _ in range(rng.choice((2, 3, 4)))]
+    return 'ال' + ''.join(SYLLABLES_AR[i] for i in picks), ''.join(SYLLABLES_EN[i] for i in picks).title()
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark in-network provider search latency (indexed vs icontains)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=50000)
+        parser.add_argument('--network-share', type=float, default=0.3)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self._run(rng, options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, rng, options):
+        count = options['providers']
+        self.stdout.write(f"Creating {count} providers...")
+        rows = []
+        for _ in range(count):
+            kind = rng.randrange(len(KINDS_AR))
+            family_ar, family_en = _family_name(rng)
+            rows.append(ServiceProvider(
+                name_ar=f"{KINDS_AR[kind]} {family_ar}",
+                name_en=f"{family_en} {KINDS_EN[kind]}",
+                type=rng.choice(ServiceProvider.ProviderTypes.values),
+                city=rng.choice(CITIES),
+            ))
+        providers = ServiceProvider.objects.bulk_create(rows, batch_size=1000)
+        for start in range(0, count, 2000):
+            search.index_providers(providers[start:start + 2000])
+
+        insurer = Provider.objects.create(name_ar='مزود', name_en='Bench Insurer', license_number='BENCH-LIC')
+        network = Network.objects.create(provider=insurer, name_ar='شبكة', name_en='Bench Network')
+        company = Client.objects.create(name_ar='شركة', name_en='Bench Co', commercial_record='BENCH-CR')
+        policy = Policy.objects.create(
+            client=company, provider=insurer, policy_number='BENCH-1',
+            start_date=datetime.date.today(), end_date=datetime.date.today() + datetime.timedelta(days=365),
+        )
+        policy_class = PolicyClass.objects.create(policy=policy, name='Bench', network=network)
+        in_network = rng.sample(providers, int(count * options['network_share']))
+        for start in range(0, len(in_network), 2000):
+            network.hospitals.add(*in_network[start:start + 2000])
+
+        # ما يكتبه العضو فعلاً: بادئة من اسم عائلة المستشفى، أحياناً مع نوعه
+        queries = []
+        for provider in rng.sample(providers, options['queries']):
+            name = rng.choice((provider.name_ar, provider.name_en))
+            words = name.split()
+            family = max(words, key=len)
+            query = family[:rng.choice((3, 4, 5, 6))]
+            if rng.random() < 0.3:
+                query = f"{words[0]} {query}"
+            queries.append(query)
+
+        def indexed(q):
+            return list(search.search_providers(policy_class.get_effective_providers(), q)[:15])
+
+        def icontains(q):
+            return list(
+                network.hospitals.filter(
+                    Q(name_ar__icontains=q) | Q(name_en__icontains=q) | Q(city__icontains=q)
+                ).order_by('name_ar')[:15]
+            )
+
+        for label, fn in (('indexed', indexed), ('icontains', icontains)):
+            samples = []
+            for q in queries:
+                started = time.perf_counter()
+                fn(q)
+                samples.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"{label:>9}: p50={statistics.median(samples):.2f}ms "
+                f"p95={_percentile(samples, 95):.2f}ms max={max(samples):.2f}ms"
+            )
+
+        search.invalidate_city_facets()
+        started = time.perf_counter()
+        search.class_city_facets(policy_class)
+        cold = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        search.class_city_facets(policy_class)
+        warm = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"   facets: cold={cold:.2f}ms cached={warm:.3f}ms")
@@ -0,0 +1,21 @@
+"""
+Management command: reindex_providers
+=====================================
+يعيد بناء فهرس البحث عن مقدمي الخدمة (ProviderSearchToken) بالكامل —
+بعد استيراد مباشر في قاعدة البيانات أو تعديل قواعد التطبيع في networks/search.py.
+
+الاستخدام:
+    python manage.py reindex_providers
+"""
+from django.core.management.base import BaseCommand
+
+from networks import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the normalized provider search index."
+
+    def handle(self, *args, **options):
+        total = search.reindex_all()
+        search.invalidate_city_facets()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} provider(s)."))
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:37
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# نسخة مجمّدة من networks.search كما كانت عند كتابة هذه الهجرة —
+# تغيير المُرمِّز لاحقاً يتبعه هجرة إعادة فهرسة خاصة به
+MAX_TOKEN_LENGTH = 64
+_ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_ARABIC_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ؤ': 'و',
+    'ئ': 'ي',
+})
+_SPLIT = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def tokenize(*texts):
+    tokens = set()
+    for text in texts:
+        text = (text or '').lower()
+        text = _ARABIC_MARKS.sub('', text).translate(_ARABIC_FOLD)
+        for word in _SPLIT.split(text):
+            word = word.strip('_')
+            if not word:
+                continue
+            tokens.add(word[:MAX_TOKEN_LENGTH])
+            if word.startswith('ال') and len(word) > 3:
+                tokens.add(word[2:MAX_TOKEN_LENGTH + 2])
+    return tokens
+
+
+def index_existing_providers(apps, schema_editor):
+    ServiceProvider = apps.get_model('networks', 'ServiceProvider')
+    ProviderSearchToken = apps.get_model('networks', 'ProviderSearchToken')
+    tokens = []
+    for provider in ServiceProvider.objects.only('pk', 'name_ar', 'name_en', 'city').iterator():
+        for token in tokenize(provider.name_ar, provider.name_en, provider.city):
+            tokens.append(ProviderSearchToken(provider_id=provider.pk, token=token))
+    ProviderSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('networks', '0002_alter_network_options_alter_serviceprovider_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='networks.serviceprovider')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'provider'], name='providertoken_token_idx')],
+                'unique_together': {('provider', 'token')},
+            },
+        ),
+        migrations.RunPython(index_existing_providers, migrations.RunPython.noop),
+    ]
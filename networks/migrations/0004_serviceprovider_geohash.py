@@ -0,0 +1,31 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+from networks.geo import encode
+
+
+def fill_geohash(apps, schema_editor):
+    ServiceProvider = apps.get_model('networks', 'ServiceProvider')
+    located = ServiceProvider.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    batch = []
+    for provider in located.only('pk', 'latitude', 'longitude').iterator():
+        provider.geohash = encode(float(provider.latitude), float(provider.longitude))
+        batch.append(provider)
+    ServiceProvider.objects.bulk_update(batch, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('networks', '0003_providersearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceprovider',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
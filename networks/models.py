@@ -2,8 +2,11 @@ import uuid
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from core.tracking import TrackedFieldsMixin
+from .geo import encode
+
 # 1. مقدم الخدمة الطبية (المستشفى نفسه)
-class ServiceProvider(models.Model):
+class ServiceProvider(TrackedFieldsMixin, models.Model):
     class ProviderTypes(models.TextChoices):
         HOSPITAL = 'HOSPITAL', _('Hospital')
         POLYCLINIC = 'POLYCLINIC', _('Polyclinic')
@@ -11,6 +14,9 @@ class ServiceProvider(models.Model):
         OPTICAL = 'OPTICAL', _('Optical Shop')
         LAB = 'LAB', _('Laboratory')
 
+    # حقول فهرس البحث — انظر networks/signals.py
+    tracked_fields = ('name_ar', 'name_en', 'city')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     
     name_ar = models.CharField(_("Name (AR)"), max_length=255)
@@ -23,6 +29,8 @@ class ServiceProvider(models.Model):
     # الإحداثيات للخريطة في تطبيق Flutter لاحقاً
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # يُحسب تلقائياً من الإحداثيات — للبحث عن أقرب المستشفيات (networks/geo.py)
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
 
     class Meta:
         verbose_name = _("Medical Service Provider")
@@ -35,6 +43,17 @@ class ServiceProvider(models.Model):
     def __str__(self):
         return f"{self.name_en} - {self.city}"
 
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode(float(self.latitude), float(self.longitude))
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+
 
 # 2. الشبكة الطبية (التي تجمع المستشفيات)
 class Network(models.Model):
@@ -72,4 +91,27 @@ class Network(models.Model):
         ]
 
     def __str__(self):
-        return f"{self.name_en} ({self.provider.name_en})"
\ No newline at end of file
+        return f"{self.name_en} ({self.provider.name_en})"
+
+# 3. فهرس البحث عن مقدمي الخدمة (كلمات مطبّعة عربي/إنجليزي)
+class ProviderSearchToken(models.Model):
+    """
+    كلمة مطبّعة واحدة من اسم/مدينة مقدم الخدمة.
+    البحث بالبادئة يتم كمسح نطاق على الفهرس (token >= q AND token < q + '\\uffff')
+    بدلاً من icontains على كامل الجدول. يُحدَّث تلقائياً — انظر networks/search.py.
+    """
+    provider = models.ForeignKey(
+        ServiceProvider,
+        on_delete=models.CASCADE,
+        related_name='search_tokens',
+    )
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('provider', 'token')
+        indexes = [
+            models.Index(fields=['token', 'provider'], name='providertoken_token_idx'),
+        ]
+
+    def __str__(self):
+        return self.token
@@ -0,0 +1,138 @@
+"""
+Provider search: normalized Arabic/English tokens + a prefix index table.
+
+Each ServiceProvider's name_ar, name_en and city are split into normalized
+tokens stored in ProviderSearchToken. A query is tokenized the same way and
+every query token must be a prefix of one of the provider's tokens, so
+"مستشفى الحبيب" is found by "حبيب", "الحبيب" or "مستشفي حب".
+
+Prefix matching is an index range scan (token >= q AND token < q + U+FFFF),
+which works on any backend and avoids LIKE '%q%' full-table scans.
+
+City facets for a member's hospital list are cached per policy class and
+invalidated through a version counter that changes whenever the effective
+provider set or a provider's city changes.
+"""
+import re
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ProviderSearchToken, ServiceProvider
+
+MAX_TOKEN_LENGTH = 64
+FACETS_TTL = 60 * 10
+FACETS_VERSION_KEY = 'networks:provider_facets_version'
+
+# تشكيل + تطويل
+_ARABIC_MARKS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_ARABIC_FOLD = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+    'ؤ': 'و',
+    'ئ': 'ي',
+})
+_SPLIT = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def normalize(text):
+    """Lowercase, drop Arabic diacritics/tatweel and fold letter variants."""
+    text = (text or '').lower()
+    text = _ARABIC_MARKS.sub('', text)
+    return text.translate(_ARABIC_FOLD)
+
+
+def tokenize(*texts, query=False):
+    """
+    Return the set of normalized tokens for ``texts``. Arabic words that start
+    with the definite article are indexed both with and without it; in a
+    query only the bare form is kept so "الحبيب" also finds "حبيب".
+    """
+    tokens = set()
+    for text in texts:
+        for word in _SPLIT.split(normalize(text)):
+            word = word.strip('_')
+            if not word:
+                continue
+            has_article = word.startswith('ال') and len(word) > 3
+            if not (query and has_article):
+                tokens.add(word[:MAX_TOKEN_LENGTH])
+            if has_article:
+                tokens.add(word[2:MAX_TOKEN_LENGTH + 2])
+    return tokens
+
+
+def provider_tokens(provider):
+    return tokenize(provider.name_ar, provider.name_en, provider.city)
+
+
+def index_providers(providers):
+    """(Re)build the search tokens of ``providers`` (an iterable of instances)."""
+    providers = list(providers)
+    if not providers:
+        return
+    with transaction.atomic():
+        ProviderSearchToken.objects.filter(provider__in=[p.pk for p in providers]).delete()
+        ProviderSearchToken.objects.bulk_create(
+            [
+                ProviderSearchToken(provider_id=p.pk, token=token)
+                for p in providers
+                for token in provider_tokens(p)
+            ],
+            batch_size=1000,
+        )
+
+
+def reindex_all(batch_size=2000):
+    """Rebuild the whole index. Returns the number of providers indexed."""
+    total = 0
+    batch = []
+    for provider in ServiceProvider.objects.only('pk', 'name_ar', 'name_en', 'city').iterator(chunk_size=batch_size):
+        batch.append(provider)
+        if len(batch) >= batch_size:
+            index_providers(batch)
+            total += len(batch)
+            batch = []
+    index_providers(batch)
+    return total + len(batch)
+
+
+def search_providers(queryset, query):
+    """
+    Narrow a ServiceProvider queryset to providers matching every token of
+    ``query`` by prefix. An empty query returns the queryset unchanged.
+    """
+    for token in tokenize(query, query=True):
+        queryset = queryset.filter(
+            pk__in=ProviderSearchToken.objects.filter(
+                token__gte=token, token__lt=token + '\uffff',
+            ).values('provider_id')
+        )
+    return queryset
+
+
+# ── City facets ─────────────────────────────────────────────────────────────
+
+def _facets_version():
+    return cache.get_or_set(FACETS_VERSION_KEY, 1, None)
+
+
+def invalidate_city_facets():
+    try:
+        cache.incr(FACETS_VERSION_KEY)
+    except ValueError:
+        cache.set(FACETS_VERSION_KEY, 1, None)
+
+
+def class_city_facets(policy_class):
+    """Distinct, sorted cities of a policy class's effective providers (cached)."""
+    key = f'networks:class_cities:{policy_class.pk}:{_facets_version()}'
+    cities = cache.get(key)
+    if cities is None:
+        cities = list(
+            policy_class.get_effective_providers()
+            .order_by('city').values_list('city', flat=True).distinct()
+        )
+        cache.set(key, cities, FACETS_TTL)
+    return cities
@@ -0,0 +1,32 @@
+# networks/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core import conditional
+from . import search
+from .models import Network, ServiceProvider
+
+
+@receiver(post_save, sender=ServiceProvider)
+def provider_reindex(sender, instance, created, **kwargs):
+    """Keep the search tokens (and cached city facets) in step with the provider row."""
+    conditional.bump('providers')
+    if created or instance.tracked_field_changed('name_ar', 'name_en', 'city'):
+        search.index_providers([instance])
+        if created or instance.tracked_field_changed('city'):
+            search.invalidate_city_facets()
+
+
+@receiver(post_delete, sender=ServiceProvider)
+def provider_deleted(sender, instance, **kwargs):
+    conditional.bump('providers')
+    search.invalidate_city_facets()
+
+
+@receiver(m2m_changed, sender=Network.hospitals.through)
+def network_hospitals_version(sender, instance, action, reverse, **kwargs):
+    """ETag شاشة إدارة مستشفيات الشبكة (core/conditional.py)."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # من جهة المستشفى (provider.networks.*) لا نعرف الشبكات بعد clear — نرفع عدّاد المستشفيات
+    conditional.bump('providers' if reverse else f'network:{instance.pk}')
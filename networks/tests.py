@@ -1,3 +1,74 @@
+import random
+
 from django.test import TestCase
 
-# Create your tests here.
+from .geo import encode, haversine_km, nearest_providers
+from .models import ProviderSearchToken, ServiceProvider
+from .search import normalize, search_providers, tokenize
+
+
+class ProviderSearchTest(TestCase):
+    def setUp(self):
+        self.habib = ServiceProvider.objects.create(
+            name_ar='مُستشفى الحبيب', name_en='Dr. Sulaiman Al-Habib Hospital', type='HOSPITAL', city='الرياض',
+        )
+        self.salam = ServiceProvider.objects.create(
+            name_ar='مستشفى السلام', name_en='Salam Hospital', type='HOSPITAL', city='جدة',
+        )
+
+    def _search(self, query):
+        return set(search_providers(ServiceProvider.objects.all(), query).values_list('pk', flat=True))
+
+    def test_normalization_folds_arabic_variants(self):
+        self.assertEqual(normalize('مُسْتَشْفَى أبها'), 'مستشفي ابها')
+        self.assertIn('حبيب', tokenize('الحبيب'))
+        self.assertEqual(tokenize('الحبيب', query=True), {'حبيب'})
+
+    def test_prefix_search_across_languages(self):
+        self.assertEqual(self._search('حبي'), {self.habib.pk})
+        self.assertEqual(self._search('مستشفى ال'), {self.habib.pk, self.salam.pk})
+        self.assertEqual(self._search('HAB hosp'), {self.habib.pk})
+        self.assertEqual(self._search('جده'), {self.salam.pk})
+        self.assertEqual(self._search('hospital xyz'), set())
+
+    def test_index_follows_provider_edits(self):
+        self.salam.name_en = 'Peace Hospital'
+        self.salam.save()
+        self.assertEqual(self._search('peace'), {self.salam.pk})
+        self.assertEqual(self._search('salam'), set())
+        self.assertFalse(ProviderSearchToken.objects.filter(provider=self.salam, token='salam').exists())
+
+
+class NearestProvidersTest(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        for i in range(120):
+            # حول الرياض وجدة
+            base_lat, base_lng = rng.choice(((24.71, 46.67), (21.54, 39.17)))
+            ServiceProvider.objects.create(
+                name_ar=f'مستشفى {i}', name_en=f'H{i}', type=rng.choice(('HOSPITAL', 'PHARMACY')), city='X',
+                latitude=round(base_lat + rng.uniform(-0.5, 0.5), 6),
+                longitude=round(base_lng + rng.uniform(-0.5, 0.5), 6),
+            )
+        ServiceProvider.objects.create(name_ar='بلا موقع', name_en='Nowhere', type='HOSPITAL', city='X')
+
+    def test_geohash_is_maintained_on_save(self):
+        provider = ServiceProvider.objects.create(
+            name_ar='أ', name_en='A', type='LAB', city='X', latitude=24.7136, longitude=46.6753,
+        )
+        self.assertEqual(provider.geohash, encode(24.7136, 46.6753))
+        self.assertTrue(provider.geohash.startswith('th3'))
+
+    def test_matches_brute_force(self):
+        for lat, lng, queryset in (
+            (24.70, 46.70, ServiceProvider.objects.all()),
+            (21.50, 39.20, ServiceProvider.objects.filter(type='PHARMACY')),
+            (23.00, 43.00, ServiceProvider.objects.all()),  # بين المدينتين
+        ):
+            expected = sorted(
+                queryset.exclude(latitude=None),
+                key=lambda p: haversine_km(lat, lng, float(p.latitude), float(p.longitude)),
+            )[:5]
+            found = nearest_providers(queryset, lat, lng, limit=5)
+            self.assertEqual([p.pk for p, _ in found], [p.pk for p in expected])
+            self.assertEqual([d for _, d in found], sorted(d for _, d in found))
@@ -5,6 +5,8 @@ from django.core.paginator import Paginator
 from django.db.models import Q
 from .models import ServiceProvider, Network
 from .forms import ServiceProviderForm, NetworkForm
+from core.conditional import conditional, versions
+from core.scope import Scope, get_scope
 
 
 def get_allowed_networks(user):
@@ -14,12 +16,12 @@ def get_allowed_networks(user):
     - موظف HR: الشبكات المرتبطة بوثائق شركته أو شركتها الأم فقط
     """
     qs = Network.objects.select_related('provider')
-    if user.is_hr_role and not user.is_broker_role:
-        client = user.related_client
-        if client:
+    if user.is_hr_role:
+        scope = get_scope(user)
+        if scope.kind == Scope.HR:
             qs = qs.filter(
-                Q(policy_classes__policy__client=client) |
-                Q(policy_classes__policy__client=client.parent)
+                Q(policy_classes__policy__client_id=scope.client_id) |
+                Q(policy_classes__policy__client_id=scope.client_parent_id)
             ).distinct()
         else:
             qs = qs.none()
@@ -29,6 +31,7 @@ def get_allowed_networks(user):
 
 @login_required
 @permission_required('networks.view_serviceprovider', raise_exception=True)
+@conditional(lambda request: versions('providers'), templates=['networks/partials/provider_table.html'])
 def service_provider_list(request):
     """
     قائمة بجميع مقدمي الخدمة الطبية
@@ -149,6 +152,10 @@ def network_delete(request, pk):
 
 @login_required
 @permission_required('networks.view_network', raise_exception=True) # or specific 'manage_hospitals'
+@conditional(
+    lambda request, pk: versions('providers', f'network:{pk}'),
+    templates=['networks/partials/hospital_selection_list.html'],
+)
 def network_manage_hospitals(request, pk):
     """
     إدارة المستشفيات داخل الشبكة (إضافة/حذف)
@@ -0,0 +1,73 @@
+# notifications/broker.py
+"""
+In-process pub/sub for the notification push channel (Server-Sent Events).
+
+Each open SSE connection subscribes an asyncio.Queue for its user. Publishers
+(NotificationService, usually from sync request threads or background jobs)
+hand events to the subscriber's event loop with call_soon_threadsafe, so
+publishing never blocks and never touches the database.
+
+The broker lives in one process. With several worker processes a user only
+receives pushes published by the process holding their stream — the 30s
+HTMX poll of views.unread_count stays in place as the fallback.
+"""
+import asyncio
+import contextlib
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+# أحداث غير مستهلكة لكل اتصال — الأقدم يُسقط إذا امتلأت (العميل يعيد جلب العداد على أي حال)
+QUEUE_SIZE = 20
+
+
+def _offer(queue, event):
+    if queue.full():
+        with contextlib.suppress(asyncio.QueueEmpty):
+            queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class NotificationBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, user_id):
+        """``async with broker.subscribe(user_id) as queue: event = await queue.get()``"""
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        key = str(user_id)
+        with self._lock:
+            self._subscribers[key].add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(key)
+                if subscribers is not None:
+                    subscribers.discard(entry)
+                    if not subscribers:
+                        del self._subscribers[key]
+
+    def publish(self, user_id, event):
+        """Deliver ``event`` (a dict) to every open stream of ``user_id``. Returns the fan-out."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(user_id), ()))
+        for loop, queue in subscribers:
+            with contextlib.suppress(RuntimeError):  # loop already closed
+                loop.call_soon_threadsafe(_offer, queue, event)
+        return len(subscribers)
+
+    def publish_on_commit(self, user_ids, event):
+        """Publish once the surrounding transaction commits (immediately outside one)."""
+        user_ids = list(user_ids)
+        transaction.on_commit(lambda: [self.publish(user_id, event) for user_id in user_ids])
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+broker = NotificationBroker()
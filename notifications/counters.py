@@ -0,0 +1,73 @@
+# notifications/counters.py
+"""
+Per-user cache behind the header bell poll (views.unread_count).
+
+Two keys per user:
+    notifications:unread:<user_id>  → unread count
+    notifications:recent:<user_id>  → the RECENT_SIZE newest notifications
+                                      (title/body/url/created_at) for the toast
+
+A poll with nothing new is served entirely from cache. Any write that can
+change either value (new notifications, mark_read, mark_all_read) drops the
+user's keys, both immediately and again after the transaction commits, so
+a poll racing the commit cannot re-cache stale data. The next poll then
+reloads them with one COUNT and one small ordered query.
+
+Invalidations only reach the process's own cache with the default
+LocMemCache, so entries expire after CACHE_TTL: a count cached by another
+worker is at most one poll interval old. A shared cache backend
+(settings.CACHES) makes every invalidation immediate.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+RECENT_SIZE = 5
+# أقصى عمر للعداد في عملية لم يصلها الإبطال — بطول فترة استطلاع الجرس
+CACHE_TTL = 30
+
+UNREAD_KEY = 'notifications:unread:{}'
+RECENT_KEY = 'notifications:recent:{}'
+
+
+def unread_count(user_id):
+    key = UNREAD_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.set(key, count, CACHE_TTL)
+    return count
+
+
+def recent_notifications(user_id):
+    """Newest notifications first, as plain dicts (ring of RECENT_SIZE)."""
+    key = RECENT_KEY.format(user_id)
+    ring = cache.get(key)
+    if ring is None:
+        ring = list(
+            Notification.objects
+            .filter(recipient_id=user_id)
+            .order_by('-created_at')
+            .values('title', 'body', 'url', 'created_at')[:RECENT_SIZE]
+        )
+        cache.set(key, ring, CACHE_TTL)
+    return ring
+
+
+def latest_since(user_id, since):
+    """The newest notification created after ``since``, or None."""
+    ring = recent_notifications(user_id)
+    if ring and ring[0]['created_at'] > since:
+        return ring[0]
+    return None
+
+
+def invalidate(user_ids):
+    keys = []
+    for user_id in set(user_ids):
+        keys += [UNREAD_KEY.format(user_id), RECENT_KEY.format(user_id)]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
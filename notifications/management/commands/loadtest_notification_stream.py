@@ -0,0 +1,87 @@
+"""
+Management command: loadtest_notification_stream
+================================================
+اختبار حمل محلي لقناة الدفع (SSE): يفتح عدداً من الاتصالات المتزامنة على
+event_stream داخل حلقة asyncio واحدة، وينشر إشعارات من خيط منفصل كما يفعل
+NotificationService، ثم يقيس زمن الوصول وعدد طلبات الاستطلاع التي تم توفيرها.
+
+الاستخدام:
+    python manage.py loadtest_notification_stream
+    python manage.py loadtest_notification_stream --connections 5000 --events 1000
+
+لا يلمس قاعدة البيانات (مستخدمون وهميون) — يقيس البروكر والمولّد فقط، بدون HTTP.
+"""
+import asyncio
+import json
+import random
+import resource
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from notifications import stream
+from notifications.broker import broker
+
+
+class Command(BaseCommand):
+    help = "Load-test the in-process SSE notification broker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000)
+        parser.add_argument('--events', type=int, default=500)
+        parser.add_argument('--poll-interval', type=int, default=30,
+                            help="Seconds between bell polls the stream replaces.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(options))
+
+    async def _run(self, options):
+        connections = options['connections']
+        user_ids = [uuid.uuid4() for _ in range(connections)]
+        latencies = []
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        async def consume(user_id):
+            async for chunk in stream.event_stream(user_id, heartbeat=3600, lifetime=3600):
+                if chunk.startswith('event:'):
+                    sent_at = json.loads(chunk.split('data: ', 1)[1])['sent_at']
+                    latencies.append((time.perf_counter() - sent_at) * 1000)
+
+        tasks = [asyncio.create_task(consume(user_id)) for user_id in user_ids]
+        while broker.connection_count() < connections:
+            await asyncio.sleep(0.01)
+        rss_held = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        def publisher():
+            rng = random.Random(1)
+            for _ in range(options['events']):
+                broker.publish(rng.choice(user_ids), {'title': 'load', 'sent_at': time.perf_counter()})
+                time.sleep(0.001)
+
+        started = time.perf_counter()
+        thread = threading.Thread(target=publisher)
+        thread.start()
+        await asyncio.to_thread(thread.join)
+        while len(latencies) < options['events'] and time.perf_counter() - started < 30:
+            await asyncio.sleep(0.01)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        poll_rps = connections / options['poll_interval']
+        self.stdout.write(f"connections held: {connections} (peak RSS +{(rss_held - rss_before) / 1024:.1f} MB)")
+        if latencies:
+            ordered = sorted(latencies)
+            self.stdout.write(
+                f"delivered {len(latencies)}/{options['events']} events: "
+                f"p50={statistics.median(ordered):.2f}ms p95={ordered[int(0.95 * (len(ordered) - 1))]:.2f}ms"
+            )
+        self.stdout.write(
+            f"bell polling replaced: {poll_rps:,.1f} req/s "
+            f"({poll_rps * 3600:,.0f} requests/hour) at one poll per {options['poll_interval']}s per tab"
+        )
+        self.stdout.write(f"connections left open: {broker.connection_count()}")
@@ -0,0 +1,251 @@
+# notifications/outbox.py
+"""
+Transaction-scoped outbox for NotificationService.
+
+Status changes and messages are not written one by one: NotificationService
+adds an OutboxEntry and the outbox writes every entry of the transaction with
+a single bulk_create once it commits. At flush time:
+
+    * member/user relations of the routed instances are loaded with one
+      prefetch per model (relations already on the instance are reused);
+    * HR recipients come from a per-client cache of active HR user ids,
+      filled with one query for all the clients missing from it;
+    * the bell counters are invalidated and push events published once.
+
+Outside a transaction an entry is flushed immediately, unless the caller
+groups the work explicitly:
+
+    with outbox.batch():
+        for claim in claims:
+            claim.save()          # autocommit — entries collected
+                                  # one flush on exit
+
+A rolled-back transaction (or savepoint) drops its entries together with
+its on_commit hooks, so nobody is notified about a change that never happened.
+
+Each entry rides on its own transaction.on_commit() hook; the connection
+carries a marker with the token of the last one added, and that hook —
+the last to run — writes the whole transaction, then clears the marker.
+When a savepoint rollback drops the final entries, the surviving ones wait
+for the next flush on the thread (at the latest, the end of the request).
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Optional
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
+
+from . import counters
+from .broker import broker
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+HR_USERS_KEY = 'notifications:hr-users:{}'
+HR_USERS_TTL = 10 * 60
+
+# Relations read when routing to the instance's member.
+ROUTING_RELATIONS = ('member__user',)
+
+# Attribute on the DB connection: token of the last entry added in the open transaction.
+MARKER = '_notification_outbox_last'
+
+
+@dataclass
+class OutboxEntry:
+    notification_type: str
+    title: str
+    url: str = ''
+    # مستلمون معروفون مسبقاً (رسائل)
+    recipient_ids: list = field(default_factory=list)
+    # توجيه حسب السجل: 'member' | 'hr' | 'both' — يُحل عند التفريغ
+    instance: Optional[Any] = None
+    target: str = ''
+    # توجيه لـ HR شركة دون سجل بعينه (ملخص انتقال جماعي) — بدلاً من instance.member.client_id
+    client_id: Optional[Any] = None
+
+    @property
+    def hr_client_id(self):
+        return self.client_id if self.client_id is not None else self.instance.member.client_id
+
+
+# ── HR users per client (cached) ────────────────────────────────────────────
+
+def hr_user_ids(client_ids):
+    """{client_id: [user_id, ...]} of active HR users, one query for cache misses."""
+    client_ids = {client_id for client_id in client_ids if client_id is not None}
+    if not client_ids:
+        return {}
+    keys = {HR_USERS_KEY.format(client_id): client_id for client_id in client_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key]: user_ids for key, user_ids in cached.items()}
+
+    missing = client_ids - result.keys()
+    if missing:
+        User = get_user_model()
+        fetched = {client_id: [] for client_id in missing}
+        rows = User.objects.filter(
+            role__in=[User.Roles.HR_ADMIN, User.Roles.HR_STAFF],
+            related_client_id__in=missing,
+            is_active=True,
+        ).values_list('related_client_id', 'pk')
+        for client_id, user_id in rows:
+            fetched[client_id].append(user_id)
+        cache.set_many({HR_USERS_KEY.format(c): ids for c, ids in fetched.items()}, HR_USERS_TTL)
+        result.update(fetched)
+    return result
+
+
+def invalidate_hr_users(client_ids):
+    keys = [HR_USERS_KEY.format(client_id) for client_id in set(client_ids) if client_id is not None]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# ── Outbox ──────────────────────────────────────────────────────────────────
+
+class NotificationOutbox:
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flushes = 0
+        self._notifications = 0
+        self._last_flush_size = 0
+        self._max_flush_size = 0
+
+    def _state(self):
+        local = self._local
+        if not hasattr(local, 'committed'):
+            local.committed = []   # entries whose transaction committed, awaiting the flush hook
+            local.batch = None     # entries collected by an open batch()
+        return local
+
+    def add(self, entry):
+        connection = transaction.get_connection()
+        if connection.in_atomic_block:
+            # يُسجَّل مع نقطة الحفظ الحالية — يسقط تلقائياً إذا تراجعت
+            token = getattr(connection, MARKER, 0) + 1
+            setattr(connection, MARKER, token)
+            transaction.on_commit(partial(self._stage_committed, entry, connection, token))
+        elif self._state().batch is not None:
+            self._state().batch.append(entry)
+        else:
+            self.flush(self._take_committed() + [entry])
+
+    def _stage_committed(self, entry, connection, token):
+        self._state().committed.append(entry)
+        # آخر إدخال في المعاملة يفرّغها كلها مرة واحدة
+        if getattr(connection, MARKER, None) == token:
+            delattr(connection, MARKER)
+            self._flush_committed()
+
+    def _take_committed(self):
+        state = self._state()
+        entries, state.committed = state.committed, []
+        return entries
+
+    def _flush_committed(self):
+        entries = self._take_committed()
+        if self._state().batch is not None:
+            self._state().batch.extend(entries)
+        else:
+            self.flush(entries)
+
+    def flush_pending(self):
+        """Write entries left staged when a savepoint rollback dropped their transaction's last entry."""
+        if self._state().committed:
+            self._flush_committed()
+
+    @contextmanager
+    def batch(self):
+        """Collect entries added outside a transaction and flush them once on exit."""
+        state = self._state()
+        if state.batch is not None:  # nested — the outer batch flushes
+            yield
+            return
+        state.batch = []
+        try:
+            yield
+        finally:
+            entries, state.batch = state.batch, None
+            self.flush(self._take_committed() + entries)
+
+    def flush(self, entries):
+        if not entries:
+            return 0
+        routed = [entry for entry in entries if entry.instance is not None]
+        by_model = {}
+        for entry in routed:
+            if isinstance(entry.instance, models.Model):
+                by_model.setdefault(type(entry.instance), []).append(entry.instance)
+        for instances in by_model.values():
+            prefetch_related_objects(instances, *ROUTING_RELATIONS)
+
+        hr_users = hr_user_ids(entry.hr_client_id for entry in entries if entry.target in ('hr', 'both'))
+
+        notifications = []
+        pushes = []
+        for entry in entries:
+            recipient_ids = list(entry.recipient_ids)
+            if entry.target in ('member', 'both'):
+                member_user = entry.instance.member.user
+                if member_user and member_user.is_active:
+                    recipient_ids.append(member_user.pk)
+            if entry.target in ('hr', 'both'):
+                recipient_ids.extend(hr_users.get(entry.hr_client_id, ()))
+            recipient_ids = list(dict.fromkeys(recipient_ids))
+            if not recipient_ids:
+                continue
+            notifications.extend(
+                Notification(
+                    recipient_id=user_id,
+                    notification_type=entry.notification_type,
+                    title=entry.title,
+                    url=entry.url,
+                )
+                for user_id in recipient_ids
+            )
+            pushes.append((recipient_ids, {'title': entry.title, 'url': entry.url}))
+
+        if notifications:
+            Notification.objects.bulk_create(notifications)
+            counters.invalidate(n.recipient_id for n in notifications)
+            for recipient_ids, event in pushes:
+                broker.publish_on_commit(recipient_ids, event)
+        self._record(len(notifications), len(entries))
+        return len(notifications)
+
+    def _record(self, size, entry_count):
+        with self._lock:
+            self._flushes += 1
+            self._notifications += size
+            self._last_flush_size = size
+            self._max_flush_size = max(self._max_flush_size, size)
+        logger.debug("notification outbox flushed %d notifications for %d entries", size, entry_count)
+
+    def metrics(self):
+        """Process-wide flush statistics (notifications per flush)."""
+        with self._lock:
+            return {
+                'flushes': self._flushes,
+                'notifications': self._notifications,
+                'last_flush_size': self._last_flush_size,
+                'max_flush_size': self._max_flush_size,
+                'avg_flush_size': self._notifications / self._flushes if self._flushes else 0.0,
+            }
+
+    def reset_metrics(self):
+        with self._lock:
+            self._flushes = self._notifications = 0
+            self._last_flush_size = self._max_flush_size = 0
+
+
+outbox = NotificationOutbox()
@@ -1,15 +1,14 @@
 # notifications/services.py
 from django.urls import reverse
-from django.contrib.auth import get_user_model
 from .models import Notification
-
-User = get_user_model()
+from .outbox import OutboxEntry, outbox
 
 
 class NotificationService:
     """
     Routing logic for all notification dispatch.
     Keeps signal handlers thin — signals detect the change, this class decides who gets notified.
+    Notifications are written through the outbox (see outbox.py), one bulk_create per transaction.
     """
 
     # --- Service Request routing map ---
@@ -44,6 +43,7 @@ class NotificationService:
         'SUBMITTED_TO_HR': {
             'to': 'hr',
             'title': 'مطالبة جديدة تحتاج مراجعتك — {reference}',
+            'summary': '{count} مطالبات جديدة تحتاج مراجعتك',
         },
         'RETURNED_BY_HR': {
             'to': 'member',
@@ -56,6 +56,7 @@ class NotificationService:
         'RETURNED_BY_BROKER': {
             'to': 'both',
             'title': 'مطالبة {reference} أُعيدت من الوسيط — يحتاج إجراء',
+            'summary': '{count} مطالبات أُعيدت من الوسيط — تحتاج إجراء',
         },
         'SENT_TO_INSURANCE': {
             'to': 'member',
@@ -64,10 +65,12 @@ class NotificationService:
         'APPROVED_BY_INSURANCE': {
             'to': 'both',
             'title': 'مطالبتك {reference} وافقت عليها شركة التأمين ✅',
+            'summary': '{count} مطالبات وافقت عليها شركة التأمين ✅',
         },
         'REJECTED_BY_INSURANCE': {
             'to': 'both',
             'title': 'مطالبتك {reference} رُفضت من شركة التأمين',
+            'summary': '{count} مطالبات رُفضت من شركة التأمين',
         },
         'PAID': {
             'to': 'member',
@@ -75,36 +78,27 @@ class NotificationService:
         },
     }
     # Statuses with no notification: DRAFT, BROKER_PROCESSING, INSURANCE_QUERY
+    # 'summary': HR title for several claims of one company moved together (claims/transitions.py)
 
     @classmethod
-    def _collect_recipients(cls, rule, instance):
+    def _route(cls, rule, instance, title, url):
         """
-        Return a list of User objects to notify based on the routing rule.
-        instance must already be loaded with select_related('member__client', 'member__user').
+        Queue the notification in the outbox; recipients are resolved when it
+        flushes (member user + cached HR users of instance.member.client_id).
         """
-        recipients = []
-        target = rule['to']
-
-        if target in ('member', 'both'):
-            member_user = instance.member.user
-            if member_user and member_user.is_active:
-                recipients.append(member_user)
-
-        if target in ('hr', 'both'):
-            hr_users = User.objects.filter(
-                role__in=[User.Roles.HR_ADMIN, User.Roles.HR_STAFF],
-                related_client=instance.member.client,
-                is_active=True,
-            )
-            recipients.extend(list(hr_users))
-
-        return recipients
+        outbox.add(OutboxEntry(
+            notification_type=Notification.Type.STATUS_CHANGE,
+            title=title,
+            url=url,
+            instance=instance,
+            target=rule['to'],
+        ))
 
     @classmethod
     def notify_service_request_status_change(cls, instance, old_status, new_status):
         """
         Called by the post_save signal for ServiceRequest.
-        instance must be loaded with select_related('member__client', 'member__user').
+        Written when the surrounding transaction commits, batched with the rest of it.
         """
         # old_status: reserved for future idempotency checks (currently unused)
         rule = cls.SR_ROUTING.get(new_status)
@@ -113,26 +107,13 @@ class NotificationService:
 
         title = rule['title'].format(reference=instance.reference)
         url = reverse('service_requests:request_detail', kwargs={'pk': instance.pk})
-        recipients = cls._collect_recipients(rule, instance)
-
-        if not recipients:
-            return
-
-        Notification.objects.bulk_create([
-            Notification(
-                recipient=user,
-                notification_type=Notification.Type.STATUS_CHANGE,
-                title=title,
-                url=url,
-            )
-            for user in recipients
-        ])
+        cls._route(rule, instance, title, url)
 
     @classmethod
     def notify_claim_status_change(cls, instance, old_status, new_status):
         """
         Called by the post_save signal for Claim.
-        instance must be loaded with select_related('member__client', 'member__user').
+        Written when the surrounding transaction commits, batched with the rest of it.
         """
         # old_status: reserved for future idempotency checks (currently unused)
         rule = cls.CLAIM_ROUTING.get(new_status)
@@ -141,20 +122,44 @@ class NotificationService:
 
         title = rule['title'].format(reference=instance.claim_reference)
         url = reverse('claims:claim_detail', kwargs={'pk': instance.pk})
-        recipients = cls._collect_recipients(rule, instance)
+        cls._route(rule, instance, title, url)
 
-        if not recipients:
+    @classmethod
+    def notify_claims_status_change(cls, claims, new_status):
+        """
+        Called by the bulk transition service (claims/transitions.py), whose
+        UPDATE sends no post_save. Members get one notification per claim;
+        each company's HR gets one summary for all of its claims in the batch.
+        """
+        rule = cls.CLAIM_ROUTING.get(new_status)
+        if not rule:
             return
 
-        Notification.objects.bulk_create([
-            Notification(
-                recipient=user,
+        by_client = {}
+        for claim in claims:
+            if rule['to'] in ('member', 'both'):
+                cls._route(
+                    {'to': 'member'}, claim, rule['title'].format(reference=claim.claim_reference),
+                    reverse('claims:claim_detail', kwargs={'pk': claim.pk}),
+                )
+            if rule['to'] in ('hr', 'both'):
+                by_client.setdefault(claim.member.client_id, []).append(claim)
+
+        for client_id, group in by_client.items():
+            if len(group) == 1:
+                claim = group[0]
+                cls._route(
+                    {'to': 'hr'}, claim, rule['title'].format(reference=claim.claim_reference),
+                    reverse('claims:claim_detail', kwargs={'pk': claim.pk}),
+                )
+                continue
+            outbox.add(OutboxEntry(
                 notification_type=Notification.Type.STATUS_CHANGE,
-                title=title,
-                url=url,
-            )
-            for user in recipients
-        ])
+                title=rule['summary'].format(count=len(group)),
+                url=f"{reverse('claims:claim_list')}?status_filter={new_status}",
+                target='hr',
+                client_id=client_id,
+            ))
 
     @classmethod
     def notify_new_message(cls, message):
@@ -175,9 +180,9 @@ class NotificationService:
         root_pk = message.parent.pk if is_reply else message.pk
         url = reverse('notifications:thread', kwargs={'pk': root_pk})
 
-        Notification.objects.create(
-            recipient=message.recipient,
+        outbox.add(OutboxEntry(
             notification_type=notif_type,
             title=title,
             url=url,
-        )
+            recipient_ids=[message.recipient_id],
+        ))
@@ -1,77 +1,79 @@
 # notifications/signals.py
-from django.db.models.signals import pre_save, post_save
+from django.core.signals import request_finished
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from accounts.models import User
 from service_requests.models import ServiceRequest
 from claims.models import Claim
+from . import counters, outbox
+from .models import Notification
 from .services import NotificationService
 
 
-# ── ServiceRequest Signals ──────────────────────────────────────────────────
-
-@receiver(pre_save, sender=ServiceRequest)
-def sr_capture_old_status(sender, instance, **kwargs):
+def status_transition(instance, created):
     """
-    Store the current DB status on the instance before saving.
-    post_save handler uses _original_status to detect actual changes.
+    Return (old_status, new_status) if this save changed the status, else None.
+    The old value comes from TrackedFieldsMixin (captured at load / last save),
+    so no extra SELECT is needed.
     """
-    if instance.pk and not instance._state.adding:
-        try:
-            old = ServiceRequest.objects.get(pk=instance.pk)
-            instance._original_status = old.status
-        except ServiceRequest.DoesNotExist:
-            instance._original_status = None
-    else:
-        instance._original_status = None
+    if created:
+        return None
+    old_status = instance.loaded_value('status')
+    new_status = instance.status
+    if old_status is None or old_status == new_status:
+        return None
+    return old_status, new_status
+
 
+# ── ServiceRequest Signals ──────────────────────────────────────────────────
 
 @receiver(post_save, sender=ServiceRequest)
 def sr_notify_on_status_change(sender, instance, created, **kwargs):
     """
     Fire notification if status actually changed.
     """
-    if created:
-        return
-    old_status = getattr(instance, '_original_status', None)
-    new_status = instance.status
-    if old_status is None or old_status == new_status:
-        return
-
-    fresh = ServiceRequest.objects.select_related(
-        'member__client', 'member__user'
-    ).get(pk=instance.pk)
-    NotificationService.notify_service_request_status_change(fresh, old_status, new_status)
+    transition = status_transition(instance, created)
+    if transition:
+        NotificationService.notify_service_request_status_change(instance, *transition)
 
 
 # ── Claim Signals ───────────────────────────────────────────────────────────
 
-@receiver(pre_save, sender=Claim)
-def claim_capture_old_status(sender, instance, **kwargs):
-    """
-    Same pattern as ServiceRequest — capture status before FSM transition saves.
-    """
-    if instance.pk and not instance._state.adding:
-        try:
-            old = Claim.objects.get(pk=instance.pk)
-            instance._original_status = old.status
-        except Claim.DoesNotExist:
-            instance._original_status = None
-    else:
-        instance._original_status = None
-
-
 @receiver(post_save, sender=Claim)
 def claim_notify_on_status_change(sender, instance, created, **kwargs):
     """
     Fire notification when Claim status transitions via FSM.
     """
-    if created:
-        return
-    old_status = getattr(instance, '_original_status', None)
-    new_status = instance.status
-    if old_status is None or old_status == new_status:
+    transition = status_transition(instance, created)
+    if transition:
+        NotificationService.notify_claim_status_change(instance, *transition)
+
+
+# ── Bell counter cache ──────────────────────────────────────────────────────
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def notification_invalidate_counters(sender, instance, **kwargs):
+    """create() / mark_read save / delete — bulk paths call counters.invalidate themselves."""
+    counters.invalidate([instance.recipient_id])
+
+
+# ── HR recipients cache ─────────────────────────────────────────────────────
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_invalidate_hr_recipients(sender, instance, **kwargs):
+    """Role, company or activation changes move a user in/out of a client's HR list."""
+    if kwargs.get('created') is False and not instance.tracked_field_changed(
+        'role', 'related_client_id', 'is_active'
+    ):
         return
+    outbox.invalidate_hr_users({instance.related_client_id, instance.loaded_value('related_client_id')})
+
+
+# ── Outbox ──────────────────────────────────────────────────────────────────
 
-    fresh = Claim.objects.select_related(
-        'member__client', 'member__user'
-    ).get(pk=instance.pk)
-    NotificationService.notify_claim_status_change(fresh, old_status, new_status)
+@receiver(request_finished)
+def flush_outbox_leftovers(sender, **kwargs):
+    """إدخالات معاملة تراجعت نقطة حفظها الأخيرة لا تنتظر أكثر من نهاية الطلب."""
+    outbox.outbox.flush_pending()
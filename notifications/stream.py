@@ -0,0 +1,67 @@
+# notifications/stream.py
+"""
+SSE endpoint for the header bell: /notifications/stream/
+
+The browser opens one EventSource per tab; every notification published for
+the user arrives as an ``event: notification`` message and the page refreshes
+the bell badge through the existing unread-count partial (served from cache).
+While the stream is open the bell polls every 120s instead of every 30s, to
+catch events lost on a reconnect; if the stream drops, the 30s poll resumes.
+
+Streaming needs an ASGI server (uvicorn/daphne + config.asgi). Under WSGI the
+endpoint answers 204, which tells EventSource to stop retrying, so the page
+simply keeps polling.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .broker import broker
+
+HEARTBEAT_SECONDS = 15
+# تُغلق الاتصالات دورياً ويعيد المتصفح الاتصال تلقائياً — يحرر الاتصالات الميتة خلف البروكسي
+STREAM_LIFETIME_SECONDS = 5 * 60
+RETRY_MS = 5000
+
+
+def format_event(event):
+    return f"event: notification\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def event_stream(user_id, heartbeat=HEARTBEAT_SECONDS, lifetime=STREAM_LIFETIME_SECONDS):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lifetime
+    async with broker.subscribe(user_id) as queue:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                # تعليق SSE — يبقي الاتصال حياً ويكشف انقطاع العميل
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event(event)
+
+
+def _authenticated_user_id(request):
+    user = request.user
+    return user.pk if user.is_authenticated else None
+
+
+async def notification_stream(request):
+    user_id = await sync_to_async(_authenticated_user_id)(request)
+    if user_id is None:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(event_stream(user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: do not buffer the stream
+    return response
@@ -130,6 +130,29 @@ class UnreadCountViewTest(TestCase):
         response = self.client.get(url_reverse('notifications:unread-count'))
         self.assertContains(response, '1')
 
+    def test_repeat_poll_is_served_from_cache(self):
+        Notification.objects.create(
+            recipient=self.user, notification_type=Notification.Type.STATUS_CHANGE,
+            title='أول',
+        )
+        url = url_reverse('notifications:unread-count') + '?since=0'
+        self.client.get(url)
+        self.client.get(url)
+        with self.assertNumQueries(2):  # session + user only
+            response = self.client.get(url)
+        self.assertContains(response, 'أول')
+
+    def test_new_notification_and_mark_all_read_refresh_the_counter(self):
+        url = url_reverse('notifications:unread-count')
+        self.assertEqual(self.client.get(url).context['unread_count'], 0)
+        Notification.objects.create(
+            recipient=self.user, notification_type=Notification.Type.STATUS_CHANGE,
+            title='جديد',
+        )
+        self.assertEqual(self.client.get(url).context['unread_count'], 1)
+        self.client.post(url_reverse('notifications:mark-all-read'))
+        self.assertEqual(self.client.get(url).context['unread_count'], 0)
+
 
 class MarkReadViewTest(TestCase):
     def setUp(self):
@@ -179,13 +202,24 @@ class MarkReadViewTest(TestCase):
 
 
 from unittest.mock import patch, MagicMock
+from django.core.signals import request_finished
+from django.core.cache import cache
+from django.db import transaction
+from clients.models import Client
+from .outbox import OutboxEntry, hr_user_ids, outbox
 from .services import NotificationService
 
 
 class NotificationServiceTest(TestCase):
+    """Routing through the outbox; entries are written when the test transaction 'commits'."""
+
     def setUp(self):
+        self.company = Client.objects.create(
+            name_ar='شركة الخدمة', name_en='Service Co', commercial_record='CR-TEST-SVC',
+        )
         self.hr_user = User.objects.create_user(
-            username='hr_staff', password='pass123', role=User.Roles.HR_ADMIN
+            username='hr_staff', password='pass123', role=User.Roles.HR_ADMIN,
+            related_client=self.company,
         )
         self.member_user = User.objects.create_user(
             username='member2', password='pass123', role=User.Roles.MEMBER
@@ -197,23 +231,22 @@ class NotificationServiceTest(TestCase):
         instance.pk = uuid.uuid4()
         instance.reference = reference
         instance.member.user = self.member_user
-        instance.member.client = MagicMock()
+        instance.member.client_id = self.company.pk
         return instance
 
-    @patch('notifications.services.User')
-    def test_no_notification_for_unmapped_status(self, MockUser):
+    def test_no_notification_for_unmapped_status(self):
         instance = self._make_sr_instance()
-        NotificationService.notify_service_request_status_change(instance, 'DRAFT', 'HR_REVIEW')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            NotificationService.notify_service_request_status_change(instance, 'DRAFT', 'HR_REVIEW')
+        self.assertEqual(callbacks, [])
         self.assertEqual(Notification.objects.count(), 0)
 
-    @patch('notifications.services.User')
     @patch('notifications.services.reverse', return_value='/service-requests/test/')
-    def test_submitted_notifies_hr_only(self, mock_reverse, MockUser):
-        MockUser.objects.filter.return_value = User.objects.filter(pk=self.hr_user.pk)
-        MockUser.Roles = User.Roles
+    def test_submitted_notifies_hr_only(self, mock_reverse):
         instance = self._make_sr_instance()
 
-        NotificationService.notify_service_request_status_change(instance, 'DRAFT', 'SUBMITTED')
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify_service_request_status_change(instance, 'DRAFT', 'SUBMITTED')
 
         notifs = Notification.objects.filter(recipient=self.hr_user)
         self.assertEqual(notifs.count(), 1)
@@ -222,30 +255,26 @@ class NotificationServiceTest(TestCase):
         # Member must NOT be notified for SUBMITTED
         self.assertEqual(Notification.objects.filter(recipient=self.member_user).count(), 0)
 
-    @patch('notifications.services.User')
     @patch('notifications.services.reverse', return_value='/service-requests/test/')
-    def test_in_review_notifies_member_only(self, mock_reverse, MockUser):
-        MockUser.objects.filter.return_value = User.objects.none()
-        MockUser.Roles = User.Roles
+    def test_in_review_notifies_member_only(self, mock_reverse):
         instance = self._make_sr_instance()
 
-        NotificationService.notify_service_request_status_change(instance, 'SUBMITTED', 'IN_REVIEW')
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify_service_request_status_change(instance, 'SUBMITTED', 'IN_REVIEW')
 
         self.assertEqual(Notification.objects.filter(recipient=self.member_user).count(), 1)
         self.assertEqual(Notification.objects.filter(recipient=self.hr_user).count(), 0)
 
-    @patch('notifications.services.User')
     @patch('notifications.services.reverse', return_value='/claims/test/')
-    def test_claim_returned_by_broker_notifies_both(self, mock_reverse, MockUser):
-        MockUser.objects.filter.return_value = User.objects.filter(pk=self.hr_user.pk)
-        MockUser.Roles = User.Roles
+    def test_claim_returned_by_broker_notifies_both(self, mock_reverse):
         instance = MagicMock()
         instance.pk = uuid.uuid4()
         instance.claim_reference = 'CLM-2026-00001'
         instance.member.user = self.member_user
-        instance.member.client = MagicMock()
+        instance.member.client_id = self.company.pk
 
-        NotificationService.notify_claim_status_change(instance, 'SUBMITTED_TO_BROKER', 'RETURNED_BY_BROKER')
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify_claim_status_change(instance, 'SUBMITTED_TO_BROKER', 'RETURNED_BY_BROKER')
 
         self.assertEqual(Notification.objects.filter(recipient=self.member_user).count(), 1)
         self.assertEqual(Notification.objects.filter(recipient=self.hr_user).count(), 1)
@@ -256,7 +285,8 @@ class NotificationServiceTest(TestCase):
         member = User.objects.create_user(username='mbr2', password='p', role=User.Roles.MEMBER)
         msg = Message.objects.create(sender=broker, recipient=member, subject='اختبار', body='نص')
 
-        NotificationService.notify_new_message(msg)
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify_new_message(msg)
 
         notif = Notification.objects.get(recipient=member)
         self.assertEqual(notif.notification_type, Notification.Type.MESSAGE)
@@ -270,15 +300,13 @@ class NotificationServiceTest(TestCase):
             sender=member, recipient=broker, subject='رد', body='رد', parent=root
         )
 
-        NotificationService.notify_new_message(reply)
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify_new_message(reply)
 
         notif = Notification.objects.get(recipient=broker)
         self.assertEqual(notif.notification_type, Notification.Type.REPLY)
 
 
-from clients.models import Client
-
-
 class HRScopingIntegrationTest(TestCase):
     """
     Verifies that HR users from one company do NOT receive notifications
@@ -304,7 +332,7 @@ class HRScopingIntegrationTest(TestCase):
             related_client=self.company_b, is_active=True,
         )
 
-        # Member user for Company A (sr.member is mocked; .client set directly)
+        # Member user for Company A (sr.member is mocked; .client_id set directly)
         self.member_user = User.objects.create_user(
             username='member_a', password='pass', role=User.Roles.MEMBER, is_active=True,
         )
@@ -314,14 +342,15 @@ class HRScopingIntegrationTest(TestCase):
         sr = MagicMock()
         sr.pk = uuid.uuid4()
         sr.reference = 'REQ-2026-SCOPING'
-        sr.member.client = self.company_a
+        sr.member.client_id = self.company_a.pk
         sr.member.user = self.member_user
         return sr
 
     @patch('notifications.services.reverse', return_value='/service-requests/test/')
     def test_hr_from_other_company_does_not_receive_notification(self, mock_reverse):
         sr = self._make_sr()
-        NotificationService.notify_service_request_status_change(sr, 'DRAFT', 'SUBMITTED')
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.notify_service_request_status_change(sr, 'DRAFT', 'SUBMITTED')
 
         # Company A's HR should receive it
         self.assertEqual(
@@ -338,74 +367,126 @@ class HRScopingIntegrationTest(TestCase):
 class SignalIntegrationTest(TestCase):
     """
     Tests that post_save signals correctly call NotificationService.
-    Uses @patch to avoid full fixture setup for ServiceRequest / Claim.
+    The old status comes from TrackedFieldsMixin.loaded_value.
     """
 
-    @patch('notifications.signals.ServiceRequest')
-    @patch('notifications.signals.NotificationService.notify_service_request_status_change')
-    def test_signal_calls_service_on_status_change(self, mock_notify, MockSR):
+    def _instance(self, old_status, new_status):
         mock_instance = MagicMock()
         mock_instance.pk = uuid.uuid4()
-        mock_instance.status = 'SUBMITTED'
-        mock_instance._original_status = 'DRAFT'
-
-        reloaded = MagicMock()
-        MockSR.objects.select_related.return_value.get.return_value = reloaded
+        mock_instance.status = new_status
+        mock_instance.loaded_value.return_value = old_status
+        return mock_instance
 
+    @patch('notifications.signals.NotificationService.notify_service_request_status_change')
+    def test_signal_calls_service_on_status_change(self, mock_notify):
         from notifications.signals import sr_notify_on_status_change
-        sr_notify_on_status_change(sender=MockSR, instance=mock_instance, created=False)
-
-        mock_notify.assert_called_once_with(reloaded, 'DRAFT', 'SUBMITTED')
+        mock_instance = self._instance('DRAFT', 'SUBMITTED')
+        sr_notify_on_status_change(sender=None, instance=mock_instance, created=False)
+        mock_notify.assert_called_once_with(mock_instance, 'DRAFT', 'SUBMITTED')
 
     @patch('notifications.signals.NotificationService.notify_service_request_status_change')
     def test_signal_does_not_fire_on_create(self, mock_notify):
-        from service_requests.models import ServiceRequest
         from notifications.signals import sr_notify_on_status_change
-        mock_instance = MagicMock(spec=ServiceRequest)
-        mock_instance.status = 'DRAFT'
-        sr_notify_on_status_change(sender=ServiceRequest, instance=mock_instance, created=True)
+        mock_instance = self._instance(None, 'DRAFT')
+        sr_notify_on_status_change(sender=None, instance=mock_instance, created=True)
         mock_notify.assert_not_called()
 
     @patch('notifications.signals.NotificationService.notify_service_request_status_change')
     def test_signal_does_not_fire_when_status_unchanged(self, mock_notify):
-        from service_requests.models import ServiceRequest
         from notifications.signals import sr_notify_on_status_change
-        mock_instance = MagicMock(spec=ServiceRequest)
-        mock_instance.status = 'SUBMITTED'
-        mock_instance._original_status = 'SUBMITTED'
-        sr_notify_on_status_change(sender=ServiceRequest, instance=mock_instance, created=False)
+        mock_instance = self._instance('SUBMITTED', 'SUBMITTED')
+        sr_notify_on_status_change(sender=None, instance=mock_instance, created=False)
         mock_notify.assert_not_called()
 
-    @patch('notifications.signals.Claim')
     @patch('notifications.signals.NotificationService.notify_claim_status_change')
-    def test_claim_signal_calls_service_on_status_change(self, mock_notify, MockClaim):
-        mock_instance = MagicMock()
-        mock_instance.pk = uuid.uuid4()
-        mock_instance.status = 'SUBMITTED_TO_HR'
-        mock_instance._original_status = 'DRAFT'
-
-        reloaded = MagicMock()
-        MockClaim.objects.select_related.return_value.get.return_value = reloaded
-
+    def test_claim_signal_calls_service_on_status_change(self, mock_notify):
         from notifications.signals import claim_notify_on_status_change
-        claim_notify_on_status_change(sender=MockClaim, instance=mock_instance, created=False)
-
-        mock_notify.assert_called_once_with(reloaded, 'DRAFT', 'SUBMITTED_TO_HR')
+        mock_instance = self._instance('DRAFT', 'SUBMITTED_TO_HR')
+        claim_notify_on_status_change(sender=None, instance=mock_instance, created=False)
+        mock_notify.assert_called_once_with(mock_instance, 'DRAFT', 'SUBMITTED_TO_HR')
 
-    def test_pre_save_sets_none_for_new_records(self):
-        """New records (pk set but not yet in DB) should get _original_status = None."""
-        from service_requests.models import ServiceRequest
-        from notifications.signals import sr_capture_old_status
-
-        # Create a mock instance that simulates a new (unsaved) object
-        mock_instance = MagicMock(spec=ServiceRequest)
-        mock_instance.pk = uuid.uuid4()
-        mock_instance._state = MagicMock()
-        mock_instance._state.adding = True  # New object not yet in DB
 
-        sr_capture_old_status(sender=ServiceRequest, instance=mock_instance, using='default')
+class OutboxTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        outbox.reset_metrics()
+        self.companies = [
+            Client.objects.create(name_ar=f'شركة {i}', commercial_record=f'CR-OUTBOX-{i}')
+            for i in range(3)
+        ]
+        self.hr = [
+            User.objects.create_user(
+                username=f'outbox_hr_{i}', password='p', role=User.Roles.HR_STAFF, related_client=company,
+            )
+            for i, company in enumerate(self.companies)
+        ]
 
-        self.assertIsNone(mock_instance._original_status)
+    def _entry(self, company, target='hr', title='تحديث'):
+        instance = MagicMock()
+        instance.member.client_id = company.pk
+        instance.member.user = None
+        return OutboxEntry(Notification.Type.STATUS_CHANGE, title, instance=instance, target=target)
+
+    def test_transaction_flushes_once_with_one_hr_lookup(self):
+        # استعلام واحد لموظفي HR للشركات الثلاث + إدراج واحد لكل الإشعارات
+        with self.assertNumQueries(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                for company in self.companies * 4:
+                    outbox.add(self._entry(company))
+        self.assertEqual(Notification.objects.count(), 12)
+        self.assertEqual(outbox.metrics()['flushes'], 1)
+        self.assertEqual(outbox.metrics()['last_flush_size'], 12)
+
+    def test_hr_users_are_cached_per_client(self):
+        with self.assertNumQueries(1):
+            hr_user_ids([c.pk for c in self.companies])
+        with self.assertNumQueries(0):
+            self.assertEqual(hr_user_ids([self.companies[0].pk]), {self.companies[0].pk: [self.hr[0].pk]})
+
+        # نقل الموظف لشركة أخرى يُبطل القائمتين
+        self.hr[0].related_client = self.companies[1]
+        self.hr[0].save()
+        self.assertEqual(hr_user_ids([self.companies[0].pk]), {self.companies[0].pk: []})
+        self.assertCountEqual(hr_user_ids([self.companies[1].pk])[self.companies[1].pk], [self.hr[0].pk, self.hr[1].pk])
+
+    def test_rolled_back_savepoint_drops_its_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox.add(self._entry(self.companies[0], title='باق'))
+            try:
+                with transaction.atomic():
+                    outbox.add(self._entry(self.companies[1], title='ملغى'))
+                    raise ValueError
+            except ValueError:
+                pass
+            outbox.add(self._entry(self.companies[2], title='بعد التراجع'))
+        self.assertCountEqual(Notification.objects.values_list('title', flat=True), ['باق', 'بعد التراجع'])
+        self.assertEqual(outbox.metrics()['flushes'], 1)
+
+    def test_entries_before_a_rolled_back_tail_flush_by_the_end_of_the_request(self):
+        # آخر إدخال سقط مع نقطة الحفظ: لا خطاف يعرف أنه الأخير
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox.add(self._entry(self.companies[0], title='باق'))
+            try:
+                with transaction.atomic():
+                    outbox.add(self._entry(self.companies[1], title='ملغى'))
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertFalse(Notification.objects.exists())
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['باق'])
+
+    def test_batch_outside_transaction_flushes_on_exit(self):
+        with patch.object(outbox, 'flush', wraps=outbox.flush) as flush:
+            with outbox.batch():
+                # وكأننا خارج أي معاملة (autocommit)
+                with patch('notifications.outbox.transaction.get_connection') as get_connection:
+                    get_connection.return_value.in_atomic_block = False
+                    for company in self.companies:
+                        outbox.add(self._entry(company))
+                flush.assert_not_called()
+            flush.assert_called_once()
+        self.assertEqual(Notification.objects.count(), 3)
 
 
 class NotificationListViewTest(TestCase):
@@ -525,3 +606,42 @@ class MessageViewTest(TestCase):
             {'body': 'محاولة'},
         )
         self.assertEqual(response.status_code, 400)
+
+
+import asyncio
+import threading
+
+from .broker import broker
+from .stream import event_stream
+
+
+class PushChannelTest(TestCase):
+    async def test_published_event_reaches_open_stream(self):
+        stream = event_stream('user-1', heartbeat=5, lifetime=5)
+        self.assertTrue((await stream.__anext__()).startswith('retry:'))
+        self.assertEqual(broker.connection_count(), 1)
+
+        # النشر يأتي عادة من خيط طلب متزامن
+        thread = threading.Thread(target=broker.publish, args=('user-1', {'title': 'مطالبة'}))
+        thread.start()
+        chunk = await asyncio.wait_for(stream.__anext__(), 2)
+        thread.join()
+
+        self.assertEqual(chunk, 'event: notification\ndata: {"title": "مطالبة"}\n\n')
+        await stream.aclose()
+        self.assertEqual(broker.connection_count(), 0)
+
+    async def test_other_users_and_heartbeat(self):
+        stream = event_stream('user-2', heartbeat=0.05, lifetime=5)
+        await stream.__anext__()
+        self.assertEqual(broker.publish('someone-else', {'title': 'x'}), 0)
+        self.assertEqual(await stream.__anext__(), ': keep-alive\n\n')
+        await stream.aclose()
+
+    def test_stream_falls_back_to_polling_under_wsgi(self):
+        user = User.objects.create_user(username='streamuser', password='pass123', role=User.Roles.MEMBER)
+        response = self.client.get(url_reverse('notifications:stream'))
+        self.assertEqual(response.status_code, 401)
+        self.client.force_login(user)
+        response = self.client.get(url_reverse('notifications:stream'))
+        self.assertEqual(response.status_code, 204)
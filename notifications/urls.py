@@ -1,6 +1,6 @@
 # notifications/urls.py
 from django.urls import path
-from . import views
+from . import stream, views
 
 app_name = 'notifications'
 
@@ -8,6 +8,7 @@ urlpatterns = [
     # ── Notification views ──────────────────────────────────────────────────
     path('', views.NotificationListView.as_view(), name='list'),
     path('unread-count/', views.unread_count, name='unread-count'),
+    path('stream/', stream.notification_stream, name='stream'),
     path('mark-read/<uuid:pk>/', views.mark_read, name='mark-read'),
     path('mark-all-read/', views.mark_all_read, name='mark-all-read'),
 
@@ -12,6 +12,7 @@ from django.views import View
 from django.views.decorators.http import require_POST
 
 from accounts.models import User
+from . import counters
 from .models import Message, Notification
 from .services import NotificationService
 
@@ -26,21 +27,15 @@ def unread_count(request):
     also injects _toast.html via HTMX OOB into #toast-container.
     Called by HTMX polling every 30s from the header bell badge.
     """
-    count = Notification.objects.filter(
-        recipient=request.user, is_read=False
-    ).count()
+    # يُخدم من الكاش — لا استعلامات ما لم يتغير شيء منذ آخر استطلاع
+    count = counters.unread_count(request.user.pk)
 
     toast = None
     since_param = request.GET.get('since')
     if since_param:
         try:
             since_dt = datetime.fromtimestamp(int(since_param), tz=dt_timezone.utc)
-            toast = (
-                Notification.objects
-                .filter(recipient=request.user, created_at__gt=since_dt)
-                .order_by('-created_at')
-                .first()
-            )
+            toast = counters.latest_since(request.user.pk, since_dt)
         except (ValueError, OSError, OverflowError):
             pass  # malformed timestamp — silently ignore
 
@@ -67,6 +62,7 @@ def mark_all_read(request):
     """Mark all of the current user's notifications as read."""
     if request.method == 'POST':
         Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        counters.invalidate([request.user.pk])
     return redirect('notifications:list')
 
 
@@ -4,7 +4,7 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from .models import Partner
 from .forms import PartnerForm
-from accounts.models import User
+from core.scope import Scope, get_scope
 
 # ==========================================
 # دالة مساعدة: عزل البيانات للشركاء (Data Isolation)
@@ -13,22 +13,17 @@ def get_allowed_partners(user):
     """
     تُرجع الشركاء المسموح للمستخدم رؤيتهم بناءً على دوره.
     """
-    # 1. السوبر أدمن يرى كل الشركاء المسجلين في المنصة
-    if user.role == User.Roles.SUPER_ADMIN:
-        return Partner.objects.all()
-        
-    # 2. الوسيط يرى فقط الشركاء الذين يمتلك عقداً نشطاً معهم
-    elif user.is_broker_role and user.related_broker:
+    scope = get_scope(user)
+
+    # الوسيط يرى فقط الشركاء الذين يمتلك عقداً نشطاً معهم
+    if scope.kind == Scope.BROKER:
         return Partner.objects.filter(
-            broker_contracts__broker=user.related_broker,
+            broker_contracts__broker_id=scope.broker_id,
             broker_contracts__is_active=True
         ).distinct()
-        
-    # 3. موظفو الشريك (صيدلي، الخ) يرون ملف شركتهم فقط
-    elif user.is_partner_role and user.related_partner:
-        return Partner.objects.filter(id=user.related_partner.id)
-        
-    return Partner.objects.none()
+
+    # السوبر أدمن: كل الشركاء | موظفو الشريك (صيدلي، الخ): ملف شركتهم فقط
+    return scope.restrict(Partner.objects.all(), partner='pk')
 
 # ==========================================
 
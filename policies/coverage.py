@@ -0,0 +1,208 @@
+"""
+Compiled coverage snapshot per PolicyClass.
+
+What a class actually covers is spread over four tables: the class's own
+network / annual limit / ClassBenefit overrides, and the PlanClass template
+with its PlanClassBenefit defaults. PolicyClass.get_effective_benefits()
+merges them in Python and only avoids N+1 behind the right prefetch.
+
+compile_snapshots() runs that merge once per class with the prefetch in
+place and stores the result in PolicyClassCoverage:
+
+    {
+        "network": {"id", "name_ar", "name_en"} | null,
+        "annual_limit": "150000.00" | null,
+        "benefits": [{"benefit_type_id", "name_ar", "name_en", "icon",
+                      "limit_amount", "copay_percentage", "description",
+                      "source": "class" | "plan"}, ...]
+    }
+
+Readers (member detail, claim review, policy detail) call for_class() /
+snapshots() — one lookup. The receivers in policies/signals.py mark a
+snapshot stale and bump its ``version`` when the class, its plan class,
+their benefits, the network or a benefit type changes; the next read
+recompiles it. The compiled data is written only if ``version`` has not
+moved since it was read, so a compilation racing an invalidation never
+marks old data fresh.
+
+Writes that bypass the ORM signals are repaired with:
+    python manage.py rebuild_coverage
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Optional
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ClassBenefit, PolicyClass, PolicyClassCoverage
+
+# صيغة البيانات المخزنة — ارفعها عند تغيير compile_class() فتُعاد ترجمة اللقطات القديمة عند قراءتها
+FORMAT = 1
+
+PREFETCH = ('benefits__benefit_type', 'plan_class__benefits__benefit_type')
+
+
+@dataclass(frozen=True)
+class Coverage:
+    policy_class_id: object
+    version: int
+    network: Optional[dict] = None
+    annual_limit: Optional[Decimal] = None
+    benefits: list = field(default_factory=list)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        data = snapshot.data
+        limit = data.get('annual_limit')
+        return cls(
+            policy_class_id=snapshot.policy_class_id,
+            version=snapshot.version,
+            network=data.get('network'),
+            annual_limit=Decimal(limit) if limit is not None else None,
+            benefits=[
+                {**benefit, 'limit_amount': Decimal(benefit['limit_amount'])}
+                for benefit in data.get('benefits', ())
+            ],
+        )
+
+
+# ── Compilation ─────────────────────────────────────────────────────────────
+
+def compile_class(policy_class):
+    """The snapshot data of one class (relations must be prefetched, see PREFETCH)."""
+    network = policy_class.effective_network
+    limit = policy_class.effective_annual_limit
+    return {
+        'network': {
+            'id': str(network.pk), 'name_ar': network.name_ar, 'name_en': network.name_en,
+        } if network else None,
+        'annual_limit': str(limit) if limit is not None else None,
+        'benefits': [
+            {
+                'benefit_type_id': str(benefit.benefit_type_id),
+                'name_ar': benefit.benefit_type.name_ar,
+                'name_en': benefit.benefit_type.name_en,
+                'icon': benefit.benefit_type.icon,
+                'limit_amount': str(benefit.limit_amount),
+                'copay_percentage': benefit.deductible_percentage,
+                'description': benefit.description,
+                'source': 'class' if isinstance(benefit, ClassBenefit) else 'plan',
+            }
+            for benefit in policy_class.get_effective_benefits()
+        ],
+    }
+
+
+def compile_snapshots(class_ids):
+    """
+    (Re)compile the snapshots of ``class_ids``. Returns {class_id: PolicyClassCoverage}.
+
+    The row's version is read before the sources, and the compiled data is
+    written only if the version is still the same. An invalidate() that lands
+    while the class is being compiled bumps the version, so the write is skipped
+    and the row stays stale for the next read. Missing rows are created stale
+    first, so an invalidation always has a row to bump.
+    """
+    class_ids = list(class_ids)
+    existing = PolicyClassCoverage.objects.in_bulk(class_ids)
+    missing = [class_id for class_id in class_ids if class_id not in existing]
+    if missing:
+        # طلبان متزامنان قد ينشئان نفس الفئة — يُتجاهل الثاني
+        PolicyClassCoverage.objects.bulk_create(
+            [
+                PolicyClassCoverage(policy_class_id=class_id, stale=True)
+                for class_id in PolicyClass.objects.filter(pk__in=missing).values_list('pk', flat=True)
+            ],
+            ignore_conflicts=True,
+        )
+        existing.update(PolicyClassCoverage.objects.in_bulk(missing))
+
+    classes = (
+        PolicyClass.objects.filter(pk__in=list(existing))
+        .select_related('network', 'plan_class__network')
+        .prefetch_related(*PREFETCH)
+    )
+    now = timezone.now()
+    compiled = {}
+    for policy_class in classes:
+        snapshot = existing[policy_class.pk]
+        read_version = snapshot.version
+        # invalidate() رفع الإصدار مسبقاً للقطة القديمة؛ إعادة الترجمة دون إبطال (rebuild) ترفعه هنا
+        version = read_version if snapshot.stale else read_version + 1
+        data = compile_class(policy_class)
+        written = PolicyClassCoverage.objects.filter(
+            policy_class_id=policy_class.pk, version=read_version,
+        ).update(data=data, format=FORMAT, stale=False, version=version, compiled_at=now)
+        snapshot.data, snapshot.format, snapshot.compiled_at = data, FORMAT, now
+        if written:
+            snapshot.stale, snapshot.version = False, version
+        compiled[policy_class.pk] = snapshot
+    return compiled
+
+
+# ── Reading ─────────────────────────────────────────────────────────────────
+
+def snapshots(class_ids):
+    """{class_id: Coverage}, recompiling missing or stale snapshots on the way."""
+    class_ids = {class_id for class_id in class_ids if class_id is not None}
+    if not class_ids:
+        return {}
+    found = {
+        snapshot.policy_class_id: snapshot
+        for snapshot in PolicyClassCoverage.objects.filter(
+            policy_class_id__in=class_ids, stale=False, format=FORMAT,
+        )
+    }
+    missing = class_ids - found.keys()
+    if missing:
+        found.update(compile_snapshots(missing))
+    return {class_id: Coverage.from_snapshot(snapshot) for class_id, snapshot in found.items()}
+
+
+def for_class(class_id):
+    """The Coverage of one class (or None for a member without a class)."""
+    return snapshots([class_id]).get(class_id)
+
+
+# ── Invalidation ────────────────────────────────────────────────────────────
+
+def invalidate(class_ids):
+    class_ids = list(class_ids)
+    if class_ids:
+        # يُرفع الإصدار حتى للقطة المُعلَّمة مسبقاً: ترجمة جارية قرأت المصادر القديمة لا تُكتب
+        PolicyClassCoverage.objects.filter(policy_class_id__in=class_ids).update(
+            stale=True, version=F('version') + 1,
+        )
+
+
+def classes_using_plan_classes(plan_class_ids):
+    return PolicyClass.objects.filter(plan_class_id__in=plan_class_ids).values_list('pk', flat=True)
+
+
+def classes_using_benefit_type(benefit_type_id):
+    return PolicyClass.objects.filter(
+        Q(benefits__benefit_type_id=benefit_type_id)
+        | Q(plan_class__benefits__benefit_type_id=benefit_type_id)
+    ).values_list('pk', flat=True).distinct()
+
+
+def rebuild():
+    """
+    Recompile every stored snapshot whose data no longer matches its sources.
+    Classes without a snapshot are left to the first read. Returns the number recompiled.
+    """
+    current = {s.policy_class_id: s for s in PolicyClassCoverage.objects.all()}
+    classes = (
+        PolicyClass.objects.filter(coverage_snapshot__isnull=False)
+        .select_related('network', 'plan_class__network')
+        .prefetch_related(*PREFETCH)
+    )
+    drifted = [
+        policy_class.pk for policy_class in classes
+        if current[policy_class.pk].stale
+        or current[policy_class.pk].format != FORMAT
+        or current[policy_class.pk].data != compile_class(policy_class)
+    ]
+    compile_snapshots(drifted)
+    return len(drifted)
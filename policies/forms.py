@@ -73,11 +73,10 @@ class PolicyForm(forms.ModelForm):
         elif self.instance.pk and self.instance.client_id:
             selected_client = self.instance.client
 
-        from clients.models import get_group_root
+        from clients.models import group_root_id
         if selected_client:
-            group_root = get_group_root(selected_client)
             self.fields['sponsor_number'].queryset = SponsorNumber.objects.filter(
-                group=group_root,
+                group_id=group_root_id(selected_client),
                 is_active=True,
             ).select_related('owner_client')
             self.fields['sponsor_number'].label_from_instance = (
@@ -85,11 +84,8 @@ class PolicyForm(forms.ModelForm):
             )
         else:
             # قبل اختيار العميل: نعرض كفلاء كل العملاء المسموحين
-            allowed_clients = self.fields['client'].queryset
-            if allowed_clients:
-                group_ids = set()
-                for c in allowed_clients:
-                    group_ids.add(get_group_root(c).pk)
+            group_ids = set(self.fields['client'].queryset.values_list('root_id', flat=True))
+            if group_ids:
                 self.fields['sponsor_number'].queryset = SponsorNumber.objects.filter(
                     group_id__in=group_ids,
                     is_active=True,
@@ -204,4 +200,21 @@ class PlanClassBenefitForm(forms.ModelForm):
             'limit_amount': forms.NumberInput(attrs={'class': FIELD_CSS, 'step': '0.01'}),
             'deductible_percentage': forms.NumberInput(attrs={'class': FIELD_CSS}),
             'description': forms.Textarea(attrs={'class': FIELD_CSS, 'rows': 2}),
-        }
\ No newline at end of file
+        }
+
+class BulkRenewalForm(forms.Form):
+    """نافذة تواريخ الانتهاء للتجديد الجماعي (policies/renewal.py)."""
+    date_from = forms.DateField(
+        label="تنتهي من",
+        widget=forms.DateInput(attrs={'class': 'w-full px-3 py-2 border border-slate-300 rounded-md focus:outline-none focus:ring-1 focus:ring-brand-500', 'type': 'date'}),
+    )
+    date_to = forms.DateField(
+        label="إلى",
+        widget=forms.DateInput(attrs={'class': 'w-full px-3 py-2 border border-slate-300 rounded-md focus:outline-none focus:ring-1 focus:ring-brand-500', 'type': 'date'}),
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('date_from') and cleaned.get('date_to') and cleaned['date_to'] < cleaned['date_from']:
+            raise forms.ValidationError("نهاية الفترة يجب أن تكون بعد بدايتها.")
+        return cleaned
@@ -0,0 +1,170 @@
+"""
+Management command: bench_policy_renewal
+========================================
+يقيس زمن وعدد استعلامات تجديد محفظة كاملة (افتراضياً 500 وثيقة × 5 فئات ×
+30 منفعة) بمحرك التجديد الجماعي (policies/renewal.py)، مقارنةً بالنسخ القديم
+صفاً بصف (PolicyClass.objects.create / ClassBenefit.objects.create) على عينة.
+
+الاستخدام:
+    python manage.py bench_policy_renewal
+    python manage.py bench_policy_renewal --policies 500 --classes 5 --benefits 30 --legacy 50
+
+تُنشأ البيانات داخل معاملة ويتم التراجع عنها بالكامل بعد القياس.
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from brokers.models import Broker
+from clients.models import Client
+from members.models import Member
+from networks.models import Network, ServiceProvider
+from policies import renewal
+from policies.models import BenefitType, ClassBenefit, Policy, PolicyClass
+from providers.models import Provider
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _QueryCounter:
+    """execute_wrapper that counts queries — CaptureQueriesContext keeps only the last 9000."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return self.count
+
+
+def _legacy_clone(old_policy, policy_number):
+    """The per-row copy policy_renew used before policies/renewal.py."""
+    new_policy = Policy.objects.create(
+        client=old_policy.client, provider=old_policy.provider, plan=old_policy.plan,
+        master_policy=old_policy.master_policy, sponsor_number=old_policy.sponsor_number,
+        policy_number=policy_number, start_date=old_policy.end_date + datetime.timedelta(days=1),
+        end_date=renewal.next_anniversary(old_policy.end_date), is_active=True,
+    )
+    old_classes = old_policy.classes.select_related('plan_class', 'network').prefetch_related('benefits__benefit_type')
+    for old_cls in old_classes:
+        new_cls = PolicyClass.objects.create(
+            policy=new_policy, plan_class=old_cls.plan_class, name=old_cls.name,
+            network=old_cls.network, annual_limit=old_cls.annual_limit,
+        )
+        for benefit in old_cls.benefits.all():
+            ClassBenefit.objects.create(
+                policy_class=new_cls, benefit_type=benefit.benefit_type, limit_amount=benefit.limit_amount,
+                deductible_percentage=benefit.deductible_percentage, description=benefit.description,
+            )
+
+
+class Command(BaseCommand):
+    help = "Benchmark bulk policy renewal against the legacy row-by-row copy."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policies', type=int, default=500)
+        parser.add_argument('--classes', type=int, default=5, help="Classes per policy.")
+        parser.add_argument('--benefits', type=int, default=30, help="Benefits per class.")
+        parser.add_argument('--members', type=int, default=2, help="Members per class.")
+        parser.add_argument('--legacy', type=int, default=50, help="Policies copied with the legacy loop.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        self.stdout.write("Creating policies, classes and benefits...")
+        broker = Broker.objects.create(name_ar='وسيط', name_en='Bench Broker', commercial_record='BENCH-BR')
+        insurer = Provider.objects.create(name_ar='مزود', name_en='Bench Insurer', license_number='BENCH-LIC')
+        network = Network.objects.create(provider=insurer, name_ar='شبكة', name_en='Bench Network')
+        hospitals = ServiceProvider.objects.bulk_create(
+            ServiceProvider(name_ar=f'مستشفى {i}', name_en=f'Hospital {i}', type='HOSPITAL', city='Riyadh')
+            for i in range(50)
+        )
+        network.hospitals.add(*hospitals[:40])
+        benefit_types = BenefitType.objects.bulk_create(
+            BenefitType(name_ar=f'منفعة {i}', name_en=f'Benefit {i}') for i in range(options['benefits'])
+        )
+        company = Client.objects.create(
+            name_ar='شركة', name_en='Bench Company', commercial_record='BENCH-C', broker=broker,
+        )
+        end = datetime.date.today() + datetime.timedelta(days=30)
+        policies = Policy.objects.bulk_create(
+            Policy(
+                client=company, provider=insurer, policy_number=f'BENCH-{i:04d}',
+                start_date=end - datetime.timedelta(days=364), end_date=end,
+            )
+            for i in range(options['policies'])
+        )
+        classes = PolicyClass.objects.bulk_create(
+            PolicyClass(policy=policy, name=f'Class {c}', network=network, annual_limit=100000)
+            for policy in policies
+            for c in range(options['classes'])
+        )
+        ClassBenefit.objects.bulk_create(
+            (
+                ClassBenefit(policy_class=policy_class, benefit_type=benefit_type, limit_amount=5000)
+                for policy_class in classes
+                for benefit_type in benefit_types
+            ),
+            batch_size=5000,
+        )
+        PolicyClass.excluded_providers.through.objects.bulk_create(
+            PolicyClass.excluded_providers.through(policyclass_id=policy_class.pk, serviceprovider_id=hospitals[0].pk)
+            for policy_class in classes
+        )
+        PolicyClass.extra_providers.through.objects.bulk_create(
+            PolicyClass.extra_providers.through(policyclass_id=policy_class.pk, serviceprovider_id=hospitals[-1].pk)
+            for policy_class in classes
+        )
+        members = []
+        for c, policy_class in enumerate(classes):
+            for m in range(options['members']):
+                member = Member(
+                    client=company, policy_class=policy_class, full_name=f'Member {c}-{m}',
+                    national_id=f'8{c:06d}{m:03d}', birth_date=datetime.date(1990, 1, 1),
+                    gender='M', relation='PRINCIPAL', phone_number='0500000000',
+                )
+                member.sync_tenant_keys()
+                members.append(member)
+        Member.objects.bulk_create(members, batch_size=2000)
+
+        sample = policies[:options['legacy']]
+        if sample:
+            with connection.execute_wrapper(queries := _QueryCounter()):
+                started = time.perf_counter()
+                for policy in sample:
+                    _legacy_clone(policy, f'{policy.policy_number}-LEGACY')
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"legacy: {len(sample)} policies in {elapsed:.2f}s "
+                f"({elapsed / len(sample) * 1000:.1f}ms, {len(queries) / len(sample):.0f} queries per policy)"
+            )
+
+        with connection.execute_wrapper(queries := _QueryCounter()):
+            started = time.perf_counter()
+            plans = renewal.preview(renewal.expiring(Policy.objects.filter(client=company), end, end))
+            previewed = time.perf_counter() - started
+            preview_queries = len(queries)
+            # التجديد في يوم بدء الوثائق الجديدة: يُقاس نقل الأعضاء أيضاً
+            report = renewal.renew(plans, move_members=True, today=end + datetime.timedelta(days=1))
+            elapsed = time.perf_counter() - started
+        renewed = len(report.renewed)
+        self.stdout.write(f"preview: {len(plans)} policies in {previewed:.2f}s ({preview_queries} queries)")
+        self.stdout.write(
+            f"bulk: {renewed} policies in {elapsed:.2f}s "
+            f"({elapsed / max(renewed, 1) * 1000:.1f}ms, {(len(queries) - preview_queries) / max(renewed, 1):.0f} "
+            f"queries per policy); {report.classes} classes, {report.benefits} benefits, "
+            f"{report.overrides} overrides, {report.members} members moved, {len(report.failed)} failed"
+        )
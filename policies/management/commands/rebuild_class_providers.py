@@ -0,0 +1,41 @@
+"""
+Management command: rebuild_class_providers
+===========================================
+يعيد بناء جدول المستشفيات الفعلية لكل فئة (PolicyClassProvider) من الشبكات
+والاستثناءات والإضافات — للإصلاح بعد تعديلات تمت خارج الـ ORM (SQL مباشر، ‎.update()).
+
+الاستخدام:
+    python manage.py rebuild_class_providers           (إصلاح)
+    python manage.py rebuild_class_providers --check   (تقرير الفروقات فقط دون حفظ)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from policies import provider_sets
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized PolicyClass → ServiceProvider table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                added, removed = provider_sets.rebuild_all()
+                if options['check']:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        prefix = "would have " if options['check'] else ""
+        self.stdout.write(f"{prefix}added {added} row(s), {prefix}removed {removed} stale row(s)")
+        if options['check'] and (added or removed):
+            self.stdout.write(self.style.WARNING("PolicyClassProvider is out of sync."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,41 @@
+"""
+Management command: rebuild_coverage
+====================================
+يعيد ترجمة لقطات التغطية لكل فئة (PolicyClassCoverage) التي لا تطابق مصادرها —
+للإصلاح بعد تعديلات تمت خارج الـ ORM (SQL مباشر، ‎.update()).
+
+الاستخدام:
+    python manage.py rebuild_coverage           (إصلاح)
+    python manage.py rebuild_coverage --check   (تقرير الفروقات فقط دون حفظ)
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from policies import coverage
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Recompile the per-class coverage snapshots."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                fixed = coverage.rebuild()
+                if options['check']:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        prefix = "would have " if options['check'] else ""
+        self.stdout.write(f"{prefix}recompiled {fixed} snapshot(s)")
+        if options['check'] and fixed:
+            self.stdout.write(self.style.WARNING("PolicyClassCoverage is out of sync."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,61 @@
+"""
+Management command: renew_policies
+==================================
+يجدّد كل الوثائق النشطة التي تنتهي في فترة معينة (لوسيط واحد أو للكل):
+ينسخ الفئات والمنافع والمستشفيات المستبعدة/الإضافية إلى وثيقة للفترة التالية
+— كل وثيقة في معاملة مستقلة (policies/renewal.py).
+
+الاستخدام:
+    python manage.py renew_policies --from 2026-12-01 --to 2026-12-31 --check     (معاينة فقط)
+    python manage.py renew_policies --broker <id> --from 2026-12-01 --to 2026-12-31
+    python manage.py renew_policies --from 2026-12-01 --to 2026-12-31 --move-members
+
+مع --move-members يُنقل الأعضاء فوراً إن بدأ سريان الوثيقة الجديدة، وإلا عند
+بدء سريانها عبر الأمر اليومي start_renewed_policies.
+"""
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from policies import renewal
+from policies.models import Policy
+
+
+class Command(BaseCommand):
+    help = "Renew every active policy expiring in a date window (classes, benefits and provider overrides)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=datetime.date.fromisoformat, required=True)
+        parser.add_argument('--to', dest='date_to', type=datetime.date.fromisoformat, required=True)
+        parser.add_argument('--broker', help="Only policies of this broker's clients.")
+        parser.add_argument('--move-members', action='store_true', help="Re-point members to the new classes when the new policy starts.")
+        parser.add_argument('--check', action='store_true', help="Preview the renewals without writing.")
+
+    def handle(self, *args, **options):
+        policies = Policy.objects.all()
+        if options['broker']:
+            policies = policies.filter(client__broker_id=options['broker'])
+        plans = renewal.preview(renewal.expiring(policies, options['date_from'], options['date_to']))
+
+        for plan in plans:
+            line = (
+                f"{plan.policy.policy_number} → {plan.policy_number} "
+                f"({plan.start_date} – {plan.end_date}, {plan.policy.class_count} classes, "
+                f"{plan.policy.member_count} members)"
+            )
+            self.stdout.write(line if plan.ok else self.style.WARNING(f"{line}: {plan.problem}"))
+
+        if options['check']:
+            self.stdout.write(f"{sum(plan.ok for plan in plans)} of {len(plans)} policies can be renewed.")
+            return
+
+        report = renewal.renew(plans, move_members=options['move_members'])
+        for policy, error in report.failed:
+            self.stdout.write(self.style.ERROR(f"{policy.policy_number}: {error}"))
+        self.stdout.write(
+            f"renewed {len(report.renewed)} policies ({report.classes} classes, {report.benefits} benefits, "
+            f"{report.overrides} provider overrides, {report.members} members moved, "
+            f"{report.scheduled} policies moving members on their start date); "
+            f"skipped {len(report.skipped)}, failed {len(report.failed)}"
+        )
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,28 @@
+"""
+Management command: start_renewed_policies
+==========================================
+ينقل أعضاء الوثائق المجدّدة إلى فئات الوثيقة الجديدة (حسب اسم الفئة) عند
+بدء سريانها — للوثائق التي جُدّدت مع نقل الأعضاء قبل تاريخ بدئها
+(policies/renewal.py). يُشغَّل يومياً.
+
+الاستخدام:
+    python manage.py start_renewed_policies
+    python manage.py start_renewed_policies --check   (عرض ما سيُنقل دون حفظ)
+"""
+from django.core.management.base import BaseCommand
+
+from policies import renewal
+
+
+class Command(BaseCommand):
+    help = "Move the members of renewed policies that have started to the new classes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Report the moves without writing.")
+
+    def handle(self, *args, **options):
+        results = renewal.move_started(check=options['check'])
+        prefix = "would move" if options['check'] else "moved"
+        for policy, members in results:
+            self.stdout.write(f"{policy.policy_number} ({policy.start_date}): {prefix} {members} member(s)")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} started renewal(s)."))
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.27 on 2026-10-18 20:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_effective_providers(apps, schema_editor):
+    """Backfill the table with (network hospitals − excluded) ∪ extra per class."""
+    PolicyClass = apps.get_model('policies', 'PolicyClass')
+    PolicyClassProvider = apps.get_model('policies', 'PolicyClassProvider')
+    Network = apps.get_model('networks', 'Network')
+
+    hospitals = {}
+    rows = []
+    for policy_class in PolicyClass.objects.select_related('plan_class').iterator():
+        network_id = policy_class.network_id
+        if not network_id and policy_class.plan_class_id:
+            network_id = policy_class.plan_class.network_id
+        if network_id and network_id not in hospitals:
+            hospitals[network_id] = set(
+                Network.hospitals.through.objects.filter(network_id=network_id)
+                .values_list('serviceprovider_id', flat=True)
+            )
+        base = hospitals.get(network_id, set())
+        excluded = set(policy_class.excluded_providers.values_list('pk', flat=True))
+        extra = set(policy_class.extra_providers.values_list('pk', flat=True))
+        for provider_id in (base - excluded) | extra:
+            rows.append(PolicyClassProvider(policy_class_id=policy_class.pk, service_provider_id=provider_id))
+    PolicyClassProvider.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('networks', '0002_alter_network_options_alter_serviceprovider_options'),
+        ('policies', '0008_policy_sponsor_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolicyClassProvider',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('policy_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_provider_links', to='policies.policyclass')),
+                ('service_provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_class_links', to='networks.serviceprovider')),
+            ],
+            options={
+                'verbose_name': 'Effective Class Provider',
+                'indexes': [models.Index(fields=['service_provider', 'policy_class'], name='policyclassprov_provider_idx')],
+                'unique_together': {('policy_class', 'service_provider')},
+            },
+        ),
+        migrations.RunPython(populate_effective_providers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policies', '0009_policyclassprovider'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolicyClassCoverage',
+            fields=[
+                ('policy_class', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='coverage_snapshot', serialize=False, to='policies.policyclass')),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('format', models.PositiveSmallIntegerField(default=0)),
+                ('stale', models.BooleanField(default=False)),
+                ('data', models.JSONField(default=dict)),
+                ('compiled_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Class Coverage Snapshot',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.27 on 2026-10-18 21:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policies', '0010_class_coverage_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policy',
+            name='renewed_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='renewals', to='policies.policy', verbose_name='Renewed From'),
+        ),
+    ]
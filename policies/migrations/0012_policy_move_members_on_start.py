@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 22:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policies', '0011_policy_renewed_from'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='policy',
+            name='move_members_on_start',
+            field=models.BooleanField(default=False, verbose_name='Move Members On Start'),
+        ),
+    ]
@@ -4,6 +4,8 @@ from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 
+from core.tracking import TrackedFieldsMixin
+
 
 # --- 0. قالب خطة التأمين (Insurance Plan Template Layer) ---
 
@@ -40,11 +42,13 @@ class InsurancePlan(models.Model):
         return f"{self.name} ({self.provider})"
 
 
-class PlanClass(models.Model):
+class PlanClass(TrackedFieldsMixin, models.Model):
     """
     فئة افتراضية داخل خطة التأمين (VIP, فئة أ, فئة ج ...).
     تحدد الشبكة الافتراضية والحد السنوي الافتراضي.
     """
+    tracked_fields = ('network_id', 'annual_limit')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     plan = models.ForeignKey(
         InsurancePlan,
@@ -162,6 +166,17 @@ class Policy(models.Model):
         related_name='policies',
         verbose_name=_("Insurance Plan Template"),
     )
+    # الوثيقة التي جُدّدت منها هذه الوثيقة (policies/renewal.py)
+    renewed_from = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='renewals',
+        verbose_name=_("Renewed From"),
+    )
+    # أعضاء الوثيقة السابقة يُنقلون إلى فئاتها عند بدء سريانها (start_renewed_policies)
+    move_members_on_start = models.BooleanField(_("Move Members On Start"), default=False)
     policy_number = models.CharField(_("Policy Number"), max_length=100)
     start_date = models.DateField(_("Start Date"))
     end_date = models.DateField(_("End Date"))
@@ -199,8 +214,8 @@ class Policy(models.Model):
 
         # التحقق: الكفيل يجب أن يكون ضمن نفس مجموعة القابضة الخاصة بالوثيقة
         if self.sponsor_number_id:
-            from clients.models import get_group_root
-            if get_group_root(self.client) != self.sponsor_number.group:
+            from clients.models import group_root_id
+            if group_root_id(self.client) != self.sponsor_number.group_id:
                 raise ValidationError(_("The sponsor number must belong to the same holding group as the policy's client."))
 
         # التحقق: لا يمكن تكرار الكفيل في أكثر من وثيقة لنفس الشركة في نفس الفترة
@@ -250,10 +265,13 @@ class Policy(models.Model):
             return self.master_policy.classes.all()
         return self.classes.all()
 # --- 3. الفئة (تم التعديل لإزالة الحقول الثابتة) ---
-class PolicyClass(models.Model):
+class PolicyClass(TrackedFieldsMixin, models.Model):
     """
     الفئة تحدد الشبكة والحد العام، ولكن تفاصيل المنافع تكون في جدول منفصل
     """
+    # مصدر الشبكة الفعلية — تغيّره يعيد حساب PolicyClassProvider (والحد يُبطل لقطة التغطية)
+    tracked_fields = ('network_id', 'plan_class_id', 'annual_limit')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     policy = models.ForeignKey(Policy, on_delete=models.CASCADE, related_name='classes')
     
@@ -324,21 +342,20 @@ class PolicyClass(models.Model):
         - مستشفيات الشبكة الفعلية
         - ناقصاً المستشفيات المستبعدة (excluded_providers)
         - زائداً المستشفيات الإضافية (extra_providers)
+
+        تُقرأ من الجدول المحسوب مسبقاً PolicyClassProvider (انظر policies/provider_sets.py).
         """
         from networks.models import ServiceProvider
-        network = self.effective_network
-        if network:
-            base_ids = set(network.hospitals.values_list('id', flat=True))
-        else:
-            base_ids = set()
-
-        excluded_ids = set(self.excluded_providers.values_list('id', flat=True))
-        extra_ids = set(self.extra_providers.values_list('id', flat=True))
+        return ServiceProvider.objects.filter(
+            effective_class_links__policy_class=self
+        ).order_by('name_ar')
 
-        final_ids = (base_ids - excluded_ids) | extra_ids
-        if not final_ids:
-            return ServiceProvider.objects.none()
-        return ServiceProvider.objects.filter(id__in=final_ids).order_by('name_ar')
+    def covers_provider(self, provider):
+        """هل المستشفى ضمن الشبكة الفعلية لهذه الفئة؟"""
+        provider_id = getattr(provider, 'pk', provider)
+        return PolicyClassProvider.objects.filter(
+            policy_class=self, service_provider_id=provider_id
+        ).exists()
 
     @property
     def effective_annual_limit(self):
@@ -355,6 +372,8 @@ class PolicyClass(models.Model):
         الأولوية: ClassBenefit (override) ثم PlanClassBenefit (افتراضي).
         المنافع ذات is_excluded=True تُحذف من النتيجة.
 
+        للقراءة استخدم اللقطة المجمّعة policies.coverage.for_class() — هذه الدالة تُستخدم لبنائها.
+
         يجب استدعاء هذه الدالة بعد prefetch_related كالتالي:
             PolicyClass.objects.prefetch_related(
                 'benefits__benefit_type',
@@ -404,6 +423,61 @@ class PolicyClass(models.Model):
     def __str__(self):
         return f"{self.name} - {self.policy.policy_number}"
 
+class PolicyClassProvider(models.Model):
+    """
+    المستشفيات الفعلية لكل فئة (جدول محسوب مسبقاً):
+    (مستشفيات الشبكة الفعلية − المستبعدة) ∪ الإضافية.
+    لا يُعدَّل يدوياً — تحافظ عليه إشارات policies/signals.py.
+    """
+    policy_class = models.ForeignKey(
+        PolicyClass,
+        on_delete=models.CASCADE,
+        related_name='effective_provider_links',
+    )
+    service_provider = models.ForeignKey(
+        'networks.ServiceProvider',
+        on_delete=models.CASCADE,
+        related_name='effective_class_links',
+    )
+
+    class Meta:
+        unique_together = ('policy_class', 'service_provider')
+        indexes = [
+            models.Index(fields=['service_provider', 'policy_class'], name='policyclassprov_provider_idx'),
+        ]
+        verbose_name = _("Effective Class Provider")
+
+    def __str__(self):
+        return f"{self.policy_class_id} → {self.service_provider_id}"
+
+
+class PolicyClassCoverage(models.Model):
+    """
+    التغطية الفعلية لكل فئة (لقطة محسوبة مسبقاً): الشبكة والحد السنوي وقائمة المنافع
+    بعد دمج override الوثيقة مع قالب الخطة. تُعلَّم stale عند أي تغيير في مصادرها
+    وتُعاد ترجمتها عند القراءة التالية — انظر policies/coverage.py.
+    """
+    policy_class = models.OneToOneField(
+        PolicyClass,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='coverage_snapshot',
+    )
+    # يزيد مع كل ترجمة — يصلح كمفتاح للكاش
+    version = models.PositiveIntegerField(default=1)
+    # صيغة البيانات المجمّعة (coverage.FORMAT) — تغييرها يعيد الترجمة تلقائياً
+    format = models.PositiveSmallIntegerField(default=0)
+    stale = models.BooleanField(default=False)
+    data = models.JSONField(default=dict)
+    compiled_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Class Coverage Snapshot")
+
+    def __str__(self):
+        return f"{self.policy_class_id} v{self.version}"
+
+
 # --- 4. تفاصيل المنافع لكل فئة (الجدول الجديد الهام جداً) ---
 class ClassBenefit(models.Model):
     """
@@ -0,0 +1,133 @@
+"""
+Materialized effective-provider set per PolicyClass.
+
+PolicyClassProvider holds one row per (policy_class, service_provider) that is
+covered by the class:
+
+    (effective network hospitals − excluded_providers) ∪ extra_providers
+
+The rows are kept in sync by the receivers in policies/signals.py, so reads
+("which hospitals does this member cover?", "is this hospital in network?")
+become a single indexed join instead of rebuilding Python sets on every call.
+
+Every sync is a diff: only the rows that actually changed are inserted or
+deleted. ``provider_ids`` narrows a sync to the providers touched by an
+m2m change, which keeps adding one hospital to a large network cheap.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from core import conditional
+from networks.models import Network
+from networks.search import invalidate_city_facets
+from .models import PolicyClass, PolicyClassProvider
+
+
+def classes_using_network(network_ids):
+    """PolicyClass ids whose effective network is one of ``network_ids``."""
+    return list(
+        PolicyClass.objects.filter(
+            Q(network_id__in=network_ids)
+            | Q(network__isnull=True, plan_class__network_id__in=network_ids)
+        ).values_list('pk', flat=True)
+    )
+
+
+def _pairs_by_class(through, class_ids, provider_ids):
+    rows = through.objects.filter(policyclass_id__in=class_ids)
+    if provider_ids is not None:
+        rows = rows.filter(serviceprovider_id__in=provider_ids)
+    grouped = defaultdict(set)
+    for class_id, provider_id in rows.values_list('policyclass_id', 'serviceprovider_id'):
+        grouped[class_id].add(provider_id)
+    return grouped
+
+
+def _network_hospitals(network_ids, provider_ids):
+    rows = Network.hospitals.through.objects.filter(network_id__in=network_ids)
+    if provider_ids is not None:
+        rows = rows.filter(serviceprovider_id__in=provider_ids)
+    grouped = defaultdict(set)
+    for network_id, provider_id in rows.values_list('network_id', 'serviceprovider_id'):
+        grouped[network_id].add(provider_id)
+    return grouped
+
+
+def sync_classes(class_ids, provider_ids=None):
+    """
+    Bring the PolicyClassProvider rows of ``class_ids`` in line with their
+    current network/exclusion/extra configuration. When ``provider_ids`` is
+    given only those providers are re-evaluated.
+
+    Returns (added, removed) row counts.
+    """
+    class_ids = list(class_ids)
+    if not class_ids:
+        return 0, 0
+    if provider_ids is not None:
+        provider_ids = list(provider_ids)
+        if not provider_ids:
+            return 0, 0
+
+    network_of = {
+        pk: network_id or plan_network_id
+        for pk, network_id, plan_network_id in PolicyClass.objects.filter(pk__in=class_ids)
+        .values_list('pk', 'network_id', 'plan_class__network_id')
+    }
+    hospitals = _network_hospitals({n for n in network_of.values() if n}, provider_ids)
+    excluded = _pairs_by_class(PolicyClass.excluded_providers.through, network_of, provider_ids)
+    extra = _pairs_by_class(PolicyClass.extra_providers.through, network_of, provider_ids)
+
+    current_rows = PolicyClassProvider.objects.filter(policy_class_id__in=class_ids)
+    if provider_ids is not None:
+        current_rows = current_rows.filter(service_provider_id__in=provider_ids)
+    current = set(current_rows.values_list('policy_class_id', 'service_provider_id'))
+
+    wanted = set()
+    for class_id, network_id in network_of.items():
+        base = hospitals.get(network_id, set()) if network_id else set()
+        for provider_id in (base - excluded.get(class_id, set())) | extra.get(class_id, set()):
+            wanted.add((class_id, provider_id))
+
+    to_add = wanted - current
+    # صفوف فئات محذوفة تُحذف تلقائياً (CASCADE)، لذا نكتفي بالفئات الموجودة
+    to_remove = {pair for pair in current if pair[0] in network_of} - wanted
+
+    with transaction.atomic():
+        removed_by_class = defaultdict(list)
+        for class_id, provider_id in to_remove:
+            removed_by_class[class_id].append(provider_id)
+        for class_id, ids in removed_by_class.items():
+            for start in range(0, len(ids), 500):
+                PolicyClassProvider.objects.filter(
+                    policy_class_id=class_id, service_provider_id__in=ids[start:start + 500],
+                ).delete()
+        if to_add:
+            PolicyClassProvider.objects.bulk_create(
+                [PolicyClassProvider(policy_class_id=c, service_provider_id=p) for c, p in to_add],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+        # ETag قائمة مستشفيات العضو (members.views.my_hospitals)
+        conditional.bump(*{f'class-providers:{class_id}' for class_id, _ in to_add | to_remove})
+    if to_add or to_remove:
+        transaction.on_commit(invalidate_city_facets)
+    return len(to_add), len(to_remove)
+
+
+def sync_networks(network_ids, provider_ids=None):
+    """Re-sync every class whose effective network is in ``network_ids``."""
+    return sync_classes(classes_using_network(network_ids), provider_ids)
+
+
+def rebuild_all():
+    """Full rebuild (repair / backfill). Returns (added, removed)."""
+    added = removed = 0
+    class_ids = list(PolicyClass.objects.values_list('pk', flat=True))
+    for start in range(0, len(class_ids), 200):
+        a, r = sync_classes(class_ids[start:start + 200])
+        added += a
+        removed += r
+    return added, removed
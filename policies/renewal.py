@@ -0,0 +1,332 @@
+"""
+Bulk policy renewal.
+
+At renewal season a broker renews a whole book of business: every policy
+expiring in a window gets a successor for the next period with the same
+classes, benefit overrides and excluded / extra hospitals.
+
+    plans = renewal.preview(renewal.expiring(get_allowed_policies(user), date_from, date_to))
+    report = renewal.renew(plans, move_members=True)
+
+preview() proposes the number and period of each new policy and flags the
+ones that cannot be renewed (already renewed, number taken, sponsor period
+overlap) in a fixed number of queries, whatever the size of the book.
+
+renew() copies each policy in its own transaction — a failing policy rolls
+back alone and is reported. The sources of up to CHUNK policies are read
+together; each copy is one INSERT for the policy and one bulk INSERT each
+for its classes, benefits and provider overrides, followed by one sync of
+the new classes' effective provider sets (bulk_create skips the receivers
+in policies/signals.py). Coverage snapshots compile on first read.
+
+``move_members`` re-points the members of each old class to the new class
+of the same name in a single UPDATE — when the new policy starts, not at
+renewal time: until then the members keep the cover, providers and
+utilisation of the running period. A renewal that starts later is flagged
+(Policy.move_members_on_start) and move_started() moves its members on the
+start date, from the daily command:
+
+    python manage.py renew_policies --broker <id> --from 2026-12-01 --to 2026-12-31
+    python manage.py start_renewed_policies
+    python manage.py bench_policy_renewal
+"""
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Value, When
+
+from members.models import Member
+from . import provider_sets
+from .models import ClassBenefit, Policy, PolicyClass
+
+# عدد الوثائق التي تُقرأ مصادرها معاً
+CHUNK = 100
+BATCH_SIZE = 1000
+
+OVERRIDES = ('excluded_providers', 'extra_providers')
+
+
+@dataclass
+class RenewalPlan:
+    policy: Policy
+    policy_number: str
+    start_date: datetime.date
+    end_date: datetime.date
+    problem: str = ''
+
+    @property
+    def ok(self):
+        return not self.problem
+
+
+@dataclass
+class RenewalReport:
+    renewed: list = field(default_factory=list)  # [(old, new)]
+    skipped: list = field(default_factory=list)  # [(policy, problem)] من المعاينة
+    failed: list = field(default_factory=list)  # [(policy, error)] أثناء النسخ
+    classes: int = 0
+    benefits: int = 0
+    overrides: int = 0
+    members: int = 0
+    scheduled: int = 0  # وثائق يُنقل أعضاؤها عند بدء سريانها
+
+
+# ── Preview ─────────────────────────────────────────────────────────────────
+
+def next_anniversary(day):
+    """The same day one year later (29 Feb → 28 Feb)."""
+    try:
+        return day.replace(year=day.year + 1)
+    except ValueError:
+        return day.replace(year=day.year + 1, day=28)
+
+
+def propose_number(policy, start_date):
+    """POL-2026-001 → POL-2027-001; numbers without the old year get a ``-<year>`` suffix."""
+    old_year, new_year = str(policy.start_date.year), str(start_date.year)
+    if old_year in policy.policy_number:
+        return new_year.join(policy.policy_number.rsplit(old_year, 1))
+    return f'{policy.policy_number}-{new_year}'
+
+
+def expiring(queryset, date_from, date_to):
+    """Active policies of ``queryset`` ending within [date_from, date_to]."""
+    return queryset.filter(is_active=True, end_date__range=(date_from, date_to))
+
+
+def preview(queryset, numbers=None, start_date=None, end_date=None):
+    """
+    One RenewalPlan per policy of ``queryset``, master policies first.
+
+    By default the new policy starts the day after the old one ends and runs
+    to the next anniversary of its end date. ``numbers`` ({policy pk: number})
+    and ``start_date`` / ``end_date`` override the proposals.
+    """
+    numbers = numbers or {}
+    policies = list(
+        queryset.select_related('client').annotate(
+            class_count=Count('classes', distinct=True),
+            member_count=Count('classes__members', distinct=True),
+            already_renewed=Exists(Policy.objects.filter(renewed_from=OuterRef('pk'))),
+        ).order_by(F('master_policy_id').asc(nulls_first=True), 'client__name_ar', 'policy_number')
+    )
+    plans = []
+    for policy in policies:
+        start = start_date or policy.end_date + datetime.timedelta(days=1)
+        plans.append(RenewalPlan(
+            policy=policy,
+            policy_number=numbers.get(policy.pk) or propose_number(policy, start),
+            start_date=start,
+            end_date=end_date or next_anniversary(policy.end_date),
+        ))
+    if not plans:
+        return plans
+
+    taken = set(Policy.objects.filter(
+        client_id__in={plan.policy.client_id for plan in plans},
+        policy_number__in={plan.policy_number for plan in plans},
+    ).values_list('client_id', 'policy_number'))
+
+    sponsor_periods = defaultdict(list)
+    sponsor_ids = {plan.policy.sponsor_number_id for plan in plans if plan.policy.sponsor_number_id}
+    if sponsor_ids:
+        rows = Policy.objects.filter(
+            sponsor_number_id__in=sponsor_ids, end_date__gte=min(plan.start_date for plan in plans),
+        ).values_list('client_id', 'sponsor_number_id', 'start_date', 'end_date')
+        for client_id, sponsor_id, start, end in rows:
+            sponsor_periods[client_id, sponsor_id].append((start, end))
+
+    for plan in plans:
+        policy = plan.policy
+        number_key = (policy.client_id, plan.policy_number)
+        periods = sponsor_periods[policy.client_id, policy.sponsor_number_id] if policy.sponsor_number_id else []
+        if policy.already_renewed:
+            plan.problem = "الوثيقة مُجدّدة مسبقاً."
+        elif plan.end_date <= plan.start_date:
+            plan.problem = "تاريخ الانتهاء يجب أن يكون بعد تاريخ البدء."
+        elif number_key in taken:
+            plan.problem = f"رقم الوثيقة {plan.policy_number} مستخدم لنفس العميل."
+        elif any(start <= plan.end_date and end >= plan.start_date for start, end in periods):
+            plan.problem = "رقم الكفيل لديه وثيقة لنفس الشركة في نفس الفترة."
+        else:
+            # يمنع تكرار الرقم أو فترة الكفيل داخل الدفعة نفسها
+            taken.add(number_key)
+            periods.append((plan.start_date, plan.end_date))
+    return plans
+
+
+# ── Renewal ─────────────────────────────────────────────────────────────────
+
+def _load_sources(policy_ids):
+    """Classes, benefits and provider overrides of ``policy_ids`` — four queries."""
+    classes = defaultdict(list)
+    for policy_class in PolicyClass.objects.filter(policy_id__in=policy_ids).order_by('name'):
+        classes[policy_class.policy_id].append(policy_class)
+    benefits = defaultdict(list)
+    for benefit in ClassBenefit.objects.filter(policy_class__policy_id__in=policy_ids):
+        benefits[benefit.policy_class_id].append(benefit)
+    overrides = {}
+    for name in OVERRIDES:
+        through = getattr(PolicyClass, name).through
+        grouped = defaultdict(list)
+        rows = through.objects.filter(policyclass__policy_id__in=policy_ids)
+        for class_id, provider_id in rows.values_list('policyclass_id', 'serviceprovider_id'):
+            grouped[class_id].append(provider_id)
+        overrides[name] = grouped
+    return classes, benefits, overrides
+
+
+def _move_members(class_map):
+    """Re-point the members of the old classes of ``class_map`` to the new ones. Returns how many."""
+    if not class_map:
+        return 0
+    return Member.objects.filter(policy_class_id__in=class_map).update(policy_class_id=Case(
+        *[When(policy_class_id=old_id, then=Value(new_id)) for old_id, new_id in class_map.items()],
+        output_field=models.UUIDField(),
+    ))
+
+
+def _clone(plan, master_policy_id, sources, move_members, today):
+    classes, benefits, overrides = sources
+    old = plan.policy
+    move_now = move_members and plan.start_date <= today
+    new_policy = Policy(
+        client_id=old.client_id,
+        provider_id=old.provider_id,
+        plan_id=old.plan_id,
+        master_policy_id=master_policy_id,
+        sponsor_number_id=old.sponsor_number_id,
+        renewed_from=old,
+        policy_number=plan.policy_number,
+        start_date=plan.start_date,
+        end_date=plan.end_date,
+        is_active=True,
+        move_members_on_start=move_members and not move_now,
+    )
+    new_policy.save()
+
+    # المعرّفات تُولَّد عند إنشاء الكائن، فتُعرف قبل الإدراج
+    class_map, new_classes = {}, []
+    for policy_class in classes[old.pk]:
+        new_class = PolicyClass(
+            policy=new_policy,
+            plan_class_id=policy_class.plan_class_id,
+            network_id=policy_class.network_id,
+            name=policy_class.name,
+            annual_limit=policy_class.annual_limit,
+        )
+        class_map[policy_class.pk] = new_class.pk
+        new_classes.append(new_class)
+    PolicyClass.objects.bulk_create(new_classes)
+
+    new_benefits = [
+        ClassBenefit(
+            policy_class_id=class_map[benefit.policy_class_id],
+            benefit_type_id=benefit.benefit_type_id,
+            limit_amount=benefit.limit_amount,
+            deductible_percentage=benefit.deductible_percentage,
+            description=benefit.description,
+            is_excluded=benefit.is_excluded,
+        )
+        for old_id in class_map
+        for benefit in benefits[old_id]
+    ]
+    ClassBenefit.objects.bulk_create(new_benefits, batch_size=BATCH_SIZE)
+
+    override_count = 0
+    for name, grouped in overrides.items():
+        through = getattr(PolicyClass, name).through
+        rows = [
+            through(policyclass_id=class_map[old_id], serviceprovider_id=provider_id)
+            for old_id in class_map
+            for provider_id in grouped[old_id]
+        ]
+        through.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        override_count += len(rows)
+
+    provider_sets.sync_classes(class_map.values())
+
+    moved = _move_members(class_map) if move_now else 0
+    return new_policy, (len(new_classes), len(new_benefits), override_count, moved)
+
+
+def renew(plans, move_members=False, today=None):
+    """
+    Renew every plan without a problem. A subsidiary policy whose master was
+    renewed (in this run or earlier) points to the master's renewal. With
+    ``move_members``, members move now if the new policy has started by
+    ``today``, otherwise on its start date (move_started()).
+    Returns a RenewalReport.
+    """
+    today = today or datetime.date.today()
+    report = RenewalReport(skipped=[(plan.policy, plan.problem) for plan in plans if not plan.ok])
+    plans = [plan for plan in plans if plan.ok]
+
+    master_ids = {plan.policy.master_policy_id for plan in plans if plan.policy.master_policy_id}
+    renewed = dict(
+        Policy.objects.filter(renewed_from_id__in=master_ids).values_list('renewed_from_id', 'pk')
+    ) if master_ids else {}
+
+    for start in range(0, len(plans), CHUNK):
+        chunk = plans[start:start + CHUNK]
+        sources = _load_sources([plan.policy.pk for plan in chunk])
+        for plan in chunk:
+            master_id = plan.policy.master_policy_id
+            try:
+                with transaction.atomic():
+                    new_policy, counts = _clone(
+                        plan, renewed.get(master_id, master_id), sources, move_members, today,
+                    )
+            except (IntegrityError, ValidationError) as exc:
+                report.failed.append((plan.policy, str(exc)))
+                continue
+            renewed[plan.policy.pk] = new_policy.pk
+            report.renewed.append((plan.policy, new_policy))
+            report.classes += counts[0]
+            report.benefits += counts[1]
+            report.overrides += counts[2]
+            report.members += counts[3]
+            report.scheduled += new_policy.move_members_on_start
+    return report
+
+
+def move_started(today=None, check=False):
+    """
+    Move the members of every flagged renewal that has started by ``today``
+    to its classes (same class name), each policy in its own transaction.
+    Returns [(policy, members moved)]; with ``check`` nothing is written and
+    the counts are the members that would move.
+    """
+    today = today or datetime.date.today()
+    due = list(
+        Policy.objects.filter(move_members_on_start=True, start_date__lte=today, renewed_from__isnull=False)
+        .order_by('start_date', 'policy_number')
+    )
+    if not due:
+        return []
+    new_classes = defaultdict(dict)
+    for policy_id, name, pk in PolicyClass.objects.filter(policy__in=due).values_list('policy_id', 'name', 'pk'):
+        new_classes[policy_id][name] = pk
+    old_classes = defaultdict(dict)
+    rows = PolicyClass.objects.filter(policy_id__in=[policy.renewed_from_id for policy in due])
+    for policy_id, name, pk in rows.values_list('policy_id', 'name', 'pk'):
+        old_classes[policy_id][name] = pk
+
+    results = []
+    for policy in due:
+        class_map = {
+            old_id: new_classes[policy.pk][name]
+            for name, old_id in old_classes[policy.renewed_from_id].items()
+            if name in new_classes[policy.pk]
+        }
+        if check:
+            results.append((policy, Member.objects.filter(policy_class_id__in=class_map).count()))
+            continue
+        with transaction.atomic():
+            moved = _move_members(class_map)
+            Policy.objects.filter(pk=policy.pk).update(move_members_on_start=False)
+        results.append((policy, moved))
+    return results
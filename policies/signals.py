@@ -0,0 +1,142 @@
+# policies/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core import conditional
+from networks.models import Network
+from . import coverage, provider_sets
+from .models import BenefitType, ClassBenefit, PlanClass, PlanClassBenefit, PolicyClass
+
+
+# ── Network hospitals ───────────────────────────────────────────────────────
+
+@receiver(m2m_changed, sender=Network.hospitals.through)
+def network_hospitals_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    network.hospitals.add/remove/clear (or provider.networks.* from the other side).
+    Only the touched hospitals are re-evaluated for the classes using the network.
+    """
+    if action == 'pre_clear':
+        # بعد clear لا نعرف ما الذي كان مرتبطاً — نحفظه الآن
+        if reverse:
+            instance._cleared_network_ids = list(instance.networks.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        provider_ids = None if action == 'post_clear' else pk_set
+        provider_sets.sync_networks([instance.pk], provider_ids)
+    else:
+        network_ids = getattr(instance, '_cleared_network_ids', []) if action == 'post_clear' else pk_set
+        provider_sets.sync_networks(network_ids, [instance.pk])
+
+
+# ── PolicyClass overrides ───────────────────────────────────────────────────
+
+def _class_overrides_changed(instance, action, reverse, pk_set, related_name):
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_class_ids = list(
+                getattr(instance, related_name).values_list('pk', flat=True)
+            )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        provider_ids = None if action == 'post_clear' else pk_set
+        provider_sets.sync_classes([instance.pk], provider_ids)
+    else:
+        class_ids = getattr(instance, '_cleared_class_ids', []) if action == 'post_clear' else pk_set
+        provider_sets.sync_classes(class_ids, [instance.pk])
+
+
+@receiver(m2m_changed, sender=PolicyClass.excluded_providers.through)
+def class_excluded_providers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _class_overrides_changed(instance, action, reverse, pk_set, 'excluded_in_classes')
+
+
+@receiver(m2m_changed, sender=PolicyClass.extra_providers.through)
+def class_extra_providers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _class_overrides_changed(instance, action, reverse, pk_set, 'added_in_classes')
+
+
+# ── Network source changes ──────────────────────────────────────────────────
+
+@receiver(post_save, sender=PolicyClass)
+def policy_class_network_changed(sender, instance, created, **kwargs):
+    """Full re-sync when the class's own network or its plan class changes."""
+    if created or instance.tracked_field_changed('network_id', 'plan_class_id'):
+        provider_sets.sync_classes([instance.pk])
+
+
+@receiver(post_save, sender=PlanClass)
+def plan_class_network_changed(sender, instance, created, **kwargs):
+    """Classes that inherit the plan's default network follow its changes."""
+    if not created and instance.tracked_field_changed('network_id'):
+        provider_sets.sync_classes(
+            instance.policy_classes.filter(network__isnull=True).values_list('pk', flat=True)
+        )
+
+
+# SET_NULL on delete runs as a queryset update (no save signals), so the
+# affected classes are captured before the delete and re-synced after it.
+
+@receiver(pre_delete, sender=Network)
+def network_pre_delete(sender, instance, **kwargs):
+    instance._affected_class_ids = provider_sets.classes_using_network([instance.pk])
+
+
+@receiver(pre_delete, sender=PlanClass)
+def plan_class_pre_delete(sender, instance, **kwargs):
+    instance._affected_class_ids = list(instance.policy_classes.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Network)
+@receiver(post_delete, sender=PlanClass)
+def network_source_deleted(sender, instance, **kwargs):
+    class_ids = getattr(instance, '_affected_class_ids', [])
+    provider_sets.sync_classes(class_ids)
+    coverage.invalidate(class_ids)
+
+
+# ── Coverage snapshot ───────────────────────────────────────────────────────
+
+@receiver(post_save, sender=PolicyClass)
+def policy_class_coverage_changed(sender, instance, created, **kwargs):
+    if not created and instance.tracked_field_changed('network_id', 'plan_class_id', 'annual_limit'):
+        coverage.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=PlanClass)
+def plan_class_coverage_changed(sender, instance, created, **kwargs):
+    if not created and instance.tracked_field_changed('network_id', 'annual_limit'):
+        coverage.invalidate(coverage.classes_using_plan_classes([instance.pk]))
+
+
+@receiver(post_save, sender=ClassBenefit)
+@receiver(post_delete, sender=ClassBenefit)
+def class_benefit_changed(sender, instance, **kwargs):
+    coverage.invalidate([instance.policy_class_id])
+
+
+@receiver(post_save, sender=PlanClassBenefit)
+@receiver(post_delete, sender=PlanClassBenefit)
+def plan_class_benefit_changed(sender, instance, **kwargs):
+    coverage.invalidate(coverage.classes_using_plan_classes([instance.plan_class_id]))
+
+
+@receiver(post_save, sender=BenefitType)
+def benefit_type_changed(sender, instance, created, **kwargs):
+    if not created:
+        coverage.invalidate(coverage.classes_using_benefit_type(instance.pk))
+
+
+@receiver(post_save, sender=Network)
+def network_renamed(sender, instance, created, **kwargs):
+    # الاسم جزء من اللقطة ومن قائمة مستشفيات العضو
+    if not created:
+        class_ids = provider_sets.classes_using_network([instance.pk])
+        coverage.invalidate(class_ids)
+        conditional.bump(*(f'class-providers:{class_id}' for class_id in class_ids))
@@ -1,3 +1,343 @@
+import datetime
+import io
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from brokers.models import Broker
+from clients.models import Client
+from members.models import Member
+from networks.models import Network, ServiceProvider
+from providers.models import Provider
+from . import coverage, renewal
+from .models import (
+    BenefitType, ClassBenefit, InsurancePlan, PlanClass, PlanClassBenefit, Policy, PolicyClass,
+    PolicyClassCoverage, PolicyClassProvider,
+)
+
+
+class EffectiveProvidersTest(TestCase):
+    def setUp(self):
+        self.insurer = Provider.objects.create(name_ar='مزود', name_en='Insurer', license_number='LIC-1')
+        self.gold = Network.objects.create(provider=self.insurer, name_ar='ذهبية', name_en='Gold')
+        self.silver = Network.objects.create(provider=self.insurer, name_ar='فضية', name_en='Silver')
+        self.h1, self.h2, self.h3 = (
+            ServiceProvider.objects.create(name_ar=f'مستشفى {i}', name_en=f'H{i}', type='HOSPITAL', city='Riyadh')
+            for i in range(1, 4)
+        )
+        self.gold.hospitals.add(self.h1, self.h2)
+        self.silver.hospitals.add(self.h3)
+
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1')
+        self.policy = Policy.objects.create(
+            client=company, provider=self.insurer, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+
+    def _ids(self, policy_class):
+        return set(policy_class.get_effective_providers().values_list('pk', flat=True))
+
+    def test_class_follows_network_and_overrides(self):
+        vip = PolicyClass.objects.create(policy=self.policy, name='VIP', network=self.gold)
+        self.assertEqual(self._ids(vip), {self.h1.pk, self.h2.pk})
+
+        vip.excluded_providers.add(self.h1)
+        vip.extra_providers.add(self.h3)
+        self.assertEqual(self._ids(vip), {self.h2.pk, self.h3.pk})
+        self.assertFalse(vip.covers_provider(self.h1))
+
+        vip.excluded_providers.remove(self.h1)
+        vip.extra_providers.clear()
+        self.assertEqual(self._ids(vip), {self.h1.pk, self.h2.pk})
+
+    def test_network_hospital_changes_propagate_from_either_side(self):
+        vip = PolicyClass.objects.create(policy=self.policy, name='VIP', network=self.gold)
+        vip.excluded_providers.add(self.h2)
+
+        self.gold.hospitals.add(self.h3)
+        self.assertEqual(self._ids(vip), {self.h1.pk, self.h3.pk})
+
+        self.h1.networks.clear()
+        self.assertEqual(self._ids(vip), {self.h3.pk})
+
+        self.gold.hospitals.add(self.h2)  # still excluded on the class
+        self.assertEqual(self._ids(vip), {self.h3.pk})
+
+    def test_inherited_plan_network_changes(self):
+        broker = Broker.objects.create(name_ar='وسيط', name_en='Broker', commercial_record='BR-1')
+        plan = InsurancePlan.objects.create(broker=broker, provider=self.insurer, name='Plan')
+        plan_class = PlanClass.objects.create(plan=plan, name='A', network=self.gold, annual_limit=1000)
+        inherited = PolicyClass.objects.create(policy=self.policy, name='A', plan_class=plan_class)
+        overridden = PolicyClass.objects.create(
+            policy=self.policy, name='B', plan_class=plan_class, network=self.silver,
+        )
+        self.assertEqual(self._ids(inherited), {self.h1.pk, self.h2.pk})
+
+        plan_class = PlanClass.objects.get(pk=plan_class.pk)
+        plan_class.network = self.silver
+        plan_class.save()
+        self.assertEqual(self._ids(inherited), {self.h3.pk})
+
+        overridden = PolicyClass.objects.get(pk=overridden.pk)
+        overridden.network = self.gold
+        overridden.save()
+        self.assertEqual(self._ids(overridden), {self.h1.pk, self.h2.pk})
+
+        self.silver.delete()
+        self.assertEqual(self._ids(inherited), set())
+
+    def test_rebuild_command_repairs_drift(self):
+        vip = PolicyClass.objects.create(policy=self.policy, name='VIP', network=self.gold)
+        PolicyClassProvider.objects.filter(policy_class=vip).delete()
+
+        call_command('rebuild_class_providers', stdout=io.StringIO())
+        self.assertEqual(self._ids(vip), {self.h1.pk, self.h2.pk})
+
+    def test_manage_page_reads_exclusions_from_the_exclusion_rows(self):
+        vip = PolicyClass.objects.create(policy=self.policy, name='VIP', network=self.gold)
+        vip.excluded_providers.add(self.h1)
+        PolicyClassProvider.objects.filter(policy_class=vip, service_provider=self.h2).delete()  # drift
+
+        self.client.force_login(User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN))
+        response = self.client.get(reverse('policies:class_provider_manage', kwargs={'class_pk': vip.pk}))
+        rows = {row['provider'].pk: (row['is_excluded'], row['is_covered']) for row in response.context['network_rows']}
+        self.assertEqual(rows, {self.h1.pk: (True, False), self.h2.pk: (False, False)})
+
+
+class CoverageSnapshotTest(TestCase):
+    def setUp(self):
+        insurer = Provider.objects.create(name_ar='مزود', name_en='Insurer', license_number='LIC-1')
+        self.gold = Network.objects.create(provider=insurer, name_ar='ذهبية', name_en='Gold')
+        broker = Broker.objects.create(name_ar='وسيط', name_en='Broker', commercial_record='BR-1')
+        plan = InsurancePlan.objects.create(broker=broker, provider=insurer, name='Plan')
+        self.plan_class = PlanClass.objects.create(plan=plan, name='VIP', network=self.gold, annual_limit=500000)
+        self.dental = BenefitType.objects.create(name_ar='أسنان', name_en='Dental')
+        self.optical = BenefitType.objects.create(name_ar='بصريات', name_en='Optical')
+        PlanClassBenefit.objects.create(plan_class=self.plan_class, benefit_type=self.dental, limit_amount=3000)
+        PlanClassBenefit.objects.create(plan_class=self.plan_class, benefit_type=self.optical, limit_amount=1000)
+
+        company = Client.objects.create(name_ar='شركة', name_en='Company', commercial_record='CR-1')
+        policy = Policy.objects.create(
+            client=company, provider=insurer, policy_number='POL-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        self.policy_class = PolicyClass.objects.create(policy=policy, name='VIP', plan_class=self.plan_class)
+
+    def _benefits(self):
+        return {
+            b['name_en']: (b['limit_amount'], b['copay_percentage'], b['source'])
+            for b in coverage.for_class(self.policy_class.pk).benefits
+        }
+
+    def test_snapshot_merges_class_overrides_with_plan_defaults(self):
+        ClassBenefit.objects.create(
+            policy_class=self.policy_class, benefit_type=self.dental, limit_amount=5000, deductible_percentage=20,
+        )
+        ClassBenefit.objects.create(policy_class=self.policy_class, benefit_type=self.optical, is_excluded=True)
+        snapshot = coverage.for_class(self.policy_class.pk)
+        self.assertEqual(snapshot.network['name_en'], 'Gold')
+        self.assertEqual(snapshot.annual_limit, Decimal('500000'))
+        self.assertEqual(self._benefits(), {'Dental': (Decimal('5000'), 20, 'class')})
+
+    def test_read_is_one_query_once_compiled(self):
+        coverage.for_class(self.policy_class.pk)
+        with self.assertNumQueries(1):
+            coverage.for_class(self.policy_class.pk)
+
+    def test_source_changes_invalidate_and_bump_version(self):
+        first = coverage.for_class(self.policy_class.pk)
+
+        PlanClassBenefit.objects.filter(benefit_type=self.optical).get().delete()
+        second = coverage.for_class(self.policy_class.pk)
+        self.assertEqual(set(self._benefits()), {'Dental'})
+        self.assertEqual(second.version, first.version + 1)
+
+        self.plan_class.annual_limit = 750000
+        self.plan_class.save()
+        self.assertEqual(coverage.for_class(self.policy_class.pk).annual_limit, Decimal('750000'))
+
+        self.policy_class.annual_limit = 100000
+        self.policy_class.save()
+        self.assertEqual(coverage.for_class(self.policy_class.pk).annual_limit, Decimal('100000'))
+
+        self.dental.name_en = 'Dentistry'
+        self.dental.save()
+        self.assertEqual(set(self._benefits()), {'Dentistry'})
+
+        self.gold.name_en = 'Platinum'
+        self.gold.save()
+        self.assertEqual(coverage.for_class(self.policy_class.pk).network['name_en'], 'Platinum')
+
+    def test_invalidation_during_compile_leaves_the_snapshot_stale(self):
+        compile_class = coverage.compile_class
+
+        def racing(policy_class):
+            data = compile_class(policy_class)
+            # تعديل متزامن للمصادر بعد قراءتها
+            coverage.invalidate([policy_class.pk])
+            return data
+
+        with patch.object(coverage, 'compile_class', racing):
+            coverage.for_class(self.policy_class.pk)
+        self.assertTrue(PolicyClassCoverage.objects.get().stale)
+
+        snapshot = coverage.for_class(self.policy_class.pk)
+        self.assertFalse(PolicyClassCoverage.objects.get().stale)
+        self.assertEqual(snapshot.version, PolicyClassCoverage.objects.get().version)
+
+    def test_rebuild_command_repairs_drift(self):
+        coverage.for_class(self.policy_class.pk)
+        PlanClass.objects.filter(pk=self.plan_class.pk).update(annual_limit=1)  # لا يمر بالإشارات
+        out = io.StringIO()
+        call_command('rebuild_coverage', '--check', stdout=out)
+        self.assertIn('would have recompiled 1 snapshot(s)', out.getvalue())
+        call_command('rebuild_coverage', stdout=io.StringIO())
+        self.assertEqual(PolicyClassCoverage.objects.get().data['annual_limit'], '1.00')
+
+
+class PolicyRenewalTest(TestCase):
+    def setUp(self):
+        insurer = Provider.objects.create(name_ar='مزود', name_en='Insurer', license_number='LIC-1')
+        gold = Network.objects.create(provider=insurer, name_ar='ذهبية', name_en='Gold')
+        self.h1, self.h2, self.h3 = (
+            ServiceProvider.objects.create(name_ar=f'مستشفى {i}', name_en=f'H{i}', type='HOSPITAL', city='Riyadh')
+            for i in range(1, 4)
+        )
+        gold.hospitals.add(self.h1, self.h2)
+        self.broker = Broker.objects.create(name_ar='وسيط', name_en='Broker', commercial_record='BR-1')
+        self.company = Client.objects.create(
+            name_ar='شركة', name_en='Company', commercial_record='CR-1', broker=self.broker,
+        )
+        self.policy = Policy.objects.create(
+            client=self.company, provider=insurer, policy_number='POL-2026-001',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+        self.vip = PolicyClass.objects.create(policy=self.policy, name='VIP', network=gold, annual_limit=100000)
+        self.vip.excluded_providers.add(self.h1)
+        self.vip.extra_providers.add(self.h3)
+        dental = BenefitType.objects.create(name_ar='أسنان', name_en='Dental')
+        optical = BenefitType.objects.create(name_ar='بصريات', name_en='Optical')
+        ClassBenefit.objects.create(policy_class=self.vip, benefit_type=dental, limit_amount=3000)
+        ClassBenefit.objects.create(policy_class=self.vip, benefit_type=optical, is_excluded=True)
+        self.member = Member.objects.create(
+            client=self.company, policy_class=self.vip, full_name='Member', national_id='1000000001',
+            birth_date=datetime.date(1990, 1, 1), gender='M', relation='PRINCIPAL', phone_number='0500000000',
+        )
+        self.sub = Policy.objects.create(
+            client=Client.objects.create(name_ar='فرعية', name_en='Sub', commercial_record='CR-2', broker=self.broker),
+            master_policy=self.policy, policy_number='SUB-1',
+            start_date=datetime.date(2026, 1, 1), end_date=datetime.date(2026, 12, 31),
+        )
+
+    def _preview(self):
+        window = (datetime.date(2026, 12, 1), datetime.date(2026, 12, 31))
+        return renewal.preview(renewal.expiring(Policy.objects.all(), *window))
+
+    def test_preview_proposes_next_period_masters_first(self):
+        with self.assertNumQueries(2):
+            plans = self._preview()
+        self.assertEqual(
+            [(p.policy, p.policy_number, p.start_date, p.end_date) for p in plans],
+            [
+                (self.policy, 'POL-2027-001', datetime.date(2027, 1, 1), datetime.date(2027, 12, 31)),
+                (self.sub, 'SUB-1-2027', datetime.date(2027, 1, 1), datetime.date(2027, 12, 31)),
+            ],
+        )
+        self.assertEqual((plans[0].policy.class_count, plans[0].policy.member_count), (1, 1))
+        self.assertTrue(all(plan.ok for plan in plans))
+
+    def test_renew_copies_classes_benefits_and_overrides(self):
+        # التجديد في يوم بدء الوثيقة الجديدة: ينتقل الأعضاء فوراً
+        report = renewal.renew(self._preview(), move_members=True, today=datetime.date(2027, 1, 1))
+        self.assertEqual((len(report.renewed), report.classes, report.benefits, report.overrides, report.members),
+                         (2, 1, 2, 2, 1))
+        new_policy = Policy.objects.get(renewed_from=self.policy)
+        new_class = new_policy.classes.get()
+        self.assertEqual((new_class.name, new_class.annual_limit), ('VIP', Decimal('100000')))
+        self.assertEqual(
+            set(new_class.benefits.values_list('benefit_type__name_en', 'is_excluded')),
+            {('Dental', False), ('Optical', True)},
+        )
+        self.assertEqual(set(new_class.get_effective_providers()), {self.h2, self.h3})
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.policy_class, new_class)
+        # الوثيقة التابعة تتبع تجديد الوثيقة الأم
+        self.assertEqual(Policy.objects.get(renewed_from=self.sub).master_policy, new_policy)
+
+    def test_members_move_when_the_new_policy_starts(self):
+        report = renewal.renew(self._preview(), move_members=True, today=datetime.date(2026, 12, 15))
+        self.assertEqual((report.members, report.scheduled), (0, 2))
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.policy_class, self.vip)
+
+        self.assertEqual(renewal.move_started(today=datetime.date(2026, 12, 31)), [])
+        new_policy = Policy.objects.get(renewed_from=self.policy)
+        self.assertEqual(renewal.move_started(today=datetime.date(2027, 1, 1), check=True)[0], (new_policy, 1))
+        self.assertEqual(
+            [(policy.pk, moved) for policy, moved in renewal.move_started(today=datetime.date(2027, 1, 1))],
+            [(new_policy.pk, 1), (Policy.objects.get(renewed_from=self.sub).pk, 0)],
+        )
+        self.member.refresh_from_db()
+        self.assertEqual(self.member.policy_class, new_policy.classes.get())
+        self.assertEqual(renewal.move_started(today=datetime.date(2027, 1, 2)), [])
+
+    def test_conflicts_are_skipped_and_failures_roll_back_alone(self):
+        renewed = Policy.objects.create(
+            client=self.sub.client, master_policy=self.policy, policy_number='SUB-2', renewed_from=self.sub,
+            start_date=datetime.date(2027, 1, 1), end_date=datetime.date(2027, 12, 31),
+        )
+        self.assertEqual([plan.problem for plan in self._preview()], ['', "الوثيقة مُجدّدة مسبقاً."])
+
+        renewed.delete()
+        plans = self._preview()
+        # رقم يُحجز بعد المعاينة — تفشل هذه الوثيقة وحدها
+        Policy.objects.create(
+            client=self.sub.client, master_policy=self.policy, policy_number='SUB-1-2027',
+            start_date=datetime.date(2030, 1, 1), end_date=datetime.date(2030, 12, 31),
+        )
+        report = renewal.renew(plans)
+        self.assertEqual([old for old, _ in report.renewed], [self.policy])
+        self.assertEqual([policy for policy, _ in report.failed], [self.sub])
+        self.assertFalse(Policy.objects.filter(renewed_from=self.sub).exists())
+
+    def test_renew_command(self):
+        out = io.StringIO()
+        args = ('renew_policies', '--from', '2026-12-01', '--to', '2026-12-31', '--broker', str(self.broker.pk))
+        call_command(*args, '--check', stdout=out)
+        self.assertIn('2 of 2 policies can be renewed', out.getvalue())
+        self.assertFalse(Policy.objects.filter(renewed_from__isnull=False).exists())
+        call_command(*args, stdout=io.StringIO())
+        self.assertEqual(Policy.objects.filter(renewed_from__isnull=False).count(), 2)
+
+    def test_bulk_renew_view(self):
+        self.client.force_login(User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN))
+        url = reverse('policies:policy_bulk_renew')
+        window = {'date_from': '2026-12-01', 'date_to': '2026-12-31'}
+        self.assertContains(self.client.get(url, window), 'POL-2027-001')
+        response = self.client.post(url, {**window, 'policies': [self.policy.pk], 'move_members': '1'})
+        self.assertContains(response, 'POL-2027-001')
+        self.assertEqual(list(Policy.objects.filter(renewed_from__isnull=False)), [response.context['report'].renewed[0][1]])
+
+    def test_bulk_renew_reports_malformed_ids(self):
+        self.client.force_login(User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN))
+        response = self.client.post(reverse('policies:policy_bulk_renew'), {
+            'date_from': '2026-12-01', 'date_to': '2026-12-31', 'policies': [self.policy.pk, 'not-a-uuid'],
+        })
+        self.assertEqual(response.status_code, 200)
+        report = response.context['report']
+        self.assertEqual([old for old, _ in report.renewed], [self.policy])
+        self.assertEqual(report.failed, [('not-a-uuid', "معرّف غير صالح")])
+        self.assertContains(response, 'not-a-uuid')
 
-# Create your tests here.
+    def test_single_renew_view(self):
+        self.client.force_login(User.objects.create_user(username='admin', password='p', role=User.Roles.SUPER_ADMIN))
+        response = self.client.post(reverse('policies:policy_renew', kwargs={'pk': self.policy.pk}), {
+            'policy_number': 'POL-NEW', 'start_date': '2027-01-01', 'end_date': '2027-12-31',
+        })
+        new_policy = Policy.objects.get(policy_number='POL-NEW')
+        self.assertRedirects(response, reverse('policies:policy_detail', kwargs={'pk': new_policy.pk}))
+        self.assertEqual(new_policy.classes.get().extra_providers.get(), self.h3)
@@ -10,6 +10,7 @@ urlpatterns = [
     path('<uuid:pk>/edit/', views.policy_update, name='policy_update'),
     path('<uuid:pk>/delete/', views.policy_delete, name='policy_delete'),
     path('<uuid:pk>/renew/', views.policy_renew, name='policy_renew'),
+    path('renew/', views.policy_bulk_renew, name='policy_bulk_renew'),
     path('<uuid:pk>/sync-plan-classes/', views.policy_sync_plan_classes, name='policy_sync_plan_classes'),
 
     # الفئات والمنافع (وثائق)
@@ -1,12 +1,17 @@
-from django.core.exceptions import ValidationError
+import datetime
+import uuid
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Policy, PolicyClass, ClassBenefit, BenefitType, InsurancePlan, PlanClass, PlanClassBenefit
-from .forms import PolicyForm, PolicyClassForm, ClassBenefitForm
+from django.db.models import Exists, OuterRef, Q
+from django.utils.dateparse import parse_date
+from .models import Policy, PolicyClass, PolicyClassProvider, ClassBenefit, BenefitType, InsurancePlan, PlanClass, PlanClassBenefit
+from .forms import BulkRenewalForm, PolicyForm, PolicyClassForm, ClassBenefitForm
 from accounts.models import User
+from core.scope import Scope, get_scope
+from . import coverage, renewal
 
 # ==========================================
 # دالة مساعدة: عزل البيانات للوسطاء والعملاء (Data Isolation)
@@ -15,23 +20,18 @@ def get_allowed_policies(user):
     """
     تُرجع البوالص المسموح للمستخدم رؤيتها/إدارتها بناءً على دوره.
     """
-    # 1. السوبر أدمن يرى كل البوالص
-    if user.role == User.Roles.SUPER_ADMIN:
-        return Policy.objects.all()
-        
-    # 2. الوسيط يرى بوالص العملاء التابعين لشركته فقط
-    elif user.is_broker_role and user.related_broker:
-        return Policy.objects.filter(client__broker=user.related_broker)
-        
-    # 3. مدير الموارد البشرية (HR) يرى بوالص شركته فقط
-    elif user.is_hr_role and user.related_client:
+    scope = get_scope(user)
+
+    # مدير الموارد البشرية (HR) يرى بوالص شركته
+    if scope.kind == Scope.HR:
         return Policy.objects.filter(
-            Q(client=user.related_client) |
-            # يرى وثائق كفلاء موظفيه (حتى لو الكفيل يتبع شركة شقيقة)
-            Q(sponsor_number__members__client=user.related_client)
+            Q(client_id=scope.client_id) |
+            # ووثائق كفلاء موظفيه (حتى لو الكفيل يتبع شركة شقيقة)
+            Q(sponsor_number__members__client_id=scope.client_id)
         ).distinct()
-        
-    return Policy.objects.none()
+
+    # السوبر أدمن: الكل | الوسيط: بوالص العملاء التابعين لشركته
+    return scope.restrict(Policy.objects.all(), broker='client__broker')
 
 
 def get_active_policy_for_sponsor(sponsor_number):
@@ -49,11 +49,17 @@ def get_allowed_plans(user):
     تُرجع InsurancePlan المسموح للمستخدم رؤيتها.
     الخطط مملوكة للوسيط — HR والأعضاء لا يصلون إليها مباشرة.
     """
-    if user.role == User.Roles.SUPER_ADMIN:
-        return InsurancePlan.objects.all()
-    elif user.is_broker_role and user.related_broker:
-        return InsurancePlan.objects.filter(broker=user.related_broker)
-    return InsurancePlan.objects.none()
+    return get_scope(user).restrict(InsurancePlan.objects.all(), broker='broker')
+
+
+def _can_view_class(user, policy):
+    """الوسيط: بوالص عملائه | الـ HR: بوالص شركته أو شركتها الأم."""
+    scope = get_scope(user)
+    if scope.kind == Scope.BROKER:
+        return policy.client.broker_id == scope.broker_id
+    if scope.kind == Scope.HR:
+        return policy.client_id in (scope.client_id, scope.client_parent_id)
+    return scope.kind == Scope.ALL
 
 
 # ==========================================
@@ -101,31 +107,23 @@ def policy_detail(request, pk):
         pk=pk,
     )
 
-    # جلب الفئات مع كل بياناتها بـ query واحد فعال
-    classes_qs = policy.effective_classes.select_related(
-        'network',
-        'plan_class__network',
-        'plan_class__plan__provider',
-    ).prefetch_related(
-        'benefits__benefit_type',
-        'plan_class__benefits__benefit_type',
-    )
+    # الفئات + لقطات التغطية المجمّعة (الشبكة والحد والمنافع الفعلية) باستعلام واحد
+    classes = list(policy.effective_classes)
 
     inherited_data = False
     master_policy_ref = None
-    if not classes_qs.exists() and policy.master_policy:
-        classes_qs = policy.master_policy.effective_classes.select_related(
-            'network', 'plan_class__network',
-        ).prefetch_related(
-            'benefits__benefit_type',
-            'plan_class__benefits__benefit_type',
-        )
+    if not classes and policy.master_policy:
+        classes = list(policy.master_policy.effective_classes)
         inherited_data = True
         master_policy_ref = policy.master_policy
 
+    class_coverage = coverage.snapshots(c.pk for c in classes)
+    for c in classes:
+        c.coverage = class_coverage.get(c.pk)
+
     context = {
         'policy': policy,
-        'classes': classes_qs,
+        'classes': classes,
         'inherited_data': inherited_data,
         'master_policy_ref': master_policy_ref,
         'sub_policies': policy.sub_policies.all() if not policy.is_subsidiary else None,
@@ -210,69 +208,82 @@ def policy_delete(request, pk):
 @permission_required('policies.add_policy', raise_exception=True)
 def policy_renew(request, pk):
     """
-    تجديد وثيقة منتهية: ينشئ وثيقة جديدة بنفس الخطة وينسخ overrides من الوثيقة القديمة.
+    تجديد وثيقة منتهية: ينشئ وثيقة جديدة بنفس الخطة وينسخ الفئات والمنافع والمستشفيات المستبعدة/الإضافية.
     """
     old_policy = get_object_or_404(get_allowed_policies(request.user).select_related('plan', 'provider', 'client'), pk=pk)
 
     if request.method == 'POST':
-        new_start = request.POST.get('start_date')
-        new_end = request.POST.get('end_date')
+        new_start = parse_date(request.POST.get('start_date', ''))
+        new_end = parse_date(request.POST.get('end_date', ''))
         new_number = request.POST.get('policy_number', '').strip()
 
         if not new_start or not new_end or not new_number:
             messages.error(request, "يرجى تعبئة جميع الحقول المطلوبة.")
             return render(request, 'policies/policy_renew_confirm.html', {'old_policy': old_policy})
 
-        # إنشاء الوثيقة الجديدة بنسخ بيانات القديمة
-        new_policy = Policy(
-            client=old_policy.client,
-            provider=old_policy.provider,
-            plan=old_policy.plan,
-            master_policy=old_policy.master_policy,
-            sponsor_number=old_policy.sponsor_number,
-            policy_number=new_number,
-            start_date=new_start,
-            end_date=new_end,
-            is_active=True,
+        [plan] = renewal.preview(
+            Policy.objects.filter(pk=old_policy.pk),
+            numbers={old_policy.pk: new_number}, start_date=new_start, end_date=new_end,
         )
-        try:
-            new_policy.full_clean()
-        except ValidationError as e:
-            for err in e.messages:
+        report = renewal.renew([plan], move_members=bool(request.POST.get('move_members')))
+        errors = [problem for _, problem in report.skipped + report.failed]
+        if errors:
+            for err in errors:
                 messages.error(request, err)
             return render(request, 'policies/policy_renew_confirm.html', {'old_policy': old_policy})
-        new_policy.save()
-
-        # نسخ PolicyClass + overrides من الوثيقة القديمة
-        old_classes = old_policy.classes.select_related('plan_class', 'network').prefetch_related('benefits__benefit_type')
-        for old_cls in old_classes:
-            new_cls = PolicyClass.objects.create(
-                policy=new_policy,
-                plan_class=old_cls.plan_class,
-                name=old_cls.name,
-                network=old_cls.network,           # نسخ override الشبكة
-                annual_limit=old_cls.annual_limit,  # نسخ override الحد السنوي
-            )
-            # نسخ ClassBenefit overrides
-            for benefit in old_cls.benefits.all():
-                ClassBenefit.objects.create(
-                    policy_class=new_cls,
-                    benefit_type=benefit.benefit_type,
-                    limit_amount=benefit.limit_amount,
-                    deductible_percentage=benefit.deductible_percentage,
-                    description=benefit.description,
-                )
-
-        # تعطيل الوثيقة القديمة (اختياري — يمكن تركها نشطة كسجل تاريخي)
-        # old_policy.is_active = False
-        # old_policy.save(update_fields=['is_active'])
 
+        # الوثيقة القديمة تبقى نشطة كسجل تاريخي
+        [(_, new_policy)] = report.renewed
         messages.success(request, f"تم تجديد الوثيقة بنجاح. الرقم الجديد: {new_policy.policy_number}")
+        if new_policy.move_members_on_start:
+            messages.info(request, f"سيُنقل الأعضاء إلى الوثيقة الجديدة عند بدء سريانها في {new_policy.start_date}.")
         return redirect('policies:policy_detail', pk=new_policy.pk)
 
     return render(request, 'policies/policy_renew_confirm.html', {'old_policy': old_policy})
 
 
+@login_required
+@permission_required('policies.add_policy', raise_exception=True)
+def policy_bulk_renew(request):
+    """
+    تجديد جماعي لمحفظة الوسيط: معاينة الوثائق التي تنتهي في فترة معينة،
+    ثم تجديد المحدد منها (كل وثيقة في معاملة مستقلة) وعرض تقرير بالنتيجة.
+    """
+    data = request.POST if request.method == 'POST' else request.GET
+    if 'date_from' in data:
+        form = BulkRenewalForm(data)
+    else:
+        today = datetime.date.today()
+        form = BulkRenewalForm(initial={'date_from': today, 'date_to': today + datetime.timedelta(days=60)})
+    context = {'form': form}
+
+    if form.is_bound and form.is_valid():
+        policies = renewal.expiring(
+            get_allowed_policies(request.user), form.cleaned_data['date_from'], form.cleaned_data['date_to'],
+        )
+        if request.method == 'POST':
+            selected, invalid = [], []
+            for value in dict.fromkeys(request.POST.getlist('policies')):
+                try:
+                    selected.append(uuid.UUID(str(value)))
+                except ValueError:
+                    invalid.append((value, "معرّف غير صالح"))
+            report = renewal.renew(
+                renewal.preview(policies.filter(pk__in=selected)),
+                move_members=bool(request.POST.get('move_members')),
+            )
+            report.failed += invalid
+            if report.renewed:
+                messages.success(request, f"تم تجديد {len(report.renewed)} وثيقة.")
+            if report.skipped or report.failed:
+                messages.error(request, f"تعذّر تجديد {len(report.skipped) + len(report.failed)} وثيقة — انظر التقرير.")
+            context['report'] = report
+        else:
+            context['plans'] = renewal.preview(policies)
+
+    return render(request, 'policies/policy_bulk_renew.html', context)
+
+
 # ==========================================
 # 2. إدارة الفئات والمنافع (Classes & Benefits)
 # ==========================================
@@ -395,17 +406,7 @@ def class_benefit_manage(request, class_pk):
     user = request.user
 
     # صلاحية الوصول
-    if user.role == User.Roles.SUPER_ADMIN:
-        has_access = True
-    elif user.is_broker_role and user.related_broker:
-        has_access = (policy.client.broker == user.related_broker)
-    elif user.is_hr_role and user.related_client:
-        client = user.related_client
-        has_access = (policy.client == client) or (
-            client.parent and policy.client == client.parent
-        )
-    else:
-        has_access = False
+    has_access = _can_view_class(user, policy)
 
     if not has_access:
         messages.error(request, "لا تملك صلاحية عرض هذه المنافع.")
@@ -529,9 +530,6 @@ def class_provider_manage(request, class_pk):
             'policy__client__broker',
             'network',
             'plan_class__network',
-        ).prefetch_related(
-            'excluded_providers',
-            'extra_providers',
         ),
         pk=class_pk,
     )
@@ -539,16 +537,7 @@ def class_provider_manage(request, class_pk):
     user = request.user
 
     # صلاحية الوصول
-    if user.role == User.Roles.SUPER_ADMIN:
-        has_access = True
-    elif user.is_broker_role and user.related_broker:
-        has_access = (policy.client.broker == user.related_broker)
-    elif user.is_hr_role and user.related_client:
-        has_access = (policy.client == user.related_client) or (
-            user.related_client.parent and policy.client == user.related_client.parent
-        )
-    else:
-        has_access = False
+    has_access = _can_view_class(user, policy)
 
     if not has_access:
         messages.error(request, "لا تملك صلاحية عرض هذه الصفحة.")
@@ -591,27 +580,28 @@ def class_provider_manage(request, class_pk):
 
     # --- بناء بيانات العرض ---
     effective_network = policy_class.effective_network
-    excluded_ids = set(policy_class.excluded_providers.values_list('id', flat=True))
-    extra_ids = set(policy_class.extra_providers.values_list('id', flat=True))
 
-    # مستشفيات الشبكة الأصلية مع تمييز المستبعدة
+    # مستشفيات الشبكة الأصلية: الاستبعاد من جدول الاستبعاد نفسه،
+    # والتغطية الفعلية (PolicyClassProvider) حالة منفصلة تكشف أي انحراف بينهما
     if effective_network:
-        network_hospitals = effective_network.hospitals.all().order_by('name_ar')
+        network_hospitals = effective_network.hospitals.annotate(
+            is_excluded=Exists(policy_class.excluded_providers.filter(pk=OuterRef('pk'))),
+            is_covered=Exists(PolicyClassProvider.objects.filter(
+                policy_class=policy_class, service_provider=OuterRef('pk'),
+            )),
+        ).order_by('name_ar')
     else:
         network_hospitals = ServiceProvider.objects.none()
 
-    network_rows = []
-    for h in network_hospitals:
-        network_rows.append({
-            'provider': h,
-            'is_excluded': h.pk in excluded_ids,
-        })
+    network_rows = [
+        {'provider': h, 'is_excluded': h.is_excluded, 'is_covered': h.is_covered}
+        for h in network_hospitals
+    ]
 
     extra_providers = policy_class.extra_providers.all().order_by('name_ar')
 
     # قائمة البحث: كل المستشفيات المتاحة عند شركة التأمين
     search_q = request.GET.get('search', '').strip()
-    network_ids = set(network_hospitals.values_list('id', flat=True))
     # نحتاج معرفة مزود التأمين الفعلي لتضييق نطاق البحث
     effective_provider = policy.effective_provider
     if search_q:
@@ -620,7 +610,9 @@ def class_provider_manage(request, class_pk):
         )
         if effective_provider:
             search_results = search_results.filter(networks__provider=effective_provider).distinct()
-        search_results = search_results.exclude(id__in=network_ids | extra_ids)[:20]
+        if effective_network:
+            search_results = search_results.exclude(pk__in=effective_network.hospitals.values('pk'))
+        search_results = search_results.exclude(pk__in=policy_class.extra_providers.values('pk'))[:20]
     else:
         search_results = []
 
@@ -808,7 +800,7 @@ def plan_get_classes(request, plan_pk):
 @permission_required('policies.add_policy', raise_exception=True)
 def load_sponsor_numbers(request):
     """HTMX endpoint: يُرجع خيارات أرقام الكفيلة لعميل معين (ضمن نفس مجموعة القابضة)."""
-    from clients.models import SponsorNumber, get_group_root
+    from clients.models import SponsorNumber, group_root_id
     client_id = request.GET.get('client_id')
     if not client_id:
         return render(request, 'policies/partials/sponsor_number_options.html', {'sponsor_numbers': []})
@@ -816,10 +808,8 @@ def load_sponsor_numbers(request):
     # حماية العزل: لا يمكن جلب كفلاء عميل غير مسموح به
     allowed_clients = get_allowed_clients_qs(request.user)
     client = get_object_or_404(allowed_clients, id=client_id)
-    group_root = get_group_root(client)
-
     sponsor_numbers = SponsorNumber.objects.filter(
-        group=group_root,
+        group_id=group_root_id(client),
         is_active=True,
     ).select_related('owner_client')
 
@@ -847,10 +837,4 @@ def load_master_policy_details(request):
 
 def get_allowed_clients_qs(user):
     from clients.models import Client
-    if user.role == User.Roles.SUPER_ADMIN:
-        return Client.objects.all()
-    elif user.is_broker_role and user.related_broker:
-        return Client.objects.filter(broker=user.related_broker)
-    elif user.is_hr_role and user.related_client:
-        return Client.objects.filter(id=user.related_client.id)
-    return Client.objects.none()
\ No newline at end of file
+    return get_scope(user).restrict(Client.objects.all(), broker='broker', client='pk')
\ No newline at end of file
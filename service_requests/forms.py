@@ -83,7 +83,7 @@ class ServiceRequestCreateForm(forms.Form):
                     self.fields['member'].queryset = Member.objects.all()
                 elif self.user.is_broker_role and self.user.related_broker:
                     self.fields['member'].queryset = Member.objects.filter(
-                        client__broker=self.user.related_broker
+                        broker=self.user.related_broker
                     )
                 elif self.user.is_hr_role and self.user.related_client:
                     self.fields['member'].queryset = Member.objects.filter(
@@ -107,7 +107,7 @@ class ServiceRequestCreateForm(forms.Form):
                     elif self.user.is_broker_role and self.user.related_broker:
                         member = Member.objects.get(
                             national_id=national_id,
-                            client__broker=self.user.related_broker
+                            broker=self.user.related_broker
                         )
                     elif self.user.is_hr_role and self.user.related_client:
                         member = Member.objects.get(
@@ -1,11 +1,13 @@
 import uuid
-import datetime
 import os
 from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import get_valid_filename
 from django.conf import settings
 
+from core.sequences import next_reference
+from core.tenancy import TenantKeysMixin
+
 
 # --- دالة مساعدة لتحديد مسار حفظ المرفقات ---
 def request_file_upload_path(instance, filename):
@@ -74,7 +76,7 @@ class RequestType(models.Model):
 # ============================================
 # 2. طلب الخدمة
 # ============================================
-class ServiceRequest(models.Model):
+class ServiceRequest(TenantKeysMixin, models.Model):
     class Status(models.TextChoices):
         DRAFT = 'DRAFT', _('Draft')
         SUBMITTED = 'SUBMITTED', _('Submitted')
@@ -85,6 +87,11 @@ class ServiceRequest(models.Model):
         REJECTED = 'REJECTED', _('Rejected')
         TRANSFERRED_TO_MEDICATIONS = 'TRANSFERRED_TO_MEDICATIONS', _('Transferred to Medications Dept')
 
+    # الحالة كما حُمّلت — تستخدمها إشارات الإشعارات لاكتشاف الانتقال دون SELECT؛
+    # والعضو ومفاتيح المستأجر لإعادة نسخها عند تغيّر العضو (core/tenancy.py)
+    tracked_fields = ('status', 'member_id', 'client_id', 'broker_id')
+    tenant_parent = 'member'
+
     # المعرّفات
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     reference = models.CharField(_("Reference"), max_length=20, unique=True, editable=False)
@@ -102,6 +109,16 @@ class ServiceRequest(models.Model):
         related_name='service_requests',
         verbose_name=_("Member")
     )
+
+    # مفاتيح المستأجر منسوخة من العضو (core/tenancy.py) — فلترة العزل بعمود واحد
+    client = models.ForeignKey(
+        'clients.Client', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', db_index=True,
+    )
+    broker = models.ForeignKey(
+        'brokers.Broker', on_delete=models.SET_NULL, null=True, blank=True,
+        editable=False, related_name='+', db_index=True,
+    )
     submitted_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.PROTECT,
@@ -153,23 +170,16 @@ class ServiceRequest(models.Model):
         return f"{self.reference} ({self.get_status_display()})"
 
     def save(self, *args, **kwargs):
-        if not self.reference:
+        if self.reference:
+            return super().save(*args, **kwargs)
+        try:
             with transaction.atomic():
-                year = datetime.date.today().year
-                last_req = (
-                    ServiceRequest.objects
-                    .select_for_update()
-                    .filter(reference__startswith=f"REQ-{year}")
-                    .order_by('-reference')
-                    .first()
-                )
-                if last_req:
-                    last_id = int(last_req.reference.split('-')[-1])
-                    new_id = last_id + 1
-                else:
-                    new_id = 1
-                self.reference = f"REQ-{year}-{new_id:05d}"
-        super().save(*args, **kwargs)
+                self.reference = next_reference('REQ')
+                super().save(*args, **kwargs)
+        except Exception:
+            # لا نُبقي مرجعاً تم التراجع عن حجزه على الكائن
+            self.reference = ''
+            raise
 
     # ====================================================
     # Status Transition Methods (Lightweight — No django-fsm)
@@ -9,7 +9,8 @@ from .models import RequestType, ServiceRequest, RequestAttachment
 from .forms import ServiceRequestCreateForm, validate_dynamic_data
 from members.models import Member
 from members.utils import get_allowed_members
-from accounts.models import User
+from core.conditional import conditional
+from core.scope import Scope, get_scope
 
 
 # ==========================================
@@ -23,35 +24,22 @@ def get_allowed_requests(user):
         'request_type', 'member', 'member__client', 'submitted_by'
     )
 
-    # 1. السوبر أدمن يرى كل شيء
-    if user.role == User.Roles.SUPER_ADMIN:
-        return base_qs
+    # السوبر أدمن: الكل | الوسيط: شركاته | الـ HR: شركته | العضو: طلباته وطلبات عائلته
+    scope = get_scope(user)
+    requests_qs = scope.restrict(base_qs, broker='broker', client='client', member='member')
 
-    # 2. الوسيط يرى طلبات الشركات التابعة له — مع استثناء:
+    # الوسيط لا يرى:
     #    - المسودات (DRAFT): لم ترسل بعد
     #    - طلبات HR_REVIEW: لدى العملاء الذين يشترطون مراجعة الموارد البشرية،
     #      الطلب لا يصل للوسيط إلا بعد أن يحيله قسم الموارد صراحةً.
-    elif user.is_broker_role and user.related_broker:
-        return base_qs.filter(
-            member__client__broker=user.related_broker
-        ).exclude(
+    if scope.kind == Scope.BROKER:
+        requests_qs = requests_qs.exclude(
             status__in=[
                 ServiceRequest.Status.DRAFT,
                 ServiceRequest.Status.HR_REVIEW,
             ]
         )
-
-    # 3. الـ HR يرى طلبات شركته فقط
-    elif user.is_hr_role and user.related_client:
-        return base_qs.filter(member__client=user.related_client)
-
-    # 4. العضو يرى طلباته وطلبات التابعين له
-    elif user.is_member_role and hasattr(user, 'member_profile'):
-        return base_qs.filter(
-            Q(member=user.member_profile) | Q(member__sponsor=user.member_profile)
-        )
-
-    return ServiceRequest.objects.none()
+    return requests_qs
 
 
 # ==========================================
@@ -320,7 +308,13 @@ def request_create(request):
 # ==========================================
 # HTMX: جلب الحقول الديناميكية حسب نوع الطلب
 # ==========================================
+def request_type_fields_version(request, type_id):
+    # صف نوع الطلب كاملاً (المخطط صغير) — أي تعديل عليه يغيّر الـ ETag
+    return RequestType.objects.filter(id=type_id).values().first() or 'missing'
+
+
 @login_required
+@conditional(request_type_fields_version, templates=['service_requests/partials/dynamic_fields.html'])
 def request_type_fields(request, type_id):
     """
     HTMX partial — يُرجع حقول الإدخال الديناميكية حسب نوع الطلب المختار.
@@ -358,16 +352,8 @@ def search_member_by_nid(request):
         return render(request, 'service_requests/partials/member_search_result.html', {'member': None})
 
     try:
-        base_members = Member.objects.all()
-        if user.role == User.Roles.SUPER_ADMIN:
-            members_qs = base_members
-        elif user.is_broker_role and user.related_broker:
-            members_qs = base_members.filter(client__broker=user.related_broker)
-        elif user.is_hr_role and user.related_client:
-            members_qs = base_members.filter(client=user.related_client)
-        else:
-            members_qs = base_members.none()
-
+        # البحث للوسيط والـ HR فقط (العضو لا يبحث برقم الهوية)
+        members_qs = get_scope(user).restrict(Member.objects.all(), broker='broker', client='client')
         member = members_qs.get(national_id=q)
     except Member.DoesNotExist:
         member = None